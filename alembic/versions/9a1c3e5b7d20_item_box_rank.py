@@ -0,0 +1,59 @@
+"""sparse box ranks for items
+
+Revision ID: 9a1c3e5b7d20
+Revises:
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "9a1c3e5b7d20"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+POSITION_GAP = 1024
+
+
+def upgrade() -> None:
+    # Старые позиции уже упорядочены — умножаем их на шаг, чтобы между соседями появилось место.
+    op.alter_column(
+        "items",
+        "box_position",
+        new_column_name="box_rank",
+        type_=sa.BigInteger(),
+        existing_nullable=False,
+    )
+    op.execute(f"UPDATE items SET box_rank = box_rank * {POSITION_GAP}")
+    op.create_index("idx_item_box_rank", "items", ["box_id", "box_rank"])
+
+
+def downgrade() -> None:
+    op.drop_index("idx_item_box_rank", table_name="items")
+    op.alter_column(
+        "items",
+        "box_rank",
+        new_column_name="box_position",
+        type_=sa.Integer(),
+        existing_nullable=False,
+    )
+    # Возвращаем непрерывные слоты с учётом qty.
+    op.execute(
+        """
+        UPDATE items SET box_position = ranked.slot
+        FROM (
+            SELECT id,
+                   1 + COALESCE(SUM(GREATEST(COALESCE(qty, 1), 1)) OVER (
+                       PARTITION BY box_id ORDER BY box_position, id
+                       ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+                   ), 0) AS slot
+            FROM items
+        ) AS ranked
+        WHERE items.id = ranked.id
+        """
+    )
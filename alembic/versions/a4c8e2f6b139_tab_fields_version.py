@@ -0,0 +1,26 @@
+"""tab fields version
+
+Revision ID: a4c8e2f6b139
+Revises: f2a6d8c4e917
+Create Date: 2026-10-17 03:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a4c8e2f6b139"
+down_revision: Union[str, Sequence[str], None] = "f2a6d8c4e917"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("tabs", sa.Column("fields_version", sa.Integer(), nullable=False, server_default="0"))
+
+
+def downgrade() -> None:
+    op.drop_column("tabs", "fields_version")
@@ -0,0 +1,34 @@
+"""search item metadata by values only
+
+Revision ID: b3d7f1a9c562
+Revises: a4c8e2f6b139
+Create Date: 2026-10-17 04:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b3d7f1a9c562"
+down_revision: Union[str, Sequence[str], None] = "a4c8e2f6b139"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Ключи метаданных (stable_key, uuid hex) не должны участвовать в поиске
+    op.drop_index("idx_item_metadata_trgm", table_name="items")
+    op.execute(
+        "CREATE INDEX idx_item_metadata_values_trgm ON items USING gin "
+        "((CAST(jsonb_path_query_array(CAST(metadata_json AS JSONB), 'strict $.*') AS TEXT)) gin_trgm_ops)"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("idx_item_metadata_values_trgm", table_name="items")
+    op.execute(
+        "CREATE INDEX idx_item_metadata_trgm ON items "
+        "USING gin ((CAST(CAST(metadata_json AS JSONB) AS TEXT)) gin_trgm_ops)"
+    )
@@ -0,0 +1,65 @@
+"""trigram and GIN indexes for item search
+
+Revision ID: b7e2d4f6a813
+Revises: 9a1c3e5b7d20
+Create Date: 2026-10-17 00:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b7e2d4f6a813"
+down_revision: Union[str, Sequence[str], None] = "9a1c3e5b7d20"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.alter_column(
+        "items",
+        "tag_ids",
+        type_=postgresql.JSONB(),
+        existing_type=sa.JSON(),
+        existing_nullable=False,
+        postgresql_using="tag_ids::jsonb",
+    )
+    op.create_index(
+        "idx_item_name_trgm",
+        "items",
+        ["name"],
+        postgresql_using="gin",
+        postgresql_ops={"name": "gin_trgm_ops"},
+    )
+    op.create_index(
+        "idx_item_serial_trgm",
+        "items",
+        ["serial_number"],
+        postgresql_using="gin",
+        postgresql_ops={"serial_number": "gin_trgm_ops"},
+    )
+    op.execute(
+        "CREATE INDEX idx_item_metadata_trgm ON items "
+        "USING gin ((CAST(CAST(metadata_json AS JSONB) AS TEXT)) gin_trgm_ops)"
+    )
+    op.create_index("idx_item_tag_ids_gin", "items", ["tag_ids"], postgresql_using="gin")
+
+
+def downgrade() -> None:
+    op.drop_index("idx_item_tag_ids_gin", table_name="items")
+    op.drop_index("idx_item_metadata_trgm", table_name="items")
+    op.drop_index("idx_item_serial_trgm", table_name="items")
+    op.drop_index("idx_item_name_trgm", table_name="items")
+    op.alter_column(
+        "items",
+        "tag_ids",
+        type_=sa.JSON(),
+        existing_type=postgresql.JSONB(),
+        existing_nullable=False,
+        postgresql_using="tag_ids::json",
+    )
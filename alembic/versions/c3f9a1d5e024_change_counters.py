@@ -0,0 +1,30 @@
+"""change counters for ETag revalidation
+
+Revision ID: c3f9a1d5e024
+Revises: b7e2d4f6a813
+Create Date: 2026-10-17 00:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c3f9a1d5e024"
+down_revision: Union[str, Sequence[str], None] = "b7e2d4f6a813"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "change_counters",
+        sa.Column("name", sa.String(), primary_key=True),
+        sa.Column("value", sa.BigInteger(), nullable=False, server_default="0"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("change_counters")
@@ -0,0 +1,33 @@
+"""item updated_at for tab contents ETag
+
+Revision ID: c7e1a3f5b924
+Revises: b3d7f1a9c562
+Create Date: 2026-10-17 05:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c7e1a3f5b924"
+down_revision: Union[str, Sequence[str], None] = "b3d7f1a9c562"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "items",
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+    )
+    op.create_index("idx_item_tab_updated", "items", ["tab_id", "updated_at"])
+    # Счётчики tab_contents:{id} больше не ведутся: ETag содержимого строится по айтемам
+    op.execute("DELETE FROM change_counters WHERE name LIKE 'tab_contents:%'")
+
+
+def downgrade() -> None:
+    op.drop_index("idx_item_tab_updated", table_name="items")
+    op.drop_column("items", "updated_at")
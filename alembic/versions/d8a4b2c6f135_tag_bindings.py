@@ -0,0 +1,48 @@
+"""tag bindings index table
+
+Revision ID: d8a4b2c6f135
+Revises: c3f9a1d5e024
+Create Date: 2026-10-17 00:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d8a4b2c6f135"
+down_revision: Union[str, Sequence[str], None] = "c3f9a1d5e024"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ENTITY_TABLES = (("tab", "tabs"), ("box", "boxes"), ("item", "items"))
+
+
+def upgrade() -> None:
+    op.create_table(
+        "tag_bindings",
+        sa.Column("tag_id", sa.Integer(), nullable=False),
+        sa.Column("entity_type", sa.String(length=8), nullable=False),
+        sa.Column("entity_id", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("tag_id", "entity_type", "entity_id"),
+    )
+    op.create_index("idx_tag_binding_entity", "tag_bindings", ["entity_type", "entity_id"])
+
+    # Заполняем из текущих tag_ids; нечисловые значения пропускаем.
+    for entity_type, table in ENTITY_TABLES:
+        op.execute(
+            f"""
+            INSERT INTO tag_bindings (tag_id, entity_type, entity_id)
+            SELECT DISTINCT tag.value::int, '{entity_type}', src.id
+            FROM {table} AS src,
+                 jsonb_array_elements_text(COALESCE(src.tag_ids::jsonb, '[]'::jsonb)) AS tag(value)
+            WHERE tag.value ~ '^-?[0-9]+$'
+            """
+        )
+
+
+def downgrade() -> None:
+    op.drop_index("idx_tag_binding_entity", table_name="tag_bindings")
+    op.drop_table("tag_bindings")
@@ -0,0 +1,66 @@
+"""item_utilized snapshot columns and history cursor index
+
+Revision ID: e5b9c3d7a246
+Revises: d8a4b2c6f135
+Create Date: 2026-10-17 01:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e5b9c3d7a246"
+down_revision: Union[str, Sequence[str], None] = "d8a4b2c6f135"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TRGM_COLUMNS = ("item_name", "tab_name", "box_name")
+
+
+def upgrade() -> None:
+    op.add_column("item_utilized", sa.Column("item_name", sa.String(), nullable=True))
+    op.add_column("item_utilized", sa.Column("tab_name", sa.String(), nullable=True))
+    op.add_column("item_utilized", sa.Column("box_name", sa.String(), nullable=True))
+    op.add_column("item_utilized", sa.Column("qty", sa.Integer(), nullable=True))
+
+    # Переносим поля из JSON-снимка; строки, где снимок не объект, остаются пустыми.
+    op.execute(
+        r"""
+        UPDATE item_utilized AS iu
+        SET item_name = snap.data ->> 'item_name',
+            tab_name = snap.data ->> 'tab_name',
+            box_name = snap.data ->> 'box_name',
+            qty = CASE
+                WHEN snap.data ->> 'qty' ~ '^-?[0-9]+$' THEN (snap.data ->> 'qty')::int
+            END
+        FROM (
+            SELECT id, item_snapshot::jsonb AS data
+            FROM item_utilized
+            WHERE item_snapshot ~ '^\s*\{'
+        ) AS snap
+        WHERE snap.id = iu.id
+        """
+    )
+
+    for column in TRGM_COLUMNS:
+        op.create_index(
+            f"idx_item_utilized_{column}_trgm",
+            "item_utilized",
+            [column],
+            postgresql_using="gin",
+            postgresql_ops={column: "gin_trgm_ops"},
+        )
+    op.create_index("idx_issue_created_id", "issues", ["created_at", "id"])
+
+
+def downgrade() -> None:
+    op.drop_index("idx_issue_created_id", table_name="issues")
+    for column in TRGM_COLUMNS:
+        op.drop_index(f"idx_item_utilized_{column}_trgm", table_name="item_utilized")
+    op.drop_column("item_utilized", "qty")
+    op.drop_column("item_utilized", "box_name")
+    op.drop_column("item_utilized", "tab_name")
+    op.drop_column("item_utilized", "item_name")
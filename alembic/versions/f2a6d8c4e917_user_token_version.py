@@ -0,0 +1,26 @@
+"""user token version
+
+Revision ID: f2a6d8c4e917
+Revises: e5b9c3d7a246
+Create Date: 2026-10-17 01:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "f2a6d8c4e917"
+down_revision: Union[str, Sequence[str], None] = "e5b9c3d7a246"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("users", sa.Column("token_version", sa.Integer(), nullable=False, server_default="0"))
+
+
+def downgrade() -> None:
+    op.drop_column("users", "token_version")
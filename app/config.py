@@ -36,4 +36,6 @@ API_BASE_URL = require_api_base_url()
 FRONTEND_DIR = os.path.join(os.path.dirname(__file__), "..", "frontend")
 SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret-change-me")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
+# Bearer-токен скрейпера для /metrics; без него метрики доступны только администратору
+METRICS_TOKEN = _read_env("METRICS_TOKEN")
 UI_PATH = Path(__file__).parent.parent / "frontend"
@@ -1,12 +1,20 @@
 from typing import Optional
 from sqlalchemy.orm import Session
 from app import models, schemas
+from app.services import change_feed
 from sqlalchemy import func, case
 from fastapi import HTTPException
 
 DEFAULT_QTY = 1
 
 
+def _publish_box(event_type: str, db_box: models.Box):
+    # Заполненность приходит отдельными дельтами box.counts из crud/items.py
+    data = schemas.BoxRead.model_validate(db_box).model_dump(mode="json", exclude={"items_count"})
+    data["color"] = db_box.color
+    change_feed.publish(event_type, db_box.tab_id, {"box": data})
+
+
 def _box_items_total_expression():
     normalized_qty = case(
         (models.Item.id.is_(None), 0),
@@ -39,6 +47,7 @@ def create_box(db: Session, box: schemas.BoxCreate):
 
 
     db.refresh(db_box)
+    _publish_box("box.created", db_box)
     return db_box
 
 def get_box(db: Session, box_id: int):
@@ -59,6 +68,7 @@ def update_box(db: Session, box_id: int, box_data: schemas.BoxUpdate):
 
     db.commit()
     db.refresh(db_box)
+    _publish_box("box.updated", db_box)
     return db_box
 
 def delete_box(db: Session, box_id: int):
@@ -70,8 +80,10 @@ def delete_box(db: Session, box_id: int):
     if item_count > 0:
         raise HTTPException(status_code=400, detail="Cannot delete non-empty box")
 
+    tab_id = db_box.tab_id
     db.delete(db_box)
     db.commit()
+    change_feed.publish("box.deleted", tab_id, {"box": {"id": box_id}})
     return {"detail": f"Box {box_id} deleted"}
 
 def get_boxes(db: Session):
@@ -0,0 +1,90 @@
+from typing import Iterable, Set
+
+from sqlalchemy import event, insert, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app import models
+
+# Счётчик справочника вкладок: меняется при любой правке вкладок, их полей и ящиков.
+# Правки айтемов его не трогают: ETag содержимого вкладки строится по самим айтемам
+# (items.get_tab_contents_version), чтобы запись айтема не блокировала общую строку.
+CATALOG = "catalog"
+
+_CATALOG_MODELS = (models.Tab, models.TabField, models.Box)
+
+
+# INSERT ... ON CONFLICT DO UPDATE по диалектам
+_UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def get_value(db: Session, name: str) -> int:
+    value = (
+        db.query(models.ChangeCounter.value)
+        .filter(models.ChangeCounter.name == name)
+        .scalar()
+    )
+    return int(value or 0)
+
+
+def bump(db: Session, name: str) -> None:
+    """
+    Увеличивает счётчик в текущей транзакции одним upsert: две транзакции,
+    впервые меняющие один счётчик, не падают на уникальном ключе.
+    """
+    dialect_insert = _UPSERT_INSERTS.get(db.get_bind().dialect.name)
+    if dialect_insert is None:
+        result = db.execute(
+            update(models.ChangeCounter)
+            .where(models.ChangeCounter.name == name)
+            .values(value=models.ChangeCounter.value + 1)
+        )
+        if not result.rowcount:
+            db.execute(insert(models.ChangeCounter).values(name=name, value=1))
+        return
+    statement = dialect_insert(models.ChangeCounter).values(name=name, value=1)
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=[models.ChangeCounter.name],
+            set_={"value": models.ChangeCounter.value + 1},
+        )
+    )
+
+
+def _touched_counters(session: Session, instances: Iterable) -> Set[str]:
+    touched: Set[str] = set()
+    for instance in instances:
+        if isinstance(instance, _CATALOG_MODELS):
+            touched.add(CATALOG)
+    return touched
+
+
+def _collect_on_flush(session: Session, flush_context, instances) -> None:
+    modified = [obj for obj in session.dirty if session.is_modified(obj, include_collections=False)]
+    session.info.setdefault("touched_counters", set()).update(
+        _touched_counters(session, [*session.new, *session.deleted, *modified])
+    )
+
+
+def _bump_on_commit(session: Session) -> None:
+    # Строка счётчика (особенно catalog) блокируется до конца транзакции, поэтому
+    # увеличиваем её перед самым commit, а не при первом flush: писатели ждут друг друга
+    # только на время фиксации. Для ETag достаточно одного увеличения за транзакцию.
+    session.flush()
+    for name in sorted(session.info.pop("touched_counters", ())):
+        bump(session, name)
+
+
+def _reset_touched(session: Session, transaction) -> None:
+    # После отката точки сохранения лишнее увеличение безвредно, пропущенное — нет
+    if transaction.parent is None:
+        session.info.pop("touched_counters", None)
+
+
+def register_hooks(session_class=Session) -> None:
+    """
+    Подключает хуки сессии; вызывается один раз из app.database.
+    """
+    event.listen(session_class, "before_flush", _collect_on_flush)
+    event.listen(session_class, "before_commit", _bump_on_commit)
+    event.listen(session_class, "after_transaction_end", _reset_touched)
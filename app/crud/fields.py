@@ -1,8 +1,18 @@
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
 from app import models, schemas
 
 
+def _bump_fields_version(db: Session, tab_id: int) -> None:
+    # Атомарно в SQL: параллельные правки полей не получат одну и ту же версию
+    db.execute(
+        update(models.Tab)
+        .where(models.Tab.id == tab_id)
+        .values(fields_version=models.Tab.fields_version + 1)
+    )
+
+
 def create_tab_field(db: Session, field: schemas.TabFieldCreate):
     """Создаёт новое поле для вкладки."""
     tab = db.query(models.Tab).filter(models.Tab.id == field.tab_id).first()
@@ -11,6 +21,7 @@ def create_tab_field(db: Session, field: schemas.TabFieldCreate):
 
     db_field = models.TabField(**field.model_dump())
     db.add(db_field)
+    _bump_fields_version(db, tab.id)
     db.commit()
     db.refresh(db_field)
     return db_field
@@ -31,6 +42,7 @@ def update_tab_field(db: Session, field_id: int, field_data: schemas.TabFieldUpd
     for key, value in field_data.model_dump(exclude_unset=True).items():
         setattr(db_field, key, value)
 
+    _bump_fields_version(db, db_field.tab_id)
     db.commit()
     db.refresh(db_field)
     return db_field
@@ -41,5 +53,6 @@ def delete_tab_field(db: Session, field_id: int):
         raise HTTPException(status_code=404, detail="Tab field not found")
 
     db.delete(db_field)
+    _bump_fields_version(db, db_field.tab_id)
     db.commit()
     return {"detail": f"Tab field {field_id} deleted"}
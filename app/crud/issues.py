@@ -1,12 +1,17 @@
+import base64
 import json
 from datetime import datetime, UTC
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 from fastapi import HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session, defer, undefer
 
 from app import models, schemas
-from app.utils.local_history import append_issue_row
+from app.utils.local_history import _format_datetime, append_issue_row
+
+EXPORT_BATCH_SIZE = 1000
+TOTAL_MODES = ("exact", "estimate", "none")
 
 
 def _parse_snapshot(raw_value: Any) -> Dict[str, Any]:
@@ -23,10 +28,47 @@ def _parse_snapshot(raw_value: Any) -> Dict[str, Any]:
     return {}
 
 
-def list_issues(
-    db: Session,
-    page: int = 1,
-    per_page: int = 20,
+def _snapshot_fields(
+    item_name: Optional[str],
+    tab_name: Optional[str],
+    box_name: Optional[str],
+    qty: Optional[int],
+    raw_snapshot: Any = None,
+) -> Dict[str, Any]:
+    """
+    Снимок айтема из отдельных колонок; старые строки без них разбираются из JSON.
+    """
+    if item_name is None and tab_name is None and box_name is None and qty is None:
+        return _parse_snapshot(raw_snapshot)
+    return {"item_name": item_name, "tab_name": tab_name, "box_name": box_name, "qty": qty}
+
+
+def _encode_history_cursor(created_at: datetime, issue_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), issue_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def _decode_history_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    if not cursor:
+        return None
+    try:
+        created_at, issue_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(created_at), int(issue_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _history_query(db: Session):
+    return (
+        db.query(models.Issue, models.ItemUtilized, models.Status, models.User)
+        .join(models.ItemUtilized, models.ItemUtilized.issue_id == models.Issue.id)
+        .join(models.Status, models.Status.id == models.Issue.status_id)
+        .outerjoin(models.User, models.User.id == models.ItemUtilized.responsible_user_id)
+    )
+
+
+def _filter_history(
+    query,
     status_id: Optional[int] = None,
     responsible: Optional[str] = None,
     serial: Optional[str] = None,
@@ -36,15 +78,7 @@ def list_issues(
     box: Optional[str] = None,
     created_from: Optional[datetime] = None,
     created_to: Optional[datetime] = None,
-) -> schemas.IssueHistoryResponse:
-    query = (
-        db.query(models.Issue, models.ItemUtilized, models.Status, models.User)
-        .join(models.ItemUtilized, models.ItemUtilized.issue_id == models.Issue.id)
-        .join(models.Status, models.Status.id == models.Issue.status_id)
-        .outerjoin(models.User, models.User.id == models.ItemUtilized.responsible_user_id)
-        .order_by(models.Issue.created_at.desc())
-    )
-
+):
     responsible = (responsible or "").strip()
     serial = (serial or "").strip()
     invoice = (invoice or "").strip()
@@ -52,9 +86,6 @@ def list_issues(
     tab = (tab or "").strip()
     box = (box or "").strip()
 
-    page = max(int(page or 1), 1)
-    per_page = min(max(int(per_page or 20), 1), 200)
-
     if status_id:
         query = query.filter(models.Status.id == status_id)
     if responsible:
@@ -64,37 +95,154 @@ def list_issues(
     if invoice:
         query = query.filter(models.ItemUtilized.invoice_number.ilike(f"%{invoice}%"))
     if item:
-        query = query.filter(models.ItemUtilized.item_snapshot.ilike(f"%{item}%"))
+        query = query.filter(models.ItemUtilized.item_name.ilike(f"%{item}%"))
     if tab:
-        query = query.filter(models.ItemUtilized.item_snapshot.ilike(f"%{tab}%"))
+        query = query.filter(models.ItemUtilized.tab_name.ilike(f"%{tab}%"))
     if box:
-        query = query.filter(models.ItemUtilized.item_snapshot.ilike(f"%{box}%"))
+        query = query.filter(models.ItemUtilized.box_name.ilike(f"%{box}%"))
     if created_from:
         query = query.filter(models.Issue.created_at >= created_from)
     if created_to:
         query = query.filter(models.Issue.created_at <= created_to)
+    return query
 
-    total = query.count()
-    if per_page:
-        query = query.limit(per_page).offset((page - 1) * per_page)
-
-    entries: List[schemas.IssueHistoryEntry] = []
-    for issue, snapshot, status, user in query.all():
-        entries.append(
-            schemas.IssueHistoryEntry(
-                id=issue.id,
-                status_id=status.id,
-                status_name=status.name,
-                status_color=status.color,
-                responsible_user_name=getattr(user, "user_name", None),
-                serial_number=snapshot.serial_number,
-                invoice_number=snapshot.invoice_number,
-                item_snapshot=_parse_snapshot(snapshot.item_snapshot),
-                created_at=issue.created_at,
-            )
-        )
 
-    return schemas.IssueHistoryResponse(items=entries, total=total)
+def _estimate_total(db: Session, query) -> int:
+    """
+    Оценка числа строк по плану Postgres (EXPLAIN), без прохода по таблице.
+    На других СУБД считаем точно.
+    """
+    bind = db.get_bind()
+    if bind.dialect.name != "postgresql":
+        return query.order_by(None).count()
+    compiled = query.order_by(None).statement.compile(dialect=bind.dialect)
+    plan = db.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled.string}", compiled.params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def _is_legacy_snapshot(snapshot: models.ItemUtilized) -> bool:
+    return snapshot.item_name is None and snapshot.tab_name is None and snapshot.box_name is None and snapshot.qty is None
+
+
+def _history_entry(issue, snapshot, status, user) -> schemas.IssueHistoryEntry:
+    # JSON-снимок читается только у старых строк: в списке истории он отложен (defer)
+    raw_snapshot = snapshot.item_snapshot if _is_legacy_snapshot(snapshot) else None
+    return schemas.IssueHistoryEntry(
+        id=issue.id,
+        status_id=status.id,
+        status_name=status.name,
+        status_color=status.color,
+        responsible_user_name=getattr(user, "user_name", None),
+        serial_number=snapshot.serial_number,
+        invoice_number=snapshot.invoice_number,
+        item_snapshot=_snapshot_fields(
+            snapshot.item_name, snapshot.tab_name, snapshot.box_name, snapshot.qty, raw_snapshot
+        ),
+        created_at=issue.created_at,
+    )
+
+
+def list_issues(
+    db: Session,
+    page: int = 1,
+    per_page: int = 20,
+    cursor: Optional[str] = None,
+    total_mode: str = "exact",
+    **filters: Any,
+) -> schemas.IssueHistoryResponse:
+    """
+    Страница истории, новые сверху.
+    С cursor страница выбирается по ключу (created_at, id) без OFFSET, и глубина
+    листания не влияет на стоимость запроса. total_mode: exact — COUNT(*),
+    estimate — оценка планировщика, none — без подсчёта.
+    """
+    if total_mode not in TOTAL_MODES:
+        raise HTTPException(status_code=400, detail="Invalid total mode")
+
+    query = _filter_history(_history_query(db), **filters)
+
+    page = max(int(page or 1), 1)
+    per_page = min(max(int(per_page or 20), 1), 200)
+
+    total = None
+    if total_mode == "exact":
+        total = query.count()
+    elif total_mode == "estimate":
+        total = _estimate_total(db, query)
+
+    # JSON-снимок не нужен: поля снимка лежат в колонках
+    query = query.options(defer(models.ItemUtilized.item_snapshot)).order_by(
+        models.Issue.created_at.desc(), models.Issue.id.desc()
+    )
+    after = _decode_history_cursor(cursor)
+    if after:
+        query = query.filter(tuple_(models.Issue.created_at, models.Issue.id) < tuple_(*after))
+    else:
+        query = query.offset((page - 1) * per_page)
+
+    rows = query.limit(per_page + 1).all()
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last_issue = rows[-1][0]
+        next_cursor = _encode_history_cursor(last_issue.created_at, last_issue.id)
+
+    legacy_ids = [snapshot.id for _, snapshot, _, _ in rows if _is_legacy_snapshot(snapshot)]
+    if legacy_ids:
+        # Старые строки без колонок снимка: JSON догружается одним запросом, а не по строке
+        db.query(models.ItemUtilized).options(undefer(models.ItemUtilized.item_snapshot)).filter(
+            models.ItemUtilized.id.in_(legacy_ids)
+        ).all()
+    entries: List[schemas.IssueHistoryEntry] = [_history_entry(*row) for row in rows]
+    return schemas.IssueHistoryResponse(
+        items=entries,
+        total=total,
+        total_estimated=total_mode == "estimate",
+        next_cursor=next_cursor,
+    )
+
+
+def iter_export_rows(db: Session, **filters: Any) -> Iterator[List[Any]]:
+    """
+    Строки выгрузки истории прямо из таблиц с теми же фильтрами, что у list_issues.
+    Выбираются только нужные колонки, курсор читается порциями по EXPORT_BATCH_SIZE
+    (в Postgres — серверный курсор). Колонки совпадают с local_history.HEADERS.
+    """
+    query = (
+        db.query(
+            models.Issue.created_at,
+            models.ItemUtilized.item_name,
+            models.ItemUtilized.tab_name,
+            models.ItemUtilized.box_name,
+            models.ItemUtilized.qty,
+            models.ItemUtilized.item_snapshot,
+            models.ItemUtilized.serial_number,
+            models.ItemUtilized.invoice_number,
+            models.Status.name,
+            models.User.user_name,
+        )
+        .select_from(models.Issue)
+        .join(models.ItemUtilized, models.ItemUtilized.issue_id == models.Issue.id)
+        .join(models.Status, models.Status.id == models.Issue.status_id)
+        .outerjoin(models.User, models.User.id == models.ItemUtilized.responsible_user_id)
+    )
+    query = _filter_history(query, **filters).order_by(models.Issue.created_at, models.Issue.id)
+    for row in query.yield_per(EXPORT_BATCH_SIZE):
+        created_at, item_name, tab_name, box_name, qty, raw_snapshot, serial, invoice, status_name, user_name = row
+        data = _snapshot_fields(item_name, tab_name, box_name, qty, raw_snapshot)
+        yield [
+            _format_datetime(created_at),
+            data.get("tab_name") or "",
+            data.get("box_name") or "",
+            data.get("item_name") or "",
+            data.get("qty") or "",
+            status_name,
+            user_name or "",
+            serial or "",
+            invoice or "",
+        ]
 
 
 def update_issue_status(db: Session, issue_id: int, status_id: int) -> schemas.IssueHistoryEntry:
@@ -110,22 +258,12 @@ def update_issue_status(db: Session, issue_id: int, status_id: int) -> schemas.I
     db.commit()
     db.refresh(issue)
 
-    joined = (
-        db.query(models.Issue, models.ItemUtilized, models.Status, models.User)
-        .join(models.ItemUtilized, models.ItemUtilized.issue_id == models.Issue.id)
-        .join(models.Status, models.Status.id == models.Issue.status_id)
-        .outerjoin(models.User, models.User.id == models.ItemUtilized.responsible_user_id)
-        .filter(models.Issue.id == issue_id)
-        .first()
-    )
+    joined = _history_query(db).filter(models.Issue.id == issue_id).first()
     if not joined:
         raise HTTPException(status_code=404, detail="Issue history entry not found")
 
-    issue_row, snapshot, status_row, user = joined
-    try:
-        snapshot_data = _parse_snapshot(snapshot.item_snapshot)
-    except Exception:
-        snapshot_data = {}
+    entry = _history_entry(*joined)
+    snapshot_data = entry.item_snapshot
 
     append_issue_row(
         {
@@ -134,21 +272,11 @@ def update_issue_status(db: Session, issue_id: int, status_id: int) -> schemas.I
             "box_name": snapshot_data.get("box_name"),
             "item_name": snapshot_data.get("item_name"),
             "qty": snapshot_data.get("qty") or "",
-            "status": status_row.name,
-            "responsible": getattr(user, "user_name", None),
-            "serial": snapshot.serial_number,
-            "invoice": snapshot.invoice_number,
+            "status": entry.status_name,
+            "responsible": entry.responsible_user_name,
+            "serial": entry.serial_number,
+            "invoice": entry.invoice_number,
         }
     )
 
-    return schemas.IssueHistoryEntry(
-        id=issue_row.id,
-        status_id=status_row.id,
-        status_name=status_row.name,
-        status_color=status_row.color,
-        responsible_user_name=getattr(user, "user_name", None),
-        serial_number=snapshot.serial_number,
-        invoice_number=snapshot.invoice_number,
-        item_snapshot=_parse_snapshot(snapshot.item_snapshot),
-        created_at=issue_row.created_at,
-    )
+    return entry
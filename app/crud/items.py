@@ -1,107 +1,108 @@
-from typing import Any, Dict, List, Optional, Set
+from typing import Any, Dict, List, Optional, Set, Tuple
 from datetime import datetime, UTC
+from difflib import SequenceMatcher
+import base64
 import json
-from sqlalchemy import func, cast
+from sqlalchemy import func, cast, case, or_, and_, literal, literal_column, select, type_coerce, Float, Text
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Session, selectinload
 from fastapi import HTTPException
 from app import models, schemas
-from app.services import sync_dispatcher
+from app.crud import change_counters
+from app.services import change_feed, field_codec, sync_dispatcher
 from app.utils.local_history import append_issue_row
 
 
-def _get_tab_fields(db: Session, tab_id: int, *, required: bool = False) -> List[models.TabField]:
-    fields = db.query(models.TabField).filter(models.TabField.tab_id == tab_id).all()
-    if required and not fields:
+def _require_fields(codec: field_codec.FieldCodec, required: bool) -> field_codec.FieldCodec:
+    if required and not codec.names:
         raise HTTPException(status_code=400, detail="Tab has no defined fields")
-    return fields
+    return codec
 
 
-def _build_field_maps(fields: List[models.TabField]):
-    name_map = {}
-    key_map = {}
-    for field in fields or []:
-        stable_key = getattr(field, "stable_key", None) or field.name
-        name_map[field.name] = field
-        key_map[stable_key] = field
-    return name_map, key_map
-
-
-def _metadata_to_storage(metadata_json: Optional[Dict[str, Any]], fields: List[models.TabField]) -> Dict[str, Any]:
-    metadata_json = metadata_json or {}
-    if not metadata_json:
-        return {}
-
-    name_map, key_map = _build_field_maps(fields)
-    if not name_map and not key_map:
-        return metadata_json.copy()
-
-    normalized: Dict[str, Any] = {}
-    unknown_keys = []
+def _tab_codec(db: Session, tab: models.Tab, *, required: bool = False) -> field_codec.FieldCodec:
+    """
+    Поля вкладки из кеша field_codec: при загруженном Tab запросов к БД нет.
+    """
+    return _require_fields(field_codec.for_tab(db, tab), required)
 
-    for raw_key, value in metadata_json.items():
-        field = name_map.get(raw_key) or key_map.get(raw_key)
-        if not field:
-            unknown_keys.append(raw_key)
-            continue
-        stable_key = getattr(field, "stable_key", None) or field.name
-        normalized[stable_key] = value
 
+def _metadata_to_storage(metadata_json: Optional[Dict[str, Any]], codec: field_codec.FieldCodec) -> Dict[str, Any]:
+    normalized, unknown_keys = codec.to_storage(metadata_json)
     if unknown_keys:
         raise HTTPException(
             status_code=400,
             detail=f"Unknown tab fields: {', '.join(unknown_keys)}",
         )
-
+    invalid_fields = codec.disallowed(normalized)
+    if invalid_fields:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Values not allowed for fields: {', '.join(invalid_fields)}",
+        )
     return normalized
 
 
-def _metadata_to_response(metadata_json: Optional[Dict[str, Any]], fields: List[models.TabField]) -> Dict[str, Any]:
-    metadata_json = metadata_json or {}
-    if not metadata_json:
-        return {}
-
-    key_to_name = {}
-    for field in fields or []:
-        stable_key = getattr(field, "stable_key", None) or field.name
-        key_to_name[stable_key] = field.name
-
-    converted: Dict[str, Any] = {}
-    for raw_key, value in metadata_json.items():
-        display_key = key_to_name.get(raw_key, raw_key)
-        converted[display_key] = value
-
-    return converted
-
-
-def _item_to_schema(item: models.Item, fields: List[models.TabField], sync_result=None) -> schemas.ItemRead:
+def _item_to_schema(
+    item: models.Item,
+    codec: field_codec.FieldCodec,
+    position: int,
+    sync_result=None,
+) -> schemas.ItemRead:
     serials = _parse_serials(item.serial_number)
     return schemas.ItemRead(
         id=item.id,
         name=item.name,
         qty=item.qty,
         serial_number=serials,
-        position=item.box_position,
-        metadata_json=_metadata_to_response(item.metadata_json, fields),
+        position=position,
+        metadata_json=codec.to_response(item.metadata_json),
         tag_ids=list(item.tag_ids or []),
         tab_id=item.tab_id,
         box_id=item.box_id,
-        box_position=item.box_position,
+        box_position=position,
         sync_result=sync_result,
     )
 
 
-def _serialize_items(db: Session, items: List[models.Item]) -> List[schemas.ItemRead]:
+def _serialize_items(
+    db: Session, items: List[models.Item], versions: Optional[Dict[int, int]] = None
+) -> List[schemas.ItemRead]:
+    """
+    items — все айтемы ящика в порядке (box_rank, id): слоты считаются по этому списку.
+    versions — уже выбранные Tab.fields_version; без них версии читаются одним запросом.
+    """
     if not items:
         return []
 
-    fields_cache: Dict[int, List[models.TabField]] = {}
-    serialized: List[schemas.ItemRead] = []
-    for item in items:
-        if item.tab_id not in fields_cache:
-            fields_cache[item.tab_id] = _get_tab_fields(db, item.tab_id)
-        serialized.append(_item_to_schema(item, fields_cache[item.tab_id]))
-    return serialized
+    slots = _compute_slots(items)
+    if versions is None:
+        codecs = field_codec.for_tabs(db, {item.tab_id for item in items})
+    else:
+        codecs = field_codec.get_codecs(db, versions)
+    return [_item_to_schema(item, codecs[item.tab_id], slots[item.id]) for item in items]
+
+
+def _item_event(item: schemas.ItemRead) -> Dict[str, Any]:
+    return {"item": item.model_dump(mode="json", exclude={"sync_result"})}
+
+
+def _publish_box_counts(db: Session, tab_id: int, box_ids) -> None:
+    """
+    Заполненность ящиков после изменения айтемов: одна дельта вместо перечитывания /boxes/{tab_id}.
+    """
+    box_ids = {box_id for box_id in box_ids if box_id}
+    if not box_ids:
+        return
+    counts = {box_id: 0 for box_id in box_ids}
+    rows = db.execute(
+        select(models.Item.box_id, func.sum(_slot_qty_expression()))
+        .where(models.Item.box_id.in_(box_ids))
+        .group_by(models.Item.box_id)
+    ).all()
+    counts.update({box_id: int(total or 0) for box_id, total in rows})
+    change_feed.publish(
+        "box.counts", tab_id, {"boxes": [{"id": box_id, "items_count": total} for box_id, total in sorted(counts.items())]}
+    )
 
 
 def _parse_serials(raw: Optional[str | List[str]]) -> List[str]:
@@ -126,30 +127,107 @@ def _normalize_qty(value: Optional[int]) -> int:
     return qty
 
 
-def _get_next_box_position(db: Session, box_id: int) -> int:
-    qty_expr = func.coalesce(models.Item.qty, 1)
-    last_slot = (
-        db.query(func.max(models.Item.box_position + qty_expr - 1))
-        .filter(models.Item.box_id == box_id)
+POSITION_GAP = 1024
+
+
+def _slot_qty_expression():
+    return case((models.Item.qty > 0, models.Item.qty), else_=1)
+
+
+def _box_order(query):
+    return query.order_by(models.Item.box_rank.asc(), models.Item.id.asc())
+
+
+def _compute_slots(items: List[models.Item]) -> Dict[int, int]:
+    """
+    Номера слотов для айтемов одного ящика: 1 + сумма qty всех предыдущих.
+    items должны быть отсортированы по (box_rank, id).
+    """
+    slots: Dict[int, int] = {}
+    next_slot = 1
+    for item in items:
+        slots[item.id] = next_slot
+        next_slot += _normalize_qty(getattr(item, "qty", 1))
+    return slots
+
+
+def _get_item_slot(db: Session, item: models.Item) -> int:
+    preceding = (
+        db.query(func.coalesce(func.sum(_slot_qty_expression()), 0))
+        .filter(
+            models.Item.box_id == item.box_id,
+            or_(
+                models.Item.box_rank < item.box_rank,
+                and_(models.Item.box_rank == item.box_rank, models.Item.id < item.id),
+            ),
+        )
         .scalar()
     )
-    return (last_slot or 0) + 1
+    return int(preceding or 0) + 1
 
 
-def _recalculate_box_positions(db: Session, box_id: int) -> None:
-    items = (
-        db.query(models.Item)
-        .filter(models.Item.box_id == box_id)
-        .order_by(models.Item.box_position.asc(), models.Item.id.asc())
-        .all()
-    )
+def _get_next_box_rank(db: Session, box_id: int) -> int:
+    last_rank = db.query(func.max(models.Item.box_rank)).filter(models.Item.box_id == box_id).scalar()
+    return (last_rank or 0) + POSITION_GAP
 
-    next_position = 1
-    for item in items:
-        normalized_qty = _normalize_qty(getattr(item, "qty", 1))
-        if item.box_position != next_position:
-            item.box_position = next_position
-        next_position += normalized_qty
+
+def _longest_increasing_ranks(ranks: List[int]) -> Set[int]:
+    """
+    Индексы самой длинной строго возрастающей подпоследовательности рангов —
+    эти айтемы уже стоят в нужном порядке и остаются на месте.
+    """
+    tails: List[int] = []
+    tail_indexes: List[int] = []
+    parents: List[int] = [-1] * len(ranks)
+    for index, rank in enumerate(ranks):
+        lo, hi = 0, len(tails)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if tails[mid] < rank:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo > 0:
+            parents[index] = tail_indexes[lo - 1]
+        if lo == len(tails):
+            tails.append(rank)
+            tail_indexes.append(index)
+        else:
+            tails[lo] = rank
+            tail_indexes[lo] = index
+
+    kept: Set[int] = set()
+    index = tail_indexes[-1] if tail_indexes else -1
+    while index >= 0:
+        kept.add(index)
+        index = parents[index]
+    return kept
+
+
+def _assign_ranks_in_order(ordered_items: List[models.Item]) -> bool:
+    """
+    Проставляет ранги так, чтобы порядок совпал с ordered_items, меняя минимум строк:
+    остальные айтемы встают между неподвижными соседями.
+    Возвращает False, если между соседями не хватило свободных рангов.
+    """
+    kept = _longest_increasing_ranks([item.box_rank for item in ordered_items])
+    lower = 0
+    pending: List[models.Item] = []
+    for index, item in enumerate(ordered_items + [None]):
+        if item is not None and index not in kept:
+            pending.append(item)
+            continue
+        if pending:
+            upper = item.box_rank if item is not None else lower + POSITION_GAP * (len(pending) + 1)
+            step = (upper - lower) // (len(pending) + 1)
+            if step < 1:
+                return False
+            for offset, moved in enumerate(pending, start=1):
+                moved.box_rank = lower + step * offset
+            pending = []
+        if item is not None:
+            lower = item.box_rank
+    return True
 
 
 def create_item(db: Session, item: schemas.ItemCreate):
@@ -165,7 +243,7 @@ def create_item(db: Session, item: schemas.ItemCreate):
     if not box:
         raise HTTPException(status_code=404, detail="Box not found")
 
-    fields = _get_tab_fields(db, tab.id, required=True)
+    codec = _tab_codec(db, tab, required=True)
     
     if not item.position:
         raise HTTPException(status_code=400, detail="Position is required")
@@ -173,17 +251,7 @@ def create_item(db: Session, item: schemas.ItemCreate):
     if not item.box_id:
         raise HTTPException(status_code=400, detail="Box is required")
 
-    metadata = _metadata_to_storage(item.metadata_json, fields)
-    
-    for f in fields:
-        # if f.required and f.name not in metadata:
-        #     raise HTTPException(status_code=400, detail=f"Missing required field: {f.name}")
-        default_value = getattr(f, "default_value", None)
-        stable_key = getattr(f, "stable_key", None) or f.name
-        if stable_key not in metadata and default_value is not None:
-            metadata[stable_key] = default_value
-
-    next_position = _get_next_box_position(db, item.box_id)
+    metadata = _metadata_to_storage(item.metadata_json, codec)
 
     new_item = models.Item(
         name=item.name,
@@ -191,57 +259,184 @@ def create_item(db: Session, item: schemas.ItemCreate):
         tab_id=item.tab_id,
         box_id=item.box_id,
         metadata_json=metadata,
-        box_position=next_position,
+        box_rank=_get_next_box_rank(db, item.box_id),
         tag_ids=list(item.tag_ids or []),
         serial_number=_serialize_serials(item.serial_number),
     )
     db.add(new_item)
     db.commit()
     db.refresh(new_item)
-    sync_payload = sync_dispatcher.build_item_payload(tab, box, new_item, fields)
+    sync_payload = sync_dispatcher.build_item_payload(tab, box, new_item, codec)
     sync_result = sync_dispatcher.enqueue_item_created(sync_payload)
-    result = _item_to_schema(new_item, fields, sync_result=sync_result)
+    result = _item_to_schema(new_item, codec, _get_item_slot(db, new_item), sync_result=sync_result)
+    change_feed.publish("item.created", result.tab_id, _item_event(result))
+    _publish_box_counts(db, result.tab_id, {result.box_id})
     return result
 
-def search_items(db: Session, query: str, tab_id: int, limit: int = 100, tag_id: int | None = None):
-    """
-    Ищет айтемы по названию в заданной вкладке.
-    Возвращает список объектов с данными по ящику и прикреплённым тегам.
-    """
+_SEARCH_MAX_LIMIT = 500
 
-    normalized_query = (query or "").strip()
 
-    # 🔹 1. Ищем только ID совпадений по названию
-    query_base = db.query(models.Item.id).filter(models.Item.tab_id == tab_id)
-    if normalized_query:
-        query_base = query_base.filter(models.Item.name.ilike(f"%{normalized_query}%"))
+def _encode_search_cursor(rank: float, item_id: int) -> str:
+    raw = json.dumps([rank, item_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
 
-    if tag_id:
-        query_base = query_base.filter(cast(models.Item.tag_ids, JSONB).contains([int(tag_id)]))
 
-    matching_items = query_base.limit(limit).all()
+def _decode_search_cursor(cursor: Optional[str]) -> Optional[Tuple[float, int]]:
+    if not cursor:
+        return None
+    try:
+        rank, item_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return float(rank), int(item_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
-    if not matching_items:
-        return []
 
-    item_ids = [i.id for i in matching_items]
+_LIKE_ESCAPE = "!"
 
-    # 🔹 2. Подтягиваем найденные айтемы с боксами и тегами
-    results = (
-        db.query(models.Item)
-        .options(selectinload(models.Item.box))
-        .filter(models.Item.id.in_(item_ids))
+
+def _escape_like(value: str) -> str:
+    return value.replace("!", "!!").replace("%", "!%").replace("_", "!_")
+
+
+def _metadata_values_text():
+    """
+    Значения полей айтема одной строкой (JSON-массив) без ключей — выражение
+    индекса idx_item_metadata_values_trgm, менять только вместе с ним.
+    """
+    values = func.jsonb_path_query_array(cast(models.Item.metadata_json, JSONB), literal_column("'strict $.*'"))
+    return cast(values, Text)
+
+
+def _search_postgres(db: Session, needle: str, tab_id: Optional[int], tag_id: Optional[int], after, limit: int):
+    """
+    Поиск в Postgres: ILIKE по имени, серийникам и значениям метаданных
+    (GIN-индексы pg_trgm), ранг — тип совпадения + similarity() по имени.
+    """
+    query = db.query(models.Item).options(selectinload(models.Item.box))
+    if tab_id is not None:
+        query = query.filter(models.Item.tab_id == tab_id)
+    if tag_id:
+        query = query.filter(type_coerce(models.Item.tag_ids, JSONB).contains([int(tag_id)]))
+
+    if needle:
+        escaped = _escape_like(needle)
+        contains = f"%{escaped}%"
+        metadata_text = _metadata_values_text()
+        query = query.filter(
+            or_(
+                models.Item.name.ilike(contains, escape=_LIKE_ESCAPE),
+                models.Item.serial_number.ilike(contains, escape=_LIKE_ESCAPE),
+                metadata_text.ilike(contains, escape=_LIKE_ESCAPE),
+            )
+        )
+        rank_expr = case(
+            (func.lower(models.Item.name) == needle.lower(), 1.0),
+            (models.Item.name.ilike(f"{escaped}%", escape=_LIKE_ESCAPE), 0.8),
+            (models.Item.name.ilike(contains, escape=_LIKE_ESCAPE), 0.6),
+            (models.Item.serial_number.ilike(contains, escape=_LIKE_ESCAPE), 0.5),
+            else_=0.3,
+        ) + 0.1 * func.similarity(models.Item.name, needle)
+    else:
+        rank_expr = literal(0.0)
+
+    rank_expr = cast(rank_expr, Float)
+    if after is not None:
+        after_rank, after_id = after
+        query = query.filter(or_(rank_expr < after_rank, and_(rank_expr == after_rank, models.Item.id > after_id)))
+
+    rows = (
+        query.add_columns(rank_expr.label("rank"))
+        .order_by(rank_expr.desc(), models.Item.id.asc())
+        .limit(limit + 1)
         .all()
     )
+    return [(item, float(rank)) for item, rank in rows]
+
+
+def _fallback_rank(item: models.Item, needle: str) -> Optional[float]:
+    if not needle:
+        return 0.0
+    name = (item.name or "").casefold()
+    if name == needle:
+        tier = 1.0
+    elif name.startswith(needle):
+        tier = 0.8
+    elif needle in name:
+        tier = 0.6
+    elif needle in (item.serial_number or "").casefold():
+        tier = 0.5
+    elif needle in " ".join(str(value) for value in (item.metadata_json or {}).values()).casefold():
+        tier = 0.3
+    else:
+        return None
+    return tier + 0.1 * SequenceMatcher(None, name, needle).ratio()
+
+
+def _search_fallback(db: Session, needle: str, tab_id: Optional[int], tag_id: Optional[int], after, limit: int):
+    """
+    Запасной матчинг для SQLite (тесты, локальный запуск): те же правила ранжирования,
+    но сравнение через casefold в Python, чтобы кириллица искалась без учёта регистра.
+    """
+    query = db.query(models.Item).options(selectinload(models.Item.box))
+    if tab_id is not None:
+        query = query.filter(models.Item.tab_id == tab_id)
+
+    needle = needle.casefold()
+    ranked = []
+    for item in query.all():
+        if tag_id and int(tag_id) not in (item.tag_ids or []):
+            continue
+        rank = _fallback_rank(item, needle)
+        if rank is None:
+            continue
+        if after is not None and (rank > after[0] or (rank == after[0] and item.id <= after[1])):
+            continue
+        ranked.append((item, rank))
+
+    ranked.sort(key=lambda pair: (-pair[1], pair[0].id))
+    return ranked[: limit + 1]
+
+
+def search_items(
+    db: Session,
+    query: str,
+    tab_id: Optional[int],
+    limit: int = 100,
+    tag_id: int | None = None,
+    cursor: Optional[str] = None,
+    all_tabs: bool = False,
+):
+    """
+    Ищет айтемы по названию, серийникам и значениям полей.
+    Без all_tabs поиск ограничен вкладкой tab_id. Результаты отсортированы
+    по релевантности, следующая страница запрашивается по next_cursor.
+    """
+    if not all_tabs and tab_id is None:
+        raise HTTPException(status_code=400, detail="tab_id is required unless all_tabs is set")
+    scope_tab_id = None if all_tabs else tab_id
+    limit = max(1, min(int(limit or 100), _SEARCH_MAX_LIMIT))
+    needle = (query or "").strip()
+    after = _decode_search_cursor(cursor)
+
+    if db.get_bind().dialect.name == "postgresql":
+        ranked = _search_postgres(db, needle, scope_tab_id, tag_id, after, limit)
+    else:
+        ranked = _search_fallback(db, needle, scope_tab_id, tag_id, after, limit)
+
+    next_cursor = None
+    if len(ranked) > limit:
+        ranked = ranked[:limit]
+        last_item, last_rank = ranked[-1]
+        next_cursor = _encode_search_cursor(last_rank, last_item.id)
 
-    # 🔹 3. Составляем JSON-ответ
-    fields = _get_tab_fields(db, tab_id)
+    codecs = field_codec.for_tabs(db, {item.tab_id for item, _ in ranked})
 
     response = [
         {
             "id": item.id,
             "name": item.name,
             "qty": item.qty,
+            "tab_id": item.tab_id,
             "serial_number": _parse_serials(item.serial_number),
             "box": {
                 "id": item.box.id,
@@ -249,12 +444,13 @@ def search_items(db: Session, query: str, tab_id: int, limit: int = 100, tag_id:
                 "color": getattr(item.box, "color", None)
             } if item.box else None,
             "tag_ids": item.tag_ids or [],
-            "metadata": _metadata_to_response(item.metadata_json, fields)
+            "metadata": codecs[item.tab_id].to_response(item.metadata_json),
+            "rank": round(rank, 4),
         }
-        for item in results
+        for item, rank in ranked
     ]
 
-    return response 
+    return response, next_cursor
 
 def get_item(db: Session, item_id: int):
     return db.query(models.Item).filter(models.Item.id == item_id).first()
@@ -273,29 +469,20 @@ def update_item(db: Session, item_id: int, item_data: schemas.ItemUpdate):
         payload["tag_ids"] = list(payload["tag_ids"])
 
     old_box_id = db_item.box_id
-    old_position = db_item.box_position
     new_box_id = payload.get("box_id", old_box_id)
     box_changed = new_box_id != old_box_id
 
-    boxes_to_recalc: Set[int] = set()
-    next_position = db_item.box_position
-    if box_changed:
-        boxes_to_recalc.add(old_box_id)
-        next_position = _get_next_box_position(db, new_box_id)
-
     tracked_keys = {"name", "qty", "metadata_json", "box_id", "serial_number"}
     sync_needed = any(key in payload for key in tracked_keys)
 
-    tab_fields: Optional[List[models.TabField]] = None
+    # Один кодек на весь запрос: после commit Tab просрочен, версию не перечитываем
+    codec = _tab_codec(db, tab, required="metadata_json" in payload)
     if "metadata_json" in payload:
-        tab_fields = _get_tab_fields(db, db_item.tab_id, required=True)
-        payload["metadata_json"] = _metadata_to_storage(payload["metadata_json"], tab_fields)
-    elif sync_needed:
-        tab_fields = _get_tab_fields(db, db_item.tab_id)
+        payload["metadata_json"] = _metadata_to_storage(payload["metadata_json"], codec)
 
     before_payload = None
-    if sync_needed and tab_fields is not None:
-        before_payload = sync_dispatcher.build_item_payload(tab, current_box, db_item, tab_fields)
+    if sync_needed:
+        before_payload = sync_dispatcher.build_item_payload(tab, current_box, db_item, codec)
 
     for key, value in payload.items():
         if key == "serial_number":
@@ -303,21 +490,13 @@ def update_item(db: Session, item_id: int, item_data: schemas.ItemUpdate):
         else:
             setattr(db_item, key, value)
 
+    # Слоты считаются из qty при чтении: смена qty соседей не трогает,
+    # перенос в другой ящик — одна строка в конец нового ящика.
     if box_changed:
-        db_item.box_position = next_position
-        boxes_to_recalc.add(new_box_id)
-
-    if "qty" in payload:
-        boxes_to_recalc.add(db_item.box_id)
-
-    for target_box_id in boxes_to_recalc:
-        if target_box_id is not None:
-            _recalculate_box_positions(db, target_box_id)
+        db_item.box_rank = _get_next_box_rank(db, new_box_id)
 
     db.commit()
     db.refresh(db_item)
-    if tab_fields is None:
-        tab_fields = _get_tab_fields(db, db_item.tab_id)
 
     updated_box = current_box
     if box_changed:
@@ -325,10 +504,14 @@ def update_item(db: Session, item_id: int, item_data: schemas.ItemUpdate):
 
     sync_result = None
     if sync_needed:
-        after_payload = sync_dispatcher.build_item_payload(tab, updated_box, db_item, tab_fields)
+        after_payload = sync_dispatcher.build_item_payload(tab, updated_box, db_item, codec)
         sync_result = sync_dispatcher.enqueue_item_updated(before_payload, after_payload)
 
-    return _item_to_schema(db_item, tab_fields, sync_result=sync_result)
+    result = _item_to_schema(db_item, codec, _get_item_slot(db, db_item), sync_result=sync_result)
+    change_feed.publish("item.updated", result.tab_id, _item_event(result))
+    if box_changed or "qty" in payload:
+        _publish_box_counts(db, result.tab_id, {old_box_id, new_box_id})
+    return result
 
 def delete_item(db: Session, item_id: int):
     db_item = get_item(db, item_id)
@@ -337,17 +520,225 @@ def delete_item(db: Session, item_id: int):
 
     tab = db.query(models.Tab).filter(models.Tab.id == db_item.tab_id).first()
     box = db.query(models.Box).filter(models.Box.id == db_item.box_id).first()
-    tab_fields = _get_tab_fields(db, db_item.tab_id)
-    payload = sync_dispatcher.build_item_payload(tab, box, db_item, tab_fields)
+    payload = sync_dispatcher.build_item_payload(tab, box, db_item, _tab_codec(db, tab))
 
-    target_box_id = db_item.box_id
+    tab_id, box_id = db_item.tab_id, db_item.box_id
     db.delete(db_item)
-    _recalculate_box_positions(db, target_box_id)
     db.commit()
     sync_dispatcher.enqueue_item_deleted(payload)
+    change_feed.publish("item.deleted", tab_id, {"item": {"id": item_id, "box_id": box_id}})
+    _publish_box_counts(db, tab_id, {box_id})
     return {"detail": f"Item {item_id} deleted"}
 
 
+def _bulk_codec(codecs: Dict[int, field_codec.FieldCodec], tab_id: int, *, required: bool = False):
+    codec = codecs.get(tab_id)
+    if codec is None:
+        codec = field_codec.FieldCodec(tab_id=tab_id, version=-1)
+    return _require_fields(codec, required)
+
+
+def _bulk_box(boxes: Dict[int, models.Box], box_id: Optional[int], tab_id: int) -> models.Box:
+    box = boxes.get(box_id) if box_id else None
+    if not box or box.tab_id != tab_id:
+        raise HTTPException(status_code=404, detail="Box not found")
+    return box
+
+
+def _bulk_next_rank(db: Session, next_ranks: Dict[int, int], box_id: int) -> int:
+    if box_id not in next_ranks:
+        next_ranks[box_id] = _get_next_box_rank(db, box_id)
+    rank = next_ranks[box_id]
+    next_ranks[box_id] = rank + POSITION_GAP
+    return rank
+
+
+def _get_box_slots(db: Session, box_ids: Set[int]) -> Dict[int, int]:
+    slots: Dict[int, int] = {}
+    if not box_ids:
+        return slots
+    rows = _box_order(
+        db.query(models.Item.id, models.Item.box_id, models.Item.qty).filter(models.Item.box_id.in_(box_ids))
+    ).all()
+    next_slot: Dict[int, int] = {}
+    for item_id, box_id, qty in rows:
+        slot = next_slot.get(box_id, 1)
+        slots[item_id] = slot
+        next_slot[box_id] = slot + _normalize_qty(qty)
+    return slots
+
+
+def bulk_items(db: Session, payload: schemas.ItemBulkPayload) -> schemas.ItemBulkResponse:
+    """
+    Применяет пачку операций create/update/delete за одну транзакцию.
+    Вкладки, ящики и поля грузятся один раз на пачку, новые и перенесённые айтемы
+    получают ранг в конце ящика без перенумерации соседей, изменения уходят
+    в синхронизацию одной задачей.
+    При atomic=True любая ошибка откатывает всю пачку.
+    """
+    operations = payload.operations
+
+    item_ids = {op.item_id for op in operations if op.action != "create" and op.item_id}
+    items_by_id: Dict[int, models.Item] = {}
+    if item_ids:
+        items_by_id = {
+            item.id: item
+            for item in db.query(models.Item).filter(models.Item.id.in_(item_ids)).all()
+        }
+
+    tab_ids = {item.tab_id for item in items_by_id.values()}
+    box_ids = {item.box_id for item in items_by_id.values() if item.box_id}
+    for op in operations:
+        if op.action == "create" and op.item:
+            tab_ids.add(op.item.tab_id)
+            if op.item.box_id:
+                box_ids.add(op.item.box_id)
+        elif op.action == "update" and op.changes and op.changes.box_id:
+            box_ids.add(op.changes.box_id)
+
+    tabs = {tab.id: tab for tab in db.query(models.Tab).filter(models.Tab.id.in_(tab_ids)).all()} if tab_ids else {}
+    boxes = {box.id: box for box in db.query(models.Box).filter(models.Box.id.in_(box_ids)).all()} if box_ids else {}
+    codecs = field_codec.get_codecs(db, {tab.id: tab.fields_version for tab in tabs.values()})
+
+    next_ranks: Dict[int, int] = {}
+    deleted_ids: Set[int] = set()
+    results: List[schemas.ItemBulkResult] = []
+    applied = []
+    # Ящики, чья заполненность изменилась: вкладка → ящики (для одной дельты box.counts)
+    touched_boxes: Dict[int, Set[int]] = {}
+
+    for index, op in enumerate(operations):
+        try:
+            if op.action == "create":
+                if not op.item:
+                    raise HTTPException(status_code=400, detail="item is required for create")
+                data = op.item
+                tab = tabs.get(data.tab_id)
+                if not tab:
+                    raise HTTPException(status_code=404, detail="Tab not found")
+                box = _bulk_box(boxes, data.box_id, tab.id)
+                codec = _bulk_codec(codecs, tab.id, required=True)
+
+                metadata = _metadata_to_storage(data.metadata_json, codec)
+
+                db_item = models.Item(
+                    name=data.name,
+                    qty=data.qty,
+                    tab_id=tab.id,
+                    box_id=box.id,
+                    metadata_json=metadata,
+                    box_rank=_bulk_next_rank(db, next_ranks, box.id),
+                    tag_ids=list(data.tag_ids or []),
+                    serial_number=_serialize_serials(data.serial_number),
+                )
+                db.add(db_item)
+                applied.append((index, op.action, db_item, None))
+                touched_boxes.setdefault(tab.id, set()).add(box.id)
+
+            else:
+                db_item = items_by_id.get(op.item_id) if op.item_id not in deleted_ids else None
+                if not db_item:
+                    raise HTTPException(status_code=404, detail="Item not found")
+                tab = tabs.get(db_item.tab_id)
+                codec = _bulk_codec(codecs, db_item.tab_id)
+                before_payload = sync_dispatcher.build_item_payload(tab, boxes.get(db_item.box_id), db_item, codec)
+
+                if op.action == "delete":
+                    db.delete(db_item)
+                    deleted_ids.add(db_item.id)
+                    applied.append((index, op.action, db_item, before_payload))
+                    touched_boxes.setdefault(db_item.tab_id, set()).add(db_item.box_id)
+                else:
+                    if not op.changes:
+                        raise HTTPException(status_code=400, detail="changes are required for update")
+                    changes = op.changes.model_dump(exclude_unset=True)
+                    changes.pop("box_position", None)
+                    if not changes.get("box_id"):
+                        changes.pop("box_id", None)
+                    if changes.get("tag_ids") is not None:
+                        changes["tag_ids"] = list(changes["tag_ids"])
+                    if "metadata_json" in changes:
+                        codec = _bulk_codec(codecs, db_item.tab_id, required=True)
+                        changes["metadata_json"] = _metadata_to_storage(changes["metadata_json"], codec)
+
+                    old_box_id = db_item.box_id
+                    new_box_id = changes.get("box_id", old_box_id)
+                    if new_box_id != old_box_id:
+                        _bulk_box(boxes, new_box_id, db_item.tab_id)
+
+                    for key, value in changes.items():
+                        if key == "serial_number":
+                            setattr(db_item, key, _serialize_serials(value))
+                        else:
+                            setattr(db_item, key, value)
+
+                    if new_box_id != old_box_id:
+                        db_item.box_rank = _bulk_next_rank(db, next_ranks, new_box_id)
+                    if new_box_id != old_box_id or "qty" in changes:
+                        touched_boxes.setdefault(db_item.tab_id, set()).update({old_box_id, new_box_id})
+
+                    tracked_keys = {"name", "qty", "metadata_json", "box_id", "serial_number"}
+                    if not any(key in changes for key in tracked_keys):
+                        before_payload = None
+                    applied.append((index, op.action, db_item, before_payload))
+        except HTTPException as exc:
+            results.append(
+                schemas.ItemBulkResult(
+                    index=index,
+                    action=op.action,
+                    status="error",
+                    item_id=op.item_id,
+                    detail=str(exc.detail),
+                )
+            )
+
+    if payload.atomic and results:
+        db.rollback()
+        failed = {result.index for result in results}
+        for index, op in enumerate(operations):
+            if index not in failed:
+                results.append(
+                    schemas.ItemBulkResult(index=index, action=op.action, status="skipped", item_id=op.item_id)
+                )
+        results.sort(key=lambda result: result.index)
+        return schemas.ItemBulkResponse(committed=False, results=results)
+
+    db.flush()
+    slots = _get_box_slots(db, {db_item.box_id for _, action, db_item, _ in applied if action != "delete"})
+
+    sync_events = []
+    feed_events = []
+    for index, action, db_item, before_payload in applied:
+        tab = tabs.get(db_item.tab_id)
+        codec = _bulk_codec(codecs, db_item.tab_id)
+        box = boxes.get(db_item.box_id)
+        if action == "create":
+            sync_events.append((action, sync_dispatcher.build_item_payload(tab, box, db_item, codec)))
+        elif action == "update" and before_payload is not None:
+            after_payload = sync_dispatcher.build_item_payload(tab, box, db_item, codec)
+            sync_events.append((action, {"before": before_payload, "after": after_payload}))
+        elif action == "delete":
+            sync_events.append((action, before_payload))
+
+        item = None if action == "delete" else _item_to_schema(db_item, codec, slots.get(db_item.id, 1))
+        if item is None:
+            feed_events.append(("item.deleted", db_item.tab_id, {"item": {"id": db_item.id, "box_id": db_item.box_id}}))
+        else:
+            feed_events.append((f"item.{action}d", item.tab_id, _item_event(item)))
+        results.append(
+            schemas.ItemBulkResult(index=index, action=action, status="ok", item_id=db_item.id, item=item)
+        )
+
+    db.commit()
+    results.sort(key=lambda result: result.index)
+    sync_result = sync_dispatcher.enqueue_item_batch(sync_events)
+    for event_type, tab_id, data in feed_events:
+        change_feed.publish(event_type, tab_id, data)
+    for tab_id, touched in touched_boxes.items():
+        _publish_box_counts(db, tab_id, touched)
+    return schemas.ItemBulkResponse(committed=True, results=results, sync_result=sync_result)
+
+
 def issue_item(db: Session, item_id: int, payload: schemas.ItemIssuePayload):
     db_item = (
         db.query(models.Item)
@@ -382,15 +773,13 @@ def issue_item(db: Session, item_id: int, payload: schemas.ItemIssuePayload):
     if issue_qty > current_qty:
         raise HTTPException(status_code=400, detail="Недостаточно количества для выдачи")
 
-    snapshot = json.dumps(
-        {
-            "item_name": db_item.name,
-            "tab_name": getattr(db_item.tab, "name", None),
-            "box_name": getattr(db_item.box, "name", None),
-            "qty": issue_qty,
-        },
-        ensure_ascii=False,
-    )
+    snapshot_data = {
+        "item_name": db_item.name,
+        "tab_name": getattr(db_item.tab, "name", None),
+        "box_name": getattr(db_item.box, "name", None),
+        "qty": issue_qty,
+    }
+    snapshot = json.dumps(snapshot_data, ensure_ascii=False)
 
     issue = models.Issue(status_id=status.id)
     serial_number = ", ".join(selected_serials) if selected_serials else None
@@ -398,6 +787,7 @@ def issue_item(db: Session, item_id: int, payload: schemas.ItemIssuePayload):
     item_utilized = models.ItemUtilized(
         issue=issue,
         item_snapshot=snapshot,
+        **snapshot_data,
         serial_number=serial_number,
         invoice_number=invoice_number,
         responsible_user_id=user.id,
@@ -405,14 +795,14 @@ def issue_item(db: Session, item_id: int, payload: schemas.ItemIssuePayload):
 
     db.add(item_utilized)
 
-    tab_fields = _get_tab_fields(db, db_item.tab_id)
-    before_payload = sync_dispatcher.build_item_payload(db_item.tab, db_item.box, db_item, tab_fields)
+    tab_id, box_id = db_item.tab_id, db_item.box_id
+    codec = _tab_codec(db, db_item.tab)
+    before_payload = sync_dispatcher.build_item_payload(db_item.tab, db_item.box, db_item, codec)
 
     remaining_serials = _parse_serials(db_item.serial_number)
     if selected_serials:
         remaining_serials = [sn for sn in remaining_serials if sn not in set(selected_serials)]
     should_delete = current_qty - issue_qty <= 0
-    target_box_id = db_item.box_id
 
     if should_delete:
         db.delete(db_item)
@@ -420,23 +810,21 @@ def issue_item(db: Session, item_id: int, payload: schemas.ItemIssuePayload):
         db_item.qty = current_qty - issue_qty
         db_item.serial_number = _serialize_serials(remaining_serials)
 
-    _recalculate_box_positions(db, target_box_id)
-
     db.commit()
     sync_result = None
     if should_delete:
         sync_result = sync_dispatcher.enqueue_item_deleted(before_payload)
+        change_feed.publish("item.deleted", tab_id, {"item": {"id": item_id, "box_id": box_id}})
     else:
         db.refresh(db_item)
-        after_payload = sync_dispatcher.build_item_payload(db_item.tab, db_item.box, db_item, tab_fields)
+        after_payload = sync_dispatcher.build_item_payload(db_item.tab, db_item.box, db_item, codec)
         sync_result = sync_dispatcher.enqueue_item_updated(before_payload, after_payload)
+        result = _item_to_schema(db_item, codec, _get_item_slot(db, db_item))
+        change_feed.publish("item.updated", tab_id, _item_event(result))
+    _publish_box_counts(db, tab_id, {box_id})
     db.refresh(item_utilized)
     response = schemas.ItemUtilizedRead.model_validate(item_utilized, from_attributes=True)
     response.sync_result = sync_result
-    try:
-        snapshot_data = json.loads(snapshot)
-    except Exception:
-        snapshot_data = {}
     append_issue_row(
         {
             "created_at": issue.created_at,
@@ -453,25 +841,105 @@ def issue_item(db: Session, item_id: int, payload: schemas.ItemIssuePayload):
     return response
 
 def get_items_by_box(db: Session, box_id: int):
-    items = (
-        db.query(models.Item)
+    # Версия полей вкладки приходит тем же запросом: при тёплом кеше кодека запрос один
+    rows = _box_order(
+        db.query(models.Item, models.Tab.fields_version)
+        .join(models.Tab, models.Tab.id == models.Item.tab_id)
         .filter(models.Item.box_id == box_id)
-        .order_by(models.Item.box_position.asc())
-        .all()
-    )
-    return _serialize_items(db, items)
+    ).all()
+    items = [item for item, _ in rows]
+    return _serialize_items(db, items, {item.tab_id: version for item, version in rows})
+
+
+CONTENTS_BOX_COLUMNS = ["id", "name", "color", "description", "capacity", "tag_ids", "items_count"]
+CONTENTS_ITEM_COLUMNS = ["id", "box_id", "name", "qty", "box_position", "serial_number", "tag_ids", "metadata"]
+
+
+def get_tab_contents_version(db: Session, tab_id: int) -> Tuple[int, int, int]:
+    """
+    Версия содержимого вкладки: счётчик справочника (ящики и поля), число айтемов
+    вкладки и время последней правки айтема (мкс) — удаление меняет число, остальное — время.
+    Оба агрегата берутся из индекса (tab_id, updated_at).
+    """
+    count, last_update = db.execute(
+        select(func.count(models.Item.id), func.max(models.Item.updated_at)).where(models.Item.tab_id == tab_id)
+    ).one()
+    last_update_us = int(last_update.timestamp() * 1_000_000) if last_update else 0
+    return change_counters.get_value(db, change_counters.CATALOG), int(count or 0), last_update_us
+
+
+def get_tab_contents(db: Session, tab_id: int, box_ids: Optional[List[int]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Все ящики и айтемы вкладки в колоночном виде: {"columns": [...], "rows": [[...], ...]}.
+    Строки читаются кортежами через Core select без создания ORM-объектов;
+    ключи метаданных переводятся в имена полей один раз на вкладку, а значения
+    айтема лежат списком в порядке `fields` (null — значения нет).
+    """
+    fields_version = db.execute(select(models.Tab.fields_version).where(models.Tab.id == tab_id)).scalar()
+    if fields_version is None:
+        return None
+
+    codec = field_codec.get_codec(db, tab_id, fields_version)
+    field_names: List[str] = list(codec.names)
+    column_of: Dict[str, int] = {key: index for index, key in enumerate(codec.keys)}
+
+    box_query = select(
+        models.Box.id, models.Box.name, models.Box.color, models.Box.description, models.Box.capacity, models.Box.tag_ids
+    ).where(models.Box.tab_id == tab_id)
+    item_query = select(
+        models.Item.box_id,
+        models.Item.id,
+        models.Item.name,
+        models.Item.qty,
+        models.Item.serial_number,
+        models.Item.tag_ids,
+        models.Item.metadata_json,
+    ).where(models.Item.tab_id == tab_id)
+    if box_ids is not None:
+        box_query = box_query.where(models.Box.id.in_(box_ids))
+        item_query = item_query.where(models.Item.box_id.in_(box_ids))
+    boxes = db.execute(box_query.order_by(models.Box.id)).all()
+    items = db.execute(item_query.order_by(models.Item.box_id, models.Item.box_rank, models.Item.id)).all()
+
+    item_rows: List[List[Any]] = []
+    totals: Dict[int, int] = {}
+    for box_id, item_id, name, qty, serial_number, tag_ids, metadata_json in items:
+        position = totals.get(box_id, 0) + 1
+        totals[box_id] = position - 1 + _normalize_qty(qty)
+        values: List[Any] = [None] * len(field_names)
+        for key, value in (metadata_json or {}).items():
+            index = column_of.get(key)
+            if index is None:
+                # Ключ без поля (поле удалено или старые данные) — отдельная колонка
+                index = column_of[key] = len(field_names)
+                field_names.append(key)
+                for row in item_rows:
+                    row[-1].append(None)
+                values.append(None)
+            values[index] = value
+        item_rows.append(
+            [item_id, box_id, name, qty, position, _parse_serials(serial_number), list(tag_ids or []), values]
+        )
+
+    return {
+        "tab_id": tab_id,
+        "fields": field_names,
+        "boxes": {
+            "columns": CONTENTS_BOX_COLUMNS,
+            "rows": [
+                [box_id, name, color, description, capacity, list(tag_ids or []), totals.get(box_id, 0)]
+                for box_id, name, color, description, capacity, tag_ids in boxes
+            ],
+        },
+        "items": {"columns": CONTENTS_ITEM_COLUMNS, "rows": item_rows},
+    }
 
 
 def reorder_items(db: Session, box_id: int, ordered_ids: List[int]):
     if not ordered_ids:
         raise HTTPException(status_code=400, detail="ordered_ids must not be empty")
 
-    items_in_box = (
-        db.query(models.Item)
-        .filter(models.Item.box_id == box_id)
-        .order_by(models.Item.box_position.asc())
-        .all()
-    )
+    items_in_box = _box_order(db.query(models.Item).filter(models.Item.box_id == box_id)).all()
 
     if not items_in_box:
         raise HTTPException(status_code=404, detail="Box has no items to reorder")
@@ -487,12 +955,14 @@ def reorder_items(db: Session, box_id: int, ordered_ids: List[int]):
 
     ordered_items = [id_to_item[item_id] for item_id in ordered_ids]
 
-    next_position = 1
-    for item in ordered_items:
-        item.box_position = next_position
-        next_position += _normalize_qty(getattr(item, "qty", 1))
+    if not _assign_ranks_in_order(ordered_items):
+        for index, item in enumerate(ordered_items, start=1):
+            item.box_rank = index * POSITION_GAP
 
+    tab_id = items_in_box[0].tab_id
     db.commit()
+    # Счётчики ящика не меняются: box.counts не нужен
+    change_feed.publish("items.reordered", tab_id, {"box_id": box_id, "ordered_ids": list(ordered_ids)})
 
-    ordered_items.sort(key=lambda item: item.box_position)
-    return _serialize_items(db, ordered_items)
+    # После commit объекты просрочены: перечитываем ящик одним запросом, а не по айтему
+    return get_items_by_box(db, box_id)
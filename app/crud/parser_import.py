@@ -7,6 +7,7 @@ from sqlalchemy import func
 from sqlalchemy.orm import Session
 
 from app import models, schemas
+from app.crud.items import POSITION_GAP
 from app.utils import parser_storage
 
 
@@ -85,13 +86,14 @@ def import_parsed_tab(db: Session, tab_name: str) -> schemas.ParserImportResult:
             created_boxes += 1
             existing_box_names.add(box_name.lower())
 
-            position = 1
+            rank = 0
             for item_data in box_entry.get("items") or []:
                 item_name = parser_storage.extract_item_name(item_data, field_names)
                 if not item_name:
                     continue
 
                 item_qty = parser_storage.extract_item_qty(item_data)
+                rank += POSITION_GAP
                 metadata = _build_metadata(item_data, field_lookup)
 
                 item = models.Item(
@@ -99,13 +101,12 @@ def import_parsed_tab(db: Session, tab_name: str) -> schemas.ParserImportResult:
                     qty=item_qty,
                     tab_id=tab.id,
                     box_id=box.id,
-                    box_position=position,
+                    box_rank=rank,
                     metadata_json=metadata,
                     tag_ids=[],
                 )
                 db.add(item)
                 created_items += 1
-                position += max(int(item_qty or 0), 1)
 
         db.commit()
     except Exception:
@@ -1,7 +1,10 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import func
+from sqlalchemy.orm import Session, selectinload
 from app import models, schemas
 from fastapi import HTTPException
+from app.crud import change_counters
 from app.crud.utils import ensure_unique_name
+from app.services import field_codec
 
 def create_tab(db: Session, tab: schemas.TabCreate):
     ensure_unique_name(db, models.Tab, tab.name, "Tab")
@@ -11,24 +14,39 @@ def create_tab(db: Session, tab: schemas.TabCreate):
     db.refresh(db_tab)
     return db_tab
 
+def _tab_to_dict(tab: models.Tab, boxes_count: int) -> dict:
+    return {
+        "id": tab.id,
+        "name": tab.name,
+        "box_count": boxes_count,
+        "description": tab.description,
+        "fields": tab.fields,
+        "tag_ids": tab.tag_ids or [],
+        "enable_pos": bool(tab.enable_pos),
+        "enable_sync": bool(tab.enable_sync),
+        "sync_config": tab.sync_config,
+    }
+
+
+def _tabs_with_box_counts(db: Session):
+    """
+    Вкладки с числом ящиков одним GROUP BY, поля — одним selectinload.
+    """
+    return (
+        db.query(models.Tab, func.count(models.Box.id))
+        .outerjoin(models.Box, models.Box.tab_id == models.Tab.id)
+        .options(selectinload(models.Tab.fields))
+        .group_by(models.Tab.id)
+        .order_by(models.Tab.id)
+    )
+
+
+def get_catalog_version(db: Session) -> int:
+    return change_counters.get_value(db, change_counters.CATALOG)
+
+
 def get_tabs(db: Session):
-    tabs = db.query(models.Tab).all()
-    result = []
-    for tab in tabs:
-        fields = db.query(models.TabField).filter(models.TabField.tab_id == tab.id).all()
-        boxes_count = db.query(models.Box).filter(models.Box.tab_id == tab.id).count()
-        result.append({
-            "id": tab.id,
-            "name": tab.name,
-            "box_count": boxes_count,
-            "description": tab.description,
-            "fields": fields,
-            "tag_ids": tab.tag_ids or [],
-            "enable_pos": bool(tab.enable_pos),
-            "enable_sync": bool(tab.enable_sync),
-            "sync_config": tab.sync_config,
-        })
-    return result
+    return [_tab_to_dict(tab, boxes_count) for tab, boxes_count in _tabs_with_box_counts(db).all()]
 
 def update_tab(db: Session, tab_id: int, tab_data: schemas.TabUpdate):
     db_tab = db.query(models.Tab).filter(models.Tab.id == tab_id).first()
@@ -54,23 +72,11 @@ def update_tab(db: Session, tab_id: int, tab_data: schemas.TabUpdate):
     return db_tab
 
 def get_tab(db: Session, tab_id: int):
-    tab = db.query(models.Tab).filter(models.Tab.id == tab_id).first()
-    if not tab:
+    row = _tabs_with_box_counts(db).filter(models.Tab.id == tab_id).first()
+    if not row:
         return None
-    fields = db.query(models.TabField).filter(models.TabField.tab_id == tab.id).all()
-    boxes_count = db.query(models.Box).filter(models.Box.tab_id == tab.id).count()
-    
-    return {
-        "id": tab.id,
-        "name": tab.name,
-        "description": tab.description,
-        "box_count": boxes_count,
-        "fields": fields,
-        "tag_ids": tab.tag_ids or [],
-        "enable_pos": bool(tab.enable_pos),
-        "enable_sync": bool(tab.enable_sync),
-        "sync_config": tab.sync_config,
-    }
+    tab, boxes_count = row
+    return _tab_to_dict(tab, boxes_count)
 
 
 def delete_tab(db: Session, tab_id: int):
@@ -85,6 +91,7 @@ def delete_tab(db: Session, tab_id: int):
 
     db.delete(tab)
     db.commit()
+    field_codec.forget(tab_id)
     return {"detail": "Tab deleted successfully"}
 
 
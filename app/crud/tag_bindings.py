@@ -0,0 +1,125 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import delete, event, inspect, insert
+from sqlalchemy.orm import Session
+
+from app import models
+
+# tag_bindings — нормализованная копия tag_ids вкладок, ящиков и айтемов.
+# Обновляется в after_flush той же транзакции, поэтому любые правки tag_ids
+# через ORM (CRUD, импорт, bulk) попадают в индекс без отдельных вызовов.
+ENTITY_TYPES = {
+    models.Tab: "tab",
+    models.Box: "box",
+    models.Item: "item",
+}
+
+BUCKETS = {"tab": "tabs", "box": "boxes", "item": "items"}
+
+
+def _tag_set(values) -> Set[int]:
+    result: Set[int] = set()
+    for value in values or []:
+        try:
+            result.add(int(value))
+        except (TypeError, ValueError):
+            continue
+    return result
+
+
+def collect_bindings(db: Session, tag_ids: Optional[Iterable[int]] = None) -> Dict[int, Dict[str, List[int]]]:
+    query = db.query(models.TagBinding)
+    if tag_ids is not None:
+        query = query.filter(models.TagBinding.tag_id.in_(list(tag_ids)))
+    bindings: Dict[int, Dict[str, List[int]]] = defaultdict(lambda: {"tabs": [], "boxes": [], "items": []})
+    for binding in query.order_by(models.TagBinding.entity_id).all():
+        bindings[binding.tag_id][BUCKETS[binding.entity_type]].append(binding.entity_id)
+    return bindings
+
+
+def get_entity_ids(db: Session, tag_id: int) -> Dict[str, List[int]]:
+    return collect_bindings(db, [tag_id]).get(tag_id) or {"tabs": [], "boxes": [], "items": []}
+
+
+def delete_tag_bindings(db: Session, tag_id: int) -> None:
+    db.execute(delete(models.TagBinding).where(models.TagBinding.tag_id == tag_id))
+
+
+def _previous_tags(instance) -> Optional[Set[int]]:
+    history = inspect(instance).attrs.tag_ids.history
+    if not history.has_changes():
+        return None
+    if history.deleted:
+        return _tag_set(history.deleted[0])
+    # Старое значение не загружалось — пересобираем привязки сущности целиком.
+    return set()
+
+
+_CHUNK = 500
+
+
+def _sync_tag_bindings(session: Session, flush_context) -> None:
+    to_insert: List[Dict[str, object]] = []
+    dropped: Dict[str, List[int]] = defaultdict(list)
+    removed: List[Tuple[str, int, Set[int]]] = []
+
+    for instance in session.new:
+        entity_type = ENTITY_TYPES.get(type(instance))
+        if entity_type and instance.id is not None:
+            for tag_id in _tag_set(instance.tag_ids):
+                to_insert.append({"tag_id": tag_id, "entity_type": entity_type, "entity_id": instance.id})
+
+    for instance in session.dirty:
+        entity_type = ENTITY_TYPES.get(type(instance))
+        if not entity_type:
+            continue
+        previous = _previous_tags(instance)
+        if previous is None:
+            continue
+        current = _tag_set(instance.tag_ids)
+        if previous:
+            if previous - current:
+                removed.append((entity_type, instance.id, previous - current))
+            added = current - previous
+        else:
+            dropped[entity_type].append(instance.id)
+            added = current
+        for tag_id in added:
+            to_insert.append({"tag_id": tag_id, "entity_type": entity_type, "entity_id": instance.id})
+
+    for instance in session.deleted:
+        entity_type = ENTITY_TYPES.get(type(instance))
+        if entity_type:
+            dropped[entity_type].append(instance.id)
+
+    if not (to_insert or dropped or removed):
+        return
+
+    table = models.TagBinding.__table__
+    connection = session.connection()
+    for entity_type, entity_ids in dropped.items():
+        for start in range(0, len(entity_ids), _CHUNK):
+            connection.execute(
+                delete(table).where(
+                    table.c.entity_type == entity_type,
+                    table.c.entity_id.in_(entity_ids[start:start + _CHUNK]),
+                )
+            )
+    for entity_type, entity_id, tag_ids in removed:
+        connection.execute(
+            delete(table).where(
+                table.c.entity_type == entity_type,
+                table.c.entity_id == entity_id,
+                table.c.tag_id.in_(tag_ids),
+            )
+        )
+    if to_insert:
+        connection.execute(insert(table), to_insert)
+
+
+def register_hooks(session_class=Session) -> None:
+    """
+    Подключает хук сессии; вызывается один раз из app.database.
+    """
+    event.listen(session_class, "after_flush", _sync_tag_bindings)
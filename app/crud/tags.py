@@ -1,9 +1,10 @@
-from collections import defaultdict
 from sqlalchemy.orm import Session
 from app import models, schemas
 from fastapi import HTTPException
 from typing import Dict, Optional, Iterable, List
+from app.crud import tag_bindings
 from app.crud.utils import ensure_unique_name
+from app.services import change_feed
 
 ENTITY_MODELS = {
     "tab_id": (models.Tab, "Tab"),
@@ -54,35 +55,22 @@ def _detach_from_entities(db: Session, tag_id: int, link_payload: Dict[str, Opti
         _remove_tag_from_entity(entity, tag_id)
 
 
-def _remove_tag_from_all_entities(db: Session, tag_id: int):
-    for model, _ in ENTITY_MODELS.values():
-        entities = db.query(model).all()
-        for entity in entities:
+def _remove_tag_from_bound_entities(db: Session, tag_id: int):
+    """
+    Снимает тег только с сущностей из tag_bindings, не перебирая все таблицы.
+    """
+    bound = tag_bindings.get_entity_ids(db, tag_id)
+    for key, (model, _) in ENTITY_MODELS.items():
+        entity_ids = bound[tag_bindings.BUCKETS[tag_bindings.ENTITY_TYPES[model]]]
+        if not entity_ids:
+            continue
+        for entity in db.query(model).filter(model.id.in_(entity_ids)).all():
             _remove_tag_from_entity(entity, tag_id)
+    tag_bindings.delete_tag_bindings(db, tag_id)
 
 
 def _collect_tag_bindings(db: Session, filter_ids: Optional[Iterable[int]] = None):
-    filter_set = set(filter_ids) if filter_ids else None
-    bindings = defaultdict(lambda: {"tabs": [], "boxes": [], "items": []})
-
-    def add_binding(tag_id: int, bucket: str, value: int):
-        if filter_set and tag_id not in filter_set:
-            return
-        bindings[tag_id][bucket].append(value)
-
-    for tab in db.query(models.Tab).all():
-        for tag_id in tab.tag_ids or []:
-            add_binding(tag_id, "tabs", tab.id)
-
-    for box in db.query(models.Box).all():
-        for tag_id in box.tag_ids or []:
-            add_binding(tag_id, "boxes", box.id)
-
-    for item in db.query(models.Item).all():
-        for tag_id in item.tag_ids or []:
-            add_binding(tag_id, "items", item.id)
-
-    return bindings
+    return tag_bindings.collect_bindings(db, filter_ids)
 
 
 def _tag_to_schema(db_tag: models.Tag, bindings: Dict[int, Dict[str, List[int]]]):
@@ -100,6 +88,12 @@ def _tag_to_schema(db_tag: models.Tag, bindings: Dict[int, Dict[str, List[int]]]
     )
 
 
+def _publish_tag(tag: schemas.TagRead) -> schemas.TagRead:
+    # Тег общий для всех вкладок: событие без tab_id получают все подписчики
+    change_feed.publish("tag.updated", None, {"tag": tag.model_dump(mode="json")})
+    return tag
+
+
 def _reset_legacy_links(db_tag: models.Tag):
     for key in ENTITY_MODELS.keys():
         setattr(db_tag, key, None)
@@ -118,7 +112,7 @@ def create_tag(db: Session, tag: schemas.TagCreate):
     db.commit()
     db.refresh(db_tag)
     bindings = _collect_tag_bindings(db, [db_tag.id])
-    return _tag_to_schema(db_tag, bindings)
+    return _publish_tag(_tag_to_schema(db_tag, bindings))
 
 
 def attach_tag(db: Session, tag_id: int, link_data: schemas.TagLinkPayload):
@@ -135,7 +129,7 @@ def attach_tag(db: Session, tag_id: int, link_data: schemas.TagLinkPayload):
     db.commit()
     db.refresh(db_tag)
     bindings = _collect_tag_bindings(db, [db_tag.id])
-    return _tag_to_schema(db_tag, bindings)
+    return _publish_tag(_tag_to_schema(db_tag, bindings))
 
 
 def get_tags(db: Session):
@@ -172,7 +166,7 @@ def update_tag(db: Session, tag_id: int, tag_data: schemas.TagUpdate):
     db.commit()
     db.refresh(db_tag)
     bindings = _collect_tag_bindings(db, [db_tag.id])
-    return _tag_to_schema(db_tag, bindings)
+    return _publish_tag(_tag_to_schema(db_tag, bindings))
 
 
 def delete_tag(db: Session, tag_id: int):
@@ -180,9 +174,10 @@ def delete_tag(db: Session, tag_id: int):
     if not db_tag:
         raise HTTPException(status_code=404, detail="Tag not found")
 
-    _remove_tag_from_all_entities(db, db_tag.id)
+    _remove_tag_from_bound_entities(db, db_tag.id)
     db.delete(db_tag)
     db.commit()
+    change_feed.publish("tag.deleted", None, {"tag": {"id": tag_id}})
     return {"detail": f"Tag {tag_id} deleted"}
 
 
@@ -199,4 +194,4 @@ def detach_tag(db: Session, tag_id: int, link_data: schemas.TagLinkPayload):
     db.commit()
     db.refresh(db_tag)
     bindings = _collect_tag_bindings(db, [db_tag.id])
-    return _tag_to_schema(db_tag, bindings)
+    return _publish_tag(_tag_to_schema(db_tag, bindings))
@@ -1,9 +1,11 @@
 from typing import List, Optional
 
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
 from app import models, schemas
-from app.security import get_password_hash, verify_password
+from app.security import get_password_hash
+from app.services import password_hasher, user_cache
 
 
 def get_user(db: Session, user_id: int) -> Optional[models.User]:
@@ -22,14 +24,18 @@ def get_user_count(db: Session) -> int:
     return db.query(models.User).count()
 
 
-def create_user(db: Session, payload: schemas.UserCreate) -> models.User:
+def create_user(db: Session, payload: schemas.UserCreate, hashed_password: Optional[str] = None) -> models.User:
+    """
+    hashed_password — заранее посчитанный в пуле хеш (см. password_hasher);
+    без него хеш считается здесь же, синхронно.
+    """
     normalized_name = payload.user_name.lower()
     if get_user_by_name(db, normalized_name):
         raise ValueError("Имя пользователя уже используется")
 
     db_user = models.User(
         user_name=normalized_name,
-        hashed_password=get_password_hash(payload.password),
+        hashed_password=hashed_password or get_password_hash(payload.password),
         role=payload.role or "viewer",
     )
     db.add(db_user)
@@ -42,26 +48,50 @@ def list_users(db: Session) -> List[models.User]:
     return db.query(models.User).order_by(models.User.id.asc()).all()
 
 
+# Поля, после смены которых выданные токены отзываются
+_TOKEN_REVOKING_FIELDS = {"role", "is_active", "hashed_password"}
+
+
 def update_user(db: Session, user: models.User, payload: schemas.UserUpdate) -> models.User:
     data = payload.model_dump(exclude_unset=True)
+    changed = set()
     for key, value in data.items():
-        setattr(user, key, value)
+        if getattr(user, key) != value:
+            setattr(user, key, value)
+            changed.add(key)
+    if changed & _TOKEN_REVOKING_FIELDS:
+        user.token_version = (user.token_version or 0) + 1
     db.commit()
     db.refresh(user)
+    user_cache.invalidate(user.id)
     return user
 
 
 def delete_user(db: Session, user: models.User) -> None:
+    user_id = user.id
     db.delete(user)
     db.commit()
+    user_cache.invalidate(user_id)
 
 
-def authenticate_user(db: Session, user_name: str, password: str) -> Optional[models.User]:
-    user = get_user_by_name(db, user_name.lower())
+def _store_password_hash(db: Session, user: models.User, hashed_password: str) -> None:
+    user.hashed_password = hashed_password
+    db.commit()
+    db.refresh(user)
+
+
+async def authenticate_user(db: Session, user_name: str, password: str) -> Optional[models.User]:
+    """
+    Запросы к БД идут в пуле Starlette, bcrypt — в отдельном ограниченном пуле,
+    так что цикл событий не блокируется. Хеш с устаревшим числом раундов
+    пересчитывается и сохраняется при успешном входе.
+    """
+    user = await run_in_threadpool(get_user_by_name, db, user_name.lower())
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
-        return None
-    if not user.is_active:
+    verified, new_hash = await password_hasher.verify_password(password, user.hashed_password)
+    if not verified or not user.is_active:
         return None
+    if new_hash:
+        await run_in_threadpool(_store_password_hash, db, user, new_hash)
     return user
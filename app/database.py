@@ -1,11 +1,157 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, TypeVar, Union
+
+from sqlalchemy import create_engine, exc as sa_exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from starlette.concurrency import run_in_threadpool
 from app.config import DATABASE_URL
+from app.crud import change_counters, tag_bindings
+
+logger = logging.getLogger(__name__)
+
+
+# --- Настройки движка из окружения ---
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+def db_role() -> str:
+    """
+    Роль процесса (api, worker, ...): от неё зависят statement_timeout и application_name.
+    """
+    return (os.getenv("DB_ROLE") or "api").strip().lower()
+
+
+def statement_timeout_ms(role: str) -> int:
+    # DB_STATEMENT_TIMEOUT_MS_<ROLE> переопределяет общий DB_STATEMENT_TIMEOUT_MS; 0 — без ограничения
+    default = _env_int("DB_STATEMENT_TIMEOUT_MS", 0)
+    return _env_int(f"DB_STATEMENT_TIMEOUT_MS_{role.upper()}", default)
+
+
+def application_name(role: str) -> str:
+    return os.getenv("DB_APPLICATION_NAME") or f"dsp-ware-{role}"
+
+
+class _PoolWaitStatsMixin:
+    """
+    Считает время получения соединения из пула и таймауты ожидания.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self._wait_lock = threading.Lock()
+        self.wait_stats = {"checkouts": 0, "wait_ms_total": 0.0, "max_wait_ms": 0.0, "timeouts": 0}
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except sa_exc.TimeoutError:
+            with self._wait_lock:
+                self.wait_stats["timeouts"] += 1
+            raise
+        waited_ms = (time.perf_counter() - started) * 1000
+        with self._wait_lock:
+            self.wait_stats["checkouts"] += 1
+            self.wait_stats["wait_ms_total"] += waited_ms
+            self.wait_stats["max_wait_ms"] = max(self.wait_stats["max_wait_ms"], waited_ms)
+        return connection
+
+
+class InstrumentedQueuePool(_PoolWaitStatsMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_PoolWaitStatsMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def engine_options(url: str, role: Optional[str] = None, is_async: bool = False) -> Dict[str, Any]:
+    """
+    Параметры create_engine из окружения: DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE, DB_POOL_PRE_PING, DB_ECHO, statement_timeout и application_name
+    для роли процесса. Для async-движка размеры пула берутся из DB_ASYNC_*, если заданы.
+    """
+    role = role or db_role()
+    backend = make_url(url).get_backend_name()
+    options: Dict[str, Any] = {
+        "future": True,
+        "echo": os.getenv("DB_ECHO", "0") == "1",
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "1") == "1",
+    }
+    if backend == "sqlite":
+        return options
+
+    prefix = "DB_ASYNC_" if is_async else "DB_"
+    options.update(
+        poolclass=InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool,
+        pool_size=_env_int(f"{prefix}POOL_SIZE", _env_int("DB_POOL_SIZE", 10)),
+        max_overflow=_env_int(f"{prefix}MAX_OVERFLOW", _env_int("DB_MAX_OVERFLOW", 10)),
+        pool_timeout=_env_float(f"{prefix}POOL_TIMEOUT", _env_float("DB_POOL_TIMEOUT", 30)),
+        pool_recycle=_env_int("DB_POOL_RECYCLE", 1800),
+    )
+    if backend == "postgresql":
+        timeout = statement_timeout_ms(role)
+        name = application_name(role)
+        if is_async:
+            settings = {"application_name": name}
+            if timeout:
+                settings["statement_timeout"] = str(timeout)
+            options["connect_args"] = {"server_settings": settings}
+        else:
+            connect_args: Dict[str, Any] = {"application_name": name}
+            if timeout:
+                connect_args["options"] = f"-c statement_timeout={timeout}"
+            options["connect_args"] = connect_args
+    return options
 
-engine = create_engine(DATABASE_URL, echo=True, future=True)
+
+def create_app_engine(url: str, role: Optional[str] = None) -> Engine:
+    return create_engine(url, **engine_options(url, role))
+
+
+def get_pool_stats(target: Engine) -> Dict[str, Any]:
+    pool = target.pool
+    stats: Dict[str, Any] = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            checked_in=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+            max_overflow=pool._max_overflow,
+            timeout_s=pool.timeout(),
+        )
+    wait_stats = getattr(pool, "wait_stats", None)
+    if wait_stats is not None:
+        with pool._wait_lock:
+            waits = dict(wait_stats)
+        waits["avg_wait_ms"] = round(waits["wait_ms_total"] / waits["checkouts"], 3) if waits["checkouts"] else 0.0
+        waits["wait_ms_total"] = round(waits["wait_ms_total"], 3)
+        waits["max_wait_ms"] = round(waits["max_wait_ms"], 3)
+        stats.update(waits)
+    return stats
+
+
+engine = create_app_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Хуки всех сессий: счётчики ETag и таблица tag_bindings меняются в транзакции правки
+change_counters.register_hooks(Session)
+tag_bindings.register_hooks(Session)
+
 # depends for FastAPI routes
 def get_db():
     db = SessionLocal()
@@ -13,3 +159,59 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# --- Асинхронный движок для горячих GET-маршрутов (DB_ASYNC_READS=1) ---
+
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+T = TypeVar("T")
+ReadSession = Union[Session, AsyncSession]
+
+
+def _async_url(url: str) -> Optional[str]:
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None:
+        return None
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
+def _create_async_engine():
+    if os.getenv("DB_ASYNC_READS") != "1" or not DATABASE_URL:
+        return None
+    url = _async_url(DATABASE_URL)
+    if url is None:
+        logger.warning("DB_ASYNC_READS=1, но для %s нет async-драйвера; чтение идёт через пул потоков", DATABASE_URL)
+        return None
+    try:
+        return create_async_engine(url, **engine_options(url, is_async=True))
+    except ImportError:
+        logger.warning("Async-драйвер для %s не установлен; чтение идёт через пул потоков", url.split(":", 1)[0])
+        return None
+
+
+async_engine = _create_async_engine()
+AsyncSessionLocal = (
+    async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False) if async_engine is not None else None
+)
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# Зависимость для маршрутов только на чтение: AsyncSession, если async-движок включён,
+# иначе обычная сессия (и её подмена в тестах через dependency_overrides[get_db]).
+get_read_db = get_async_db if AsyncSessionLocal is not None else get_db
+
+
+async def run_read(db: ReadSession, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Выполняет синхронную CRUD-функцию fn(session, ...) не блокируя цикл событий:
+    на AsyncSession — через run_sync (greenlet поверх asyncpg или aiosqlite), иначе — в пуле потоков.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
@@ -1,8 +1,8 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, Response
+from fastapi.responses import FileResponse, PlainTextResponse, Response
 from app.config import (
     API_BASE_URL,
     FRONTEND_DIR,
@@ -20,12 +20,14 @@ from app.routers import (
     users,
     parser,
     system,
+    events,
 )
+from app.services import metrics, sql_profiler, sync_jobs, sync_queue
 from . import database, models
+from .security import require_metrics_access
 
 import os
 import json
-import logging
 from starlette.middleware.base import BaseHTTPMiddleware
 
 NO_CACHE_EXTS = (".js", ".css", ".html", ".htm")
@@ -40,13 +42,14 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(sql_profiler.SQLProfilerMiddleware)
+# Снаружи остальных middleware: время запроса включает CORS и заголовки прокси.
+app.add_middleware(metrics.MetricsMiddleware)
 
 if os.getenv("AUTO_CREATE_TABLES") == "1":
     models.Base.metadata.create_all(bind=database.engine)
 
 
-logging.getLogger("sqlalchemy.engine.Engine").disabled = True
-
 if os.getenv("DEV_NO_CACHE") == "1":
 
     @app.middleware("http")
@@ -70,6 +73,23 @@ app.include_router(statuses.router)
 app.include_router(issues.router)
 app.include_router(parser.router)
 app.include_router(system.router)
+app.include_router(events.router)
+
+
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(require_metrics_access)])
+def serve_metrics():
+    """
+    Метрики процесса в формате Prometheus (METRICS_TOKEN или администратор). При METRICS_WORKER_SNAPSHOT=1
+    добавляются метрики воркера синхронизации из Redis и отставание очереди по вкладкам.
+    """
+    worker_text = None
+    if os.getenv("METRICS_WORKER_SNAPSHOT") == "1":
+        sync_jobs.update_lag_gauge()
+        worker_text = sync_queue.get_worker_metrics()
+    if not worker_text:
+        return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+    content = metrics.render(exclude=metrics.WORKER_METRICS) + worker_text
+    return PlainTextResponse(content, media_type=metrics.CONTENT_TYPE)
 
 
 def _build_frontend_config() -> dict:
@@ -4,6 +4,7 @@ import uuid
 from sqlalchemy import (
     Column,
     Integer,
+    BigInteger,
     String,
     ForeignKey,
     DateTime,
@@ -11,7 +12,11 @@ from sqlalchemy import (
     JSON,
     Index,
     Text,
+    DDL,
+    event,
+    text,
 )
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship, declarative_base
 
 
@@ -26,6 +31,10 @@ def generate_stable_key() -> str:
     return uuid.uuid4().hex
 
 
+# В Postgres — JSONB (индексируется GIN и поддерживает @>), в SQLite — обычный JSON.
+JSONVariant = JSON().with_variant(JSONB(), "postgresql")
+
+
 # --- Tags ---
 class Tag(Base):
     __tablename__ = "tags"
@@ -42,6 +51,19 @@ class Tag(Base):
     item = relationship("Item", foreign_keys=[item_id])
 
 
+# --- Tag bindings (индекс по tag_ids вкладок, ящиков и айтемов) ---
+class TagBinding(Base):
+    __tablename__ = "tag_bindings"
+
+    tag_id = Column(Integer, primary_key=True)
+    entity_type = Column(String(8), primary_key=True)  # tab / box / item
+    entity_id = Column(Integer, primary_key=True)
+
+    __table_args__ = (
+        Index("idx_tag_binding_entity", "entity_type", "entity_id"),
+    )
+
+
 # --- Statuses ---
 class Status(Base):
     __tablename__ = "statuses"
@@ -62,8 +84,10 @@ class Tab(Base):
     enable_sync = Column(Boolean, nullable=False, default=False)
     sync_config = Column(String, nullable=True)
     tag_ids = Column(JSON, nullable=False, default=list)
+    # Версия набора полей: увеличивается при любом изменении TabField (кеш field_codec)
+    fields_version = Column(Integer, nullable=False, default=0, server_default="0")
     boxes = relationship("Box", back_populates="tab", cascade="all, delete")
-    fields = relationship("TabField", back_populates="tab", cascade="all, delete")
+    fields = relationship("TabField", back_populates="tab", cascade="all, delete", order_by="TabField.id")
 
 
 # --- Tab fields (динамические параметры для айтемов этой вкладки) ---
@@ -81,6 +105,14 @@ class TabField(Base):
     tab = relationship("Tab", back_populates="fields")
 
 
+# --- Change counters (версии для ETag) ---
+class ChangeCounter(Base):
+    __tablename__ = "change_counters"
+
+    name = Column(String, primary_key=True)
+    value = Column(BigInteger, nullable=False, default=0)
+
+
 # --- Boxes ---
 class Box(Base):
     __tablename__ = "boxes"
@@ -110,12 +142,15 @@ class Item(Base):
     id = Column(Integer, primary_key=True)
     name = Column(String, nullable=False)
     qty = Column(Integer, nullable=False, default=1)
-    box_position = Column(Integer, nullable=False, default=1)
+    # Разреженный ранг внутри ящика (шаг POSITION_GAP); номера слотов считаются из qty при чтении.
+    box_rank = Column(BigInteger, nullable=False, default=0)
     metadata_json = Column(JSON, default={})
     serial_number = Column(String, nullable=True)
     tab_id = Column(Integer, ForeignKey("tabs.id"), nullable=False)
     box_id = Column(Integer, ForeignKey("boxes.id"), nullable=False)
-    tag_ids = Column(JSON, nullable=False, default=list)
+    tag_ids = Column(JSONVariant, nullable=False, default=list)
+    # Время последней правки: вместе с числом айтемов вкладки даёт ETag /tabs/{id}/contents
+    updated_at = Column(DateTime(timezone=True), default=utcnow, onupdate=utcnow, nullable=False)
 
     tab = relationship("Tab")
     box = relationship("Box", back_populates="items")
@@ -123,9 +158,39 @@ class Item(Base):
     # индекс на вкладку
     __table_args__ = (
         Index("idx_item_tab_name", "tab_id", "name"),
+        Index("idx_item_tab_updated", "tab_id", "updated_at"),
+        Index("idx_item_box_rank", "box_id", "box_rank"),
+        # Индексы поиска (pg_trgm / GIN) создаются только в Postgres.
+        Index(
+            "idx_item_name_trgm",
+            "name",
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+        Index(
+            "idx_item_serial_trgm",
+            "serial_number",
+            postgresql_using="gin",
+            postgresql_ops={"serial_number": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+        # Только значения полей: ключи метаданных — stable_key (uuid hex) и совпадали бы с любым запросом
+        Index(
+            "idx_item_metadata_values_trgm",
+            text("(CAST(jsonb_path_query_array(CAST(metadata_json AS JSONB), 'strict $.*') AS TEXT)) gin_trgm_ops"),
+            postgresql_using="gin",
+        ).ddl_if(dialect="postgresql"),
+        Index("idx_item_tag_ids_gin", "tag_ids", postgresql_using="gin").ddl_if(dialect="postgresql"),
     )
 
 
+# Расширение нужно до создания любой таблицы с trgm-индексом (items, item_utilized).
+event.listen(
+    Base.metadata,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
+
+
 # --- Issues ---
 class Issue(Base):
     __tablename__ = "issues"
@@ -137,6 +202,9 @@ class Issue(Base):
     status = relationship("Status")
     item_utilized = relationship("ItemUtilized", back_populates="issue", uselist=False)
 
+    # Ключ курсора истории: ORDER BY created_at DESC, id DESC
+    __table_args__ = (Index("idx_issue_created_id", "created_at", "id"),)
+
 
 # --- Item utilization history ---
 class ItemUtilized(Base):
@@ -145,6 +213,11 @@ class ItemUtilized(Base):
     id = Column(Integer, primary_key=True)
     issue_id = Column(Integer, ForeignKey("issues.id", ondelete="CASCADE"), nullable=False, unique=True)
     item_snapshot = Column(Text, nullable=False)
+    # Поля снимка отдельными колонками — для фильтров истории без разбора JSON
+    item_name = Column(String, nullable=True)
+    tab_name = Column(String, nullable=True)
+    box_name = Column(String, nullable=True)
+    qty = Column(Integer, nullable=True)
     serial_number = Column(String, nullable=True)
     invoice_number = Column(String, nullable=True)
     responsible_user_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
@@ -152,6 +225,27 @@ class ItemUtilized(Base):
     issue = relationship("Issue", back_populates="item_utilized")
     responsible_user = relationship("User")
 
+    __table_args__ = (
+        Index(
+            "idx_item_utilized_item_name_trgm",
+            "item_name",
+            postgresql_using="gin",
+            postgresql_ops={"item_name": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+        Index(
+            "idx_item_utilized_tab_name_trgm",
+            "tab_name",
+            postgresql_using="gin",
+            postgresql_ops={"tab_name": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+        Index(
+            "idx_item_utilized_box_name_trgm",
+            "box_name",
+            postgresql_using="gin",
+            postgresql_ops={"box_name": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+    )
+
     @property
     def responsible_user_name(self) -> str | None:
         return getattr(self.responsible_user, "user_name", None)
@@ -166,4 +260,6 @@ class User(Base):
     hashed_password = Column(String, nullable=False)
     role = Column(String, nullable=False, default="viewer")
     is_active = Column(Boolean, nullable=False, default=True)
+    # Растёт при смене роли/блокировке: токены со старой версией перестают приниматься
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime(timezone=True), default=utcnow, nullable=False)
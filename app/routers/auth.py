@@ -1,13 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
-from app import database, models, schemas
+from app import database, schemas
 from app.crud import users as users_crud
 from app.security import (
-    create_access_token,
+    create_user_token,
     get_current_user_optional,
     require_read_access,
 )
+from app.services import password_hasher
+from app.services.user_cache import CachedUser
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
 
@@ -16,15 +19,16 @@ router = APIRouter(prefix="/auth", tags=["Auth"])
 async def register_user(
     payload: schemas.UserCreate,
     db: Session = Depends(database.get_db),
-    current_user: models.User | None = Depends(get_current_user_optional),
+    current_user: CachedUser | None = Depends(get_current_user_optional),
 ):
-    user_count = users_crud.get_user_count(db)
+    user_count = await run_in_threadpool(users_crud.get_user_count, db)
     if user_count > 0:
         if not current_user or current_user.role != "admin":
             raise HTTPException(status_code=403, detail="Только администратор может создавать пользователей")
 
+    hashed_password = await password_hasher.hash_password(payload.password)
     try:
-        user = users_crud.create_user(db, payload)
+        user = await run_in_threadpool(users_crud.create_user, db, payload, hashed_password)
     except ValueError as exc:
         raise HTTPException(status_code=400, detail=str(exc))
     return user
@@ -32,14 +36,18 @@ async def register_user(
 
 @router.post("/login", response_model=schemas.TokenWithUser)
 async def login(payload: schemas.LoginRequest, db: Session = Depends(database.get_db)):
-    user = users_crud.authenticate_user(db, payload.user_name, payload.password)
+    user = await users_crud.authenticate_user(db, payload.user_name, payload.password)
     if not user:
         raise HTTPException(status_code=400, detail="Неверное имя пользователя или пароль")
 
-    token = create_access_token({"sub": str(user.id)})
+    token = create_user_token(user)
     return schemas.TokenWithUser(access_token=token, token_type="bearer", user=user)
 
 
 @router.get("/me", response_model=schemas.UserRead)
-async def read_me(current_user: models.User = Depends(require_read_access)):
-    return current_user
+def read_me(current_user: CachedUser = Depends(require_read_access), db: Session = Depends(database.get_db)):
+    # В кеше только поля для проверки доступа; профиль читаем целиком
+    user = users_crud.get_user(db, current_user.id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
@@ -5,6 +5,7 @@ from app import schemas, database
 from app.crud import boxes
 from fastapi.exceptions import HTTPException
 from app.security import require_read_access, require_edit_access
+from app.utils import fast_json
 
 router = APIRouter(prefix="/boxes", tags=["Boxes"], dependencies=[Depends(require_read_access)])
 
@@ -13,18 +14,18 @@ def create_box(box: schemas.BoxCreate, db: Session = Depends(database.get_db)):
     return boxes.create_box(db, box)
 
 @router.get("/", response_model=List[schemas.BoxRead])
-def get_boxes(db: Session = Depends(database.get_db)):
-    return boxes.get_boxes(db)
+async def get_boxes(db: database.ReadSession = Depends(database.get_read_db)):
+    return fast_json.respond(await database.run_read(db, boxes.get_boxes), schemas.BoxRead)
 
 @router.get("/{tab_id}", response_model=List[schemas.BoxRead])
-def read_boxes_by_tab(tab_id: int, db: Session = Depends(database.get_db)):
+async def read_boxes_by_tab(tab_id: int, db: database.ReadSession = Depends(database.get_read_db)):
     """
     Получить все боксы, относящиеся к указанной вкладке.
     """
-    boxes_list = boxes.get_boxes_by_tab_id(db, tab_id)
+    boxes_list = await database.run_read(db, boxes.get_boxes_by_tab_id, tab_id)
     if not boxes_list:
         raise HTTPException(status_code=404, detail="No boxes found for this tab")
-    return boxes_list
+    return fast_json.respond(boxes_list, schemas.BoxRead)
 
 @router.put("/{box_id}", response_model=schemas.BoxRead, dependencies=[Depends(require_edit_access)])
 def update_box(box_id: int, box_data: schemas.BoxUpdate, db: Session = Depends(database.get_db)):
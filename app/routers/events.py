@@ -0,0 +1,42 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import database
+from app.security import require_read_access
+from app.services import change_feed
+
+router = APIRouter(prefix="/events", tags=["Events"], dependencies=[Depends(require_read_access)])
+
+
+def _parse_event_id(raw: Optional[str]) -> Optional[int]:
+    try:
+        return int(raw) if raw else None
+    except ValueError:
+        return None
+
+
+@router.get("")
+async def stream_events(
+    tab_id: Optional[int] = Query(None, description="только события этой вкладки (и общие, например теги)"),
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+    db: database.ReadSession = Depends(database.get_read_db),
+):
+    """
+    Server-Sent Events с дельтами айтемов, ящиков и тегов. После переподключения
+    с Last-Event-ID пропущенные события повторяются из буфера; если буфер их уже
+    не покрывает, приходит событие reset — данные нужно перечитать целиком.
+    """
+    # Сессия проверки токена больше не нужна: соединение не держится всё время потока
+    if isinstance(db, AsyncSession):
+        await db.close()
+    else:
+        db.close()
+    subscriber = change_feed.subscribe(tab_id)
+    return StreamingResponse(
+        change_feed.stream(subscriber, _parse_event_id(last_event_id)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
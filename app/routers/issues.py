@@ -1,22 +1,25 @@
 from datetime import datetime
 from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
 from app import schemas, database
 from app.crud import issues as issues_crud
 from app.security import require_read_access, require_edit_access
-from app.utils.local_history import HISTORY_XLSX_PATH
+from app.utils import fast_json
+from app.utils.local_history import CSV_MEDIA_TYPE, XLSX_MEDIA_TYPE, iter_history_csv, iter_history_xlsx
 
 router = APIRouter(prefix="/issues", tags=["Issues"], dependencies=[Depends(require_read_access)])
 
 
 @router.get("/", response_model=schemas.IssueHistoryResponse)
-def list_issues(
+async def list_issues(
     page: int = 1,
     per_page: int = 20,
+    cursor: Optional[str] = None,
+    total: str = Query("exact", pattern="^(exact|estimate|none)$"),
     status_id: Optional[int] = None,
     responsible: Optional[str] = None,
     serial: Optional[str] = None,
@@ -26,12 +29,15 @@ def list_issues(
     box: Optional[str] = None,
     created_from: Optional[datetime] = None,
     created_to: Optional[datetime] = None,
-    db: Session = Depends(database.get_db),
+    db: database.ReadSession = Depends(database.get_read_db),
     ):
-    return issues_crud.list_issues(
+    history = await database.run_read(
         db,
+        issues_crud.list_issues,
         page=page,
         per_page=per_page,
+        cursor=cursor,
+        total_mode=total,
         status_id=status_id,
         responsible=responsible,
         serial=serial,
@@ -42,14 +48,44 @@ def list_issues(
         created_from=created_from,
         created_to=created_to,
     )
+    return fast_json.respond(history)
 
 
 @router.get("/export")
-def export_issue_history():
-    if not HISTORY_XLSX_PATH.exists():
-        raise HTTPException(status_code=404, detail="Файл истории ещё не создан")
-    filename = HISTORY_XLSX_PATH.name
-    return FileResponse(HISTORY_XLSX_PATH, media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", filename=filename)
+def export_issue_history(
+    export_format: str = Query("xlsx", alias="format", pattern="^(csv|xlsx)$"),
+    status_id: Optional[int] = None,
+    responsible: Optional[str] = None,
+    serial: Optional[str] = None,
+    invoice: Optional[str] = None,
+    item: Optional[str] = None,
+    tab: Optional[str] = None,
+    box: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    db: Session = Depends(database.get_db),
+):
+    rows = issues_crud.iter_export_rows(
+        db,
+        status_id=status_id,
+        responsible=responsible,
+        serial=serial,
+        invoice=invoice,
+        item=item,
+        tab=tab,
+        box=box,
+        created_from=created_from,
+        created_to=created_to,
+    )
+    if export_format == "csv":
+        body, media_type = iter_history_csv(rows), CSV_MEDIA_TYPE
+    else:
+        body, media_type = iter_history_xlsx(rows), XLSX_MEDIA_TYPE
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="issue_history.{export_format}"'},
+    )
 
 
 @router.api_route("/{issue_id}/status", methods=["PATCH", "PUT"], response_model=schemas.IssueHistoryEntry, dependencies=[Depends(require_edit_access)])
@@ -6,25 +6,37 @@ from typing import List
 from app import schemas, database
 from app.crud import items
 from app.security import require_read_access, require_edit_access
+from app.utils import fast_json
 
 router = APIRouter(prefix="/items", tags=["Items"], dependencies=[Depends(require_read_access)])
 
 
 
 @router.get("/search")
-def search_items(
+async def search_items(
     query: str = Query(..., description="Строка поиска (например, 'DDR4')"),
-    tab_id: int = Query(..., description="ID вкладки (например, 1 — 'ОЗУ')"),
+    tab_id: int | None = Query(None, description="ID вкладки (например, 1 — 'ОЗУ')"),
     limit: int = Query(100, description="Максимум элементов в ответе"),
     tag_id: int | None = Query(None, description="ID тега для фильтрации"),
-    db: Session = Depends(database.get_db)
+    cursor: str | None = Query(None, description="next_cursor из предыдущей страницы"),
+    all_tabs: bool = Query(False, description="Искать по всем вкладкам"),
+    db: database.ReadSession = Depends(database.get_read_db),
 ):
     """
-    Быстрый поиск по названию айтема внутри вкладки.
-    Возвращает совпадения с информацией о ящике и теге.
+    Поиск по названию, серийникам и полям айтема внутри вкладки (или по всем вкладкам).
+    Возвращает совпадения по релевантности с информацией о ящике и теге.
     """
-    results = items.search_items(db, query=query, tab_id=tab_id, limit=limit, tag_id=tag_id)
-    return {"results": results, "count": len(results)}
+    results, next_cursor = await database.run_read(
+        db,
+        items.search_items,
+        query=query,
+        tab_id=tab_id,
+        limit=limit,
+        tag_id=tag_id,
+        cursor=cursor,
+        all_tabs=all_tabs,
+    )
+    return fast_json.respond({"results": results, "count": len(results), "next_cursor": next_cursor})
 
 
 
@@ -32,9 +44,13 @@ def search_items(
 def create_item(item: schemas.ItemCreate, db: Session = Depends(database.get_db)):
     return items.create_item(db, item)
 
+@router.post("/bulk", response_model=schemas.ItemBulkResponse, dependencies=[Depends(require_edit_access)])
+def bulk_items(payload: schemas.ItemBulkPayload, db: Session = Depends(database.get_db)):
+    return items.bulk_items(db, payload)
+
 @router.get("/{box_id}", response_model=List[schemas.ItemRead])
-def get_items(box_id: int, db: Session = Depends(database.get_db)):
-    return items.get_items_by_box(db, box_id)
+async def get_items(box_id: int, db: database.ReadSession = Depends(database.get_read_db)):
+    return fast_json.respond(await database.run_read(db, items.get_items_by_box, box_id))
 
 @router.put("/{item_id}", response_model=schemas.ItemRead, dependencies=[Depends(require_edit_access)])
 def update_item(item_id: int, item_data: schemas.ItemUpdate, db: Session = Depends(database.get_db)):
@@ -1,7 +1,13 @@
-from fastapi import APIRouter, Depends
+from typing import List, Optional
 
+from anyio import to_thread
+from fastapi import APIRouter, Depends, Query
+
+from app import database
 from app.security import require_read_access
-from app.services import sync_queue
+from app.services import change_feed, field_codec, password_hasher, sync_jobs, sync_queue, user_cache
+from gsheets_parser import parser as sheets_parser
+from gsheets_parser import quota as sheets_quota
 
 router = APIRouter(prefix="/system", tags=["System"], dependencies=[Depends(require_read_access)])
 
@@ -12,3 +18,86 @@ def read_sync_worker_status():
     Возвращает информацию о доступности воркера очереди синхронизации.
     """
     return sync_queue.get_worker_status()
+
+
+@router.get("/sync-jobs")
+def read_sync_jobs(
+    status: Optional[str] = Query(None, pattern=f"^({'|'.join(sync_jobs.STATUSES)})$"),
+    sync_config: Optional[str] = Query(None, description="конфиг листа"),
+    tab: Optional[str] = Query(None, description="id вкладки (как метка tab в /metrics)"),
+    job_id: Optional[List[str]] = Query(None, description="id задач из sync_result"),
+    limit: int = Query(50, ge=1, le=500),
+):
+    """
+    Последние задачи синхронизации (новые первыми), отставание очереди по вкладкам в секундах
+    и max_wait — сколько секунд задача может оставаться незавершённой с учётом повторов.
+    """
+    jobs = sync_jobs.list_jobs(status=status, sync_config=sync_config, tab=tab, job_ids=job_id, limit=limit)
+    return {"jobs": jobs, "lag": sync_jobs.tab_lag(), "max_wait": sync_queue.max_job_seconds()}
+
+
+@router.get("/sheets-cache")
+def read_sheets_cache_stats():
+    """
+    Счётчики кеша учёток и Sheets-сервисов процесса API (запуски парсера).
+    Статистика воркера синхронизации отдаётся в /system/sync-worker.
+    """
+    return sheets_parser.get_service_cache_stats()
+
+
+@router.get("/sheets-quota")
+def read_sheets_quota_stats():
+    """
+    Квоты Sheets API и вызовы по методам: суммы API и всех воркеров из Redis
+    (scope "redis"), без Redis — только этого процесса API (scope "process").
+    """
+    return sheets_quota.get_stats()
+
+
+@router.get("/auth-cache")
+def read_auth_cache_stats():
+    """
+    Счётчики кеша пользователей для проверки токенов в этом процессе API.
+    """
+    return user_cache.get_stats()
+
+
+@router.get("/field-codecs")
+def read_field_codec_stats():
+    """
+    Счётчики кеша кодеков полей вкладок в этом процессе API.
+    """
+    return field_codec.get_stats()
+
+
+@router.get("/change-feed")
+def read_change_feed_stats():
+    """
+    Лента изменений (GET /events) в этом процессе API: подписчики, буфер повтора, сбросы.
+    """
+    return change_feed.get_stats()
+
+
+@router.get("/password-pool")
+def read_password_pool_stats():
+    """
+    Пул bcrypt этого процесса: занятость, глубина очереди и время ожидания.
+    """
+    return password_hasher.get_stats()
+
+
+@router.get("/db-pool")
+async def read_db_pool_stats():
+    """
+    Пулы соединений с БД этого процесса и занятость пула потоков,
+    в котором выполняются синхронные маршруты: пул БД стоит подбирать под его размер.
+    """
+    limiter = to_thread.current_default_thread_limiter()
+    stats = {
+        "role": database.db_role(),
+        "sync": database.get_pool_stats(database.engine),
+        "threadpool": {"size": limiter.total_tokens, "busy": limiter.borrowed_tokens},
+    }
+    if database.async_engine is not None:
+        stats["async"] = database.get_pool_stats(database.async_engine.sync_engine)
+    return stats
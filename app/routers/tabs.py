@@ -1,9 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+import hashlib
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from app import schemas, database
-from app.crud import tabs
+from app.crud import items, tabs
 from app.security import require_read_access, require_edit_access
+from app.utils import fast_json
+from app.utils.http_cache import make_etag, not_modified, set_etag
 
 router = APIRouter(prefix="/tabs", tags=["Tabs"], dependencies=[Depends(require_read_access)])
 
@@ -12,16 +16,52 @@ def create_tab(tab: schemas.TabCreate, db: Session = Depends(database.get_db)):
     return tabs.create_tab(db, tab)
 
 @router.get("/", response_model=List[schemas.TabRead])
-def get_tabs(db: Session = Depends(database.get_db)):
-    return tabs.get_tabs(db)
+async def get_tabs(request: Request, response: Response, db: database.ReadSession = Depends(database.get_read_db)):
+    etag = make_etag("tabs", await database.run_read(db, tabs.get_catalog_version))
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    set_etag(response, etag)
+    return await database.run_read(db, tabs.get_tabs)
 
 @router.get("/{tab_id}", response_model=schemas.TabRead)
-def get_tab(tab_id: int, db: Session = Depends(database.get_db)):
-    tab = tabs.get_tab(db, tab_id)
+async def get_tab(tab_id: int, request: Request, response: Response, db: database.ReadSession = Depends(database.get_read_db)):
+    etag = make_etag("tab", tab_id, await database.run_read(db, tabs.get_catalog_version))
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    tab = await database.run_read(db, tabs.get_tab, tab_id)
     if not tab:
         raise HTTPException(status_code=404, detail="Tab not found")
+    set_etag(response, etag)
     return tab
 
+@router.get("/{tab_id}/contents")
+async def get_tab_contents(
+    tab_id: int,
+    request: Request,
+    box_ids: Optional[List[int]] = Query(None, description="Только эти ящики вкладки (?box_ids=1&box_ids=2)"),
+    db: database.ReadSession = Depends(database.get_read_db),
+):
+    """
+    Все ящики и айтемы вкладки одним ответом в колоночном виде (для полного вида сетки).
+    ETag меняется при любой правке ящиков, полей и айтемов вкладки.
+    """
+    subset = "all"
+    if box_ids:
+        subset = hashlib.sha1(",".join(map(str, sorted(set(box_ids)))).encode()).hexdigest()[:12]
+    version = await database.run_read(db, items.get_tab_contents_version, tab_id)
+    etag = make_etag("tab-contents", tab_id, *version, subset)
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    contents = await database.run_read(db, items.get_tab_contents, tab_id, box_ids)
+    if contents is None:
+        raise HTTPException(status_code=404, detail="Tab not found")
+    response = fast_json.json_response(contents)
+    set_etag(response, etag)
+    return response
+
 @router.put("/{tab_id}", response_model=schemas.TabRead, dependencies=[Depends(require_edit_access)])
 def update_tab(tab_id: int, tab_data: schemas.TabUpdate, db: Session = Depends(database.get_db)):
     return tabs.update_tab(db, tab_id, tab_data)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, constr
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Literal
 from pydantic.config import ConfigDict
 from datetime import datetime
 
@@ -76,6 +76,7 @@ class ItemIssuePayload(BaseModel):
 class SyncResult(BaseModel):
     status: str
     detail: Optional[str] = None
+    job_ids: List[str] = Field(default_factory=list)
 
 
 class ItemUtilizedRead(BaseModel):
@@ -103,7 +104,9 @@ class IssueHistoryEntry(BaseModel):
 
 class IssueHistoryResponse(BaseModel):
     items: List[IssueHistoryEntry]
-    total: int
+    total: Optional[int] = None
+    total_estimated: bool = False
+    next_cursor: Optional[str] = None
 
 class IssueStatusUpdate(BaseModel):
     status_id: int
@@ -268,6 +271,33 @@ class ItemReorderPayload(BaseModel):
     ordered_ids: List[int] = Field(min_length=1)
 
 
+class ItemBulkOperation(BaseModel):
+    action: Literal["create", "update", "delete"]
+    item_id: Optional[int] = None
+    item: Optional[ItemCreate] = None
+    changes: Optional[ItemUpdate] = None
+
+
+class ItemBulkPayload(BaseModel):
+    operations: List[ItemBulkOperation] = Field(min_length=1, max_length=1000)
+    atomic: bool = True
+
+
+class ItemBulkResult(BaseModel):
+    index: int
+    action: str
+    status: Literal["ok", "error", "skipped"]
+    item_id: Optional[int] = None
+    item: Optional[ItemRead] = None
+    detail: Optional[str] = None
+
+
+class ItemBulkResponse(BaseModel):
+    committed: bool
+    results: List[ItemBulkResult]
+    sync_result: Optional[SyncResult] = None
+
+
 # --- Parser / Imports ---
 class ParsedTabSummary(BaseModel):
     name: str
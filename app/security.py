@@ -1,17 +1,18 @@
+import hmac
 import os
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from sqlalchemy.orm import Session
 
 from app import models, database
-from app.config import SECRET_KEY, ACCESS_TOKEN_EXPIRE_MINUTES
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from app.config import SECRET_KEY, ACCESS_TOKEN_EXPIRE_MINUTES, METRICS_TOKEN
+from app.services import sql_profiler, user_cache
+from app.services.password_hasher import pwd_context
+from app.services.user_cache import CachedUser
 
 
 ALGORITHM = "HS256"
@@ -38,42 +39,76 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def _decode_token(token: str) -> int:
+def create_user_token(user: models.User) -> str:
+    """
+    Токен с версией: версия сверяется при каждом запросе, так что смена роли
+    или блокировка отзывают старые токены. Роль берётся из пользователя, а не из токена.
+    """
+    return create_access_token({"sub": str(user.id), "tv": user.token_version or 0})
+
+
+def _decode_token(token: str) -> Tuple[int, int]:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id = payload.get("sub")
         if user_id is None:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token payload")
-        return int(user_id)
+        # Токены, выданные до появления версии, считаются версией 0
+        return int(user_id), int(payload.get("tv", 0))
     except (JWTError, ValueError):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid authentication credentials")
 
 
+def _load_user(db: Session, user_id: int) -> Optional[CachedUser]:
+    cached = user_cache.get_shared(user_id)
+    if cached is not None:
+        return cached
+    user = db.query(models.User).filter(models.User.id == user_id).first()
+    if user is None:
+        return None
+    cached = CachedUser(
+        id=user.id,
+        user_name=user.user_name,
+        role=user.role,
+        is_active=user.is_active,
+        token_version=user.token_version or 0,
+    )
+    user_cache.put(cached)
+    return cached
+
+
+async def _get_active_user(db: database.ReadSession, user_id: int, token_version: int) -> CachedUser:
+    user = user_cache.get_local(user_id)
+    if user is None:
+        # Запрос к БД не должен выполняться прямо в цикле событий
+        user = await database.run_read(db, _load_user, user_id)
+    if not user or not user.is_active:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Inactive user")
+    if user.token_version != token_version:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token revoked")
+    sql_profiler.authorize(user)
+    return user
+
+
 async def get_current_user_optional(
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_optional),
-    db: Session = Depends(database.get_db),
+    db: database.ReadSession = Depends(database.get_read_db),
 ):
     if credentials is None:
         return None
-    user_id = _decode_token(credentials.credentials)
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    if not user or not user.is_active:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Inactive user")
-    return user
+    user_id, token_version = _decode_token(credentials.credentials)
+    return await _get_active_user(db, user_id, token_version)
 
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(bearer_required),
-    db: Session = Depends(database.get_db),
+    db: database.ReadSession = Depends(database.get_read_db),
 ):
-    user_id = _decode_token(credentials.credentials)
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    if not user or not user.is_active:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Inactive user")
-    return user
+    user_id, token_version = _decode_token(credentials.credentials)
+    return await _get_active_user(db, user_id, token_version)
 
 
-def _ensure_role(user: models.User, minimum: str):
+def _ensure_role(user: CachedUser, minimum: str):
     user_level = ROLE_PRIORITY.get(user.role, 0)
     min_level = ROLE_PRIORITY.get(minimum, 0)
 
@@ -82,15 +117,30 @@ def _ensure_role(user: models.User, minimum: str):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Недостаточно прав")
 
 
-async def require_read_access(current_user: models.User = Depends(get_current_user)):
+async def require_read_access(current_user: CachedUser = Depends(get_current_user)):
     return current_user
 
 
-async def require_edit_access(current_user: models.User = Depends(get_current_user)):
+async def require_edit_access(current_user: CachedUser = Depends(get_current_user)):
     _ensure_role(current_user, "editor")
     return current_user
 
 
-async def require_admin_access(current_user: models.User = Depends(get_current_user)):
+async def require_admin_access(current_user: CachedUser = Depends(get_current_user)):
     _ensure_role(current_user, "admin")
     return current_user
+
+
+async def require_metrics_access(
+    credentials: HTTPAuthorizationCredentials = Depends(bearer_required),
+    db: database.ReadSession = Depends(database.get_read_db),
+):
+    """
+    /metrics: токен скрейпера из METRICS_TOKEN (без запроса к БД) или токен администратора.
+    """
+    if METRICS_TOKEN and hmac.compare_digest(credentials.credentials.encode(), METRICS_TOKEN.encode()):
+        return None
+    user_id, token_version = _decode_token(credentials.credentials)
+    user = await _get_active_user(db, user_id, token_version)
+    _ensure_role(user, "admin")
+    return user
@@ -0,0 +1,333 @@
+"""
+Лента изменений для живого обновления страниц (GET /events, Server-Sent Events).
+
+CRUD после commit публикует компактные дельты: айтем, ящик, тег или новый
+порядок айтемов ящика. С CHANGE_FEED_REDIS=1 событие получает номер из общего
+счётчика Redis, пишется в ограниченный буфер для повтора (Last-Event-ID) и
+рассылается через pub/sub всем процессам API — одним Lua-скриптом, поэтому
+порядок номеров совпадает с порядком рассылки и буфера. Иначе — шина в памяти
+процесса с таким же буфером. Если Redis недоступен, клиенты этого процесса
+получают reset (номера из памяти пересеклись бы с номерами Redis).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Set
+
+from redis import Redis
+
+logger = logging.getLogger(__name__)
+
+_REDIS_CHANNEL = "change_feed"
+_REDIS_SEQ_KEY = "change_feed:seq"
+_REDIS_BUFFER_KEY = "change_feed:events"
+RETRY_MS = 3000
+# Номер, запись в буфер и рассылка атомарно. JSON события собирается приписыванием
+# номера к готовому телу: cjson при перекодировании превратил бы пустые списки в {}.
+_PUBLISH_SCRIPT = """
+local id = redis.call('INCR', KEYS[1])
+local raw = '{"id":' .. id .. ',' .. ARGV[1]
+redis.call('RPUSH', KEYS[2], raw)
+redis.call('LTRIM', KEYS[2], -tonumber(ARGV[2]), -1)
+redis.call('PUBLISH', ARGV[3], raw)
+return raw
+"""
+
+
+def redis_enabled() -> bool:
+    return os.getenv("CHANGE_FEED_REDIS", "0") == "1"
+
+
+def buffer_size() -> int:
+    return max(int(os.getenv("CHANGE_FEED_BUFFER", "1000")), 1)
+
+
+def keepalive_seconds() -> float:
+    return max(float(os.getenv("CHANGE_FEED_KEEPALIVE", "15")), 0.1)
+
+
+def _queue_size() -> int:
+    # Медленный клиент не копит события бесконечно: после переполнения получает reset
+    return max(int(os.getenv("CHANGE_FEED_QUEUE", "500")), 1)
+
+
+@lru_cache
+def _redis_connection() -> Redis:
+    redis_url = os.getenv("RQ_REDIS_URL", "redis://localhost:6379/0")
+    return Redis.from_url(redis_url, socket_timeout=0.5)
+
+
+@dataclass(frozen=True)
+class ChangeEvent:
+    id: int
+    type: str
+    tab_id: Optional[int]
+    data: Dict[str, Any]
+
+    @staticmethod
+    def body_json(event_type: str, tab_id: Optional[int], data: Dict[str, Any]) -> str:
+        """
+        Тело события без номера и открывающей скобки: номер дописывает скрипт Redis.
+        """
+        raw = json.dumps(
+            {"type": event_type, "tab_id": tab_id, "data": data},
+            ensure_ascii=False,
+            separators=(",", ":"),
+            default=str,
+        )
+        return raw[1:]
+
+    @classmethod
+    def from_json(cls, raw: str | bytes) -> "ChangeEvent":
+        payload = json.loads(raw)
+        return cls(id=int(payload["id"]), type=payload["type"], tab_id=payload.get("tab_id"), data=payload.get("data") or {})
+
+    def encode_sse(self) -> str:
+        data = json.dumps({"tab_id": self.tab_id, **self.data}, ensure_ascii=False, separators=(",", ":"), default=str)
+        return f"id: {self.id}\nevent: {self.type}\ndata: {data}\n\n"
+
+    def visible_to(self, tab_id: Optional[int]) -> bool:
+        # События без вкладки (теги) получают все подписчики
+        return tab_id is None or self.tab_id is None or self.tab_id == tab_id
+
+
+class Subscriber:
+    """
+    Подписка одного SSE-клиента: очередь в цикле событий, куда события
+    попадают из любых потоков (CRUD выполняется в пуле потоков).
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, tab_id: Optional[int]):
+        self.loop = loop
+        self.tab_id = tab_id
+        self.queue: asyncio.Queue[ChangeEvent] = asyncio.Queue(maxsize=_queue_size())
+        self.overflowed = False
+
+    def offer(self, event: ChangeEvent) -> bool:
+        if not event.visible_to(self.tab_id):
+            return True
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # Цикл событий уже закрыт: подписка мертва
+            return False
+        return True
+
+    def _put(self, event: ChangeEvent) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+# --- Шина в памяти процесса ---
+
+_LOCK = threading.Lock()
+_BUFFER: Deque[ChangeEvent] = deque(maxlen=buffer_size())
+_SUBSCRIBERS: Set[Subscriber] = set()
+_STATE = {"last_id": 0}
+_STATS = {"published": 0, "delivered": 0, "redis_errors": 0, "resets": 0}
+_LISTENER: Dict[str, threading.Thread] = {}
+
+
+def _dispatch(event: ChangeEvent) -> None:
+    with _LOCK:
+        _STATE["last_id"] = max(_STATE["last_id"], event.id)
+        _BUFFER.append(event)
+        subscribers = list(_SUBSCRIBERS)
+    dead = [subscriber for subscriber in subscribers if not subscriber.offer(event)]
+    with _LOCK:
+        _STATS["delivered"] += len(subscribers) - len(dead)
+        _SUBSCRIBERS.difference_update(dead)
+
+
+@lru_cache
+def _publish_script():
+    return _redis_connection().register_script(_PUBLISH_SCRIPT)
+
+
+def _publish_redis(event_type: str, tab_id: Optional[int], data: Dict[str, Any]) -> None:
+    _publish_script()(
+        keys=[_REDIS_SEQ_KEY, _REDIS_BUFFER_KEY],
+        args=[ChangeEvent.body_json(event_type, tab_id, data), buffer_size(), _REDIS_CHANNEL],
+    )
+
+
+def _broadcast_reset(tab_id: Optional[int]) -> None:
+    """
+    Событие не ушло в Redis: подписчики процесса перечитывают данные, номер не тратится.
+    """
+    with _LOCK:
+        subscribers = list(_SUBSCRIBERS)
+        event = ChangeEvent(id=_STATE["last_id"], type="reset", tab_id=tab_id, data={})
+    for subscriber in subscribers:
+        subscriber.offer(event)
+
+
+def publish(event_type: str, tab_id: Optional[int], data: Dict[str, Any]) -> None:
+    """
+    Публикует дельту после commit. Не бросает исключений: лента — не повод
+    отвечать ошибкой на уже сохранённое изменение.
+    """
+    with _LOCK:
+        _STATS["published"] += 1
+    if redis_enabled():
+        try:
+            _publish_redis(event_type, tab_id, data)
+            return
+        except Exception:
+            logger.warning("Redis недоступен для ленты изменений, клиенты процесса получат reset", exc_info=True)
+            with _LOCK:
+                _STATS["redis_errors"] += 1
+            _broadcast_reset(tab_id)
+            return
+    with _LOCK:
+        event_id = _STATE["last_id"] + 1
+        _STATE["last_id"] = event_id
+    _dispatch(ChangeEvent(id=event_id, type=event_type, tab_id=tab_id, data=data))
+
+
+def _listen_redis() -> None:
+    redis_url = os.getenv("RQ_REDIS_URL", "redis://localhost:6379/0")
+    while True:
+        try:
+            pubsub = Redis.from_url(redis_url, health_check_interval=30).pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(_REDIS_CHANNEL)
+            for message in pubsub.listen():
+                if message.get("type") == "message":
+                    _dispatch(ChangeEvent.from_json(message["data"]))
+        except Exception:
+            logger.warning("Подписка ленты изменений на Redis прервана, переподключение", exc_info=True)
+            with _LOCK:
+                _STATS["redis_errors"] += 1
+            time.sleep(1.0)
+
+
+def _ensure_listener() -> None:
+    if not redis_enabled():
+        return
+    with _LOCK:
+        thread = _LISTENER.get("redis")
+        if thread is not None and thread.is_alive():
+            return
+        thread = threading.Thread(target=_listen_redis, name="change-feed-redis", daemon=True)
+        _LISTENER["redis"] = thread
+    thread.start()
+
+
+def subscribe(tab_id: Optional[int]) -> Subscriber:
+    _ensure_listener()
+    subscriber = Subscriber(asyncio.get_running_loop(), tab_id)
+    with _LOCK:
+        _SUBSCRIBERS.add(subscriber)
+    return subscriber
+
+
+def unsubscribe(subscriber: Subscriber) -> None:
+    with _LOCK:
+        _SUBSCRIBERS.discard(subscriber)
+
+
+def _recent_events() -> List[ChangeEvent]:
+    if redis_enabled():
+        try:
+            return [ChangeEvent.from_json(raw) for raw in _redis_connection().lrange(_REDIS_BUFFER_KEY, 0, -1)]
+        except Exception:
+            logger.warning("Не удалось прочитать буфер ленты из Redis", exc_info=True)
+            with _LOCK:
+                _STATS["redis_errors"] += 1
+    with _LOCK:
+        return list(_BUFFER)
+
+
+def last_event_id() -> int:
+    with _LOCK:
+        return _STATE["last_id"]
+
+
+def replay(after_id: int, tab_id: Optional[int]) -> Optional[List[ChangeEvent]]:
+    """
+    События после after_id для вкладки. None — буфер уже не покрывает разрыв
+    (или счётчик начат заново): клиенту нужно перечитать данные целиком.
+    """
+    events = _recent_events()
+    if not events:
+        return [] if after_id <= last_event_id() else None
+    if events[0].id > after_id + 1 or after_id > events[-1].id:
+        return None
+    return [event for event in events if event.id > after_id and event.visible_to(tab_id)]
+
+
+def _reset_message() -> str:
+    with _LOCK:
+        _STATS["resets"] += 1
+    return f"id: {last_event_id()}\nevent: reset\ndata: {{}}\n\n"
+
+
+async def stream(subscriber: Subscriber, after_id: Optional[int]) -> AsyncIterator[str]:
+    """
+    Тело SSE-ответа: повтор пропущенного по Last-Event-ID, затем живые события
+    и комментарии keepalive. Подписка снимается при отключении клиента.
+    """
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        last_sent = 0
+        if after_id is not None:
+            missed = await asyncio.to_thread(replay, after_id, subscriber.tab_id)
+            if missed is None:
+                yield _reset_message()
+            else:
+                last_sent = after_id
+                for event in missed:
+                    yield event.encode_sse()
+                    last_sent = event.id
+        while True:
+            try:
+                event = await asyncio.wait_for(subscriber.queue.get(), keepalive_seconds())
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if event.type == "reset":
+                yield _reset_message()
+                continue
+            if subscriber.overflowed:
+                # Часть событий потеряна: очередь сбрасывается, клиент перечитывает данные
+                while not subscriber.queue.empty():
+                    subscriber.queue.get_nowait()
+                subscriber.overflowed = False
+                yield _reset_message()
+                continue
+            if event.id <= last_sent:
+                continue
+            yield event.encode_sse()
+            last_sent = event.id
+    finally:
+        unsubscribe(subscriber)
+
+
+def get_stats() -> Dict[str, Any]:
+    with _LOCK:
+        stats: Dict[str, Any] = dict(_STATS)
+        stats["subscribers"] = len(_SUBSCRIBERS)
+        stats["buffered"] = len(_BUFFER)
+        stats["last_id"] = _STATE["last_id"]
+    stats["redis"] = redis_enabled()
+    return stats
+
+
+def clear() -> None:
+    with _LOCK:
+        _BUFFER.clear()
+        _SUBSCRIBERS.clear()
+        _STATE["last_id"] = 0
+        for key in _STATS:
+            _STATS[key] = 0
@@ -0,0 +1,216 @@
+"""
+Кодек метаданных вкладки: имя поля ↔ stable_key и допустимые значения
+строгих полей.
+
+Кодек собирается один раз на версию полей вкладки (Tab.fields_version, её
+увеличивает crud/fields.py) и хранится в памяти процесса. Перевод метаданных
+сводится к поиску в словаре: если версия вкладки уже известна (объект Tab
+загружен), запросов к БД нет вовсе.
+"""
+
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, Iterable, List, Mapping, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app import models
+
+
+@dataclass(frozen=True)
+class FieldCodec:
+    tab_id: int
+    version: int
+    names: Tuple[str, ...] = ()
+    keys: Tuple[str, ...] = ()
+    name_to_key: Mapping[str, str] = field(default_factory=dict)
+    key_to_name: Mapping[str, str] = field(default_factory=dict)
+    # Для полей со strong=True: stable_key → допустимые значения
+    allowed: Mapping[str, FrozenSet[str]] = field(default_factory=dict)
+
+    def to_storage(self, metadata_json: Optional[Dict[str, Any]]) -> Tuple[Dict[str, Any], List[str]]:
+        """
+        Метаданные с ключами-именами (или уже stable_key) → ключи stable_key.
+        Возвращает (метаданные, неизвестные ключи); без полей метаданные не меняются.
+        """
+        if not metadata_json:
+            return {}, []
+        if not self.names:
+            return dict(metadata_json), []
+        normalized: Dict[str, Any] = {}
+        unknown: List[str] = []
+        for raw_key, value in metadata_json.items():
+            stable_key = self.name_to_key.get(raw_key)
+            if stable_key is None:
+                stable_key = raw_key if raw_key in self.key_to_name else None
+            if stable_key is None:
+                unknown.append(raw_key)
+                continue
+            normalized[stable_key] = value
+        return normalized, unknown
+
+    def disallowed(self, metadata_json: Mapping[str, Any]) -> List[str]:
+        """
+        Имена строгих полей, значения которых не входят в allowed_values
+        (метаданные уже с ключами stable_key; пустое значение допустимо).
+        """
+        invalid: List[str] = []
+        for stable_key, values in self.allowed.items():
+            value = metadata_json.get(stable_key)
+            if value is None or value == "":
+                continue
+            candidates = value if isinstance(value, list) else [value]
+            if any(str(candidate) not in values for candidate in candidates):
+                invalid.append(self.key_to_name.get(stable_key, stable_key))
+        return invalid
+
+    def to_response(self, metadata_json: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Ключи stable_key → имена полей; ключи без поля остаются как есть.
+        """
+        if not metadata_json:
+            return {}
+        key_to_name = self.key_to_name
+        return {key_to_name.get(raw_key, raw_key): value for raw_key, value in metadata_json.items()}
+
+
+def compile_fields(tab_id: int, version: int, fields: Iterable) -> FieldCodec:
+    names: List[str] = []
+    keys: List[str] = []
+    allowed: Dict[str, FrozenSet[str]] = {}
+    for tab_field in fields or []:
+        stable_key = getattr(tab_field, "stable_key", None) or tab_field.name
+        names.append(tab_field.name)
+        keys.append(stable_key)
+        values = getattr(tab_field, "allowed_values", None)
+        if getattr(tab_field, "strong", False) and values:
+            allowed[stable_key] = frozenset(str(value) for value in (values.values() if isinstance(values, dict) else values))
+    return FieldCodec(
+        tab_id=tab_id,
+        version=version,
+        names=tuple(names),
+        keys=tuple(keys),
+        name_to_key=dict(zip(names, keys)),
+        key_to_name=dict(zip(keys, names)),
+        allowed=allowed,
+    )
+
+
+# --- Кеш в памяти процесса: одна запись (последняя версия) на вкладку ---
+
+_LOCK = threading.Lock()
+_CODECS: Dict[int, FieldCodec] = {}
+_STATS = {"hits": 0, "misses": 0}
+
+
+def _cached(tab_id: int, version: Optional[int]) -> Optional[FieldCodec]:
+    codec = _CODECS.get(tab_id)
+    if codec is None or version is None or codec.version != version:
+        return None
+    return codec
+
+
+def _load(db: Session, tab_ids: Iterable[int]) -> Dict[int, FieldCodec]:
+    """
+    Версия и поля вкладок одним запросом: кодек всегда собран из полей своей версии.
+    """
+    rows = db.execute(
+        select(
+            models.Tab.id.label("tab_id"),
+            models.Tab.fields_version,
+            models.TabField.name,
+            models.TabField.stable_key,
+            models.TabField.allowed_values,
+            models.TabField.strong,
+        )
+        .outerjoin(models.TabField, models.TabField.tab_id == models.Tab.id)
+        .where(models.Tab.id.in_(list(tab_ids)))
+        .order_by(models.Tab.id, models.TabField.id)
+    ).all()
+    versions: Dict[int, int] = {}
+    fields: Dict[int, List[Any]] = {}
+    for row in rows:
+        versions[row.tab_id] = int(row.fields_version or 0)
+        fields.setdefault(row.tab_id, [])
+        if row.name is not None:
+            fields[row.tab_id].append(row)
+    loaded = {tab_id: compile_fields(tab_id, versions[tab_id], fields[tab_id]) for tab_id in versions}
+    with _LOCK:
+        for tab_id, codec in loaded.items():
+            current = _CODECS.get(tab_id)
+            if current is None or current.version <= codec.version:
+                _CODECS[tab_id] = codec
+    return loaded
+
+
+def get_codecs(db: Session, versions: Mapping[int, Optional[int]]) -> Dict[int, FieldCodec]:
+    """
+    Кодеки вкладок по известным версиям {tab_id: fields_version}. Версия None
+    (неизвестна) или устаревшая запись догружаются одним запросом на все вкладки.
+    Вкладки, которых нет в БД, получают пустой кодек.
+    """
+    found: Dict[int, FieldCodec] = {}
+    missing = []
+    with _LOCK:
+        for tab_id, version in versions.items():
+            codec = _cached(tab_id, version)
+            if codec is None:
+                missing.append(tab_id)
+            else:
+                found[tab_id] = codec
+        _STATS["hits"] += len(found)
+        _STATS["misses"] += len(missing)
+    if missing:
+        loaded = _load(db, missing)
+        for tab_id in missing:
+            found[tab_id] = loaded[tab_id] if tab_id in loaded else FieldCodec(tab_id=tab_id, version=-1)
+    return found
+
+
+def get_codec(db: Session, tab_id: int, version: Optional[int] = None) -> FieldCodec:
+    return get_codecs(db, {tab_id: version})[tab_id]
+
+
+def for_tab(db: Session, tab: models.Tab) -> FieldCodec:
+    return get_codec(db, tab.id, tab.fields_version)
+
+
+def for_tabs(db: Session, tab_ids: Iterable[int]) -> Dict[int, FieldCodec]:
+    """
+    Кодеки вкладок, версии которых ещё не загружены: один короткий запрос версий,
+    поля читаются только для вкладок, чья версия изменилась.
+    """
+    tab_ids = set(tab_ids)
+    if not tab_ids:
+        return {}
+    versions = dict(
+        db.execute(select(models.Tab.id, models.Tab.fields_version).where(models.Tab.id.in_(tab_ids))).all()
+    )
+    return get_codecs(db, {tab_id: versions.get(tab_id) for tab_id in tab_ids})
+
+
+def forget(tab_id: int) -> None:
+    """
+    Сбрасывает кодек удалённой вкладки: в SQLite её id может достаться новой вкладке.
+    """
+    with _LOCK:
+        _CODECS.pop(tab_id, None)
+
+
+def get_stats() -> Dict[str, float]:
+    with _LOCK:
+        stats: Dict[str, float] = dict(_STATS)
+        stats["cached"] = len(_CODECS)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+    return stats
+
+
+def clear() -> None:
+    with _LOCK:
+        _CODECS.clear()
+        for key in _STATS:
+            _STATS[key] = 0
@@ -1,23 +1,43 @@
 from __future__ import annotations
 
 import logging
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
 
 from app.utils import parser_storage
-from app.services import sheets_config
+from app.services import metrics, sheet_snapshot, sheets_config
+from app.services.sheet_snapshot import WorksheetSnapshot
 from gsheets_parser import parser as sheets_parser
+from gsheets_parser import quota as sheets_quota
 
 logger = logging.getLogger(__name__)
 
 NAME_KEYS = {"имя", "товар", "name", "item", "название"}
 QTY_KEYS = {"qty", "quantity", "кол-во", "количество", "шт"}
 
+SyncEvent = Tuple[str, Dict[str, Any]]
+
 
 class SyncConfigurationError(ValueError):
     """Raised when sync settings are incomplete."""
 
 
+class StaleSnapshotError(RuntimeError):
+    """Raised when the cached worksheet snapshot no longer matches the sheet."""
+
+
 class TabSyncManager:
+    """
+    Синхронизирует изменения айтемов с листом Google Sheets.
+
+    Лист скачивается один раз, все операции применяются к копии в памяти,
+    а в конце отправляется одна пара запросов: spreadsheets().batchUpdate
+    (вставка строк) и values().batchUpdate (значения ячеек).
+
+    Разобранный снимок листа (WorksheetSnapshot) переживает задачу и
+    переиспользуется следующей пачкой; перед записью затронутые строки
+    сверяются с листом одним values().batchGet.
+    """
+
     def __init__(self, config_name: str):
         self.config = parser_storage.get_config(config_name)
         if not self.config:
@@ -37,6 +57,7 @@ class TabSyncManager:
         self.spreadsheet_id = spreadsheet_id
         self.worksheet_name = worksheet
         self.sheet_id: Optional[int] = None
+        self.api_calls = 0
 
         self.box_column_name = self.config.get("box_column")
         if not self.box_column_name:
@@ -46,9 +67,15 @@ class TabSyncManager:
         self.name_field = self._resolve_field(NAME_KEYS)
         self.qty_field = self._resolve_field(QTY_KEYS)
 
-        self._values: Optional[List[List[str]]] = None
-        self._header_map: Optional[Dict[str, int]] = None
-        self._boxes: Optional[List[Dict[str, Any]]] = None
+        self._snapshot: Optional[WorksheetSnapshot] = None
+        self._snapshot_from_cache = False
+
+        # Изменения, накопленные в памяти до flush().
+        self._pending_inserts: List[int] = []
+        self._dirty_rows: Dict[int, Tuple[List[Any], Set[int]]] = {}
+        self._inserted_rows: Set[int] = set()
+        # Исходные строки (номер до пачки, значения), которые сверяются перед записью.
+        self._baseline_rows: Dict[int, Tuple[int, List[str]]] = {}
 
     def _resolve_field(self, tokens) -> Optional[str]:
         for field_name in self.fields.keys():
@@ -56,66 +83,84 @@ class TabSyncManager:
                 return field_name
         return None
 
+    # --- Состояние листа ---
+
+    def _execute(self, request, operation: str):
+        # Каждый execute() — отдельный вызов Sheets API; счётчик уходит в метрики задачи.
+        # Квота и повтор 429 — в sheets_quota: задача не перезапускается целиком.
+        self.api_calls += 1
+        metrics.SHEETS_API_REQUESTS.inc(operation=operation)
+        return sheets_quota.execute(request, operation)
+
+    @property
+    def _snapshot_key(self) -> sheet_snapshot.SnapshotKey:
+        return (self.spreadsheet_id, self.worksheet_name)
+
+    @property
+    def _values(self) -> Optional[List[List[Any]]]:
+        return self._snapshot.values if self._snapshot else None
+
+    @property
+    def _header_map(self) -> Optional[Dict[str, int]]:
+        return self._snapshot.header_map if self._snapshot else None
+
     def _fetch_state(self):
-        response = (
-            self.service.spreadsheets()
-            .values()
-            .get(spreadsheetId=self.spreadsheet_id, range=self.worksheet_name)
-            .execute()
+        response = self._execute(
+            self.service.spreadsheets().values().get(spreadsheetId=self.spreadsheet_id, range=self.worksheet_name),
+            "values.get",
         )
         values = response.get("values") or []
         if not values:
             raise SyncConfigurationError(f"Лист '{self.worksheet_name}' пуст")
-        self._values = values
-        self._header_map = {str(col).strip(): idx for idx, col in enumerate(values[0])}
-        self._boxes = sheets_parser.extract_box_structure(values, self.config)
-
-    def _ensure_state(self):
-        logger.info("STATE")
-        if self._values is None or self._header_map is None or self._boxes is None:
-            self._fetch_state()
-            self._ensure_columns_present()
+        header_map = {str(col).strip(): idx for idx, col in enumerate(values[0])}
+        self._reset_pending()
+        self._ensure_columns_present(values, header_map)
+        self._snapshot = WorksheetSnapshot(values, header_map, self.config, self.name_field, self.qty_field)
+        self._snapshot_from_cache = False
+
+    def _ensure_state(self, *, use_cache: bool = True):
+        if self._snapshot is not None:
+            return
+        if use_cache:
+            cached = sheet_snapshot.checkout(self._snapshot_key, self.config)
+            if cached is not None:
+                self._reset_pending()
+                self._snapshot = cached
+                self._snapshot_from_cache = True
+                return
+        self._fetch_state()
 
     def _clear_state(self):
-        self._values = None
-        self._header_map = None
-        self._boxes = None
+        self._snapshot = None
+        self._snapshot_from_cache = False
+        self._reset_pending()
+
+    def _reset_pending(self):
+        self._pending_inserts = []
+        self._dirty_rows = {}
+        self._inserted_rows = set()
+        self._baseline_rows = {}
 
-    def _ensure_columns_present(self):
+    def _ensure_columns_present(self, values: List[List[Any]], header_map: Dict[str, int]):
         """
         Если в таблице нет колонок из маппинга конфигурации, добавляем их в шапку.
         """
-        missing = [col for col in (self.fields or {}).values() if col and col not in (self._header_map or {})]
+        missing = [col for col in (self.fields or {}).values() if col and col not in header_map]
         if not missing:
-            logger.info("THERE IS NO MISSING in: ", self.fields )
             return
 
-        logger.info("MISSING: ", missing)
+        logger.info("Добавляем недостающие колонки: %s", missing)
 
-        next_idx = len(self._header_map or {})
+        header = values[0]
         for column_name in missing:
-            column_letter = self._column_letter(next_idx)
-            # Обновляем заголовок в первой строке, чтобы создать новую колонку.
-            self.service.spreadsheets().values().update(
-                spreadsheetId=self.spreadsheet_id,
-                range=f"'{self.worksheet_name}'!{column_letter}1",
-                valueInputOption="USER_ENTERED",
-                body={"values": [[column_name]]},
-            ).execute()
-            next_idx += 1
-
-        # После модификации шапки перезагружаем состояние.
-        self._fetch_state()
+            next_idx = len(header)
+            header.append(column_name)
+            header_map[column_name] = next_idx
+            self._mark_dirty(header, next_idx)
 
     def _find_box(self, name: str) -> Optional[Dict[str, Any]]:
         self._ensure_state()
-        if not name:
-            return None
-        target = name.strip().lower()
-        for box in self._boxes or []:
-            if str(box.get("box") or "").strip().lower() == target:
-                return box
-        return None
+        return self._snapshot.find_box(name)
 
     def _items_equal(self, candidate: Dict[str, Any], payload_item: Dict[str, Any]) -> bool:
         if not candidate or not payload_item:
@@ -132,18 +177,14 @@ class TabSyncManager:
         return True
 
     def _find_item(self, box: Dict[str, Any], payload_item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        for item in box.get("items") or []:
-            if self._items_equal(item, payload_item):
-                return item
-        return None
+        return self._snapshot.find_item(box, payload_item, self._items_equal)
 
     def _ensure_sheet_id(self) -> int:
         if self.sheet_id is not None:
             return self.sheet_id
-        metadata = (
-            self.service.spreadsheets()
-            .get(spreadsheetId=self.spreadsheet_id, fields="sheets.properties")
-            .execute()
+        metadata = self._execute(
+            self.service.spreadsheets().get(spreadsheetId=self.spreadsheet_id, fields="sheets.properties"),
+            "spreadsheets.get",
         )
         for sheet in metadata.get("sheets", []):
             props = sheet.get("properties", {})
@@ -165,52 +206,63 @@ class TabSyncManager:
                 break
         return result
 
-    def _update_cells(self, row_number: int, updates: Dict[int, Any]):
-        if not updates:
+    # --- Изменения в памяти ---
+
+    def _mark_dirty(self, row: List[Any], col_idx: int):
+        entry = self._dirty_rows.get(id(row))
+        if entry is None:
+            entry = (row, set())
+            self._dirty_rows[id(row)] = entry
+        entry[1].add(col_idx)
+
+    def _original_row_number(self, row_number: int) -> int:
+        """Номер строки до вставок текущей пачки."""
+        for inserted_at in reversed(self._pending_inserts):
+            if row_number > inserted_at:
+                row_number -= 1
+        return row_number
+
+    def _remember_baseline(self, row_number: int):
+        row = self._snapshot.row(row_number)
+        if id(row) in self._inserted_rows or id(row) in self._baseline_rows:
             return
-        data = []
-        for col_idx, value in updates.items():
-            column_letter = self._column_letter(col_idx)
-            range_ref = f"'{self.worksheet_name}'!{column_letter}{row_number}"
-            data.append({"range": range_ref, "values": [[value]]})
-        self.service.spreadsheets().values().batchUpdate(
-            spreadsheetId=self.spreadsheet_id,
-            body={"valueInputOption": "USER_ENTERED", "data": data},
-        ).execute()
-
-    def _insert_row(self, row_number: int):
-        request = {
-            "requests": [
-                {
-                    "insertDimension": {
-                        "range": {
-                            "sheetId": self._ensure_sheet_id(),
-                            "dimension": "ROWS",
-                            "startIndex": row_number - 1,
-                            "endIndex": row_number,
-                        }
-                    }
-                }
-            ]
-        }
-        self.service.spreadsheets().batchUpdate(spreadsheetId=self.spreadsheet_id, body=request).execute()
+        self._baseline_rows[id(row)] = (self._original_row_number(row_number), _normalize_row(row))
 
-    def _delete_row(self, row_number: int):
-        request = {
-            "requests": [
-                {
-                    "deleteDimension": {
-                        "range": {
-                            "sheetId": self._ensure_sheet_id(),
-                            "dimension": "ROWS",
-                            "startIndex": row_number - 1,
-                            "endIndex": row_number,
-                        }
-                    }
-                }
-            ]
-        }
-        self.service.spreadsheets().batchUpdate(spreadsheetId=self.spreadsheet_id, body=request).execute()
+    def _update_item_cells(self, item: Dict[str, Any], updates: Dict[int, Any]):
+        if not updates:
+            return
+        self._remember_baseline(item["__row_number"])
+        row = self._snapshot.update_item(item, updates)
+        for col_idx in updates:
+            self._mark_dirty(row, col_idx)
+
+    def _insert_item_row(self, box: Dict[str, Any], row_values: List[Any]):
+        reference_row = self._snapshot.last_row(box) or 1
+        self._remember_baseline(reference_row)
+        row_number = reference_row + 1
+        self._snapshot.insert_item_row(box, row_number, row_values)
+        self._pending_inserts.append(row_number)
+        self._inserted_rows.add(id(row_values))
+        self._dirty_rows[id(row_values)] = (row_values, set())
+
+    def _verify_baseline(self):
+        """
+        Сверяет строки, на которые опирается пачка, с текущим листом.
+        Нужна только для снимка из кеша: лист могли поменять вручную.
+        """
+        if not self._snapshot_from_cache or not self._baseline_rows:
+            return
+        entries = sorted(self._baseline_rows.values())
+        ranges = [f"'{self.worksheet_name}'!{row_number}:{row_number}" for row_number, _ in entries]
+        response = self._execute(
+            self.service.spreadsheets().values().batchGet(spreadsheetId=self.spreadsheet_id, ranges=ranges),
+            "values.batchGet",
+        )
+        value_ranges = response.get("valueRanges") or []
+        for (row_number, expected), value_range in zip(entries, value_ranges):
+            actual = (value_range.get("values") or [[]])[0]
+            if _normalize_row(actual) != expected:
+                raise StaleSnapshotError(f"Строка {row_number} изменилась вне синхронизации")
 
     def _build_row(self, payload: Dict[str, Any]) -> List[str]:
         header = self._values[0] if self._values else []
@@ -230,15 +282,122 @@ class TabSyncManager:
                 row[column_idx] = metadata.get(field_name, "")
         return row
 
-    def handle_create(self, payload: Dict[str, Any]) -> None:
-        if not payload:
+    def flush(self) -> None:
+        """
+        Отправляет накопленные изменения: сначала вставки строк, затем значения
+        ячеек по итоговым номерам строк. Если значения не записались, вставленные
+        пустые строки удаляются: повтор задачи применит события к исходному листу.
+        """
+        if self._snapshot is None:
             return
-        try:
-            self._ensure_state()
-        except SyncConfigurationError as exc:
-            logger.warning("Синхронизация пропущена: %s", exc)
+        if not self._pending_inserts and not self._dirty_rows:
             return
 
+        self._verify_baseline()
+
+        if self._pending_inserts:
+            sheet_id = self._ensure_sheet_id()
+            requests = [
+                {
+                    "insertDimension": {
+                        "range": {
+                            "sheetId": sheet_id,
+                            "dimension": "ROWS",
+                            "startIndex": row_number - 1,
+                            "endIndex": row_number,
+                        }
+                    }
+                }
+                for row_number in self._pending_inserts
+            ]
+            self._execute(
+                self.service.spreadsheets().batchUpdate(
+                    spreadsheetId=self.spreadsheet_id,
+                    body={"requests": requests},
+                ),
+                "spreadsheets.batchUpdate",
+            )
+
+        data = []
+        if self._dirty_rows:
+            for row_idx, row in enumerate(self._values):
+                entry = self._dirty_rows.get(id(row))
+                if entry is None:
+                    continue
+                row_number = row_idx + 1
+                if id(row) in self._inserted_rows:
+                    data.append(
+                        {
+                            "range": f"'{self.worksheet_name}'!{row_number}:{row_number}",
+                            "values": [list(row)],
+                        }
+                    )
+                    continue
+                for col_idx in sorted(entry[1]):
+                    column_letter = self._column_letter(col_idx)
+                    data.append(
+                        {
+                            "range": f"'{self.worksheet_name}'!{column_letter}{row_number}",
+                            "values": [[row[col_idx]]],
+                        }
+                    )
+
+        if data:
+            try:
+                self._execute(
+                    self.service.spreadsheets().values().batchUpdate(
+                        spreadsheetId=self.spreadsheet_id,
+                        body={"valueInputOption": "USER_ENTERED", "data": data},
+                    ),
+                    "values.batchUpdate",
+                )
+            except Exception:
+                if self._pending_inserts:
+                    self._rollback_inserts()
+                raise
+
+        self._reset_pending()
+
+    def _rollback_inserts(self) -> None:
+        """
+        Удаляет строки, вставленные текущим flush(). Удаление идёт снизу вверх,
+        чтобы номера оставшихся строк не сдвигались.
+        """
+        row_numbers = sorted(
+            (row_idx + 1 for row_idx, row in enumerate(self._values) if id(row) in self._inserted_rows),
+            reverse=True,
+        )
+        requests = [
+            {
+                "deleteDimension": {
+                    "range": {
+                        "sheetId": self.sheet_id,
+                        "dimension": "ROWS",
+                        "startIndex": row_number - 1,
+                        "endIndex": row_number,
+                    }
+                }
+            }
+            for row_number in row_numbers
+        ]
+        try:
+            self._execute(
+                self.service.spreadsheets().batchUpdate(
+                    spreadsheetId=self.spreadsheet_id,
+                    body={"requests": requests},
+                ),
+                "spreadsheets.batchUpdate",
+            )
+        except Exception:
+            logger.exception(
+                "Не удалось удалить пустые строки %s листа «%s» после сбоя записи значений",
+                row_numbers,
+                self.worksheet_name,
+            )
+
+    # --- Операции ---
+
+    def _apply_create(self, payload: Dict[str, Any]) -> None:
         box_name = payload.get("box", {}).get("name", "")
         box = self._find_box(box_name)
         if not box:
@@ -258,33 +417,11 @@ class TabSyncManager:
             except (ValueError, TypeError):
                 previous = 0
             new_qty = previous + int(payload_item.get("qty") or 0)
-            self._update_cells(existing.get("__row_number"), {qty_column_idx: new_qty})
+            self._update_item_cells(existing, {qty_column_idx: new_qty})
         else:
-            reference_row = (
-                box["items"][-1]["__row_number"] if box.get("items") else box.get("__header_row", 1)
-            )
-            target_row = (reference_row or 1) + 1
-            self._insert_row(target_row)
-            row_values = self._build_row(payload)
-            range_ref = f"'{self.worksheet_name}'!{target_row}:{target_row}"
-            self.service.spreadsheets().values().update(
-                spreadsheetId=self.spreadsheet_id,
-                range=range_ref,
-                valueInputOption="USER_ENTERED",
-                body={"values": [row_values]},
-            ).execute()
-
-        self._clear_state()
-
-    def handle_update(self, before: Dict[str, Any], after: Dict[str, Any]) -> None:
-        if not after:
-            return
-        try:
-            self._ensure_state()
-        except SyncConfigurationError as exc:
-            logger.warning("Синхронизация пропущена: %s", exc)
-            return
+            self._insert_item_row(box, self._build_row(payload))
 
+    def _apply_update(self, before: Dict[str, Any], after: Dict[str, Any]) -> None:
         box_name = before.get("box", {}).get("name") or after.get("box", {}).get("name") or ""
         box = self._find_box(box_name)
         if not box:
@@ -298,7 +435,7 @@ class TabSyncManager:
             target_item = self._find_item(box, reference_item)
         if not target_item:
             logger.info("Строка не найдена, создаём новую")
-            self.handle_create(after)
+            self._apply_create(after)
             return
 
         metadata = (after.get("item") or {}).get("metadata") or {}
@@ -318,18 +455,9 @@ class TabSyncManager:
                 updates[column_idx] = new_value
 
         if updates:
-            self._update_cells(target_item.get("__row_number"), updates)
-        self._clear_state()
-
-    def handle_delete(self, payload: Dict[str, Any]) -> None:
-        if not payload:
-            return
-        try:
-            self._ensure_state()
-        except SyncConfigurationError as exc:
-            logger.warning("Синхронизация пропущена: %s", exc)
-            return
+            self._update_item_cells(target_item, updates)
 
+    def _apply_delete(self, payload: Dict[str, Any]) -> None:
         box_name = payload.get("box", {}).get("name", "")
         box = self._find_box(box_name)
         if not box:
@@ -345,11 +473,78 @@ class TabSyncManager:
             )
             return
 
-        row_number = target_item.get("__row_number")
         updates = {}
         for column_name in self.fields.values():
             column_idx = self._header_map.get(column_name)
             if column_idx is not None:
                 updates[column_idx] = ""
-        self._update_cells(row_number, updates)
+        self._update_item_cells(target_item, updates)
+
+    def _apply_event(self, action: str, payload: Dict[str, Any]) -> None:
+        if action == "create":
+            self._apply_create(payload)
+        elif action == "update":
+            before = payload.get("before") or {}
+            after = payload.get("after") or {}
+            if after:
+                self._apply_update(before, after)
+        elif action == "delete":
+            self._apply_delete(payload)
+        else:
+            logger.warning("Неизвестный тип операции синхронизации: %s", action)
+
+    def apply_events(self, events: Iterable[SyncEvent]) -> None:
+        """
+        Применяет пачку событий (action, payload) к одному снимку листа
+        и отправляет результат одним flush().
+        """
+        events = [(action, payload) for action, payload in events if payload]
+        if not events:
+            return
+
+        use_cache = True
+        while True:
+            try:
+                self._ensure_state(use_cache=use_cache)
+            except SyncConfigurationError as exc:
+                logger.warning("Синхронизация пропущена: %s", exc)
+                return
+
+            try:
+                for action, payload in events:
+                    self._apply_event(action, payload)
+                self.flush()
+            except StaleSnapshotError as exc:
+                if not use_cache:
+                    raise
+                logger.info("Снимок листа устарел (%s), скачиваем заново", exc)
+                sheet_snapshot.mark_stale()
+                self._clear_state()
+                use_cache = False
+                continue
+            except Exception:
+                # Снимок мог измениться частично — в кеш его не возвращаем.
+                self._clear_state()
+                raise
+            break
+
+        sheet_snapshot.checkin(self._snapshot_key, self._snapshot)
         self._clear_state()
+
+    def handle_create(self, payload: Dict[str, Any]) -> None:
+        self.apply_events([("create", payload)])
+
+    def handle_update(self, before: Dict[str, Any], after: Dict[str, Any]) -> None:
+        if not after:
+            return
+        self.apply_events([("update", {"before": before, "after": after})])
+
+    def handle_delete(self, payload: Dict[str, Any]) -> None:
+        self.apply_events([("delete", payload)])
+
+
+def _normalize_row(row: List[Any]) -> List[str]:
+    normalized = [str(value if value is not None else "").strip() for value in row]
+    while normalized and not normalized[-1]:
+        normalized.pop()
+    return normalized
@@ -0,0 +1,379 @@
+"""
+Метрики процесса в текстовом формате Prometheus (exposition format 0.0.4).
+
+Реестр держится в памяти процесса и не требует prometheus_client:
+счётчики, gauge и гистограммы с метками. HTTP-метрики снимает MetricsMiddleware,
+SQL-метрики — события SQLAlchemy на всех Engine.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import copy
+import json
+import math
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+LabelValues = Tuple[str, ...]
+
+_LOCK = threading.Lock()
+_REGISTRY: List["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, object] = {}
+        with _LOCK:
+            _REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, object]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: ожидаются метки {self.labelnames}, получены {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def _flatten(self) -> Dict[str, float]:
+        """
+        Значения плоским словарём {поле: число}: поля складываются сложением (HINCRBYFLOAT).
+        """
+        raise NotImplementedError
+
+    def _merge(self, fields: Dict[str, float]) -> None:
+        raise NotImplementedError
+
+    def reset(self) -> None:
+        with _LOCK:
+            self._values.clear()
+
+    def render(self) -> List[str]:
+        with _LOCK:
+            samples = list(self._samples())
+        if self.labelnames and not samples:
+            return []
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}", *samples]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels: object) -> None:
+        key = self._key(labels)
+        with _LOCK:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: object) -> float:
+        with _LOCK:
+            return self._values.get(self._key(labels), 0)
+
+    def _flatten(self) -> Dict[str, float]:
+        return {json.dumps(key, ensure_ascii=False): value for key, value in self._values.items()}
+
+    def _merge(self, fields: Dict[str, float]) -> None:
+        for field, value in fields.items():
+            key = tuple(json.loads(field))
+            self._values[key] = self._values.get(key, 0) + value
+
+    def _samples(self) -> Iterable[str]:
+        if not self.labelnames and not self._values:
+            yield f"{self.name} 0"
+        for key, value in sorted(self._values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels: object) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: object) -> None:
+        key = self._key(labels)
+        with _LOCK:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels: object) -> None:
+        key = self._key(labels)
+        with _LOCK:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for idx, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][idx] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    def snapshot(self, **labels: object) -> Optional[Dict[str, float]]:
+        with _LOCK:
+            state = self._values.get(self._key(labels))
+            return {"count": state["count"], "sum": state["sum"]} if state else None
+
+    def _flatten(self) -> Dict[str, float]:
+        fields: Dict[str, float] = {}
+        for key, state in self._values.items():
+            prefix = json.dumps(key, ensure_ascii=False)
+            for idx, count in enumerate(state["counts"]):
+                if count:
+                    fields[f"{prefix}|{idx}"] = count
+            fields[f"{prefix}|sum"] = state["sum"]
+            fields[f"{prefix}|count"] = state["count"]
+        return fields
+
+    def _merge(self, fields: Dict[str, float]) -> None:
+        for field, value in fields.items():
+            prefix, part = field.rsplit("|", 1)
+            key = tuple(json.loads(prefix))
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            if part == "sum":
+                state["sum"] += value
+            elif part == "count":
+                state["count"] += int(value)
+            else:
+                state["counts"][int(part)] += int(value)
+
+    def _samples(self) -> Iterable[str]:
+        bucket_names = self.labelnames + ("le",)
+        for key, state in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, state["counts"]):
+                cumulative += count
+                labels = _format_labels(bucket_names, key + (_format_value(bound),))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(state['sum'])}"
+            yield f"{self.name}_count{labels} {state['count']}"
+
+
+# --- Метрики приложения ---
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Время обработки HTTP-запроса.", ("method", "route", "status")
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP-запросы, обрабатываемые прямо сейчас.")
+HTTP_RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes", "Размер тела HTTP-ответа.", ("method", "route"), buckets=SIZE_BUCKETS
+)
+DB_STATEMENTS_PER_REQUEST = Histogram(
+    "db_statements_per_request", "SQL-запросов на один HTTP-запрос.", ("route",), buckets=COUNT_BUCKETS
+)
+DB_TIME_PER_REQUEST = Histogram("db_time_per_request_seconds", "Время SQL на один HTTP-запрос.", ("route",))
+DB_STATEMENTS = Counter("db_statements_total", "Выполненные SQL-запросы процесса.")
+SYNC_JOBS_ENQUEUED = Counter("sync_jobs_enqueued_total", "Изменения, поставленные в очередь синхронизации.", ("tab",))
+SYNC_JOBS_FAILED = Counter("sync_jobs_failed_total", "Изменения, синхронизация которых завершилась ошибкой.", ("tab",))
+SYNC_EVENTS_COMPACTED = Counter(
+    "sync_events_compacted_total", "События синхронизации, поглощённые сжатием до обращения к Sheets.", ("sync_config",)
+)
+SHEETS_API_REQUESTS = Counter(
+    "sheets_api_requests_total", "Вызовы Google Sheets API воркера по методам.", ("operation",)
+)
+SHEETS_API_CALLS_PER_JOB = Histogram(
+    "sheets_api_calls_per_job", "Вызовов Google Sheets API на одну задачу синхронизации.", ("sync_config",),
+    buckets=COUNT_BUCKETS,
+)
+SYNC_LAG_SECONDS = Gauge(
+    "sync_lag_seconds", "Возраст самой старой незавершённой задачи синхронизации вкладки.", ("tab",)
+)
+HISTORY_WRITE_DURATION = Histogram(
+    "history_write_duration_seconds", "Запись истории выдачи: пачка журнала или XLSX-выгрузка.", ("target",)
+)
+
+# Эти метрики снимает воркер синхронизации: после задачи приросты складываются в Redis (drain), API отдаёт суммы.
+WORKER_METRICS = (
+    SYNC_JOBS_FAILED.name,
+    SYNC_EVENTS_COMPACTED.name,
+    SHEETS_API_REQUESTS.name,
+    SHEETS_API_CALLS_PER_JOB.name,
+)
+
+
+def render(names: Optional[Iterable[str]] = None, exclude: Iterable[str] = ()) -> str:
+    """
+    Текст для /metrics. names ограничивает набор метрик, exclude — исключает.
+    """
+    selected = set(names) if names is not None else None
+    skipped = set(exclude)
+    with _LOCK:
+        metrics = list(_REGISTRY)
+    lines: List[str] = []
+    for metric in metrics:
+        if (selected is not None and metric.name not in selected) or metric.name in skipped:
+            continue
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+def drain(names: Iterable[str]) -> Dict[str, Dict[str, float]]:
+    """
+    Забирает накопленное метриками names с обнулением: {имя: {поле: прирост}}.
+    Приросты воркеров складываются в Redis, поэтому счётчики не сбрасываются
+    между задачами и суммируются по всем воркерам.
+    """
+    selected = set(names)
+    deltas: Dict[str, Dict[str, float]] = {}
+    with _LOCK:
+        for metric in _REGISTRY:
+            if metric.name in selected and metric._values:
+                deltas[metric.name] = metric._flatten()
+                metric._values.clear()
+    return deltas
+
+
+def restore(deltas: Dict[str, Dict[str, float]]) -> None:
+    """
+    Возвращает приросты в реестр процесса (не удалось записать их в Redis).
+    """
+    with _LOCK:
+        for metric in _REGISTRY:
+            if metric.name in deltas:
+                metric._merge(deltas[metric.name])
+
+
+def render_totals(totals: Dict[str, Dict[str, float]]) -> str:
+    """
+    Текст Prometheus для сумм, собранных drain() со всех воркеров.
+    """
+    with _LOCK:
+        metrics = [metric for metric in _REGISTRY if metric.name in totals]
+    lines: List[str] = []
+    for metric in metrics:
+        # Копия без регистрации: реестр процесса API эти значения не трогают
+        total = copy.copy(metric)
+        total._values = {}
+        total._merge(totals[metric.name])
+        lines.extend(total.render())
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+def clear() -> None:
+    with _LOCK:
+        metrics = list(_REGISTRY)
+    for metric in metrics:
+        metric.reset()
+
+
+def tab_label(payload: Optional[Dict[str, object]]) -> str:
+    tab = (payload or {}).get("tab") or {}
+    return str(tab.get("id") or tab.get("sync_config") or "unknown")
+
+
+# --- SQL на запрос ---
+
+_REQUEST_SQL: contextvars.ContextVar[Optional[List[float]]] = contextvars.ContextVar("metrics_request_sql", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("metrics_started")
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    DB_STATEMENTS.inc()
+    # Синхронные маршруты работают в пуле потоков с копией контекста:
+    # список общий, поэтому счёт доходит до middleware.
+    totals = _REQUEST_SQL.get()
+    if totals is not None:
+        totals[0] += 1
+        totals[1] += elapsed
+
+
+# --- HTTP ---
+
+def _route_label(scope) -> str:
+    route = scope.get("route")
+    # Шаблон маршрута (/tabs/{tab_id}), а не фактический путь: иначе метки плодятся без предела.
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    ASGI-middleware: время, размер ответа и число SQL-запросов по шаблону маршрута.
+    Размер считается по отправленным кускам, поэтому учитывает и StreamingResponse.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        sql_totals = [0, 0.0]
+        token = _REQUEST_SQL.set(sql_totals)
+        state = {"status": 500, "size": 0}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                state["size"] += len(message.get("body", b""))
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            _REQUEST_SQL.reset(token)
+            route = _route_label(scope)
+            method = scope["method"]
+            HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - started, method=method, route=route, status=state["status"]
+            )
+            HTTP_RESPONSE_SIZE.observe(state["size"], method=method, route=route)
+            DB_STATEMENTS_PER_REQUEST.observe(sql_totals[0], route=route)
+            DB_TIME_PER_REQUEST.observe(sql_totals[1], route=route)
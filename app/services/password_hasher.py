@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar
+
+from passlib.context import CryptContext
+
+T = TypeVar("T")
+
+
+def bcrypt_rounds() -> int:
+    return int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+
+def pool_workers() -> int:
+    return max(int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1)))), 1)
+
+
+# Хеши с другим числом раундов считаются устаревшими и перехешируются при входе.
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=bcrypt_rounds())
+
+# bcrypt отпускает GIL, поэтому отдельного пула потоков достаточно: он не занимает
+# пул Starlette и не даёт волне логинов вытеснить остальные запросы.
+_WORKERS = pool_workers()
+_EXECUTOR = ThreadPoolExecutor(max_workers=_WORKERS, thread_name_prefix="password-hash")
+
+_LOCK = threading.Lock()
+_STATS = {"submitted": 0, "completed": 0, "in_flight": 0, "max_in_flight": 0, "wait_ms_total": 0.0, "max_wait_ms": 0.0}
+
+
+def _track(fn: Callable[..., T], submitted_at: float, *args: Any) -> T:
+    waited_ms = (time.perf_counter() - submitted_at) * 1000
+    with _LOCK:
+        _STATS["wait_ms_total"] += waited_ms
+        _STATS["max_wait_ms"] = max(_STATS["max_wait_ms"], waited_ms)
+    try:
+        return fn(*args)
+    finally:
+        with _LOCK:
+            _STATS["in_flight"] -= 1
+            _STATS["completed"] += 1
+
+
+async def _run(fn: Callable[..., T], *args: Any) -> T:
+    with _LOCK:
+        _STATS["submitted"] += 1
+        _STATS["in_flight"] += 1
+        _STATS["max_in_flight"] = max(_STATS["max_in_flight"], _STATS["in_flight"])
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_EXECUTOR, _track, fn, time.perf_counter(), *args)
+
+
+async def hash_password(password: str) -> str:
+    return await _run(pwd_context.hash, password)
+
+
+async def verify_password(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Проверяет пароль в пуле. Второй элемент — новый хеш, если старый
+    посчитан с устаревшим числом раундов (его нужно сохранить).
+    """
+    return await _run(pwd_context.verify_and_update, password, hashed_password)
+
+
+def get_stats() -> Dict[str, float]:
+    with _LOCK:
+        stats: Dict[str, float] = dict(_STATS)
+    stats["workers"] = _WORKERS
+    stats["queue_depth"] = max(stats["in_flight"] - _WORKERS, 0)
+    stats["avg_wait_ms"] = round(stats["wait_ms_total"] / stats["completed"], 2) if stats["completed"] else 0.0
+    stats["wait_ms_total"] = round(stats["wait_ms_total"], 2)
+    stats["max_wait_ms"] = round(stats["max_wait_ms"], 2)
+    return stats
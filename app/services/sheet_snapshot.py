@@ -0,0 +1,431 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from redis import Redis
+
+from gsheets_parser import parser as sheets_parser
+
+logger = logging.getLogger(__name__)
+
+SnapshotKey = Tuple[str, str]
+
+
+def _normalize(value: Any) -> str:
+    return str(value or "").strip()
+
+
+def _normalize_name(value: Any) -> str:
+    return _normalize(value).lower()
+
+
+def snapshot_ttl_seconds() -> float:
+    return max(float(os.getenv("SYNC_SNAPSHOT_TTL", "300")), 0.0)
+
+
+def config_signature(config: Dict[str, Any]) -> str:
+    raw = json.dumps(
+        {"box_column": config.get("box_column"), "fields": config.get("fields") or {}},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class WorksheetSnapshot:
+    """
+    Разобранный лист с индексами: имя ящика → ящик,
+    (ящик, имя айтема, хеш метаданных) → строки айтема.
+
+    Снимок правится на месте при вставке и изменении строк, поэтому
+    повторно скачивать и разбирать лист для каждого события не нужно.
+    """
+
+    def __init__(
+        self,
+        values: List[List[Any]],
+        header_map: Dict[str, int],
+        config: Dict[str, Any],
+        name_field: Optional[str],
+        qty_field: Optional[str],
+        boxes: Optional[List[Dict[str, Any]]] = None,
+    ):
+        self.values = values
+        self.header_map = header_map
+        self.signature = config_signature(config)
+        self.version = 0
+        self.fetched_at = time.monotonic()
+        # Поколение снимка в кеше: совпадает с записью в Redis — объект в памяти актуален
+        self.generation: Optional[str] = None
+
+        fields = config.get("fields") or {}
+        self.name_field = name_field or next(iter(fields), None)
+        self.qty_field = qty_field
+        self.field_columns = {
+            field: header_map[column] for field, column in fields.items() if column in header_map
+        }
+        self.meta_fields = [
+            field for field in fields if field not in {self.name_field, self.qty_field}
+        ]
+
+        self._box_index: Dict[str, Dict[str, Any]] = {}
+        self._name_index: Dict[Tuple[str, str], List[Dict[str, Any]]] = defaultdict(list)
+        self._exact_index: Dict[Tuple[str, str, str], List[Dict[str, Any]]] = defaultdict(list)
+        if boxes is not None:
+            # Разобранная структура и индексы пришли из кеша (restore), лист не разбирается
+            self.boxes = boxes
+            return
+        self.boxes = sheets_parser.extract_box_structure(values, config)
+        for box in self.boxes:
+            box_key = _normalize_name(box.get("box"))
+            self._box_index.setdefault(box_key, box)
+            for item in box.get("items") or []:
+                self._index_item(box_key, item)
+
+    # --- Сохранение ---
+
+    def dump_indexes(self) -> Dict[str, Any]:
+        """
+        Структура ящиков и индексы в JSON-виде: ссылки на айтемы заменены номерами строк.
+        """
+        return {
+            "boxes": self.boxes,
+            "box_index": {box_key: box["__header_row"] for box_key, box in self._box_index.items()},
+            "name_index": {
+                "\x1f".join(key): [item["__row_number"] for item in items] for key, items in self._name_index.items()
+            },
+            "exact_index": {
+                "\x1f".join(key): [item["__row_number"] for item in items] for key, items in self._exact_index.items()
+            },
+        }
+
+    @classmethod
+    def restore(
+        cls,
+        values: List[List[Any]],
+        header_map: Dict[str, int],
+        config: Dict[str, Any],
+        name_field: Optional[str],
+        qty_field: Optional[str],
+        indexes: Dict[str, Any],
+    ) -> "WorksheetSnapshot":
+        """
+        Снимок из dump_indexes() без повторного разбора листа.
+        """
+        boxes = indexes["boxes"]
+        snapshot = cls(values, header_map, config, name_field, qty_field, boxes=boxes)
+        items_by_row = {item["__row_number"]: item for box in boxes for item in box.get("items") or []}
+        boxes_by_row = {box["__header_row"]: box for box in boxes}
+        snapshot._box_index = {box_key: boxes_by_row[row] for box_key, row in indexes["box_index"].items()}
+        for target, name in ((snapshot._name_index, "name_index"), (snapshot._exact_index, "exact_index")):
+            for key, rows in indexes[name].items():
+                target[tuple(key.split("\x1f"))] = [items_by_row[row] for row in rows]
+        return snapshot
+
+    # --- Ключи ---
+
+    def _meta_hash(self, values: Dict[str, Any]) -> str:
+        raw = "\x1f".join(_normalize(values.get(field)) for field in self.meta_fields)
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _item_keys(self, box_key: str, item: Dict[str, Any]):
+        name_key = _normalize_name(item.get(self.name_field))
+        return (box_key, name_key), (box_key, name_key, self._meta_hash(item))
+
+    def _index_item(self, box_key: str, item: Dict[str, Any]) -> None:
+        item["__box_key"] = box_key
+        name_key, exact_key = self._item_keys(box_key, item)
+        self._name_index[name_key].append(item)
+        self._exact_index[exact_key].append(item)
+
+    def _unindex_item(self, item: Dict[str, Any]) -> None:
+        name_key, exact_key = self._item_keys(item["__box_key"], item)
+        for index, key in ((self._name_index, name_key), (self._exact_index, exact_key)):
+            bucket = index.get(key)
+            if bucket is None:
+                continue
+            bucket[:] = [entry for entry in bucket if entry is not item]
+            if not bucket:
+                del index[key]
+
+    # --- Поиск ---
+
+    def find_box(self, name: str) -> Optional[Dict[str, Any]]:
+        if not name:
+            return None
+        return self._box_index.get(_normalize_name(name))
+
+    def find_item(
+        self,
+        box: Dict[str, Any],
+        payload_item: Dict[str, Any],
+        matcher: Callable[[Dict[str, Any], Dict[str, Any]], bool],
+    ) -> Optional[Dict[str, Any]]:
+        if not payload_item:
+            return None
+        box_key = _normalize_name(box.get("box"))
+        name_key = _normalize_name(payload_item.get("name"))
+        metadata = payload_item.get("metadata") or {}
+
+        # Полный набор метаданных — точный ключ; иначе перебираем только одноимённые строки ящика.
+        if set(metadata) == set(self.meta_fields):
+            candidates = self._exact_index.get((box_key, name_key, self._meta_hash(metadata))) or []
+        else:
+            candidates = [
+                item for item in self._name_index.get((box_key, name_key)) or [] if matcher(item, payload_item)
+            ]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda item: item["__row_number"])
+
+    def last_row(self, box: Dict[str, Any]) -> int:
+        items = box.get("items") or []
+        if items:
+            return items[-1]["__row_number"]
+        return box.get("__header_row", 1)
+
+    def row(self, row_number: int) -> List[Any]:
+        return self.values[row_number - 1]
+
+    # --- Изменения ---
+
+    def set_cells(self, row_number: int, updates: Dict[int, Any]) -> List[Any]:
+        row = self.row(row_number)
+        for col_idx, value in updates.items():
+            if len(row) <= col_idx:
+                row.extend([""] * (col_idx + 1 - len(row)))
+            row[col_idx] = value
+        self.version += 1
+        return row
+
+    def update_item(self, item: Dict[str, Any], updates: Dict[int, Any]) -> List[Any]:
+        """
+        Меняет ячейки строки айтема и переиндексирует его.
+        Айтем с пустым именем пропадает из ящика, как при разборе листа.
+        """
+        self._unindex_item(item)
+        row = self.set_cells(item["__row_number"], updates)
+        for field, column_idx in self.field_columns.items():
+            if column_idx in updates:
+                item[field] = _normalize(updates[column_idx])
+
+        if _normalize(item.get(self.name_field)):
+            self._index_item(item["__box_key"], item)
+        else:
+            box = self._box_index.get(item["__box_key"])
+            if box is not None:
+                box["items"] = [entry for entry in box.get("items") or [] if entry is not item]
+        return row
+
+    def insert_item_row(self, box: Dict[str, Any], row_number: int, row_values: List[Any]) -> Dict[str, Any]:
+        """
+        Вставляет строку айтема в конец ящика и сдвигает номера строк ниже.
+        """
+        self.values.insert(row_number - 1, row_values)
+        for other_box in self.boxes:
+            if other_box.get("__header_row", 0) >= row_number:
+                other_box["__header_row"] += 1
+            for item in other_box.get("items") or []:
+                if item["__row_number"] >= row_number:
+                    item["__row_number"] += 1
+
+        item = {
+            field: _normalize(row_values[column_idx]) if column_idx < len(row_values) else ""
+            for field, column_idx in self.field_columns.items()
+        }
+        item["__row_number"] = row_number
+        box.setdefault("items", []).append(item)
+        self._index_item(_normalize_name(box.get("box")), item)
+        self.version += 1
+        return item
+
+
+# --- Кеш снимков ---
+#
+# Воркер (SimpleWorker) держит разобранный снимок в памяти между задачами. При
+# SYNC_SNAPSHOT_REDIS=1 снимок дублируется в Redis вместе с индексами: запись
+# поколения (ключ .../generation) говорит, чей снимок свежий. Совпало с памятью —
+# берётся объект из памяти без скачивания; иначе (другой воркер, рестарт) снимок
+# восстанавливается из Redis без разбора листа. Расхождение со свежими правками
+# всё равно ловит проверка строк перед записью.
+
+_REDIS_KEY = "sheet_snapshot:{digest}"
+_REDIS_GENERATION_KEY = "sheet_snapshot:{digest}:generation"
+
+
+def redis_enabled() -> bool:
+    return os.getenv("SYNC_SNAPSHOT_REDIS", "1") == "1"
+
+
+@lru_cache
+def _redis_connection() -> Redis:
+    redis_url = os.getenv("RQ_REDIS_URL", "redis://localhost:6379/0")
+    return Redis.from_url(redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+
+
+_LOCK = threading.Lock()
+_SNAPSHOTS: Dict[SnapshotKey, WorksheetSnapshot] = {}
+_STATE = {"redis_retry_at": 0.0}
+_STATS = {"hits": 0, "misses": 0, "expired": 0, "stale": 0, "restored": 0, "redis_errors": 0}
+
+
+def _digest(key: SnapshotKey, signature: str) -> str:
+    raw = json.dumps([key[0], key[1], signature], ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _use_redis() -> bool:
+    return redis_enabled() and time.monotonic() >= _STATE["redis_retry_at"]
+
+
+def _redis_failed() -> None:
+    # Не проверяем Redis на каждой задаче, пока он лежит
+    logger.warning("Redis недоступен для снимков листа, кеш в памяти процесса", exc_info=True)
+    with _LOCK:
+        _STATS["redis_errors"] += 1
+    _STATE["redis_retry_at"] = time.monotonic() + 30
+
+
+def _dump(snapshot: WorksheetSnapshot) -> str:
+    age = time.monotonic() - snapshot.fetched_at
+    return json.dumps(
+        {
+            "generation": snapshot.generation,
+            "values": snapshot.values,
+            "header_map": snapshot.header_map,
+            "name_field": snapshot.name_field,
+            "qty_field": snapshot.qty_field,
+            "indexes": snapshot.dump_indexes(),
+            "fetched_at": time.time() - age,
+        },
+        ensure_ascii=False,
+    )
+
+
+def _load(raw: Any, config: Dict[str, Any], generation: str) -> Optional[WorksheetSnapshot]:
+    try:
+        data = json.loads(raw)
+        if data.get("generation") != generation:
+            return None
+        snapshot = WorksheetSnapshot.restore(
+            data["values"], data["header_map"], config, data.get("name_field"), data.get("qty_field"), data["indexes"]
+        )
+    except (TypeError, ValueError, KeyError):
+        logger.warning("Повреждённый снимок листа в Redis, скачиваем лист заново")
+        return None
+    snapshot.generation = generation
+    snapshot.fetched_at = time.monotonic() - max(time.time() - float(data.get("fetched_at") or 0), 0.0)
+    return snapshot
+
+
+def _decode(raw: Any) -> Optional[str]:
+    if raw is None:
+        return None
+    return raw.decode() if isinstance(raw, bytes) else str(raw)
+
+
+def _checkout_redis(
+    key: SnapshotKey, config: Dict[str, Any], signature: str, local: Optional[WorksheetSnapshot]
+) -> Optional[WorksheetSnapshot]:
+    """
+    Забирает поколение снимка из Redis: совпало с памятью — объект из памяти,
+    иначе — снимок, восстановленный из Redis.
+    """
+    connection = _redis_connection()
+    digest = _digest(key, signature)
+    generation_key = _REDIS_GENERATION_KEY.format(digest=digest)
+    pipe = connection.pipeline(transaction=True)
+    pipe.get(generation_key)
+    pipe.delete(generation_key)
+    generation = _decode(pipe.execute()[0])
+    if generation is None:
+        # Снимок на руках у другой задачи или его нет
+        return None
+    if local is not None and local.generation == generation:
+        return local
+
+    data_key = _REDIS_KEY.format(digest=digest)
+    pipe = connection.pipeline(transaction=True)
+    pipe.get(data_key)
+    pipe.delete(data_key)
+    raw = pipe.execute()[0]
+    snapshot = _load(raw, config, generation) if raw is not None else None
+    if snapshot is not None:
+        with _LOCK:
+            _STATS["restored"] += 1
+    return snapshot
+
+
+def checkout(key: SnapshotKey, config: Dict[str, Any]) -> Optional[WorksheetSnapshot]:
+    """
+    Забирает снимок из кеша на время обработки пачки.
+    Пока снимок на руках, другие задачи его не видят и скачают лист сами.
+    """
+    signature = config_signature(config)
+    with _LOCK:
+        local = _SNAPSHOTS.pop(key, None)
+    snapshot = local
+    if _use_redis():
+        try:
+            snapshot = _checkout_redis(key, config, signature, local)
+        except Exception:
+            _redis_failed()
+            snapshot = local
+    with _LOCK:
+        if snapshot is None:
+            _STATS["misses"] += 1
+            return None
+        if snapshot.signature != signature or time.monotonic() - snapshot.fetched_at > snapshot_ttl_seconds():
+            _STATS["expired"] += 1
+            return None
+        _STATS["hits"] += 1
+        return snapshot
+
+
+def checkin(key: SnapshotKey, snapshot: WorksheetSnapshot) -> None:
+    ttl = snapshot_ttl_seconds() - (time.monotonic() - snapshot.fetched_at)
+    if ttl <= 0:
+        return
+    snapshot.generation = uuid.uuid4().hex
+    with _LOCK:
+        _SNAPSHOTS[key] = snapshot
+    if not _use_redis():
+        return
+    try:
+        digest = _digest(key, snapshot.signature)
+        pipe = _redis_connection().pipeline(transaction=True)
+        pipe.set(_REDIS_KEY.format(digest=digest), _dump(snapshot), ex=max(int(ttl), 1))
+        pipe.set(_REDIS_GENERATION_KEY.format(digest=digest), snapshot.generation, ex=max(int(ttl), 1))
+        pipe.execute()
+    except Exception:
+        _redis_failed()
+
+
+def mark_stale() -> None:
+    with _LOCK:
+        _STATS["stale"] += 1
+
+
+def get_stats() -> Dict[str, Any]:
+    with _LOCK:
+        stats: Dict[str, Any] = dict(_STATS)
+        stats["cached"] = len(_SNAPSHOTS)
+    stats["redis"] = _use_redis()
+    return stats
+
+
+def clear() -> None:
+    with _LOCK:
+        _SNAPSHOTS.clear()
+        for key in _STATS:
+            _STATS[key] = 0
+    _STATE["redis_retry_at"] = 0.0
@@ -0,0 +1,215 @@
+"""
+Профилировщик SQL на запрос: число и время запросов, группировка по форме
+запроса и поиск вероятных N+1 (одна форма много раз с одного места в коде).
+
+Включается для всех запросов через SQL_PROFILE=1 или для одного запроса
+заголовком X-SQL-Profile: 1 от администратора. Результат — заголовки
+X-Query-Count, X-Query-Time (мс) и X-Query-N1, подробности — в лог.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import logging
+import os
+import re
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "x-sql-profile"
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+_SKIPPED_FILES = {__file__, str(PROJECT_ROOT / "app" / "database.py")}
+
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\((?:\s*(?:\?|%\(\w+\)s|:\w+|__\[POSTCOMPILE_\w+\])\s*,?)+\)")
+_SPACES_RE = re.compile(r"\s+")
+
+
+def profiling_forced() -> bool:
+    return os.getenv("SQL_PROFILE", "0") == "1"
+
+
+def n_plus_one_threshold() -> int:
+    # Сколько одинаковых запросов с одного места считать циклом
+    return max(int(os.getenv("SQL_PROFILE_N1_THRESHOLD", "5")), 2)
+
+
+def statement_shape(statement: str) -> str:
+    """
+    Форма запроса без литералов и с одним плейсхолдером вместо списков IN (...).
+    """
+    shape = _LITERAL_RE.sub("?", statement)
+    shape = _IN_LIST_RE.sub("(?)", shape)
+    return _SPACES_RE.sub(" ", shape).strip()
+
+
+def _call_site() -> str:
+    """
+    Первая строка кода проекта в стеке: то место, откуда ушёл запрос.
+    """
+    frame = sys._getframe(2)
+    root = str(PROJECT_ROOT)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(root) and filename not in _SKIPPED_FILES and "site-packages" not in filename:
+            return f"{Path(filename).relative_to(PROJECT_ROOT)}:{frame.f_lineno}"
+        frame = frame.f_back
+    return "?"
+
+
+@dataclass
+class ShapeStats:
+    count: int = 0
+    time_ms: float = 0.0
+    call_sites: Dict[str, int] = field(default_factory=dict)
+
+
+@dataclass
+class QueryProfile:
+    authorized: bool = False
+    count: int = 0
+    time_ms: float = 0.0
+    shapes: Dict[str, ShapeStats] = field(default_factory=dict)
+
+    def record(self, statement: str, elapsed_ms: float, call_site: str) -> None:
+        self.count += 1
+        self.time_ms += elapsed_ms
+        stats = self.shapes.setdefault(statement_shape(statement), ShapeStats())
+        stats.count += 1
+        stats.time_ms += elapsed_ms
+        stats.call_sites[call_site] = stats.call_sites.get(call_site, 0) + 1
+
+    def suspected_n_plus_one(self, threshold: Optional[int] = None) -> List[Tuple[str, str, int]]:
+        """
+        (форма, место вызова, повторы) для форм, которые одно место кода выполнило threshold+ раз.
+        """
+        threshold = threshold or n_plus_one_threshold()
+        found = [
+            (shape, site, hits)
+            for shape, stats in self.shapes.items()
+            for site, hits in stats.call_sites.items()
+            if hits >= threshold
+        ]
+        return sorted(found, key=lambda entry: -entry[2])
+
+    def summary(self) -> Dict[str, object]:
+        shapes = sorted(self.shapes.items(), key=lambda entry: -entry[1].count)
+        return {
+            "count": self.count,
+            "time_ms": round(self.time_ms, 3),
+            "shapes": [
+                {"statement": shape, "count": stats.count, "time_ms": round(stats.time_ms, 3), "call_sites": stats.call_sites}
+                for shape, stats in shapes
+            ],
+            "n_plus_one": [
+                {"statement": shape, "call_site": site, "count": hits}
+                for shape, site, hits in self.suspected_n_plus_one()
+            ],
+        }
+
+
+_PROFILE: contextvars.ContextVar[Optional[QueryProfile]] = contextvars.ContextVar("sql_profile", default=None)
+
+
+def current_profile() -> Optional[QueryProfile]:
+    return _PROFILE.get()
+
+
+def authorize(user) -> None:
+    """
+    Вызывается проверкой токена: заголовок X-SQL-Profile действует только для администратора.
+    """
+    profile = _PROFILE.get()
+    if profile is not None and getattr(user, "role", None) == "admin":
+        profile.authorized = True
+
+
+@contextmanager
+def profile() -> Iterator[QueryProfile]:
+    """
+    Собирает профиль запросов внутри блока (вне HTTP: скрипты, тесты сервисов).
+    """
+    current = QueryProfile(authorized=True)
+    token = _PROFILE.set(current)
+    try:
+        yield current
+    finally:
+        _PROFILE.reset(token)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _PROFILE.get() is not None:
+        conn.info.setdefault("sql_profile_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    current = _PROFILE.get()
+    started = conn.info.get("sql_profile_started")
+    if current is None or not started:
+        return
+    current.record(statement, (time.perf_counter() - started.pop()) * 1000, _call_site())
+
+
+def _n_plus_one_header(current: QueryProfile) -> str:
+    return "; ".join(f"{site} x{hits}" for _, site, hits in current.suspected_n_plus_one())
+
+
+class SQLProfilerMiddleware:
+    """
+    ASGI-middleware: собирает профиль, если профилирование включено окружением
+    или запрошено заголовком, и дописывает X-Query-* в ответ. Заголовки
+    уходят вместе с началом ответа: запросы из тела StreamingResponse не учитываются.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        forced = profiling_forced()
+        requested = any(name == PROFILE_HEADER.encode() and value == b"1" for name, value in scope.get("headers", []))
+        if not forced and not requested:
+            await self.app(scope, receive, send)
+            return
+
+        current = QueryProfile(authorized=forced)
+        token = _PROFILE.set(current)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and current.authorized:
+                headers = list(message.get("headers", []))
+                headers.append((b"x-query-count", str(current.count).encode()))
+                headers.append((b"x-query-time", f"{current.time_ms:.3f}".encode()))
+                suspects = _n_plus_one_header(current)
+                if suspects:
+                    headers.append((b"x-query-n1", suspects.encode("latin-1", "replace")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _PROFILE.reset(token)
+            if current.authorized:
+                _log_profile(scope, current)
+
+
+def _log_profile(scope, current: QueryProfile) -> None:
+    suspects = current.suspected_n_plus_one()
+    if suspects:
+        for shape, site, hits in suspects:
+            logger.warning("Вероятный N+1 в %s %s: %s x%s — %s", scope["method"], scope["path"], site, hits, shape)
+    logger.info("SQL %s %s: %s запросов, %.1f мс", scope["method"], scope["path"], current.count, current.time_ms)
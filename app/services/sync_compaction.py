@@ -0,0 +1,75 @@
+"""
+Сжатие ожидающих событий синхронизации до того, как воркер обратится к Google.
+
+События одного айтема (ключ — конфиг листа и id айтема) сводятся к чистому
+итогу: create+update → create, update+update → update, create+delete → ничего,
+update+delete → delete исходной строки. Update, после которого строка не
+изменилась (qty 1 → 2 → 1), отбрасывается. События без id айтема остаются
+как есть. Порядок айтемов сохраняется по первому событию каждого.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.sync_queue import event_target
+
+SyncEvent = Tuple[str, Dict[str, Any]]
+
+
+def _event_key(action: str, payload: Dict[str, Any]) -> Optional[Tuple[str, Any]]:
+    target = event_target(action, payload)
+    config_name = (target.get("tab") or {}).get("sync_config")
+    item_id = (target.get("item") or {}).get("id")
+    if not config_name or item_id is None:
+        return None
+    return config_name, item_id
+
+
+def _merge(first: SyncEvent, second: SyncEvent) -> Optional[List[SyncEvent]]:
+    """
+    Итог двух подряд идущих событий одного айтема. None — пару свести нельзя.
+    """
+    first_action, first_payload = first
+    second_action, second_payload = second
+    if first_action == "create":
+        if second_action == "update":
+            return [("create", second_payload.get("after") or first_payload)]
+        if second_action == "delete":
+            return []
+    elif first_action == "update":
+        if second_action == "update":
+            before = first_payload.get("before") or second_payload.get("before")
+            return [("update", {"before": before, "after": second_payload.get("after")})]
+        if second_action == "delete":
+            # В листе ещё строка из состояния до первого update
+            return [("delete", first_payload.get("before") or second_payload)]
+    return None
+
+
+def _is_noop(event: SyncEvent) -> bool:
+    action, payload = event
+    return action == "update" and bool(payload.get("before")) and payload.get("before") == payload.get("after")
+
+
+def compact_events(events: List[SyncEvent]) -> List[SyncEvent]:
+    slots: List[List[SyncEvent]] = []
+    chains: Dict[Tuple[str, Any], List[SyncEvent]] = {}
+    for action, payload in events:
+        if not payload:
+            continue
+        event = (action, payload)
+        key = _event_key(action, payload)
+        if key is None:
+            slots.append([event])
+            continue
+        chain = chains.get(key)
+        if chain is None:
+            chain = chains[key] = []
+            slots.append(chain)
+        merged = _merge(chain[-1], event) if chain else None
+        if merged is None:
+            chain.append(event)
+        else:
+            chain[-1:] = merged
+    return [event for chain in slots for event in chain if not _is_noop(event)]
@@ -1,14 +1,18 @@
 from __future__ import annotations
 
 import logging
-from typing import Any, Dict, Iterable, Optional
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
 
 from app.services import sync_queue
 
 logger = logging.getLogger(__name__)
 
 
-def _field_name_map(fields: Iterable) -> Dict[str, str]:
+def _field_name_map(fields: Iterable) -> Mapping[str, str]:
+    # Кодек вкладки (field_codec.FieldCodec) уже хранит готовую карту
+    key_to_name = getattr(fields, "key_to_name", None)
+    if key_to_name is not None:
+        return key_to_name
     mapping = {}
     for field in fields or []:
         stable_key = getattr(field, "stable_key", None) or field.name
@@ -65,19 +69,52 @@ def build_item_payload(tab, box, item, fields: Iterable) -> Optional[Dict[str, A
     return payload
 
 
-def enqueue_item_created(payload: Optional[Dict[str, Any]]) -> Dict[str, str] | None:
+def enqueue_item_created(payload: Optional[Dict[str, Any]]) -> Dict[str, Any] | None:
     return run_sync_action("create", payload)
 
 
-def enqueue_item_updated(before_payload: Optional[Dict[str, Any]], after_payload: Optional[Dict[str, Any]]) -> Dict[str, str] | None:
+def enqueue_item_updated(before_payload: Optional[Dict[str, Any]], after_payload: Optional[Dict[str, Any]]) -> Dict[str, Any] | None:
     return run_sync_action("update", {"before": before_payload, "after": after_payload})
 
 
-def enqueue_item_deleted(payload: Optional[Dict[str, Any]]) -> Dict[str, str] | None:
+def enqueue_item_deleted(payload: Optional[Dict[str, Any]]) -> Dict[str, Any] | None:
     return run_sync_action("delete", payload)
 
 
-def run_sync_action(action: str, payload: Optional[Dict[str, Any]]) -> Dict[str, str] | None:
+def enqueue_item_batch(events: List[Tuple[str, Optional[Dict[str, Any]]]]) -> Dict[str, Any] | None:
+    """
+    Отправляет изменения пачкой: по одной задаче на каждый конфиг листа.
+    Статус "queued": итог задач смотрится по job_ids в GET /system/sync-jobs.
+    """
+    grouped: Dict[str, List[Tuple[str, Dict[str, Any]]]] = {}
+    for action, payload in events:
+        if action not in {"create", "update", "delete"} or not payload:
+            continue
+        target_payload = payload
+        if action == "update":
+            target_payload = payload.get("after") or payload.get("before")
+        config_name = ((target_payload or {}).get("tab") or {}).get("sync_config")
+        if not config_name:
+            continue
+        grouped.setdefault(config_name, []).append((action, payload))
+
+    if not grouped:
+        return None
+
+    try:
+        job_ids = []
+        for config_name, config_events in grouped.items():
+            for job_id in sync_queue.enqueue_sync_events(config_name, config_events) or []:
+                if job_id not in job_ids:
+                    job_ids.append(job_id)
+        total = sum(len(config_events) for config_events in grouped.values())
+        return {"status": "queued", "detail": f"Изменений в очереди: {total}", "job_ids": job_ids}
+    except Exception as exc:
+        logger.exception("Не удалось отправить пачку синхронизации")
+        return {"status": "error", "detail": str(exc)}
+
+
+def run_sync_action(action: str, payload: Optional[Dict[str, Any]]) -> Dict[str, Any] | None:
     if action not in {"create", "update", "delete"}:
         return None
     if not payload:
@@ -93,11 +130,12 @@ def run_sync_action(action: str, payload: Optional[Dict[str, Any]]) -> Dict[str,
         return None
 
     try:
-        sync_queue.enqueue_sync_job(action, payload)
+        job_id = sync_queue.enqueue_sync_job(action, payload, config_name=config_name)
         names = _extract_box_item(action, payload or {})
         return {
-            "status": "success",
+            "status": "queued",
             "detail": f"{names['box']} — {names['item']}",
+            "job_ids": [job_id] if job_id else [],
         }
     except Exception as exc:
         logger.exception("Не удалось отправить задачу синхронизации")
@@ -0,0 +1,254 @@
+"""
+Учёт задач синхронизации: у каждой задачи RQ есть запись со статусом
+(queued → running → succeeded/failed), числом попыток, длительностью и
+вызовами Sheets API. Id задачи возвращается в sync_result ответа API.
+
+Записи живут в Redis (HASH на задачу с TTL) и индексируются по времени
+постановки; незавершённые задачи дают отставание синхронизации по вкладкам.
+Ошибки Redis только пишутся в лог: учёт не должен ломать саму синхронизацию.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from redis import Redis
+
+from app.services import metrics
+
+logger = logging.getLogger(__name__)
+
+STATUSES = ("queued", "running", "succeeded", "failed")
+
+_JOB_KEY = "sync_job:{job_id}"
+_INDEX_KEY = "sync_jobs"
+_PENDING_KEY = "sync_jobs:pending"
+_TAB_PREFIX = "tab:"
+
+
+def history_size() -> int:
+    return max(int(os.getenv("SYNC_JOB_HISTORY", "1000")), 1)
+
+
+def record_ttl() -> int:
+    return max(int(os.getenv("SYNC_JOB_TTL", "86400")), 60)
+
+
+@lru_cache
+def _redis_connection() -> Redis:
+    redis_url = os.getenv("RQ_REDIS_URL", "redis://localhost:6379/0")
+    # register() вызывается из запроса API: недоступный Redis не должен его подвешивать
+    return Redis.from_url(redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+
+
+def new_job_id() -> str:
+    return f"sync-{uuid.uuid4().hex[:16]}"
+
+
+def _tab_fields(tabs: Iterable[str]) -> Dict[str, str]:
+    return {f"{_TAB_PREFIX}{tab}": "1" for tab in tabs}
+
+
+def register(job_id: str, config_name: str, handler: str, tabs: Iterable[str], events: int) -> None:
+    """
+    Запись новой задачи в статусе queued. Вызывается до постановки в RQ,
+    чтобы воркер не начал задачу раньше, чем появится её запись.
+    """
+    now = time.time()
+    try:
+        key = _JOB_KEY.format(job_id=job_id)
+        pipe = _redis_connection().pipeline(transaction=False)
+        mapping = {"id": job_id, "status": "queued", "sync_config": config_name, "handler": handler, "enqueued_at": now}
+        pipe.hset(key, mapping={**mapping, **_tab_fields(tabs)})
+        # Счётчики через HINCRBY: события, присоединённые до register, не теряются
+        pipe.hincrby(key, "events", events)
+        pipe.hincrby(key, "attempts", 0)
+        pipe.expire(key, record_ttl())
+        pipe.zadd(_INDEX_KEY, {job_id: now})
+        pipe.zadd(_PENDING_KEY, {job_id: now})
+        pipe.zremrangebyrank(_INDEX_KEY, 0, -history_size() - 1)
+        pipe.execute()
+    except Exception:
+        logger.exception("Не удалось записать задачу синхронизации %s", job_id)
+
+
+def join(job_id: str, tabs: Iterable[str], events: int) -> None:
+    """
+    События, доставшиеся уже запланированной задаче (пакет или правки айтема).
+    """
+    try:
+        key = _JOB_KEY.format(job_id=job_id)
+        pipe = _redis_connection().pipeline(transaction=False)
+        pipe.hincrby(key, "events", events)
+        tab_fields = _tab_fields(tabs)
+        if tab_fields:
+            pipe.hset(key, mapping=tab_fields)
+        pipe.execute()
+    except Exception:
+        logger.exception("Не удалось обновить задачу синхронизации %s", job_id)
+
+
+def mark_running(job_id: str) -> None:
+    try:
+        key = _JOB_KEY.format(job_id=job_id)
+        pipe = _redis_connection().pipeline(transaction=False)
+        pipe.hset(key, mapping={"status": "running", "started_at": time.time()})
+        pipe.hincrby(key, "attempts", 1)
+        pipe.execute()
+    except Exception:
+        logger.exception("Не удалось отметить запуск задачи синхронизации %s", job_id)
+
+
+def mark_finished(
+    job_id: str,
+    status: str,
+    duration: float,
+    sheets_calls: int,
+    detail: Optional[str] = None,
+) -> None:
+    """
+    Итог попытки. Статус queued — попытка упала, но RQ ещё повторит задачу:
+    она остаётся в отставании вкладок, а detail хранит последнюю ошибку.
+    """
+    try:
+        key = _JOB_KEY.format(job_id=job_id)
+        mapping = {"status": status, "finished_at": time.time(), "duration": round(duration, 3), "sheets_calls": sheets_calls}
+        pipe = _redis_connection().pipeline(transaction=False)
+        if detail:
+            mapping["detail"] = detail[:500]
+        else:
+            # Ошибка прошлой попытки не должна висеть на успешной задаче
+            pipe.hdel(key, "detail")
+        pipe.hset(key, mapping=mapping)
+        pipe.expire(key, record_ttl())
+        if status in {"succeeded", "failed"}:
+            pipe.zrem(_PENDING_KEY, job_id)
+        pipe.execute()
+    except Exception:
+        logger.exception("Не удалось записать итог задачи синхронизации %s", job_id)
+
+
+@contextmanager
+def track(job_id: Optional[str], final_attempt: bool = True) -> Iterator[Dict[str, Any]]:
+    """
+    Статус running на время блока и итог по его завершению. В словарь run
+    обработчик кладёт sheets_calls и detail. Без job_id (вызов вне RQ) ничего не пишет.
+    """
+    run: Dict[str, Any] = {"sheets_calls": 0, "detail": None}
+    if not job_id:
+        yield run
+        return
+    mark_running(job_id)
+    started = time.monotonic()
+    try:
+        yield run
+    except Exception as exc:
+        detail = f"{exc.__class__.__name__}: {exc}" if str(exc) else exc.__class__.__name__
+        status = "failed" if final_attempt else "queued"
+        mark_finished(job_id, status, time.monotonic() - started, run["sheets_calls"], detail)
+        raise
+    mark_finished(job_id, "succeeded", time.monotonic() - started, run["sheets_calls"], run["detail"])
+
+
+def _decode(raw: Dict[Any, Any]) -> Dict[str, Any]:
+    record: Dict[str, Any] = {"tabs": []}
+    for key, value in raw.items():
+        key = key.decode() if isinstance(key, bytes) else str(key)
+        value = value.decode() if isinstance(value, bytes) else value
+        if key.startswith(_TAB_PREFIX):
+            record["tabs"].append(key[len(_TAB_PREFIX):])
+        elif key in {"events", "attempts", "sheets_calls"}:
+            record[key] = int(value)
+        elif key in {"enqueued_at", "started_at", "finished_at", "duration"}:
+            record[key] = float(value)
+        else:
+            record[key] = value
+    record["tabs"].sort()
+    return record
+
+
+def _load(job_ids: List[str]) -> List[Optional[Dict[str, Any]]]:
+    pipe = _redis_connection().pipeline(transaction=False)
+    for job_id in job_ids:
+        pipe.hgetall(_JOB_KEY.format(job_id=job_id))
+    return [_decode(raw) if raw else None for raw in pipe.execute()]
+
+
+def _ids(raw_ids: Iterable[Any]) -> List[str]:
+    return [raw.decode() if isinstance(raw, bytes) else str(raw) for raw in raw_ids]
+
+
+def list_jobs(
+    status: Optional[str] = None,
+    sync_config: Optional[str] = None,
+    tab: Optional[str] = None,
+    job_ids: Optional[List[str]] = None,
+    limit: int = 50,
+) -> List[Dict[str, Any]]:
+    """
+    Последние задачи (новые первыми) с фильтрами по статусу, конфигу листа,
+    вкладке (tab_label) или списку id.
+    """
+    try:
+        ids = list(job_ids) if job_ids else _ids(_redis_connection().zrevrange(_INDEX_KEY, 0, history_size() - 1))
+        jobs = []
+        for record in _load(ids):
+            if record is None or "status" not in record:
+                continue
+            if status and record["status"] != status:
+                continue
+            if sync_config and record.get("sync_config") != sync_config:
+                continue
+            if tab and tab not in record["tabs"]:
+                continue
+            jobs.append(record)
+            if len(jobs) >= limit:
+                break
+        return jobs
+    except Exception:
+        logger.exception("Не удалось получить задачи синхронизации")
+        return []
+
+
+def tab_lag(now: Optional[float] = None) -> Dict[str, float]:
+    """
+    Отставание по вкладкам: возраст самой старой незавершённой задачи, в секундах.
+    """
+    now = time.time() if now is None else now
+    try:
+        connection = _redis_connection()
+        pending = [(job_id, float(score)) for job_id, score in connection.zrange(_PENDING_KEY, 0, -1, withscores=True)]
+        if not pending:
+            return {}
+        ids = _ids(job_id for job_id, _ in pending)
+        lag: Dict[str, float] = {}
+        expired = []
+        for job_id, (_, enqueued_at), record in zip(ids, pending, _load(ids)):
+            if record is None:
+                expired.append(job_id)
+                continue
+            for tab in record["tabs"] or ["unknown"]:
+                lag[tab] = max(lag.get(tab, 0.0), round(now - enqueued_at, 3))
+        if expired:
+            connection.zrem(_PENDING_KEY, *expired)
+        return lag
+    except Exception:
+        logger.exception("Не удалось посчитать отставание синхронизации")
+        return {}
+
+
+def update_lag_gauge() -> Dict[str, float]:
+    """
+    Обновляет sync_lag_seconds перед выдачей /metrics: вкладки без очереди пропадают из gauge.
+    """
+    lag = tab_lag()
+    metrics.SYNC_LAG_SECONDS.reset()
+    for tab, seconds in lag.items():
+        metrics.SYNC_LAG_SECONDS.set(seconds, tab=tab)
+    return lag
@@ -1,16 +1,26 @@
 from __future__ import annotations
 
+import json
 import logging
 import os
+from datetime import timedelta
 from functools import lru_cache
-from typing import Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from redis import Redis
 from rq import Queue, Retry, Worker
 
+from app.services import metrics, sync_jobs
+
 logger = logging.getLogger(__name__)
 
 _ERROR_KEY = "sync_worker:last_error"
+_SHEETS_CACHE_KEY = "sync_worker:sheets_cache"
+_WORKER_METRICS_KEY = "sync_worker:metrics:{name}"
+_BATCH_PENDING_KEY = "sync_batch:pending:{config}"
+_BATCH_SCHEDULED_KEY = "sync_batch:scheduled:{config}"
+_ITEM_PENDING_KEY = "sync_item:pending:{config}:{item}"
+_ITEM_SCHEDULED_KEY = "sync_item:scheduled:{config}:{item}"
 
 
 @lru_cache
@@ -19,24 +29,389 @@ def _redis_connection() -> Redis:
     return Redis.from_url(redis_url)
 
 
+def _default_timeout() -> int:
+    return int(os.getenv("RQ_DEFAULT_TIMEOUT", "90"))
+
+
 @lru_cache
 def _queue() -> Queue:
     queue_name = os.getenv("RQ_QUEUE_NAME", "sync")
-    default_timeout = int(os.getenv("RQ_DEFAULT_TIMEOUT", "90"))
-    return Queue(queue_name, connection=_redis_connection(), default_timeout=default_timeout)
+    return Queue(queue_name, connection=_redis_connection(), default_timeout=_default_timeout())
+
+
+_RETRY_INTERVALS = [5, 15, 30]
+# Пауза перед задачей, которая подбирает события, вернувшиеся в список после последнего повтора
+_FOLLOWUP_DELAY_SECONDS = 60
+
+
+def _retry() -> Retry:
+    return Retry(max=len(_RETRY_INTERVALS), interval=list(_RETRY_INTERVALS))
+
+
+def max_job_seconds() -> int:
+    """
+    Сколько задача может оставаться незавершённой: все попытки по RQ_DEFAULT_TIMEOUT,
+    паузы Retry между ними и окно пакета. По нему фронт ограничивает опрос статуса.
+    """
+    attempts = len(_RETRY_INTERVALS) + 1
+    window = batch_window_seconds() if batching_enabled() else 0
+    return int(attempts * _default_timeout() + sum(_RETRY_INTERVALS) + window)
+
+
+def batching_enabled() -> bool:
+    """
+    Пакетный режим: события копятся в Redis-списке по конфигу и
+    обрабатываются одной задачей handle_sync_batch.
+    """
+    return os.getenv("SYNC_BATCH_MODE", "0") == "1"
+
 
+def batch_window_seconds() -> float:
+    return max(float(os.getenv("SYNC_BATCH_WINDOW", "2")), 0.0)
 
-def enqueue_sync_job(action: str, payload: dict | None) -> None:
+
+def batch_max_events() -> int:
+    return max(int(os.getenv("SYNC_BATCH_MAX_EVENTS", "500")), 1)
+
+
+def enqueue_sync_job(action: str, payload: dict | None, config_name: str | None = None) -> Optional[str]:
+    """
+    Ставит событие в очередь и возвращает id задачи синхронизации (см. sync_jobs).
+    Событие, доставшееся уже запланированной задаче, получает её id.
+    """
     if not payload:
+        return None
+
+    tabs = _event_tabs([(action, payload)])
+    item_id = event_item_id(action, payload)
+    if config_name and batching_enabled():
+        job_id = _enqueue_batched(config_name, action, payload, tabs)
+    elif config_name and item_id is not None:
+        job_id = _enqueue_item(config_name, item_id, action, payload, tabs)
+    else:
+        job_id = sync_jobs.new_job_id()
+        sync_jobs.register(job_id, config_name or "", "handle_sync_event", tabs, 1)
+        _queue().enqueue(
+            "app.services.sync_worker.handle_sync_event",
+            action,
+            payload,
+            retry=_retry(),
+            job_id=job_id,
+        )
+    metrics.SYNC_JOBS_ENQUEUED.inc(tab=tabs[0])
+    return job_id
+
+
+def enqueue_sync_events(config_name: str, events: List[Tuple[str, Dict[str, Any]]]) -> List[str]:
+    """
+    Ставит несколько событий одного конфига: в пакетном режиме — одним RPUSH,
+    иначе — через списки айтемов (см. _enqueue_items) одной задачей handle_items_sync.
+    Возвращает id задач, которым достались события.
+    """
+    events = [(action, payload) for action, payload in events if payload]
+    if not events:
+        return []
+
+    if batching_enabled():
+        connection = _redis_connection()
+        connection.rpush(
+            _BATCH_PENDING_KEY.format(config=config_name),
+            *[_encode_event(action, payload) for action, payload in events],
+        )
+        job_ids = [_schedule_batch(config_name, _event_tabs(events), len(events))]
+    else:
+        item_events = [(action, payload) for action, payload in events if event_item_id(action, payload) is not None]
+        loose_events = [(action, payload) for action, payload in events if event_item_id(action, payload) is None]
+        job_ids = _enqueue_items(config_name, item_events) if item_events else []
+        if loose_events:
+            job_id = sync_jobs.new_job_id()
+            sync_jobs.register(job_id, config_name, "handle_sync_events", _event_tabs(loose_events), len(loose_events))
+            _queue().enqueue(
+                "app.services.sync_worker.handle_sync_events",
+                config_name,
+                loose_events,
+                retry=_retry(),
+                job_id=job_id,
+            )
+            job_ids.append(job_id)
+    for action, payload in events:
+        metrics.SYNC_JOBS_ENQUEUED.inc(tab=metrics.tab_label(event_target(action, payload)))
+    return job_ids
+
+
+def event_target(action: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Payload, по которому определяется вкладка события: для update — состояние после изменения.
+    """
+    if action == "update":
+        return payload.get("after") or payload.get("before") or {}
+    return payload
+
+
+def event_item_id(action: str, payload: Dict[str, Any]) -> Optional[int]:
+    return (event_target(action, payload).get("item") or {}).get("id")
+
+
+def _encode_event(action: str, payload: Dict[str, Any]) -> str:
+    return json.dumps({"action": action, "payload": payload}, ensure_ascii=False)
+
+
+def _decode_event(raw: Any) -> Optional[Tuple[str, Dict[str, Any]]]:
+    try:
+        data = json.loads(raw)
+    except (TypeError, ValueError):
+        logger.warning("Пропускаем повреждённое событие синхронизации: %r", raw)
+        return None
+    return data.get("action"), data.get("payload") or {}
+
+
+def _event_tabs(events: List[Tuple[str, Dict[str, Any]]]) -> List[str]:
+    tabs: List[str] = []
+    for action, payload in events:
+        tab = metrics.tab_label(event_target(action, payload))
+        if tab not in tabs:
+            tabs.append(tab)
+    return tabs
+
+
+def _claim_flag(connection: Redis, scheduled_key: str, job_id: str) -> Optional[str]:
+    """
+    Ставит флаг запланированной задачи. Возвращает id задачи, уже владеющей флагом,
+    или None, если флаг достался job_id.
+    Флаг живёт не дольше таймаута задачи, чтобы упавший воркер не блокировал очередь.
+    """
+    for _ in range(3):
+        if connection.set(scheduled_key, job_id, nx=True, ex=_default_timeout()):
+            return None
+        existing = connection.get(scheduled_key)
+        if existing is not None:
+            return existing.decode() if isinstance(existing, bytes) else str(existing)
+        # Флаг сняли между SET и GET: воркер уже забрал события, пробуем ещё раз
+    return None
+
+
+def _claim_job(scheduled_key: str, config_name: str, handler: str, tabs: List[str], events: int) -> Tuple[str, bool]:
+    """
+    Флаг запланированной задачи хранит её id: события, пришедшие до её запуска,
+    присоединяются к ней. Возвращает (id задачи, нужно ли ставить её в RQ).
+    """
+    job_id = sync_jobs.new_job_id()
+    existing = _claim_flag(_redis_connection(), scheduled_key, job_id)
+    if existing is not None:
+        sync_jobs.join(existing, tabs, events)
+        return existing, False
+    sync_jobs.register(job_id, config_name, handler, tabs, events)
+    return job_id, True
+
+
+def _schedule_batch(config_name: str, tabs: List[str], events: int) -> str:
+    """
+    Ставит задачу разбора пачки, если для конфига она ещё не запланирована.
+    """
+    scheduled_key = _BATCH_SCHEDULED_KEY.format(config=config_name)
+    job_id, created = _claim_job(scheduled_key, config_name, "handle_sync_batch", tabs, events)
+    if created:
+        _queue().enqueue(
+            "app.services.sync_worker.handle_sync_batch",
+            config_name,
+            retry=_retry(),
+            job_id=job_id,
+        )
+    return job_id
+
+
+def _enqueue_batched(config_name: str, action: str, payload: Dict[str, Any], tabs: List[str]) -> str:
+    connection = _redis_connection()
+    connection.rpush(_BATCH_PENDING_KEY.format(config=config_name), _encode_event(action, payload))
+    return _schedule_batch(config_name, tabs, 1)
+
+
+def _enqueue_item(config_name: str, item_id: int, action: str, payload: Dict[str, Any], tabs: List[str]) -> str:
+    """
+    События айтема копятся в своём списке, задача на айтем ставится одна:
+    пока воркер до неё не дошёл, новые правки лишь дописываются и сжимаются вместе.
+    """
+    connection = _redis_connection()
+    connection.rpush(_ITEM_PENDING_KEY.format(config=config_name, item=item_id), _encode_event(action, payload))
+    scheduled_key = _ITEM_SCHEDULED_KEY.format(config=config_name, item=item_id)
+    job_id, created = _claim_job(scheduled_key, config_name, "handle_item_sync", tabs, 1)
+    if created:
+        _queue().enqueue(
+            "app.services.sync_worker.handle_item_sync",
+            config_name,
+            item_id,
+            retry=_retry(),
+            job_id=job_id,
+        )
+    return job_id
+
+
+def _enqueue_items(config_name: str, events: List[Tuple[str, Dict[str, Any]]]) -> List[str]:
+    """
+    Пачка правок (POST /items/bulk) идёт через те же списки айтемов, что и одиночные:
+    порядок правок айтема не зависит от того, какая задача дойдёт до воркера первой.
+    Айтемы, для которых задача ещё не запланирована, забирает одна новая задача
+    handle_items_sync (один снимок листа на всю пачку), остальные присоединяются к своим задачам.
+    """
+    by_item: Dict[int, List[Tuple[str, Dict[str, Any]]]] = {}
+    for action, payload in events:
+        by_item.setdefault(event_item_id(action, payload), []).append((action, payload))
+
+    connection = _redis_connection()
+    pipe = connection.pipeline(transaction=False)
+    for item_id, item_events in by_item.items():
+        pipe.rpush(
+            _ITEM_PENDING_KEY.format(config=config_name, item=item_id),
+            *[_encode_event(action, payload) for action, payload in item_events],
+        )
+    pipe.execute()
+
+    job_id = sync_jobs.new_job_id()
+    claimed: List[int] = []
+    joined: List[str] = []
+    for item_id, item_events in by_item.items():
+        scheduled_key = _ITEM_SCHEDULED_KEY.format(config=config_name, item=item_id)
+        existing = _claim_flag(connection, scheduled_key, job_id)
+        if existing is None:
+            claimed.append(item_id)
+            continue
+        sync_jobs.join(existing, _event_tabs(item_events), len(item_events))
+        if existing not in joined:
+            joined.append(existing)
+
+    if not claimed:
+        return joined
+    claimed_events = [event for item_id in claimed for event in by_item[item_id]]
+    sync_jobs.register(job_id, config_name, "handle_items_sync", _event_tabs(claimed_events), len(claimed_events))
+    _queue().enqueue(
+        "app.services.sync_worker.handle_items_sync",
+        config_name,
+        claimed,
+        retry=_retry(),
+        job_id=job_id,
+    )
+    return [job_id] + joined
+
+
+def pop_item_events(config_name: str, item_id: int) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Атомарно забирает все ожидающие события айтема.
+    """
+    connection = _redis_connection()
+    pending_key = _ITEM_PENDING_KEY.format(config=config_name, item=item_id)
+    # Как и для пачек: флаг снимается до чтения, поздние события поставят новую задачу.
+    connection.delete(_ITEM_SCHEDULED_KEY.format(config=config_name, item=item_id))
+    pipe = connection.pipeline(transaction=True)
+    pipe.lrange(pending_key, 0, -1)
+    pipe.delete(pending_key)
+    raw_events, _ = pipe.execute()
+    return [event for event in (_decode_event(raw) for raw in raw_events or []) if event is not None]
+
+
+def requeue_item_events(
+    config_name: str, item_id: int, events: List[Tuple[str, Dict[str, Any]]], followup: bool = False
+) -> None:
+    """
+    Возвращает события айтема в начало его списка; followup — см. _schedule_followup.
+    """
+    if not events:
+        return
+    connection = _redis_connection()
+    encoded = [_encode_event(action, payload) for action, payload in events]
+    connection.lpush(_ITEM_PENDING_KEY.format(config=config_name, item=item_id), *reversed(encoded))
+    if followup:
+        job_id = sync_jobs.new_job_id()
+        scheduled_key = _ITEM_SCHEDULED_KEY.format(config=config_name, item=item_id)
+        if _claim_flag(connection, scheduled_key, job_id) is None:
+            _schedule_followup(job_id, config_name, "handle_item_sync", (item_id,), events)
+
+
+def requeue_items_events(config_name: str, events: List[Tuple[str, Dict[str, Any]]], followup: bool = False) -> None:
+    """
+    Возвращает события нескольких айтемов в начало их списков.
+    """
+    by_item: Dict[int, List[Tuple[str, Dict[str, Any]]]] = {}
+    for action, payload in events:
+        by_item.setdefault(event_item_id(action, payload), []).append((action, payload))
+    for item_id, item_events in by_item.items():
+        requeue_item_events(config_name, item_id, item_events)
+    if not followup or not by_item:
+        return
+
+    connection = _redis_connection()
+    job_id = sync_jobs.new_job_id()
+    claimed = [
+        item_id
+        for item_id in by_item
+        if _claim_flag(connection, _ITEM_SCHEDULED_KEY.format(config=config_name, item=item_id), job_id) is None
+    ]
+    if claimed:
+        claimed_events = [event for item_id in claimed for event in by_item[item_id]]
+        _schedule_followup(job_id, config_name, "handle_items_sync", (claimed,), claimed_events)
+
+
+def pop_batch_events(config_name: str) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Атомарно забирает накопленные события конфига (не больше batch_max_events()).
+    Если в списке что-то осталось, планирует следующую задачу.
+    """
+    connection = _redis_connection()
+    pending_key = _BATCH_PENDING_KEY.format(config=config_name)
+    limit = batch_max_events()
+
+    # Снимаем флаг до чтения: события, пришедшие после, запланируют новую задачу.
+    connection.delete(_BATCH_SCHEDULED_KEY.format(config=config_name))
+    pipe = connection.pipeline(transaction=True)
+    pipe.lrange(pending_key, 0, limit - 1)
+    pipe.ltrim(pending_key, limit, -1)
+    pipe.llen(pending_key)
+    raw_events, _, remaining = pipe.execute()
+
+    events = []
+    for raw in raw_events or []:
+        event = _decode_event(raw)
+        if event is not None:
+            events.append(event)
+
+    if remaining:
+        # Вкладки остатка не читаем из Redis: берём вкладки текущей пачки того же конфига
+        _schedule_batch(config_name, _event_tabs(events), int(remaining))
+    return events
+
+
+def requeue_batch_events(config_name: str, events: List[Tuple[str, Dict[str, Any]]], followup: bool = False) -> None:
+    """
+    Возвращает необработанные события в начало списка с сохранением порядка,
+    чтобы повтор задачи (Retry) применил их снова; followup — см. _schedule_followup.
+    """
+    if not events:
         return
+    connection = _redis_connection()
+    encoded = [_encode_event(action, payload) for action, payload in events]
+    connection.lpush(_BATCH_PENDING_KEY.format(config=config_name), *reversed(encoded))
+    if followup:
+        job_id = sync_jobs.new_job_id()
+        if _claim_flag(connection, _BATCH_SCHEDULED_KEY.format(config=config_name), job_id) is None:
+            _schedule_followup(job_id, config_name, "handle_sync_batch", (), events)
+
 
-    queue = _queue()
-    retry = Retry(max=3, interval=[5, 15, 30])
-    queue.enqueue(
-        "app.services.sync_worker.handle_sync_event",
-        action,
-        payload,
-        retry=retry,
+def _schedule_followup(
+    job_id: str, config_name: str, handler: str, args: Tuple[Any, ...], events: List[Tuple[str, Dict[str, Any]]]
+) -> None:
+    """
+    Повторы RQ кончились, а события вернулись в список: без новой задачи они
+    пролежали бы там до следующей правки. Задача ставится с паузой, флаг
+    запланированной задачи уже взят вызывающим; если флаг был занят, события
+    заберёт уже стоящая задача.
+    """
+    sync_jobs.register(job_id, config_name, handler, _event_tabs(events), len(events))
+    _queue().enqueue_in(
+        timedelta(seconds=_FOLLOWUP_DELAY_SECONDS),
+        f"app.services.sync_worker.{handler}",
+        config_name,
+        *args,
+        retry=_retry(),
+        job_id=job_id,
     )
 
 
@@ -89,6 +464,64 @@ def get_last_error() -> Optional[str]:
         return None
 
 
+def record_sheets_cache_stats(stats: Dict[str, int], ttl_seconds: int = 3600) -> None:
+    """
+    Сохраняет счётчики кеша Sheets-сервиса воркера, чтобы API мог их показать.
+    """
+    try:
+        _redis_connection().set(_SHEETS_CACHE_KEY, json.dumps(stats), ex=ttl_seconds)
+    except Exception:
+        logger.exception("Не удалось записать статистику кеша Sheets")
+
+
+def get_sheets_cache_stats() -> Optional[Dict[str, int]]:
+    try:
+        raw = _redis_connection().get(_SHEETS_CACHE_KEY)
+        if raw is None:
+            return None
+        return json.loads(raw)
+    except Exception:
+        logger.exception("Не удалось получить статистику кеша Sheets")
+        return None
+
+
+def record_worker_metrics(deltas: Dict[str, Dict[str, float]]) -> None:
+    """
+    Добавляет приросты метрик воркера (metrics.drain) к суммам в Redis.
+    Если Redis недоступен, приросты возвращаются в процесс и уйдут со следующей задачей.
+    """
+    if not deltas:
+        return
+    try:
+        pipe = _redis_connection().pipeline(transaction=True)
+        for name, fields in deltas.items():
+            for field, value in fields.items():
+                pipe.hincrbyfloat(_WORKER_METRICS_KEY.format(name=name), field, value)
+        pipe.execute()
+    except Exception:
+        logger.exception("Не удалось записать метрики воркера")
+        metrics.restore(deltas)
+
+
+def get_worker_metrics() -> Optional[str]:
+    try:
+        pipe = _redis_connection().pipeline(transaction=False)
+        for name in metrics.WORKER_METRICS:
+            pipe.hgetall(_WORKER_METRICS_KEY.format(name=name))
+        totals = {}
+        for name, raw in zip(metrics.WORKER_METRICS, pipe.execute()):
+            if raw:
+                totals[name] = {_decode_text(field): float(value) for field, value in raw.items()}
+        return metrics.render_totals(totals) if totals else None
+    except Exception:
+        logger.exception("Не удалось получить метрики воркера")
+        return None
+
+
+def _decode_text(raw: Any) -> str:
+    return raw.decode("utf-8") if isinstance(raw, (bytes, bytearray)) else str(raw)
+
+
 def get_worker_status() -> dict:
     """
     Возвращает статус воркера с последней ошибкой (если была).
@@ -96,4 +529,5 @@ def get_worker_status() -> dict:
     return {
         "rq_worker_online": has_active_worker(),
         "last_error": get_last_error(),
+        "sheets_cache": get_sheets_cache_stats(),
     }
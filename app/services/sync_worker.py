@@ -1,12 +1,16 @@
 from __future__ import annotations
 
 import logging
-from typing import Any, Dict, Optional
+import time
+from typing import Any, Callable, ContextManager, Dict, List, Optional, Tuple
 
 from google.auth.exceptions import RefreshError
+from rq import get_current_job
 
 from app.services.google_sync import SyncConfigurationError, TabSyncManager
-from app.services import sync_queue
+from app.services import metrics, sheet_snapshot, sync_compaction, sync_jobs, sync_queue
+from gsheets_parser import parser as sheets_parser
+from gsheets_parser import quota as sheets_quota
 
 logger = logging.getLogger(__name__)
 # RQ-воркер запускается без настроек логирования, поэтому INFO не видно.
@@ -28,7 +32,31 @@ def _resolve_config(payload: Dict[str, Any] | None) -> Optional[str]:
     return config
 
 
+def _tracked() -> ContextManager[Dict[str, Any]]:
+    """
+    Запись задачи в sync_jobs: id совпадает с id задачи RQ. Неудачная попытка,
+    после которой RQ ещё повторит задачу, не закрывает её в отставании вкладок.
+    """
+    job = get_current_job()
+    if job is None:
+        return sync_jobs.track(None)
+    return sync_jobs.track(job.id, final_attempt=not job.retries_left)
+
+
+def _final_attempt() -> bool:
+    """
+    Последняя попытка задачи: после неё RQ повторять не будет.
+    """
+    job = get_current_job()
+    return job is None or not job.retries_left
+
+
 def handle_sync_event(action: str, payload: Dict[str, Any]) -> None:
+    with _tracked() as run:
+        _handle_sync_event(action, payload, run)
+
+
+def _handle_sync_event(action: str, payload: Dict[str, Any], run: Dict[str, Any]) -> None:
     if action not in {"create", "update", "delete"}:
         logger.warning("Неизвестный тип задачи синхронизации: %s", action)
         return
@@ -42,6 +70,8 @@ def handle_sync_event(action: str, payload: Dict[str, Any]) -> None:
     if not config_name:
         return
 
+    manager: Optional[TabSyncManager] = None
+    failed = False
     try:
         manager = TabSyncManager(config_name)
         if action == "create":
@@ -51,16 +81,174 @@ def handle_sync_event(action: str, payload: Dict[str, Any]) -> None:
         else:
             manager.handle_delete(payload)
         sync_queue.clear_last_error()
+        _record_cache_stats()
     except SyncConfigurationError as exc:
         logger.warning("Синхронизация отключена: %s", exc)
+        run["detail"] = str(exc)
     except RefreshError as exc:
         message = _format_refresh_error(exc)
         logger.warning("Ошибка авторизации Google: %s", message)
         sync_queue.set_last_error(message)
+        failed = True
         raise
     except Exception:
         logger.exception("Ошибка обработки задачи синхронизации")
+        failed = True
+        raise
+    finally:
+        run["sheets_calls"] = manager.api_calls if manager else 0
+        _record_job_metrics(config_name, manager, [(action, payload)], failed)
+
+
+def handle_sync_events(config_name: str, events: List[Tuple[str, Dict[str, Any]]]) -> None:
+    """
+    Применяет список событий одного конфига без id айтема (их не к чему привязать)
+    одним снимком листа и одной парой записей.
+    """
+    if not events:
+        return
+
+    logger.info("Пачка изменений %s: %s событий", config_name, len(events))
+    with _tracked() as run:
+        _apply_events(config_name, events, run=run)
+
+
+def handle_sync_batch(config_name: str) -> None:
+    """
+    Разбирает накопленные события одного конфига: ждёт окно батча,
+    забирает события и применяет их к одному снимку листа.
+    При ошибке события возвращаются в очередь для повтора задачи.
+    """
+    with _tracked() as run:
+        window = sync_queue.batch_window_seconds()
+        if window:
+            time.sleep(window)
+
+        events = sync_queue.pop_batch_events(config_name)
+        if not events:
+            return
+
+        logger.info("Пакет синхронизации %s: %s событий", config_name, len(events))
+        _apply_events(
+            config_name,
+            events,
+            requeue=lambda batch: sync_queue.requeue_batch_events(config_name, batch, followup=_final_attempt()),
+            run=run,
+        )
+
+
+def handle_item_sync(config_name: str, item_id: int) -> None:
+    """
+    Применяет накопленные правки одного айтема. Если предыдущая задача айтема
+    уже забрала их вместе со своими, список пуст и Google не вызывается.
+    """
+    with _tracked() as run:
+        events = sync_queue.pop_item_events(config_name, item_id)
+        if not events:
+            return
+
+        _apply_events(
+            config_name,
+            events,
+            requeue=lambda batch: sync_queue.requeue_item_events(config_name, item_id, batch, followup=_final_attempt()),
+            run=run,
+        )
+
+
+def handle_items_sync(config_name: str, item_ids: List[int]) -> None:
+    """
+    Применяет накопленные правки нескольких айтемов (пачка из POST /items/bulk)
+    одним снимком листа. Правки берутся из тех же списков, что и в handle_item_sync.
+    """
+    with _tracked() as run:
+        events: List[Tuple[str, Dict[str, Any]]] = []
+        for item_id in item_ids:
+            events.extend(sync_queue.pop_item_events(config_name, item_id))
+        if not events:
+            return
+
+        logger.info("Пачка изменений %s: %s айтемов, %s событий", config_name, len(item_ids), len(events))
+        _apply_events(
+            config_name,
+            events,
+            requeue=lambda batch: sync_queue.requeue_items_events(config_name, batch, followup=_final_attempt()),
+            run=run,
+        )
+
+
+def _apply_events(
+    config_name: str,
+    events: List[Tuple[str, Dict[str, Any]]],
+    requeue: Optional[Callable[[List[Tuple[str, Dict[str, Any]]]], None]] = None,
+    run: Optional[Dict[str, Any]] = None,
+) -> None:
+    """
+    Сжимает события (sync_compaction) и применяет итог одним снимком листа.
+    requeue возвращает события в очередь, если задачу нужно повторить;
+    в run (sync_jobs.track) пишутся вызовы Sheets и причина пропуска.
+    """
+    run = run if run is not None else {}
+    compacted = sync_compaction.compact_events(events)
+    if len(compacted) < len(events):
+        logger.info("Сжатие синхронизации %s: %s событий → %s", config_name, len(events), len(compacted))
+        metrics.SYNC_EVENTS_COMPACTED.inc(len(events) - len(compacted), sync_config=config_name)
+    if not compacted:
+        # Правки взаимно погасились: лист трогать не нужно
+        run["detail"] = "Правки взаимно погасились при сжатии"
+        _record_job_metrics(config_name, None, compacted, False)
+        return
+
+    manager: Optional[TabSyncManager] = None
+    failed = False
+    try:
+        manager = TabSyncManager(config_name)
+        manager.apply_events(compacted)
+        sync_queue.clear_last_error()
+        _record_cache_stats()
+    except SyncConfigurationError as exc:
+        logger.warning("Синхронизация отключена: %s", exc)
+        run["detail"] = str(exc)
+    except RefreshError as exc:
+        message = _format_refresh_error(exc)
+        logger.warning("Ошибка авторизации Google: %s", message)
+        sync_queue.set_last_error(message)
+        if requeue is not None:
+            requeue(compacted)
+        failed = True
+        raise
+    except Exception:
+        logger.exception("Ошибка обработки пакета синхронизации %s", config_name)
+        if requeue is not None:
+            requeue(compacted)
+        failed = True
         raise
+    finally:
+        run["sheets_calls"] = manager.api_calls if manager else 0
+        _record_job_metrics(config_name, manager, compacted, failed)
+
+
+def _record_job_metrics(
+    config_name: str,
+    manager: Optional[TabSyncManager],
+    events: List[Tuple[str, Dict[str, Any]]],
+    failed: bool,
+) -> None:
+    """
+    Вызовы Sheets API на задачу и упавшие изменения по вкладкам;
+    приросты метрик воркера складываются в Redis для /metrics API.
+    """
+    metrics.SHEETS_API_CALLS_PER_JOB.observe(manager.api_calls if manager else 0, sync_config=config_name)
+    if failed:
+        for action, payload in events:
+            metrics.SYNC_JOBS_FAILED.inc(tab=metrics.tab_label(sync_queue.event_target(action, payload)))
+    sync_queue.record_worker_metrics(metrics.drain(metrics.WORKER_METRICS))
+
+
+def _record_cache_stats() -> None:
+    stats = dict(sheets_parser.get_service_cache_stats())
+    stats["snapshots"] = sheet_snapshot.get_stats()
+    stats["quota"] = sheets_quota.get_stats()
+    sync_queue.record_sheets_cache_stats(stats)
 
 
 def _format_refresh_error(exc: RefreshError) -> str:
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+from redis import Redis
+
+logger = logging.getLogger(__name__)
+
+_REDIS_KEY = "auth_user:{user_id}"
+
+
+@dataclass(frozen=True)
+class CachedUser:
+    """
+    Всё, что нужно проверке доступа: без обращения к таблице users.
+    """
+
+    id: int
+    user_name: str
+    role: str
+    is_active: bool
+    token_version: int
+
+
+def cache_ttl_seconds() -> float:
+    return max(float(os.getenv("AUTH_CACHE_TTL", "5")), 0.0)
+
+
+def shared_cache_enabled() -> bool:
+    return os.getenv("AUTH_CACHE_REDIS", "0") == "1"
+
+
+@lru_cache
+def _redis_connection() -> Redis:
+    redis_url = os.getenv("RQ_REDIS_URL", "redis://localhost:6379/0")
+    return Redis.from_url(redis_url, socket_timeout=0.2)
+
+
+# --- Кеш в памяти процесса ---
+
+_LOCK = threading.Lock()
+_USERS: Dict[int, Tuple[float, CachedUser]] = {}
+_STATS = {"hits": 0, "shared_hits": 0, "misses": 0, "invalidations": 0}
+
+
+def get_local(user_id: int) -> Optional[CachedUser]:
+    with _LOCK:
+        entry = _USERS.get(user_id)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        _STATS["hits"] += 1
+        return entry[1]
+
+
+def get_shared(user_id: int) -> Optional[CachedUser]:
+    """
+    Общий кеш в Redis (AUTH_CACHE_REDIS=1). Найденная запись кладётся и в память процесса.
+    Промах тоже считается здесь: вызывающий после него идёт в БД.
+    """
+    if shared_cache_enabled():
+        try:
+            raw = _redis_connection().get(_REDIS_KEY.format(user_id=user_id))
+        except Exception:
+            logger.warning("Redis недоступен для кеша пользователей", exc_info=True)
+            raw = None
+        if raw:
+            user = CachedUser(**json.loads(raw))
+            _store_local(user)
+            with _LOCK:
+                _STATS["shared_hits"] += 1
+            return user
+    with _LOCK:
+        _STATS["misses"] += 1
+    return None
+
+
+def _store_local(user: CachedUser) -> None:
+    ttl = cache_ttl_seconds()
+    if ttl <= 0:
+        return
+    with _LOCK:
+        _USERS[user.id] = (time.monotonic() + ttl, user)
+
+
+def put(user: CachedUser) -> None:
+    _store_local(user)
+    if not shared_cache_enabled() or cache_ttl_seconds() <= 0:
+        return
+    try:
+        _redis_connection().set(
+            _REDIS_KEY.format(user_id=user.id),
+            json.dumps(asdict(user), ensure_ascii=False),
+            px=int(cache_ttl_seconds() * 1000),
+        )
+    except Exception:
+        logger.warning("Не удалось записать пользователя в Redis-кеш", exc_info=True)
+
+
+def invalidate(user_id: int) -> None:
+    """
+    Сбрасывает запись после изменения или удаления пользователя.
+    Другие процессы без Redis увидят изменение не позже чем через AUTH_CACHE_TTL.
+    """
+    with _LOCK:
+        _USERS.pop(user_id, None)
+        _STATS["invalidations"] += 1
+    if not shared_cache_enabled():
+        return
+    try:
+        _redis_connection().delete(_REDIS_KEY.format(user_id=user_id))
+    except Exception:
+        logger.warning("Не удалось сбросить пользователя в Redis-кеше", exc_info=True)
+
+
+def get_stats() -> Dict[str, float]:
+    with _LOCK:
+        stats: Dict[str, float] = dict(_STATS)
+        stats["cached"] = len(_USERS)
+    lookups = stats["hits"] + stats["shared_hits"] + stats["misses"]
+    stats["hit_rate"] = round((stats["hits"] + stats["shared_hits"]) / lookups, 4) if lookups else 0.0
+    return stats
+
+
+def clear() -> None:
+    with _LOCK:
+        _USERS.clear()
+        for key in _STATS:
+            _STATS[key] = 0
@@ -0,0 +1,87 @@
+"""
+Быстрый JSON для тяжёлых списков (айтемы ящика, содержимое вкладки, поиск,
+история, ящики). Ответы этих маршрутов уже собраны из pydantic-моделей или
+словарей нужной формы, поэтому повторная проверка через response_model не
+нужна. Готовые модели пишет в JSON ядро pydantic (без model_dump() в словари),
+словари и строки — orjson.
+
+Включается FAST_JSON=1. Без пакета orjson (или с FAST_JSON=0) маршруты
+отвечают как раньше, через response_model и стандартный json.
+"""
+
+from __future__ import annotations
+
+import os
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Type
+
+import pydantic_core
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # orjson необязателен: без него остаётся обычный путь
+    orjson = None
+
+
+def fast_json_enabled() -> bool:
+    return orjson is not None and os.getenv("FAST_JSON", "0") == "1"
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """
+    Кириллица пишется как есть (UTF-8), datetime — в ISO 8601 с «Z» для UTC,
+    как у pydantic в режиме json.
+    """
+    if isinstance(content, BaseModel) or (isinstance(content, list) and content and isinstance(content[0], BaseModel)):
+        # Сериализатор модели на Rust быстрее, чем model_dump() и orjson поверх словарей
+        return pydantic_core.to_json(content)
+    return orjson.dumps(content, default=_default, option=orjson.OPT_UTC_Z)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+@lru_cache(maxsize=None)
+def _model_shape(model: Type[BaseModel]) -> Tuple[Tuple[str, Any], ...]:
+    shape = []
+    for name, field in model.model_fields.items():
+        shape.append((name, field.get_default(call_default_factory=True) if not field.is_required() else None))
+    return tuple(shape)
+
+
+def project(model: Type[BaseModel], rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Словари из CRUD → ровно поля model (лишние ключи отбрасываются, пропущенные
+    получают значения по умолчанию), как сделал бы response_model, но без валидации.
+    """
+    shape = _model_shape(model)
+    return [{name: row.get(name, default) for name, default in shape} for row in rows]
+
+
+def json_response(content: Any) -> JSONResponse:
+    """
+    Для маршрутов, которые сами собирают ответ (ETag и т.п.).
+    """
+    return FastJSONResponse(content) if fast_json_enabled() else JSONResponse(content)
+
+
+def respond(content: Any, model: Optional[Type[BaseModel]] = None) -> Any:
+    """
+    С FAST_JSON=1 возвращает готовый ответ (FastAPI не валидирует Response повторно),
+    иначе — content без изменений. model — схема строк-словарей списка content.
+    """
+    if not fast_json_enabled():
+        return content
+    if model is not None:
+        content = project(model, content)
+    return FastJSONResponse(content)
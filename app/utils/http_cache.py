@@ -0,0 +1,26 @@
+from typing import Optional
+
+from fastapi import Request, Response
+
+
+def make_etag(*parts) -> str:
+    return 'W/"' + "-".join(str(part) for part in parts) + '"'
+
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """
+    Возвращает 304, если клиент прислал тот же ETag в If-None-Match.
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    candidates = {value.strip() for value in header.split(",")}
+    if etag in candidates or "*" in candidates:
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    return None
+
+
+def set_etag(response: Response, etag: str) -> None:
+    # no-cache: браузер хранит ответ, но каждый раз перепроверяет его по ETag.
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
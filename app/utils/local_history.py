@@ -1,22 +1,38 @@
 from __future__ import annotations
 
+import atexit
+import csv
+import io
 import json
+import logging
 import os
+import queue
+import tempfile
+import threading
+import time
 from datetime import datetime, UTC
 from pathlib import Path
-from typing import Dict, Any
+from typing import Any, Dict, Iterable, Iterator, List, Optional
 
-from openpyxl import Workbook, load_workbook
+from openpyxl import Workbook
 from openpyxl.utils import get_column_letter
 
+from app.services import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: межпроцессная блокировка недоступна
+    fcntl = None
+
+logger = logging.getLogger(__name__)
 
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
-DEFAULT_HISTORY_PATH = Path("/app/data/issue_history.xlsx")
-HISTORY_XLSX_PATH = Path(os.getenv("HISTORY_XLSX_PATH", DEFAULT_HISTORY_PATH))
+DEFAULT_JOURNAL_PATH = Path("/app/data/issue_history.jsonl")
+HISTORY_JOURNAL_PATH = Path(os.getenv("HISTORY_JOURNAL_PATH", DEFAULT_JOURNAL_PATH))
 
 HEADERS = [
     "Дата",
-    # "Вкладка",
+    "Вкладка",
     "Ящик",
     "Айтем",
     "Количество",
@@ -26,53 +42,190 @@ HEADERS = [
     "Номер счёта",
 ]
 
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CSV_MEDIA_TYPE = "text/csv; charset=utf-8"
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
 def _format_datetime(dt: datetime) -> str:
     return f"{dt.day}.{dt.month}.{dt.year} | {dt.time().strftime('%H:%M:%S')}"
 
-def _ensure_workbook():
-    if HISTORY_XLSX_PATH.exists():
+
+def _fsync_interval() -> float:
+    return max(float(os.getenv("HISTORY_FSYNC_INTERVAL", "1")), 0.0)
+
+
+def _fsync_batch() -> int:
+    return max(int(os.getenv("HISTORY_FSYNC_BATCH", "100")), 1)
+
+
+class JournalWriter:
+    """
+    Единственный фоновый писатель журнала истории (JSONL, только дозапись).
+
+    Запросы кладут записи в очередь и не ждут диска. Поток копит пачку
+    (до batch_size записей или flush_interval секунд), пишет её одним write()
+    под flock и делает один fsync на пачку. flock защищает файл, когда
+    API запущен в нескольких процессах.
+    """
+
+    def __init__(self, path: Path, flush_interval: Optional[float] = None, batch_size: Optional[int] = None):
+        self.path = Path(path)
+        self.flush_interval = _fsync_interval() if flush_interval is None else flush_interval
+        self.batch_size = _fsync_batch() if batch_size is None else batch_size
+        self.stats = {"written": 0, "batches": 0, "errors": 0}
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, record: Dict[str, Any]) -> None:
+        self._ensure_started()
+        self._queue.put(record)
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """
+        Дожидается записи всего, что уже поставлено в очередь.
+        """
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="issue-history-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        batch: List[Dict[str, Any]] = []
+        waiters: List[threading.Event] = []
+        deadline: Optional[float] = None
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+            try:
+                entry = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                entry = None
+
+            if isinstance(entry, threading.Event):
+                waiters.append(entry)
+            elif entry is not None:
+                batch.append(entry)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            due = deadline is not None and time.monotonic() >= deadline
+            if batch and (waiters or due or len(batch) >= self.batch_size):
+                self._write(batch)
+                batch = []
+                deadline = None
+            if waiters and not batch:
+                for waiter in waiters:
+                    waiter.set()
+                waiters = []
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        payload = "".join(json.dumps(record, ensure_ascii=False, default=str) + "\n" for record in batch)
+        started = time.perf_counter()
         try:
-            return load_workbook(HISTORY_XLSX_PATH)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as handle:
+                if fcntl is not None:
+                    fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+                try:
+                    handle.write(payload)
+                    handle.flush()
+                    os.fsync(handle.fileno())
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+            self.stats["written"] += len(batch)
+            self.stats["batches"] += 1
+            metrics.HISTORY_WRITE_DURATION.observe(time.perf_counter() - started, target="journal")
         except Exception:
-            HISTORY_XLSX_PATH.unlink(missing_ok=True)
-            
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "History"
-    ws.append(HEADERS)
-    for idx in range(1, len(HEADERS) + 1):
-        ws.column_dimensions[get_column_letter(idx)].width = 20
-    return wb
+            self.stats["errors"] += 1
+            logger.exception("Не удалось записать журнал истории (%s записей)", len(batch))
+
+
+_writer = JournalWriter(HISTORY_JOURNAL_PATH)
+atexit.register(_writer.flush)
+
+
+def get_journal_writer() -> JournalWriter:
+    return _writer
 
 
 def append_issue_row(data: Dict[str, Any]):
     """
-    Добавляет запись об истории в локальный XLSX.
+    Ставит запись истории в журнал (JSONL) без ожидания диска.
     data ожидает ключи:
       created_at (datetime), tab_name, box_name, item_name, qty, status, responsible, serial, invoice
     """
-    # f"{now.day}.{now.month}.{now.year} | {now.time().strftime('%H:%M:%S')}"
     try:
-        wb = _ensure_workbook()
-        ws = wb.active
         created_at = data.get("created_at") or datetime.now(UTC)
-        # formatted_created_at = f"{created_at.date()} | {created_at.time().strftime('%H:%M:%S')}"
-        row = [
-            _format_datetime(created_at),
-            # data.get("tab_name") or "",
-            data.get("box_name") or "",
-            data.get("item_name") or "",
-            data.get("qty") or "",
-            data.get("status") or "",
-            data.get("responsible") or "",
-            data.get("serial") or "",
-            data.get("invoice") or "",
-        ]
-        ws.append(row)
-        HISTORY_XLSX_PATH.parent.mkdir(parents=True, exist_ok=True)
-        wb.save(HISTORY_XLSX_PATH)
+        record = {
+            "created_at": created_at.isoformat() if isinstance(created_at, datetime) else str(created_at),
+            "tab_name": data.get("tab_name") or "",
+            "box_name": data.get("box_name") or "",
+            "item_name": data.get("item_name") or "",
+            "qty": data.get("qty") or "",
+            "status": data.get("status") or "",
+            "responsible": data.get("responsible") or "",
+            "serial": data.get("serial") or "",
+            "invoice": data.get("invoice") or "",
+        }
+        _writer.submit(record)
     except Exception:
         # Логируем, но не блокируем основной поток
-        import logging
+        logger.exception("Не удалось поставить запись истории в журнал")
 
-        logging.getLogger(__name__).exception("Не удалось записать историю в XLSX")
+
+def write_history_xlsx(rows: Iterable[List[Any]], target) -> None:
+    """
+    Пишет XLSX в режиме write_only: строки не держатся в памяти целиком.
+    target — путь или файловый объект.
+    """
+    started = time.perf_counter()
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("History")
+    for idx in range(1, len(HEADERS) + 1):
+        ws.column_dimensions[get_column_letter(idx)].width = 20
+    ws.append(HEADERS)
+    for row in rows:
+        ws.append(row)
+    wb.save(target)
+    metrics.HISTORY_WRITE_DURATION.observe(time.perf_counter() - started, target="xlsx")
+
+
+def iter_history_xlsx(rows: Iterable[List[Any]]) -> Iterator[bytes]:
+    """
+    Отдаёт XLSX кусками. write_only держит строки во временном файле openpyxl,
+    готовый архив тоже пишется во временный файл, так что память не растёт с числом строк.
+    """
+    with tempfile.TemporaryFile() as buffer:
+        write_history_xlsx(rows, buffer)
+        buffer.seek(0)
+        while chunk := buffer.read(STREAM_CHUNK_SIZE):
+            yield chunk
+
+
+def iter_history_csv(rows: Iterable[List[Any]]) -> Iterator[bytes]:
+    """
+    Отдаёт CSV кусками по мере чтения строк. BOM нужен, чтобы Excel понял UTF-8.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")
+    writer.writerow(HEADERS)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= STREAM_CHUNK_SIZE:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
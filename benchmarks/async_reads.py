@@ -0,0 +1,155 @@
+"""
+Пропускная способность горячих GET-маршрутов при N одновременных клиентах:
+синхронные сессии в пуле потоков (DB_ASYNC_READS=0) против AsyncSession/asyncpg (DB_ASYNC_READS=1).
+
+Для каждого режима поднимается отдельный uvicorn на той же БД (DATABASE_URL),
+в БД создаётся вкладка с ящиками и айтемами, затем клиенты в течение --duration
+секунд по кругу запрашивают /tabs, /boxes/{tab}, /items/{box}, /items/search и /issues.
+
+Запуск: DATABASE_URL=postgresql://... python -m benchmarks.async_reads [--clients 200] [--duration 15]
+Async-режим требует Postgres (asyncpg); на SQLite без aiosqlite он откатится на пул потоков.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+import httpx
+
+HOT_PATHS = ("/tabs/", "/boxes/{tab_id}", "/items/{box_id}", "/items/search?query=Part&tab_id={tab_id}", "/issues/?total=none")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_server(port: int, async_reads: bool, workers: int) -> subprocess.Popen:
+    env = dict(os.environ, DB_ASYNC_READS="1" if async_reads else "0", AUTO_CREATE_TABLES="1")
+    env.setdefault("API_URL", f"http://127.0.0.1:{port}")
+    cmd = [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--workers", str(workers), "--log-level", "warning"]
+    return subprocess.Popen(cmd, env=env)
+
+
+def _wait_ready(base_url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"{base_url}/config.js", timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Сервер {base_url} не поднялся за {timeout} с")
+
+
+def _login(base_url: str, user_name: str, password: str) -> str:
+    # Первый пользователь регистрируется без токена; если он уже есть — просто логинимся.
+    httpx.post(f"{base_url}/auth/register", json={"user_name": user_name, "password": password, "role": "admin"})
+    resp = httpx.post(f"{base_url}/auth/login", json={"user_name": user_name, "password": password})
+    resp.raise_for_status()
+    return resp.json()["access_token"]
+
+
+def _seed(base_url: str, token: str, boxes: int, items_per_box: int) -> Dict[str, int]:
+    headers = {"Authorization": f"Bearer {token}"}
+    with httpx.Client(base_url=base_url, headers=headers, timeout=60.0) as client:
+        tab_id = client.post("/tabs/", json={"name": f"Bench {time.time_ns()}"}).json()["id"]
+        box_id = None
+        for box_idx in range(boxes):
+            box_id = client.post("/boxes/", json={"tab_id": tab_id, "name": f"Box {tab_id}-{box_idx}"}).json()["id"]
+            operations = [
+                {"action": "create", "item": {"name": f"Part {box_idx}-{idx}", "qty": 1, "tab_id": tab_id, "box_id": box_id}}
+                for idx in range(items_per_box)
+            ]
+            client.post("/items/bulk", json={"operations": operations}).raise_for_status()
+    return {"tab_id": tab_id, "box_id": box_id}
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+
+async def _load(base_url: str, token: str, ids: Dict[str, int], clients: int, duration: float) -> Dict[str, float]:
+    paths = [path.format(**ids) for path in HOT_PATHS]
+    latencies: List[float] = []
+    errors = 0
+    deadline = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+
+    async with httpx.AsyncClient(base_url=base_url, headers={"Authorization": f"Bearer {token}"}, limits=limits, timeout=60.0) as client:
+
+        async def worker(offset: int) -> None:
+            nonlocal errors
+            for path in itertools.islice(itertools.cycle(paths), offset, None):
+                if time.monotonic() >= deadline:
+                    return
+                started = time.perf_counter()
+                try:
+                    resp = await client.get(path)
+                    if resp.status_code >= 400:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.monotonic()
+        await asyncio.gather(*(worker(idx) for idx in range(clients)))
+        elapsed = time.monotonic() - started
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(_percentile(latencies, 50), 1),
+        "p95_ms": round(_percentile(latencies, 95), 1),
+        "p99_ms": round(_percentile(latencies, 99), 1),
+    }
+
+
+def run(clients: int = 200, duration: float = 15.0, boxes: int = 20, items_per_box: int = 50, workers: int = 1) -> List[Dict]:
+    report = []
+    ids = None
+    for async_reads in (False, True):
+        port = _free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        server = _start_server(port, async_reads, workers)
+        try:
+            _wait_ready(base_url)
+            token = _login(base_url, "bench_admin", "bench_password")
+            # Данные общие для обоих режимов: сеем один раз
+            ids = ids or _seed(base_url, token, boxes, items_per_box)
+            result = asyncio.run(_load(base_url, token, ids, clients, duration))
+            report.append({"mode": "async" if async_reads else "threadpool", **result})
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--boxes", type=int, default=20)
+    parser.add_argument("--items-per-box", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+    results = run(args.clients, args.duration, args.boxes, args.items_per_box, args.workers)
+    print(json.dumps({"clients": args.clients, "duration_s": args.duration, "results": results}, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
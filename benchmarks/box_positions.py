@@ -0,0 +1,125 @@
+"""
+Сравнение числа UPDATE при правках в большом ящике:
+старая схема (непрерывные слоты, перенумерация всего ящика) против разреженных рангов.
+
+Запуск: python -m benchmarks.box_positions [--size 500]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+from contextlib import contextmanager
+from typing import Callable, Dict, List
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker
+
+from app import models
+from app.crud import items as items_crud
+
+
+@contextmanager
+def _count_updates(engine):
+    counter = {"rows": 0}
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("UPDATE"):
+            counter["rows"] += len(parameters) if executemany else 1
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def _legacy_renumber(db: Session, box_id: int, ordered: List[models.Item] | None = None) -> None:
+    # Прежний _recalculate_box_positions: слот каждого айтема хранится в строке.
+    items = ordered or items_crud._box_order(db.query(models.Item).filter(models.Item.box_id == box_id)).all()
+    next_slot = 1
+    for item in items:
+        if item.box_rank != next_slot:
+            item.box_rank = next_slot
+        next_slot += items_crud._normalize_qty(item.qty)
+
+
+def _seed(db: Session, size: int, legacy: bool) -> int:
+    tab = models.Tab(name="Bench")
+    box = models.Box(name="Bench box", tab=tab)
+    db.add_all([tab, box])
+    db.flush()
+    slot = 1
+    for idx in range(size):
+        rank = slot if legacy else (idx + 1) * items_crud.POSITION_GAP
+        db.add(models.Item(name=f"Part {idx}", qty=2, tab_id=tab.id, box_id=box.id, box_rank=rank, tag_ids=[]))
+        slot += 2
+    db.commit()
+    return box.id
+
+
+def _box_items(db: Session, box_id: int) -> List[models.Item]:
+    return items_crud._box_order(db.query(models.Item).filter(models.Item.box_id == box_id)).all()
+
+
+def _move_last_to_front(db: Session, box_id: int, legacy: bool) -> None:
+    items = _box_items(db, box_id)
+    ordered = [items[-1]] + items[:-1]
+    if legacy:
+        _legacy_renumber(db, box_id, ordered)
+    elif not items_crud._assign_ranks_in_order(ordered):
+        _legacy_renumber(db, box_id, ordered)
+
+
+def _delete_middle(db: Session, box_id: int, legacy: bool) -> None:
+    items = _box_items(db, box_id)
+    db.delete(items[len(items) // 2])
+    db.flush()
+    if legacy:
+        _legacy_renumber(db, box_id)
+
+
+def _change_first_qty(db: Session, box_id: int, legacy: bool) -> None:
+    items = _box_items(db, box_id)
+    items[0].qty = 5
+    if legacy:
+        _legacy_renumber(db, box_id)
+
+
+SCENARIOS: Dict[str, Callable[[Session, int, bool], None]] = {
+    "move_last_to_front": _move_last_to_front,
+    "delete_middle": _delete_middle,
+    "change_first_qty": _change_first_qty,
+}
+
+
+def run(size: int = 500) -> List[Dict[str, int | str]]:
+    report = []
+    for name, scenario in SCENARIOS.items():
+        row: Dict[str, int | str] = {"scenario": name}
+        for legacy in (True, False):
+            engine = create_engine("sqlite://")
+            models.Base.metadata.create_all(engine)
+            session = sessionmaker(bind=engine, autoflush=False)()
+            try:
+                box_id = _seed(session, size, legacy)
+                with _count_updates(engine) as counter:
+                    scenario(session, box_id, legacy)
+                    session.commit()
+                row["legacy_updates" if legacy else "ranked_updates"] = counter["rows"]
+            finally:
+                session.close()
+                engine.dispose()
+        report.append(row)
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=500)
+    args = parser.parse_args()
+    print(json.dumps({"box_size": args.size, "results": run(args.size)}, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
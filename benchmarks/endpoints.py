@@ -0,0 +1,180 @@
+"""
+Время горячих эндпоинтов на синтетическом складе (benchmarks.synthetic).
+
+Приложение работает в процессе через TestClient на БД из --database-url:
+сеть не добавляет шума, и отчёты разных коммитов сравнимы между собой. Для каждого
+эндпоинта первый вызов идёт с X-SQL-Profile и даёт число SQL-запросов, затем
+--repeat вызовов меряют p50/p95/p99. Отчёт — JSON (stdout или --output).
+
+Запуск: python -m benchmarks.endpoints [--database-url sqlite:///./bench.db] [--scale 0.05] [--repeat 30] [--reseed]
+На Postgres: --database-url postgresql://... (полный объём — --scale 1).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from benchmarks.async_reads import _percentile
+from benchmarks.synthetic import ADMIN_PASSWORD, ADMIN_USER, Volume, item_name
+
+# (метод, шаблон пути, тело) — тело может зависеть от номера вызова
+Call = Tuple[str, str, Optional[Callable[[int], Dict[str, Any]]]]
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _configure_env(database_url: str) -> None:
+    # Настройки читаются при импорте app.*, поэтому задаются до него
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("API_URL", "http://bench.local")
+    os.environ.setdefault("HISTORY_JOURNAL_PATH", os.path.join(tempfile.gettempdir(), "bench_issue_history.jsonl"))
+    os.environ.setdefault("AUTO_CREATE_TABLES", "0")
+
+
+def _calls(ids: Dict[str, int]) -> Dict[str, Call]:
+    tab_id, box_id, item_id = ids["tab_id"], ids["box_id"], ids["item_id"]
+    query = item_name(item_id).split(" ")[0]
+    return {
+        "GET /tabs/": ("GET", "/tabs/", None),
+        "GET /tabs/{tab_id}/contents": ("GET", f"/tabs/{tab_id}/contents", None),
+        "GET /boxes/{tab_id}": ("GET", f"/boxes/{tab_id}", None),
+        "GET /items/{box_id}": ("GET", f"/items/{box_id}", None),
+        "GET /items/search": ("GET", f"/items/search?query={query}&tab_id={tab_id}&limit=50", None),
+        "GET /items/search?all_tabs": ("GET", f"/items/search?query={query}&all_tabs=true&limit=50", None),
+        "GET /issues/": ("GET", "/issues/", None),
+        "GET /issues/?total=none": ("GET", "/issues/?total=none", None),
+        "GET /tags/": ("GET", "/tags/", None),
+        "PUT /items/{item_id}": ("PUT", f"/items/{item_id}", lambda n: {"qty": n % 5 + 1, "box_id": box_id}),
+        "POST /items/{item_id}/issue": (
+            "POST",
+            f"/items/{ids['issue_item_id']}/issue",
+            lambda n: {"status_id": 1, "responsible_user_name": ADMIN_USER, "qty": 1},
+        ),
+        # Создание — последним: новые айтемы меняют состав ящика для reorder
+        "POST /items/reorder": ("POST", "/items/reorder", lambda n: {"box_id": box_id, "ordered_ids": ids["box_order"][n % 2]}),
+        "POST /items/": (
+            "POST",
+            "/items/",
+            lambda n: {"name": f"Bench create {n}", "qty": 1, "tab_id": tab_id, "box_id": box_id, "metadata_json": {}},
+        ),
+    }
+
+
+def _prepare_ids(client, headers: Dict[str, str], ids: Dict[str, int], repeat: int) -> Dict[str, Any]:
+    prepared: Dict[str, Any] = dict(ids)
+    # Отдельный айтем с запасом количества для выдач
+    resp = client.post(
+        "/items/",
+        headers=headers,
+        json={"name": "Bench issue stock", "qty": repeat + 10, "tab_id": ids["tab_id"], "box_id": ids["box_id"], "metadata_json": {}},
+    )
+    resp.raise_for_status()
+    prepared["issue_item_id"] = resp.json()["id"]
+    current = [item["id"] for item in client.get(f"/items/{ids['box_id']}", headers=headers).json()]
+    # Две перестановки по очереди: первый айтем в конец и обратно
+    prepared["box_order"] = (current[1:] + current[:1], current)
+    return prepared
+
+
+def _measure(client, headers: Dict[str, str], call: Call, repeat: int) -> Dict[str, Any]:
+    method, path, body = call
+
+    def send(n: int, extra: Optional[Dict[str, str]] = None):
+        resp = client.request(method, path, headers={**headers, **(extra or {})}, json=body(n) if body else None)
+        if resp.status_code >= 400:
+            raise RuntimeError(f"{method} {path}: {resp.status_code} {resp.text[:200]}")
+        return resp
+
+    profiled = send(0, {"X-SQL-Profile": "1"})
+    latencies: List[float] = []
+    for n in range(1, repeat + 1):
+        started = time.perf_counter()
+        send(n)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return {
+        "calls": repeat,
+        "queries": int(profiled.headers.get("x-query-count", -1)),
+        "n_plus_one": profiled.headers.get("x-query-n1"),
+        "p50_ms": round(_percentile(latencies, 50), 2),
+        "p95_ms": round(_percentile(latencies, 95), 2),
+        "p99_ms": round(_percentile(latencies, 99), 2),
+        "mean_ms": round(sum(latencies) / len(latencies), 2),
+    }
+
+
+def run(database_url: str, scale: float = 0.05, repeat: int = 30, reseed: bool = False, only: Optional[List[str]] = None) -> Dict[str, Any]:
+    _configure_env(database_url)
+    from fastapi.testclient import TestClient
+    from sqlalchemy import func, select
+
+    from app import database, models
+    from app.main import app
+    from benchmarks import synthetic
+
+    seeded: Dict[str, Any] = {}
+    with database.engine.connect() as conn:
+        models.Base.metadata.create_all(conn)
+        conn.commit()
+        has_data = conn.execute(select(func.count()).select_from(models.Tab)).scalar()
+    if reseed or not has_data:
+        synthetic.prepare_schema(database.engine, reset=reseed)
+        seeded = synthetic.seed(database.engine, Volume().scaled(scale))
+
+    with database.engine.connect() as conn:
+        rows = {
+            name: conn.execute(select(func.count()).select_from(model)).scalar()
+            for name, model in (("tabs", models.Tab), ("boxes", models.Box), ("items", models.Item), ("issues", models.Issue))
+        }
+
+    client = TestClient(app)
+    token = client.post("/auth/login", json={"user_name": ADMIN_USER, "password": ADMIN_PASSWORD})
+    token.raise_for_status()
+    headers = {"Authorization": f"Bearer {token.json()['access_token']}"}
+    ids = _prepare_ids(client, headers, {"tab_id": 1, "box_id": 1, "item_id": 1}, repeat)
+
+    results = {}
+    for name, call in _calls(ids).items():
+        if only and name not in only:
+            continue
+        results[name] = _measure(client, headers, call, repeat)
+
+    return {
+        "revision": _git_revision(),
+        "database": database.engine.dialect.name,
+        "rows": rows,
+        "seed": seeded or None,
+        "repeat": repeat,
+        "endpoints": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--database-url", default="sqlite:///./bench.db")
+    parser.add_argument("--scale", type=float, default=0.05, help="доля от 50 вкладок / 5k ящиков / 200k айтемов / 1M выдач")
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--reseed", action="store_true", help="пересоздать таблицы и данные")
+    parser.add_argument("--only", action="append", help="имя эндпоинта из отчёта, можно несколько раз")
+    parser.add_argument("--output", help="записать отчёт в файл")
+    args = parser.parse_args()
+    report = run(args.database_url, args.scale, args.repeat, args.reseed, args.only)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            handle.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
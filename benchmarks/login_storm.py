@@ -0,0 +1,105 @@
+"""
+Волна логинов против задержки остальных запросов.
+
+Поднимается uvicorn (один воркер), читающие клиенты по кругу дёргают /statuses/.
+Сначала задержка меряется без нагрузки, затем во время --logins одновременных
+входов (bcrypt). Пока хеширование идёт в отдельном пуле, p99 чтения должен
+оставаться примерно на уровне фона.
+
+Запуск: python -m benchmarks.login_storm [--logins 30] [--readers 10] [--duration 5]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.async_reads import _free_port, _login, _percentile, _start_server, _wait_ready
+
+READ_PATH = "/statuses/"
+USER_NAME = "storm_admin"
+PASSWORD = "storm_password"
+
+
+async def _readers(client: httpx.AsyncClient, token: str, readers: int, stop: asyncio.Event) -> List[float]:
+    latencies: List[float] = []
+
+    async def reader() -> None:
+        while not stop.is_set():
+            started = time.perf_counter()
+            await client.get(READ_PATH, headers={"Authorization": f"Bearer {token}"})
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    await asyncio.gather(*(reader() for _ in range(readers)))
+    return latencies
+
+
+async def _phase(base_url: str, token: str, readers: int, duration: float, logins: int) -> Dict[str, float]:
+    stop = asyncio.Event()
+    login_latencies: List[float] = []
+    async with httpx.AsyncClient(base_url=base_url, timeout=120.0) as client:
+
+        async def login_once() -> None:
+            started = time.perf_counter()
+            resp = await client.post("/auth/login", json={"user_name": USER_NAME, "password": PASSWORD})
+            resp.raise_for_status()
+            login_latencies.append((time.perf_counter() - started) * 1000)
+
+        async def storm() -> None:
+            deadline = time.monotonic() + duration
+            while time.monotonic() < deadline:
+                if logins:
+                    await asyncio.gather(*(login_once() for _ in range(logins)))
+                else:
+                    await asyncio.sleep(0.05)
+            stop.set()
+
+        read_latencies, _ = await asyncio.gather(_readers(client, token, readers, stop), storm())
+
+    result = {
+        "reads": len(read_latencies),
+        "read_p50_ms": round(_percentile(read_latencies, 50), 1),
+        "read_p95_ms": round(_percentile(read_latencies, 95), 1),
+        "read_p99_ms": round(_percentile(read_latencies, 99), 1),
+    }
+    if login_latencies:
+        result.update(
+            logins=len(login_latencies),
+            login_p50_ms=round(_percentile(login_latencies, 50), 1),
+            login_p99_ms=round(_percentile(login_latencies, 99), 1),
+        )
+    return result
+
+
+def run(logins: int = 30, readers: int = 10, duration: float = 5.0) -> Dict[str, Dict]:
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = _start_server(port, async_reads=False, workers=1)
+    try:
+        _wait_ready(base_url)
+        token = _login(base_url, USER_NAME, PASSWORD)
+        baseline = asyncio.run(_phase(base_url, token, readers, duration, 0))
+        during = asyncio.run(_phase(base_url, token, readers, duration, logins))
+        pool = httpx.get(f"{base_url}/system/password-pool", headers={"Authorization": f"Bearer {token}"}).json()
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return {"baseline": baseline, "login_storm": during, "password_pool": pool}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logins", type=int, default=30)
+    parser.add_argument("--readers", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=5.0)
+    args = parser.parse_args()
+    print(json.dumps(run(args.logins, args.readers, args.duration), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
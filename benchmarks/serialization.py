@@ -0,0 +1,138 @@
+"""
+Стоимость сериализации одного айтема (и записи истории) в ответе списка:
+обычный путь FastAPI (response_model → повторная проверка → json) против
+FAST_JSON (model_dump → orjson). БД не нужна: модели строятся в памяти с
+кириллическими полями, ответ кодируется так же, как в маршрутах.
+
+Запуск: python -m benchmarks.serialization [--sizes 100 1000 5000] [--repeat 20]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timedelta, UTC
+from typing import Any, Callable, Dict, List
+
+os.environ.setdefault("API_URL", "http://bench.local")
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench.db")
+os.environ.setdefault("AUTO_CREATE_TABLES", "0")
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import APIRoute, serialize_response  # noqa: E402
+
+from app import schemas  # noqa: E402
+from app.main import app  # noqa: E402
+from app.utils import fast_json  # noqa: E402
+from benchmarks.synthetic import FIELD_NAMES, item_name  # noqa: E402
+
+
+def _items(count: int) -> List[schemas.ItemRead]:
+    return [
+        schemas.ItemRead(
+            id=idx,
+            name=item_name(idx),
+            qty=idx % 5 + 1,
+            position=idx,
+            box_position=idx,
+            metadata_json={FIELD_NAMES[0]: "Kingston", FIELD_NAMES[1]: f"DDR4-{idx}", FIELD_NAMES[2]: "16", FIELD_NAMES[3]: "б/у"},
+            tag_ids=[1, 2] if idx % 10 == 0 else [],
+            serial_number=[f"SN{idx:09d}"] if idx % 3 == 0 else [],
+            tab_id=1,
+            box_id=1,
+        )
+        for idx in range(1, count + 1)
+    ]
+
+
+def _history(count: int) -> schemas.IssueHistoryResponse:
+    now = datetime.now(UTC)
+    return schemas.IssueHistoryResponse(
+        items=[
+            schemas.IssueHistoryEntry(
+                id=idx,
+                status_id=1,
+                status_name="Выдано",
+                status_color="#0d6efd",
+                responsible_user_name="склад",
+                serial_number=f"SN{idx:09d}",
+                invoice_number=f"INV-{idx:05d}",
+                item_snapshot={"item_name": item_name(idx), "tab_name": "Вкладка 1", "box_name": "Ящик 1", "qty": 1},
+                created_at=now - timedelta(minutes=idx),
+            )
+            for idx in range(1, count + 1)
+        ],
+        total=count,
+    )
+
+
+def _response_field(path: str):
+    for route in app.routes:
+        if isinstance(route, APIRoute) and route.path == path and "GET" in route.methods:
+            return route.response_field
+    raise LookupError(path)
+
+
+def _default_path(field) -> Callable[[Any], bytes]:
+    def encode(content: Any) -> bytes:
+        payload = asyncio.run(serialize_response(field=field, response_content=content))
+        return JSONResponse(payload).body
+
+    return encode
+
+
+def _fast_path(content: Any) -> bytes:
+    return fast_json.FastJSONResponse(content).body
+
+
+def _time_per_item(encode: Callable[[Any], bytes], content: Any, count: int, repeat: int) -> float:
+    encode(content)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        encode(content)
+    return (time.perf_counter() - started) / repeat / count * 1_000_000
+
+
+def run(sizes: List[int], repeat: int) -> Dict[str, Any]:
+    if fast_json.orjson is None:
+        raise SystemExit("orjson не установлен: pip install orjson")
+    cases = {
+        "GET /items/{box_id}": (_response_field("/items/{box_id}"), _items),
+        "GET /issues/": (_response_field("/issues/"), _history),
+    }
+    report: Dict[str, Any] = {}
+    for name, (field, build) in cases.items():
+        rows = []
+        for size in sizes:
+            content = build(size)
+            default_bytes = _default_path(field)(content)
+            fast_bytes = _fast_path(content)
+            assert json.loads(default_bytes) == json.loads(fast_bytes), name
+            before = _time_per_item(_default_path(field), content, size, repeat)
+            after = _time_per_item(_fast_path, content, size, repeat)
+            rows.append(
+                {
+                    "items": size,
+                    "response_model_us_per_item": round(before, 2),
+                    "fast_json_us_per_item": round(after, 2),
+                    "speedup": round(before / after, 2) if after else None,
+                    "bytes": len(fast_bytes),
+                }
+            )
+        report[name] = rows
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    print(json.dumps(run(args.sizes, args.repeat), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""
+Синтетический склад для бенчмарков: вкладки с полями, ящики, айтемы с метаданными,
+серийниками и тегами, история выдачи.
+
+Строки пишутся пачками через insert() по таблицам моделей (executemany), поэтому
+миллион выдач заливается за минуты, а не часы. Привязки тегов (tag_bindings) и снимки
+выдач заполняются так же, как их пишет приложение. Генерация детерминирована (--seed).
+
+Запуск: python -m benchmarks.synthetic --database-url sqlite:///./bench.db [--scale 0.1] [--reset]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, UTC
+from typing import Any, Dict, Iterable, Iterator, List
+
+from sqlalchemy import create_engine, func, insert, select, text
+from sqlalchemy.engine import Connection, Engine
+
+from app import models
+from app.crud.items import POSITION_GAP
+from app.services.password_hasher import pwd_context
+
+ADMIN_USER = "bench_admin"
+ADMIN_PASSWORD = "bench_password"
+
+PART_KINDS = ("DDR4", "DDR5", "SSD", "HDD", "CPU", "GPU", "PSU", "NIC", "RAID", "Кабель")
+VENDORS = ("Kingston", "Samsung", "Intel", "AMD", "Seagate", "WD", "Crucial", "Supermicro")
+FIELD_NAMES = ("Производитель", "Модель", "Объём", "Состояние")
+STATUSES = (("Выдано", "#0d6efd"), ("Списано", "#dc3545"), ("В ремонте", "#ffc107"), ("Возврат", "#198754"))
+
+
+@dataclass
+class Volume:
+    tabs: int = 50
+    boxes: int = 5_000
+    items: int = 200_000
+    issues: int = 1_000_000
+    tags: int = 200
+    tagged_share: float = 0.1
+    serial_share: float = 0.3
+
+    def scaled(self, factor: float) -> "Volume":
+        if factor == 1:
+            return self
+        return Volume(
+            tabs=max(int(self.tabs * factor), 1),
+            boxes=max(int(self.boxes * factor), 1),
+            items=max(int(self.items * factor), 1),
+            issues=int(self.issues * factor),
+            tags=max(int(self.tags * factor), 1),
+            tagged_share=self.tagged_share,
+            serial_share=self.serial_share,
+        )
+
+
+def item_name(item_id: int) -> str:
+    kind = PART_KINDS[item_id % len(PART_KINDS)]
+    vendor = VENDORS[(item_id // len(PART_KINDS)) % len(VENDORS)]
+    return f"{kind} {vendor} {item_id}"
+
+
+def _chunks(rows: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    chunk: List[Dict[str, Any]] = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _insert(conn: Connection, model, rows: Iterable[Dict[str, Any]], chunk_size: int) -> int:
+    total = 0
+    for chunk in _chunks(rows, chunk_size):
+        conn.execute(insert(model), chunk)
+        total += len(chunk)
+    return total
+
+
+def _reset_sequences(conn: Connection) -> None:
+    # Идентификаторы заданы явно: в Postgres сдвигаем последовательности за максимум
+    for table in ("tabs", "tab_fields", "boxes", "items", "tags", "statuses", "users", "issues", "item_utilized"):
+        conn.execute(
+            text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE((SELECT MAX(id) FROM {table}), 1))")
+        )
+
+
+def prepare_schema(engine: Engine, reset: bool = False) -> None:
+    if reset:
+        models.Base.metadata.drop_all(engine)
+    models.Base.metadata.create_all(engine)
+    with engine.connect() as conn:
+        if conn.execute(select(func.count()).select_from(models.Tab)).scalar():
+            raise RuntimeError("В БД уже есть вкладки: укажите пустую БД или --reset")
+
+
+def seed(engine: Engine, volume: Volume, rng_seed: int = 0, chunk_size: int = 10_000) -> Dict[str, Any]:
+    """
+    Заполняет пустую БД. Возвращает объёмы, время заливки и id, удобные для запросов.
+    """
+    rng = random.Random(rng_seed)
+    started = time.perf_counter()
+    counts: Dict[str, int] = {}
+
+    tab_fields: Dict[int, List[str]] = {}
+    field_rows = []
+    field_id = 0
+    for tab_id in range(1, volume.tabs + 1):
+        keys = []
+        for name in FIELD_NAMES:
+            field_id += 1
+            key = f"bench-{tab_id}-{field_id}"
+            keys.append(key)
+            field_rows.append({"id": field_id, "tab_id": tab_id, "name": name, "stable_key": key, "strong": False})
+        tab_fields[tab_id] = keys
+
+    box_tab = {box_id: (box_id - 1) % volume.tabs + 1 for box_id in range(1, volume.boxes + 1)}
+    tag_ids = list(range(1, volume.tags + 1))
+
+    def item_rows() -> Iterator[Dict[str, Any]]:
+        box_ranks: Dict[int, int] = {}
+        for item_id in range(1, volume.items + 1):
+            # Айтемы идут подряд по ящикам: ящик получает примерно items/boxes айтемов
+            box_id = (item_id - 1) * volume.boxes // volume.items + 1
+            tab_id = box_tab[box_id]
+            box_ranks[box_id] = box_ranks.get(box_id, 0) + POSITION_GAP
+            name = item_name(item_id)
+            kind, vendor, _ = name.rsplit(" ", 2)
+            keys = tab_fields[tab_id]
+            tags = rng.sample(tag_ids, k=min(rng.randint(1, 2), len(tag_ids))) if rng.random() < volume.tagged_share else []
+            yield {
+                "id": item_id,
+                "name": name,
+                "qty": rng.randint(1, 5),
+                "box_rank": box_ranks[box_id],
+                "metadata_json": {
+                    keys[0]: vendor,
+                    keys[1]: f"{kind}-{rng.randint(100, 999)}",
+                    keys[2]: f"{rng.choice((8, 16, 32, 64, 512, 1024))}",
+                    keys[3]: rng.choice(("новый", "б/у", "неисправен")),
+                },
+                "serial_number": f"SN{item_id:09d}" if rng.random() < volume.serial_share else None,
+                "tab_id": tab_id,
+                "box_id": box_id,
+                "tag_ids": tags,
+            }
+
+    item_tags: List[Dict[str, Any]] = []
+
+    def tracked_items() -> Iterator[Dict[str, Any]]:
+        for row in item_rows():
+            for tag_id in row["tag_ids"]:
+                item_tags.append({"tag_id": tag_id, "entity_type": "item", "entity_id": row["id"]})
+            yield row
+
+    now = datetime.now(UTC)
+    span_seconds = 2 * 365 * 24 * 3600
+
+    def issue_rows() -> Iterator[Dict[str, Any]]:
+        for issue_id in range(1, volume.issues + 1):
+            # Старые выдачи — с меньшими id, как при обычной работе
+            offset = span_seconds * (volume.issues - issue_id) // max(volume.issues, 1)
+            yield {"id": issue_id, "status_id": rng.randint(1, len(STATUSES)), "created_at": now - timedelta(seconds=offset)}
+
+    def utilized_rows() -> Iterator[Dict[str, Any]]:
+        for issue_id in range(1, volume.issues + 1):
+            item_id = rng.randint(1, volume.items)
+            box_id = (item_id - 1) * volume.boxes // volume.items + 1
+            snapshot = {
+                "item_name": item_name(item_id),
+                "tab_name": f"Вкладка {box_tab[box_id]}",
+                "box_name": f"Ящик {box_id}",
+                "qty": 1,
+            }
+            yield {
+                "id": issue_id,
+                "issue_id": issue_id,
+                "item_snapshot": json.dumps(snapshot, ensure_ascii=False),
+                **snapshot,
+                "serial_number": f"SN{item_id:09d}" if rng.random() < volume.serial_share else None,
+                "invoice_number": f"INV-{issue_id % 5000:05d}",
+                "responsible_user_id": 1,
+            }
+
+    with engine.begin() as conn:
+        counts["users"] = _insert(
+            conn,
+            models.User,
+            [{"id": 1, "user_name": ADMIN_USER, "hashed_password": pwd_context.hash(ADMIN_PASSWORD), "role": "admin", "is_active": True, "token_version": 0}],
+            chunk_size,
+        )
+        counts["statuses"] = _insert(
+            conn, models.Status, ({"id": idx, "name": name, "color": color} for idx, (name, color) in enumerate(STATUSES, 1)), chunk_size
+        )
+        counts["tabs"] = _insert(
+            conn,
+            models.Tab,
+            ({"id": tab_id, "name": f"Вкладка {tab_id}", "enable_pos": True, "enable_sync": False, "tag_ids": []} for tab_id in tab_fields),
+            chunk_size,
+        )
+        counts["tab_fields"] = _insert(conn, models.TabField, field_rows, chunk_size)
+        counts["boxes"] = _insert(
+            conn,
+            models.Box,
+            ({"id": box_id, "name": f"Ящик {box_id}", "tab_id": tab_id, "tag_ids": []} for box_id, tab_id in box_tab.items()),
+            chunk_size,
+        )
+        counts["tags"] = _insert(
+            conn, models.Tag, ({"id": tag_id, "name": f"Тег {tag_id}", "color": "#cccccc"} for tag_id in tag_ids), chunk_size
+        )
+        counts["items"] = _insert(conn, models.Item, tracked_items(), chunk_size)
+        counts["tag_bindings"] = _insert(conn, models.TagBinding, item_tags, chunk_size)
+        counts["issues"] = _insert(conn, models.Issue, issue_rows(), chunk_size)
+        counts["item_utilized"] = _insert(conn, models.ItemUtilized, utilized_rows(), chunk_size)
+        if conn.dialect.name == "postgresql":
+            _reset_sequences(conn)
+            conn.execute(text("ANALYZE"))
+
+    return {
+        "volume": asdict(volume),
+        "rows": counts,
+        "seed_seconds": round(time.perf_counter() - started, 2),
+        "ids": {"tab_id": 1, "box_id": 1, "item_id": 1},
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--database-url", default="sqlite:///./bench.db")
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--reset", action="store_true", help="удалить и создать таблицы заново")
+    args = parser.parse_args()
+    engine = create_engine(args.database_url)
+    try:
+        prepare_schema(engine, reset=args.reset)
+        print(json.dumps(seed(engine, Volume().scaled(args.scale), args.seed), ensure_ascii=False, indent=2))
+    finally:
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -53,6 +53,15 @@ export async function fetchSyncWorkerStatus() {
   return await res.json();
 }
 
+// Фоновый опрос: без глобального индикатора загрузки
+export async function fetchSyncJobs(jobIds = []) {
+  const params = new URLSearchParams();
+  jobIds.forEach((jobId) => params.append("job_id", jobId));
+  const res = await fetch(`${API_URL}/system/sync-jobs?${params}`, { headers: buildHeaders() });
+  if (!res.ok) throw new Error("Не удалось получить статус задач синхронизации");
+  return await res.json();
+}
+
 // ---- Tabs ----
 export async function fetchTabs() {
   const res = await authFetch(`${API_URL}/tabs`);
@@ -174,6 +183,91 @@ export async function getBoxes(tabId) {
   return await res.json();
 }
 
+// Все ящики и айтемы вкладки одним запросом, колонками: { fields, boxes: {columns, rows}, items: {columns, rows} }
+export async function getTabContents(tabId, boxIds = null) {
+  const params = new URLSearchParams();
+  (boxIds || []).forEach((id) => params.append("box_ids", id));
+  const query = params.toString();
+  const res = await authFetch(`${API_URL}/tabs/${tabId}/contents${query ? `?${query}` : ""}`);
+  if (!res.ok) throw new Error("Не удалось загрузить содержимое вкладки");
+  return await res.json();
+}
+
+// Колоночный ответ getTabContents -> { boxes, itemsByBox } в форме ответов /boxes и /items
+export function unpackTabContents(contents) {
+  const toObjects = ({ columns = [], rows = [] } = {}) =>
+    rows.map((row) => Object.fromEntries(columns.map((column, index) => [column, row[index]])));
+  const fields = contents?.fields || [];
+  const boxes = toObjects(contents?.boxes);
+  const itemsByBox = Object.fromEntries(boxes.map((box) => [box.id, []]));
+  toObjects(contents?.items).forEach(({ metadata, ...item }) => {
+    const metadata_json = {};
+    (metadata || []).forEach((value, index) => {
+      if (value !== null && value !== undefined) metadata_json[fields[index]] = value;
+    });
+    (itemsByBox[item.box_id] ||= []).push({ ...item, position: item.box_position, metadata_json });
+  });
+  return { boxes, itemsByBox };
+}
+
+// Живые дельты вкладки (SSE). EventSource не умеет заголовок Authorization,
+// поэтому поток читается через fetch; после обрыва — переподключение с Last-Event-ID.
+// onEvent(type, data); тип "reset" — данные нужно перечитать целиком. Возвращает функцию отписки.
+export function subscribeChanges(tabId, onEvent) {
+  const controller = new AbortController();
+  let lastEventId = null;
+  let retryMs = 3000;
+
+  const handleBlock = (block) => {
+    let type = "message";
+    const data = [];
+    block.split("\n").forEach((line) => {
+      if (line.startsWith(":")) return;
+      const sep = line.indexOf(":");
+      const field = sep === -1 ? line : line.slice(0, sep);
+      const value = sep === -1 ? "" : line.slice(sep + 1).replace(/^ /, "");
+      if (field === "id") lastEventId = value;
+      else if (field === "event") type = value;
+      else if (field === "data") data.push(value);
+      else if (field === "retry" && Number(value) > 0) retryMs = Number(value);
+    });
+    if (!data.length) return;
+    try {
+      onEvent(type, JSON.parse(data.join("\n")));
+    } catch (err) {
+      console.warn("Событие ленты не обработано", err);
+    }
+  };
+
+  const connect = async () => {
+    while (!controller.signal.aborted) {
+      try {
+        const headers = buildHeaders(lastEventId ? { "Last-Event-ID": lastEventId } : {});
+        const res = await fetch(`${API_URL}/events?tab_id=${tabId}`, { headers, signal: controller.signal });
+        if (!res.ok || !res.body) throw new Error(`events: ${res.status}`);
+        const reader = res.body.pipeThrough(new TextDecoderStream()).getReader();
+        let buffer = "";
+        for (;;) {
+          const { value, done } = await reader.read();
+          if (done) break;
+          buffer += value.replace(/\r\n?/g, "\n");
+          let end;
+          while ((end = buffer.indexOf("\n\n")) !== -1) {
+            handleBlock(buffer.slice(0, end));
+            buffer = buffer.slice(end + 2);
+          }
+        }
+      } catch (err) {
+        if (controller.signal.aborted) return;
+      }
+      await new Promise((resolve) => setTimeout(resolve, retryMs));
+    }
+  };
+
+  connect();
+  return () => controller.abort();
+}
+
 export async function createBox(tabId, name, description, capacity = null) {
   const res = await authFetch(`${API_URL}/boxes`, {
     method: "POST",
@@ -584,11 +678,18 @@ export async function fetchIssues(filters = {}) {
   return { items, total };
 }
 
-export async function downloadIssuesXlsx() {
-  const res = await authFetch(`${API_URL}/issues/export`, { method: "GET" });
-  if (res.status === 404) {
-    throw new Error("Файл истории ещё не создан");
-  }
+export async function downloadIssuesXlsx(filters = {}, format = "xlsx") {
+  const params = new URLSearchParams({ format });
+  if (filters.status_id) params.set("status_id", String(filters.status_id));
+  if (filters.responsible) params.set("responsible", filters.responsible);
+  if (filters.serial) params.set("serial", filters.serial);
+  if (filters.invoice) params.set("invoice", filters.invoice);
+  if (filters.item) params.set("item", filters.item);
+  if (filters.tab) params.set("tab", filters.tab);
+  if (filters.box) params.set("box", filters.box);
+  if (filters.created_from) params.set("created_from", filters.created_from);
+  if (filters.created_to) params.set("created_to", filters.created_to);
+  const res = await authFetch(`${API_URL}/issues/export?${params.toString()}`, { method: "GET" });
   if (!res.ok) {
     const text = await res.text();
     throw new Error(text || "Не удалось скачать историю");
@@ -210,7 +210,7 @@ export async function bootstrapHistoryPage() {
     if (!downloadBtn) return;
     downloadBtn.setAttribute("disabled", "disabled");
     try {
-      const blob = await downloadIssuesXlsx();
+      const blob = await downloadIssuesXlsx(state.filters || {});
       const url = window.URL.createObjectURL(blob);
       const link = document.createElement("a");
       link.href = url;
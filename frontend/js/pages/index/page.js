@@ -1,5 +1,5 @@
 import { showTopAlert } from "../../common/alerts.js";
-import { fetchTabs, getBoxes, getItemsByBox, getTabFields } from "../../api.js";
+import { fetchTabs, getTabContents, getTabFields, unpackTabContents } from "../../api.js";
 import { escapeHtml } from "../../common/dom.js";
 import { renderTagFillCell } from "../../common/tagTemplates.js";
 import { setupFieldControls } from "./fields.js";
@@ -244,9 +244,13 @@ async function renderAdvancedMode(state, tagManager) {
     contentEl.appendChild(pane);
 
     let boxes = [];
+    let itemsByBox = {};
     let tabFields = [];
     try {
-      [boxes, tabFields] = await Promise.all([getBoxes(tab.id), getTabFields(tab.id)]);
+      // Ящики и айтемы вкладки одним запросом вместо /items/{box_id} на каждый ящик
+      const [contents, fields] = await Promise.all([getTabContents(tab.id), getTabFields(tab.id)]);
+      ({ boxes, itemsByBox } = unpackTabContents(contents));
+      tabFields = fields;
     } catch (err) {
       console.error("Не удалось получить ящики вкладки", tab.id, err);
       pane.innerHTML = `<div class="text-danger small">Не удалось загрузить ящики вкладки</div>`;
@@ -255,16 +259,6 @@ async function renderAdvancedMode(state, tagManager) {
       continue;
     }
 
-    const itemsByBox = {};
-    for (const box of boxes) {
-      try {
-        itemsByBox[box.id] = (await getItemsByBox(box.id)) || [];
-      } catch (err) {
-        console.error("Не удалось загрузить айтемы ящика", box.id, err);
-        itemsByBox[box.id] = [];
-      }
-    }
-
     if (!boxes.length) {
       pane.innerHTML = `<div class="text-muted">Ящиков нет</div>`;
     } else {
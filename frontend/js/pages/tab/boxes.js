@@ -11,6 +11,8 @@ import {
   addItem,
   updateBox as updateBoxApi,
   deleteBox as deleteBoxApi,
+  fetchSyncJobs,
+  subscribeChanges,
 } from "../../api.js";
 import { showTopAlert, showBottomToast } from "../../common/alerts.js";
 import { escapeHtml } from "../../common/dom.js";
@@ -210,6 +212,9 @@ export function createBoxesController(state, elements) {
     async openSearchFilters() {
       await filtersController?.open();
     },
+    subscribeChanges() {
+      return subscribeTabChanges(state, () => tagManagerApi);
+    },
   };
 }
 
@@ -398,9 +403,10 @@ async function renderBoxes(state, tagManagerApi, options = {}) {
 }
 
 async function openBoxModal(state, tagManagerApi, boxId, highlightItems = null, options = {}) {
-  const { refreshOnly = false } = options || {};
+  const { refreshOnly = false, items: knownItems = null } = options || {};
   state.currentBoxViewBoxId = Number(boxId);
-  const items = await getItemsByBox(boxId);
+  const items = Array.isArray(knownItems) ? knownItems : await getItemsByBox(boxId);
+  state.currentBoxItems = items;
   const content = document.getElementById("boxViewContent");
   const normalizedBoxId = Number(boxId);
   const fallbackTabId = items[0]?.tab_id ?? state.tabId;
@@ -720,6 +726,129 @@ async function openBoxModal(state, tagManagerApi, boxId, highlightItems = null,
   modal.show();
 }
 
+// Дельты ленты изменений применяются к state; перерисовка откладывается, чтобы пачка
+// событий (bulk, box.counts после каждого айтема) давала одну отрисовку.
+function subscribeTabChanges(state, getTagManagerApi) {
+  const pending = { boxes: false, modal: false, reload: false };
+  let scheduled = false;
+
+  const flush = async () => {
+    scheduled = false;
+    const { boxes, modal, reload } = pending;
+    pending.boxes = pending.modal = pending.reload = false;
+    const tagManagerApi = getTagManagerApi();
+    try {
+      if (reload || boxes) {
+        await renderBoxes(state, tagManagerApi, { skipFetch: !reload });
+      }
+      if ((reload || modal) && isBoxModalOpen(state)) {
+        await openBoxModal(state, tagManagerApi, state.currentBoxViewBoxId, null, {
+          refreshOnly: true,
+          items: reload ? null : state.currentBoxItems,
+        });
+      }
+    } catch (err) {
+      console.warn("Не удалось применить изменения вкладки", err);
+    }
+  };
+
+  const schedule = (key) => {
+    pending[key] = true;
+    if (scheduled) return;
+    scheduled = true;
+    setTimeout(flush, 0);
+  };
+
+  return subscribeChanges(state.tabId, (type, data) => {
+    if (type === "reset") {
+      schedule("reload");
+      return;
+    }
+    if (type.startsWith("box")) {
+      if (applyBoxEvent(state, type, data)) schedule("boxes");
+      return;
+    }
+    if (type.startsWith("item")) {
+      if (applyItemEvent(state, type, data)) schedule("modal");
+      return;
+    }
+    if (type.startsWith("tag")) {
+      state.tagStore
+        .refresh(true)
+        .catch((err) => console.warn("Не удалось обновить кэш тэгов", err))
+        .then(() => {
+          schedule("boxes");
+          schedule("modal");
+        });
+    }
+  });
+}
+
+function isBoxModalOpen(state) {
+  const modalEl = state.ui.boxViewModalEl || document.getElementById("boxViewModal");
+  return Boolean(modalEl?.classList.contains("show") && state.currentBoxViewBoxId);
+}
+
+function applyBoxEvent(state, type, data) {
+  const boxes = Array.isArray(state.boxesData) ? state.boxesData : [];
+  if (type === "box.counts") {
+    const counts = new Map((data.boxes || []).map((entry) => [Number(entry.id), entry.items_count]));
+    state.boxesData = boxes.map((box) =>
+      counts.has(Number(box.id)) ? { ...box, items_count: counts.get(Number(box.id)) } : box
+    );
+    return true;
+  }
+  const incoming = data.box || {};
+  const boxId = Number(incoming.id);
+  if (type === "box.deleted") {
+    state.boxesData = boxes.filter((box) => Number(box.id) !== boxId);
+    return true;
+  }
+  const index = boxes.findIndex((box) => Number(box.id) === boxId);
+  if (index === -1) {
+    state.boxesData = [...boxes, { items_count: 0, ...incoming }];
+  } else {
+    // items_count в box.* не приходит — его обновляет box.counts
+    state.boxesData = boxes.map((box, i) => (i === index ? { ...box, ...incoming } : box));
+  }
+  return true;
+}
+
+function applyItemEvent(state, type, data) {
+  const boxId = Number(state.currentBoxViewBoxId);
+  if (!boxId || !isBoxModalOpen(state)) return false;
+  let items = Array.isArray(state.currentBoxItems) ? [...state.currentBoxItems] : [];
+
+  if (type === "items.reordered") {
+    if (Number(data.box_id) !== boxId) return false;
+    const order = new Map((data.ordered_ids || []).map((id, index) => [Number(id), index]));
+    items.sort((a, b) => (order.get(Number(a.id)) ?? order.size) - (order.get(Number(b.id)) ?? order.size));
+  } else {
+    const item = data.item || {};
+    const itemId = Number(item.id);
+    const index = items.findIndex((entry) => Number(entry.id) === itemId);
+    if (index === -1 && Number(item.box_id) !== boxId) return false;
+    if (type === "item.deleted" || Number(item.box_id) !== boxId) {
+      items = items.filter((entry) => Number(entry.id) !== itemId);
+    } else if (index !== -1) {
+      items[index] = item;
+    } else {
+      const insertAt = items.findIndex((entry) => Number(entry.box_position) >= Number(item.box_position));
+      items.splice(insertAt === -1 ? items.length : insertAt, 0, item);
+    }
+  }
+
+  // Позиции соседей в дельте не приходят: пересчитываем слоты так же, как сервер (qty < 1 занимает один слот)
+  let slot = 1;
+  state.currentBoxItems = items.map((entry) => {
+    const positioned = { ...entry, box_position: slot, position: slot };
+    const qty = Number(entry.qty);
+    slot += Number.isFinite(qty) && qty > 0 ? qty : 1;
+    return positioned;
+  });
+  return true;
+}
+
 function enableItemReorder(state, tagManagerApi, container, boxId) {
   const tbody = container.querySelector("tbody");
   if (!tbody) return;
@@ -1422,18 +1551,59 @@ function announceSyncEvent(state, action, box, itemName, syncResult = null) {
     showTopAlert(detail || "Не удалось синхронизировать изменения с Google Sheets", "danger", 8000);
     return;
   }
-  if (status === "success") {
+  if (status === "success" || status === "queued") {
     const message = detail || null;
     if (message) {
-      showBottomToast(message, { title: "Синхронизация", delay: 6000 });
+      const title = status === "queued" ? "Синхронизация: в очереди" : "Синхронизация";
+      showBottomToast(message, { title, delay: 6000 });
     } else {
       notifySheetEvent(action, box, itemName);
     }
+    if (status === "queued") {
+      watchSyncJobs(syncResult.job_ids || [], detail);
+    }
     return;
   }
   notifySheetEvent(action, box, itemName);
 }
 
+const SYNC_JOB_POLL_DELAYS_MS = [2000, 4000, 8000, 15000, 30000];
+// Пока сервер не прислал max_wait: 4 попытки по RQ_DEFAULT_TIMEOUT (90 с) и паузы повторов 5 + 15 + 30 с
+const SYNC_JOB_DEFAULT_MAX_WAIT_MS = 410000;
+
+// Задача в очереди ещё может упасть: опрашиваем статус, пока каждая задача не завершится,
+// но не дольше, чем задача может жить с учётом повторов (max_wait из /system/sync-jobs)
+async function watchSyncJobs(jobIds, detail) {
+  let pending = jobIds.filter(Boolean);
+  const startedAt = Date.now();
+  let deadline = startedAt + SYNC_JOB_DEFAULT_MAX_WAIT_MS;
+  let attempt = 0;
+  while (pending.length && Date.now() < deadline) {
+    const delay = SYNC_JOB_POLL_DELAYS_MS[Math.min(attempt, SYNC_JOB_POLL_DELAYS_MS.length - 1)];
+    attempt += 1;
+    await new Promise((resolve) => setTimeout(resolve, delay));
+    let data;
+    try {
+      data = await fetchSyncJobs(pending);
+    } catch (err) {
+      continue;
+    }
+    if (Number.isFinite(data?.max_wait)) {
+      deadline = startedAt + data.max_wait * 1000;
+    }
+    const jobs = Array.isArray(data?.jobs) ? data.jobs : [];
+    const failed = jobs.find((job) => job.status === "failed");
+    if (failed) {
+      const reason = failed.detail ? `: ${failed.detail}` : "";
+      showTopAlert(`Не удалось синхронизировать ${detail || "изменения"} с Google Sheets${reason}`, "danger", 8000);
+      return;
+    }
+    // Задачи без записи (истёк SYNC_JOB_TTL) тоже больше не ждём
+    const active = new Set(jobs.filter((job) => job.status !== "succeeded").map((job) => job.id));
+    pending = pending.filter((jobId) => active.has(jobId));
+  }
+}
+
 function notifySheetEvent(action, box, itemName) {
   if (!action) return;
   const boxLabel = box?.name || (box?.id ? `Ящик #${box.id}` : "Ящик");
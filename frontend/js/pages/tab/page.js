@@ -45,6 +45,8 @@ export async function bootstrapTabPage() {
   }
   tagManager.renderPills();
   await boxesController.renderBoxes();
+  const unsubscribe = boxesController.subscribeChanges();
+  window.addEventListener("pagehide", unsubscribe, { once: true });
 }
 
 async function initializeTabMeta(state) {
@@ -11,6 +11,7 @@ export function createTabState(tabId) {
     boxesData: [],
     latestTabsSnapshot: [],
     currentBoxViewBoxId: null,
+    currentBoxItems: [],
     currentTabEnablePos: true,
     currentTabFields: [],
     isDescriptionFull: false,
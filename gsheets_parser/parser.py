@@ -1,11 +1,15 @@
+import hashlib
 import json
 import os
-from typing import Any, Dict, Union, Optional
+import threading
+from typing import Any, Dict, Union, Optional, Tuple
 
 import pandas as pd
 from google.oauth2.service_account import Credentials
 from googleapiclient.discovery import build
 
+from gsheets_parser import quota
+
 
 SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
 
@@ -29,9 +33,97 @@ def _load_credentials(creds_source: Union[str, Dict[str, Any], Credentials]) ->
     raise TypeError("Unsupported credentials source type")
 
 
-def build_sheets_service(creds_source: Union[str, Dict[str, Any], Credentials]):
+####################################
+# SERVICE CACHE
+####################################
+
+# Учётки общие для процесса: токен обновляется один раз и переиспользуется всеми задачами.
+# Воркер синхронизации должен быть rq.SimpleWorker: у rq.Worker каждая задача в новом fork и кеш пуст.
+# Объект сервиса (httplib2) не потокобезопасен, поэтому сервисы кешируются по потокам.
+_CACHE_LOCK = threading.Lock()
+_CREDENTIALS_POOL: Dict[str, Tuple[Any, Credentials]] = {}
+_SERVICE_LOCAL = threading.local()
+_CACHE_STATS = {
+    "credentials_hits": 0,
+    "credentials_misses": 0,
+    "service_hits": 0,
+    "service_misses": 0,
+}
+
+
+def _credentials_cache_key(creds_source) -> Optional[Tuple[str, Any]]:
+    """
+    Возвращает (идентификатор, версия) источника учёток.
+    Для файла версия — mtime и размер, чтобы замена credentials.json сбрасывала кеш.
+    """
+    if isinstance(creds_source, dict):
+        raw = json.dumps(creds_source, sort_keys=True, ensure_ascii=False)
+        return f"info:{hashlib.sha256(raw.encode('utf-8')).hexdigest()}", None
+    if isinstance(creds_source, str):
+        if os.path.isfile(creds_source):
+            stat = os.stat(creds_source)
+            return os.path.abspath(creds_source), (stat.st_mtime_ns, stat.st_size)
+        return f"info:{hashlib.sha256(creds_source.encode('utf-8')).hexdigest()}", None
+    return None
+
+
+def get_credentials(creds_source: Union[str, Dict[str, Any], Credentials]) -> Credentials:
+    key = _credentials_cache_key(creds_source)
+    if key is None:
+        return _load_credentials(creds_source)
+
+    identity, version = key
+    with _CACHE_LOCK:
+        entry = _CREDENTIALS_POOL.get(identity)
+        if entry is not None and entry[0] == version:
+            _CACHE_STATS["credentials_hits"] += 1
+            return entry[1]
+
     creds = _load_credentials(creds_source)
-    return build("sheets", "v4", credentials=creds, cache_discovery=False)
+    with _CACHE_LOCK:
+        _CREDENTIALS_POOL[identity] = (version, creds)
+        _CACHE_STATS["credentials_misses"] += 1
+    return creds
+
+
+def build_sheets_service(creds_source: Union[str, Dict[str, Any], Credentials]):
+    key = _credentials_cache_key(creds_source)
+    if key is None:
+        creds = _load_credentials(creds_source)
+        return build("sheets", "v4", credentials=creds, cache_discovery=False)
+
+    identity, _ = key
+    creds = get_credentials(creds_source)
+    services = getattr(_SERVICE_LOCAL, "services", None)
+    if services is None:
+        services = _SERVICE_LOCAL.services = {}
+
+    cached = services.get(identity)
+    if cached is not None and cached[0] is creds:
+        with _CACHE_LOCK:
+            _CACHE_STATS["service_hits"] += 1
+        return cached[1]
+
+    service = build("sheets", "v4", credentials=creds, cache_discovery=False)
+    services[identity] = (creds, service)
+    with _CACHE_LOCK:
+        _CACHE_STATS["service_misses"] += 1
+    return service
+
+
+def get_service_cache_stats() -> Dict[str, int]:
+    with _CACHE_LOCK:
+        stats = dict(_CACHE_STATS)
+        stats["credentials_cached"] = len(_CREDENTIALS_POOL)
+    return stats
+
+
+def clear_service_cache() -> None:
+    with _CACHE_LOCK:
+        _CREDENTIALS_POOL.clear()
+        for key in _CACHE_STATS:
+            _CACHE_STATS[key] = 0
+    _SERVICE_LOCAL.services = {}
 
 
 def _dedupe_box_name(name: str, seen: Dict[str, int]) -> tuple[str, bool]:
@@ -62,12 +154,15 @@ def _update_sheet_cell(service, spreadsheet_id: str, worksheet_name: str, column
     cell_range = f"'{worksheet_name}'!{column_letter}{row_number}"
     body = {"values": [[value]]}
     try:
-        service.spreadsheets().values().update(
-            spreadsheetId=spreadsheet_id,
-            range=cell_range,
-            valueInputOption="USER_ENTERED",
-            body=body,
-        ).execute()
+        quota.execute(
+            service.spreadsheets().values().update(
+                spreadsheetId=spreadsheet_id,
+                range=cell_range,
+                valueInputOption="USER_ENTERED",
+                body=body,
+            ),
+            "values.update",
+        )
     except Exception:
         # Не прерываем парсер из-за ошибки обновления таблицы
         print(f"Failed to update duplicate box name at {cell_range}")
@@ -81,10 +176,13 @@ def get_data_validation_values(spreadsheet_id, range_name, sheet_name, creds_sou
     service = service or build_sheets_service(creds_source)
 
     # 1. Определяем sheetId вкладки по имени
-    metadata = service.spreadsheets().get(
-        spreadsheetId=spreadsheet_id,
-        fields="sheets.properties"
-    ).execute()
+    metadata = quota.execute(
+        service.spreadsheets().get(
+            spreadsheetId=spreadsheet_id,
+            fields="sheets.properties"
+        ),
+        "spreadsheets.get",
+    )
 
     target_sheet_id = None
     for sh in metadata["sheets"]:
@@ -97,11 +195,14 @@ def get_data_validation_values(spreadsheet_id, range_name, sheet_name, creds_sou
         raise ValueError(f"Sheet '{sheet_name}' not found")
 
     # 2. Получаем dataValidation правила только этой вкладки
-    response = service.spreadsheets().get(
-        spreadsheetId=spreadsheet_id,
-        ranges=[f"'{sheet_name}'!{range_name}"],
-        fields="sheets(data(rowData(values(dataValidation)))),sheets.properties"
-    ).execute()
+    response = quota.execute(
+        service.spreadsheets().get(
+            spreadsheetId=spreadsheet_id,
+            ranges=[f"'{sheet_name}'!{range_name}"],
+            fields="sheets(data(rowData(values(dataValidation)))),sheets.properties"
+        ),
+        "spreadsheets.get",
+    )
 
     values = set()
 
@@ -129,13 +230,16 @@ def get_data_validation_values(spreadsheet_id, range_name, sheet_name, creds_sou
 # SHEET LOADER
 ####################################
 
-def load_sheet_df(spreadsheet_id, worksheet_name, creds_source):
-    service = build_sheets_service(creds_source)
+def load_sheet_df(spreadsheet_id, worksheet_name, creds_source, service=None):
+    service = service or build_sheets_service(creds_source)
 
-    resp = service.spreadsheets().values().get(
-        spreadsheetId=spreadsheet_id,
-        range=worksheet_name
-    ).execute()
+    resp = quota.execute(
+        service.spreadsheets().values().get(
+            spreadsheetId=spreadsheet_id,
+            range=worksheet_name
+        ),
+        "values.get",
+    )
 
     rows = resp.get("values", [])
     header = rows[0]
@@ -419,8 +523,8 @@ def main(config, creds_override=None):
         raise ValueError("Credentials are not provided. Pass them via config['creds'] or CLI.")
 
     print("Loading sheet data...")
-    df = load_sheet_df(spreadsheet_id, sheet_name, creds_source)
     service = build_sheets_service(creds_source)
+    df = load_sheet_df(spreadsheet_id, sheet_name, creds_source, service=service)
 
     print("Extracting reserved values...")
     reserved_values = _collect_reserved_values(
@@ -0,0 +1,281 @@
+"""
+Вызовы Google Sheets API с учётом квот: общий token bucket, повтор на 429 и счётчики.
+
+Квоты Sheets считаются в минуту на проект и на пользователя (сервисный
+аккаунт), отдельно для чтения и записи. Все процессы (API с парсером и
+воркеры синхронизации) берут токены из одного bucket в Redis, поэтому
+всплеск правок растягивается во времени, а не упирается в 429. Если Redis
+недоступен, bucket держится в памяти процесса.
+
+Ответы 429 и временные 5xx повторяются на уровне запроса: пауза берётся из
+Retry-After, а без него — экспоненциальная со случайным разбросом. Задача RQ
+при этом не перезапускается и лист заново не скачивается.
+
+Счётчики вызовов, повторов и ожиданий по методам тоже живут в Redis рядом с
+bucket: они общие для API и всех воркеров и не теряются вместе с процессом задачи.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import random
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+from googleapiclient.errors import HttpError
+from redis import Redis
+
+logger = logging.getLogger(__name__)
+
+READ_OPERATIONS = frozenset({"values.get", "values.batchGet", "spreadsheets.get"})
+RETRY_STATUSES = frozenset({429, 500, 503})
+# После паузы (1 - tokens) / rate пополнение из-за округления может чуть недобрать до целого токена
+_ONE_TOKEN = 1 - 1e-6
+
+_BUCKET_KEY = "sheets_quota:{kind}"
+_STATS_KEY = "sheets_quota:stats"
+_STAT_FIELDS = ("calls", "retries", "throttled", "wait_seconds", "errors")
+# Токены и время последнего пополнения в одном HASH; ответ — сколько секунд ждать (0 — токен выдан)
+_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local one_token = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+if now > ts then
+  tokens = math.min(capacity, tokens + (now - ts) * rate)
+  ts = now
+end
+local wait = 0
+if tokens >= one_token then
+  tokens = tokens - 1
+else
+  wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(ts))
+redis.call('EXPIRE', KEYS[1], 120)
+return tostring(wait)
+"""
+
+
+def quota_per_minute(kind: str) -> int:
+    """
+    Лимит запросов в минуту (по умолчанию — квота Sheets на пользователя). 0 отключает ограничение.
+    """
+    env = "SHEETS_READ_QUOTA_PER_MINUTE" if kind == "read" else "SHEETS_WRITE_QUOTA_PER_MINUTE"
+    return max(int(os.getenv(env, "60")), 0)
+
+
+def burst_size() -> int:
+    return max(int(os.getenv("SHEETS_QUOTA_BURST", "10")), 1)
+
+
+def max_retries() -> int:
+    return max(int(os.getenv("SHEETS_MAX_RETRIES", "5")), 0)
+
+
+def backoff_base() -> float:
+    return max(float(os.getenv("SHEETS_BACKOFF_BASE", "1")), 0.0)
+
+
+def backoff_max() -> float:
+    return max(float(os.getenv("SHEETS_BACKOFF_MAX", "64")), 0.0)
+
+
+def redis_enabled() -> bool:
+    return os.getenv("SHEETS_QUOTA_REDIS", "1") == "1"
+
+
+@lru_cache
+def _redis_connection() -> Redis:
+    redis_url = os.getenv("RQ_REDIS_URL", "redis://localhost:6379/0")
+    return Redis.from_url(redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+
+
+def operation_kind(operation: str) -> str:
+    return "read" if operation in READ_OPERATIONS else "write"
+
+
+def _bucket_params(kind: str) -> Optional[tuple]:
+    """
+    (ёмкость, пополнение в секунду): всплеск плюс пополнение за минуту не превышают квоту.
+    """
+    quota = quota_per_minute(kind)
+    if not quota:
+        return None
+    capacity = min(burst_size(), quota)
+    return capacity, max(quota - capacity, 1) / 60.0
+
+
+# --- Состояние процесса ---
+
+_LOCK = threading.Lock()
+_LOCAL_BUCKETS: Dict[str, Dict[str, float]] = {}
+_STATE = {"redis_retry_at": 0.0}
+_STATS: Dict[str, Dict[str, float]] = {}
+
+
+def _use_redis() -> bool:
+    return redis_enabled() and time.monotonic() >= _STATE["redis_retry_at"]
+
+
+def _redis_failed() -> None:
+    # Не проверяем Redis на каждом вызове, пока он лежит
+    logger.warning("Redis недоступен для квоты Sheets, ограничение и счётчики в памяти процесса", exc_info=True)
+    _STATE["redis_retry_at"] = time.monotonic() + 30
+
+
+def _empty_entry() -> Dict[str, float]:
+    return {field: 0.0 if field == "wait_seconds" else 0 for field in _STAT_FIELDS}
+
+
+def _count(operation: str, key: str, amount: float = 1) -> None:
+    with _LOCK:
+        entry = _STATS.setdefault(operation, _empty_entry())
+        entry[key] += amount
+    if _use_redis():
+        try:
+            _redis_connection().hincrbyfloat(_STATS_KEY, f"{operation}|{key}", amount)
+        except Exception:
+            _redis_failed()
+
+
+def _take_local(kind: str, capacity: float, rate: float, now: float) -> float:
+    with _LOCK:
+        bucket = _LOCAL_BUCKETS.setdefault(kind, {"tokens": capacity, "ts": now})
+        if now > bucket["ts"]:
+            bucket["tokens"] = min(capacity, bucket["tokens"] + (now - bucket["ts"]) * rate)
+            bucket["ts"] = now
+        if bucket["tokens"] >= _ONE_TOKEN:
+            bucket["tokens"] -= 1
+            return 0.0
+        return (1 - bucket["tokens"]) / rate
+
+
+def _take_redis(kind: str, capacity: float, rate: float, now: float) -> Optional[float]:
+    if not _use_redis():
+        return None
+    try:
+        wait = _redis_connection().eval(_BUCKET_SCRIPT, 1, _BUCKET_KEY.format(kind=kind), capacity, rate, now, _ONE_TOKEN)
+        return float(wait)
+    except Exception:
+        _redis_failed()
+        return None
+
+
+def acquire(operation: str) -> float:
+    """
+    Ждёт токен квоты для операции. Возвращает время ожидания в секундах.
+    """
+    params = _bucket_params(operation_kind(operation))
+    if params is None:
+        return 0.0
+    capacity, rate = params
+    waited = 0.0
+    while True:
+        now = time.time()
+        wait = _take_redis(operation_kind(operation), capacity, rate, now)
+        if wait is None:
+            wait = _take_local(operation_kind(operation), capacity, rate, now)
+        if wait <= 0:
+            break
+        time.sleep(wait)
+        waited += wait
+    if waited:
+        _count(operation, "throttled")
+        _count(operation, "wait_seconds", waited)
+    return waited
+
+
+def _status(exc: HttpError) -> int:
+    status = getattr(exc, "status_code", None) or getattr(exc.resp, "status", 0)
+    return int(status or 0)
+
+
+def _retry_after(exc: HttpError) -> Optional[float]:
+    raw = exc.resp.get("retry-after") if exc.resp is not None else None
+    try:
+        return max(float(raw), 0.0) if raw is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _backoff(attempt: int, exc: HttpError) -> float:
+    retry_after = _retry_after(exc)
+    if retry_after is not None:
+        return retry_after
+    # Full jitter: воркеры, упёршиеся в квоту одновременно, не повторяют запрос хором
+    return random.uniform(0, min(backoff_max(), backoff_base() * 2 ** attempt))
+
+
+def execute(request: Any, operation: str) -> Any:
+    """
+    request.execute() с ожиданием квоты и повтором 429/5xx.
+    operation — метод Sheets API ("values.get", "spreadsheets.batchUpdate", ...).
+    """
+    attempt = 0
+    while True:
+        acquire(operation)
+        _count(operation, "calls")
+        try:
+            return request.execute()
+        except HttpError as exc:
+            if _status(exc) not in RETRY_STATUSES or attempt >= max_retries():
+                _count(operation, "errors")
+                raise
+            delay = _backoff(attempt, exc)
+            attempt += 1
+            _count(operation, "retries")
+            _count(operation, "wait_seconds", delay)
+            logger.info("Sheets %s: HTTP %s, повтор %s через %.1f с", operation, _status(exc), attempt, delay)
+            time.sleep(delay)
+
+
+def _redis_operations() -> Optional[Dict[str, Dict[str, float]]]:
+    try:
+        raw = _redis_connection().hgetall(_STATS_KEY)
+    except Exception:
+        _redis_failed()
+        return None
+    operations: Dict[str, Dict[str, float]] = {}
+    for field, value in raw.items():
+        field = field.decode() if isinstance(field, bytes) else str(field)
+        operation, _, key = field.rpartition("|")
+        if key not in _STAT_FIELDS:
+            continue
+        amount = float(value)
+        operations.setdefault(operation, _empty_entry())[key] = amount if key == "wait_seconds" else int(amount)
+    return operations
+
+
+def get_stats() -> Dict[str, Any]:
+    """
+    operations — суммы всех процессов из Redis (scope "redis"), без него — счётчики этого процесса.
+    """
+    operations = _redis_operations() if _use_redis() else None
+    scope = "redis"
+    if operations is None:
+        scope = "process"
+        with _LOCK:
+            operations = {operation: dict(entry) for operation, entry in _STATS.items()}
+    for entry in operations.values():
+        entry["wait_seconds"] = round(entry["wait_seconds"], 3)
+    return {
+        "read_quota_per_minute": quota_per_minute("read"),
+        "write_quota_per_minute": quota_per_minute("write"),
+        "redis": _use_redis(),
+        "scope": scope,
+        "operations": operations,
+    }
+
+
+def clear() -> None:
+    with _LOCK:
+        _LOCAL_BUCKETS.clear()
+        _STATS.clear()
+        _STATE["redis_retry_at"] = 0.0
@@ -38,6 +38,16 @@ def override_get_db():
 app.dependency_overrides[get_db] = override_get_db
 
 
+@pytest.fixture(autouse=True)
+def _sheets_quota_off(monkeypatch):
+    # Fake-сервис Sheets не ограничен квотой; test_sheets_quota включает её сам
+    monkeypatch.setenv("SHEETS_QUOTA_REDIS", "0")
+    # Redis в тестах нет: снимки листа — в памяти, тесты Redis-кеша подменяют соединение
+    monkeypatch.setenv("SYNC_SNAPSHOT_REDIS", "0")
+    monkeypatch.setenv("SHEETS_READ_QUOTA_PER_MINUTE", "0")
+    monkeypatch.setenv("SHEETS_WRITE_QUOTA_PER_MINUTE", "0")
+
+
 @pytest.fixture(scope="module")
 def client():
     """Возвращаем TestClient с тестовой БД и авторизацией администратора."""
@@ -0,0 +1,130 @@
+"""
+Минимальная подмена Redis для тестов очереди и учёта задач синхронизации.
+Поддерживает только команды, которые вызывают sync_queue, sync_jobs и sheet_snapshot; TTL не соблюдается.
+"""
+
+
+class _Pipeline:
+    def __init__(self, redis):
+        self._redis = redis
+        self._commands = []
+
+    def __getattr__(self, name):
+        method = getattr(self._redis, name)
+
+        def queue(*args, **kwargs):
+            self._commands.append((method, args, kwargs))
+            return self
+
+        return queue
+
+    def execute(self):
+        commands, self._commands = self._commands, []
+        return [method(*args, **kwargs) for method, args, kwargs in commands]
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def pipeline(self, transaction=True):
+        return _Pipeline(self)
+
+    # --- строки ---
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = str(value).encode()
+        return True
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def delete(self, *keys):
+        return sum(1 for key in keys if self.data.pop(key, None) is not None)
+
+    def expire(self, key, seconds):
+        return key in self.data
+
+    # --- списки ---
+
+    def rpush(self, key, *values):
+        items = self.data.setdefault(key, [])
+        items.extend(str(value).encode() for value in values)
+        return len(items)
+
+    def lpush(self, key, *values):
+        items = self.data.setdefault(key, [])
+        for value in values:
+            items.insert(0, str(value).encode())
+        return len(items)
+
+    def lrange(self, key, start, end):
+        items = self.data.get(key, [])
+        return items[start:] if end == -1 else items[start:end + 1]
+
+    def ltrim(self, key, start, end):
+        items = self.data.get(key, [])
+        self.data[key] = items[start:] if end == -1 else items[start:end + 1]
+        return True
+
+    def llen(self, key):
+        return len(self.data.get(key, []))
+
+    # --- хеши ---
+
+    def hset(self, key, mapping):
+        fields = self.data.setdefault(key, {})
+        fields.update({name.encode(): str(value).encode() for name, value in mapping.items()})
+        return len(mapping)
+
+    def hincrby(self, key, name, amount=1):
+        fields = self.data.setdefault(key, {})
+        value = int(fields.get(name.encode(), b"0")) + amount
+        fields[name.encode()] = str(value).encode()
+        return value
+
+    def hincrbyfloat(self, key, name, amount=1.0):
+        fields = self.data.setdefault(key, {})
+        value = float(fields.get(name.encode(), b"0")) + amount
+        fields[name.encode()] = repr(value).encode()
+        return value
+
+    def hdel(self, key, *names):
+        fields = self.data.get(key, {})
+        return sum(1 for name in names if fields.pop(name.encode(), None) is not None)
+
+    def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    # --- упорядоченные множества ---
+
+    def zadd(self, key, mapping):
+        members = self.data.setdefault(key, {})
+        members.update({member.encode(): float(score) for member, score in mapping.items()})
+        return len(mapping)
+
+    def zrem(self, key, *members):
+        scores = self.data.get(key, {})
+        return sum(1 for member in members if scores.pop(member.encode(), None) is not None)
+
+    def _sorted(self, key):
+        return sorted(self.data.get(key, {}).items(), key=lambda pair: (pair[1], pair[0]))
+
+    def zrange(self, key, start, end, withscores=False):
+        pairs = self._sorted(key)
+        pairs = pairs[start:] if end == -1 else pairs[start:end + 1]
+        return pairs if withscores else [member for member, _ in pairs]
+
+    def zrevrange(self, key, start, end):
+        members = [member for member, _ in reversed(self._sorted(key))]
+        return members[start:] if end == -1 else members[start:end + 1]
+
+    def zremrangebyrank(self, key, start, end):
+        pairs = self._sorted(key)
+        stop = len(pairs) + end + 1 if end < 0 else end + 1
+        removed = pairs[start:stop]
+        for member, _ in removed:
+            del self.data[key][member]
+        return len(removed)
@@ -0,0 +1,133 @@
+"""
+Минимальная подмена Google Sheets API для тестов синхронизации.
+Хранит лист в памяти, применяет запросы и считает вызовы execute().
+"""
+
+import copy
+import re
+from collections import Counter
+
+_CELL_RE = re.compile(r"^'?(?P<sheet>.*?)'?!(?:(?P<col>[A-Z]+)(?P<row>\d+)|(?P<start>\d+):(?P<end>\d+))$")
+
+
+def _column_index(letters: str) -> int:
+    result = 0
+    for char in letters:
+        result = result * 26 + (ord(char) - ord("A") + 1)
+    return result - 1
+
+
+class _Request:
+    def __init__(self, service, operation, handler):
+        self._service = service
+        self._operation = operation
+        self._handler = handler
+
+    def execute(self, *args, **kwargs):
+        self._service.calls[self._operation] += 1
+        return self._handler()
+
+
+class _Values:
+    def __init__(self, service):
+        self._service = service
+
+    def get(self, spreadsheetId, range):
+        return _Request(
+            self._service,
+            "values.get",
+            lambda: {"values": copy.deepcopy(self._service.grid)},
+        )
+
+    def batchGet(self, spreadsheetId, ranges):
+        return _Request(
+            self._service,
+            "values.batchGet",
+            lambda: {"valueRanges": [{"range": ref, "values": [self._service.read_row(ref)]} for ref in ranges]},
+        )
+
+    def update(self, spreadsheetId, range, valueInputOption, body):
+        return _Request(self._service, "values.update", lambda: self._service.write(range, body["values"]))
+
+    def batchUpdate(self, spreadsheetId, body):
+        def handler():
+            for entry in body.get("data", []):
+                self._service.write(entry["range"], entry["values"])
+            return {}
+
+        return _Request(self._service, "values.batchUpdate", handler)
+
+
+class _Spreadsheets:
+    def __init__(self, service):
+        self._service = service
+
+    def values(self):
+        return _Values(self._service)
+
+    def get(self, spreadsheetId, fields=None, ranges=None):
+        return _Request(
+            self._service,
+            "spreadsheets.get",
+            lambda: {"sheets": [{"properties": {"title": self._service.title, "sheetId": 7}}]},
+        )
+
+    def batchUpdate(self, spreadsheetId, body):
+        def handler():
+            for request in body.get("requests", []):
+                if "insertDimension" in request:
+                    start = request["insertDimension"]["range"]["startIndex"]
+                    self._service.grid.insert(start, [])
+                elif "deleteDimension" in request:
+                    start = request["deleteDimension"]["range"]["startIndex"]
+                    del self._service.grid[start]
+            return {}
+
+        return _Request(self._service, "spreadsheets.batchUpdate", handler)
+
+
+class FakeSheetsService:
+    def __init__(self, grid, title="Sheet"):
+        self.grid = [list(row) for row in grid]
+        self.title = title
+        self.calls = Counter()
+
+    def spreadsheets(self):
+        return _Spreadsheets(self)
+
+    def write(self, range_ref, values):
+        match = _CELL_RE.match(range_ref)
+        if not match:
+            raise ValueError(f"Unsupported range {range_ref}")
+        if match.group("col"):
+            row_idx = int(match.group("row")) - 1
+            col_idx = _column_index(match.group("col"))
+            self._set(row_idx, col_idx, values[0][0])
+        else:
+            row_idx = int(match.group("start")) - 1
+            for col_idx, value in enumerate(values[0]):
+                self._set(row_idx, col_idx, value)
+        return {}
+
+    def read_row(self, range_ref):
+        match = _CELL_RE.match(range_ref)
+        row_idx = int(match.group("start")) - 1
+        if row_idx >= len(self.grid):
+            return []
+        return [str(value) for value in self.grid[row_idx]]
+
+    def _set(self, row_idx, col_idx, value):
+        while len(self.grid) <= row_idx:
+            self.grid.append([])
+        row = self.grid[row_idx]
+        if len(row) <= col_idx:
+            row.extend([""] * (col_idx + 1 - len(row)))
+        row[col_idx] = value
+
+    def cell(self, row_number, col_idx):
+        row = self.grid[row_number - 1]
+        return str(row[col_idx]) if col_idx < len(row) else ""
+
+    @property
+    def total_calls(self):
+        return sum(self.calls.values())
@@ -0,0 +1,39 @@
+"""
+Бюджет SQL-запросов на эндпоинт: запрос идёт с X-SQL-Profile (клиент — администратор),
+число запросов берётся из X-Query-Count. Рост числа запросов или N+1 валит тест.
+count_queries() — список SQL тестового движка внутри блока (для сравнения двух запросов
+и кода без HTTP).
+"""
+
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from app.services import sql_profiler
+from tests.conftest import engine
+
+
+@contextmanager
+def count_queries():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def assert_query_budget(client, method, url, max_queries, **kwargs):
+    headers = dict(kwargs.pop("headers", None) or {})
+    headers[sql_profiler.PROFILE_HEADER] = "1"
+    resp = client.request(method, url, headers=headers, **kwargs)
+    assert resp.status_code < 400, resp.text
+    assert "x-query-count" in resp.headers, "профилировщик не включился: нужен токен администратора"
+    count = int(resp.headers["x-query-count"])
+    assert count <= max_queries, f"{method} {url}: {count} SQL-запросов при бюджете {max_queries}"
+    assert "x-query-n1" not in resp.headers, f"{method} {url}: вероятный N+1 — {resp.headers['x-query-n1']}"
+    return resp
@@ -0,0 +1,54 @@
+import asyncio
+import threading
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app import database, models
+from app.config import SQLALCHEMY_DATABASE_URL
+from tests.conftest import TestingSessionLocal
+
+
+def test_async_url_swaps_driver():
+    assert database._async_url("postgresql://u:p@db:5432/app") == "postgresql+asyncpg://u:p@db:5432/app"
+    assert database._async_url("postgresql+psycopg2://u:p@db/app") == "postgresql+asyncpg://u:p@db/app"
+    assert database._async_url("sqlite:///./test.db") == "sqlite+aiosqlite:///./test.db"
+    assert database._async_url("mysql://u:p@db/app") is None
+
+
+def test_run_read_keeps_sync_session_off_event_loop():
+    seen = {}
+
+    def crud_fn(db, value, *, extra):
+        seen["thread"] = threading.get_ident()
+        return value + extra
+
+    async def call():
+        seen["loop_thread"] = threading.get_ident()
+        db = TestingSessionLocal()
+        try:
+            return await database.run_read(db, crud_fn, 2, extra=3)
+        finally:
+            db.close()
+
+    assert asyncio.run(call()) == 5
+    assert seen["thread"] != seen["loop_thread"]
+
+
+def test_async_session_reads_through_run_sync(client, monkeypatch):
+    tab = client.post("/tabs/", json={"name": "AsyncRead"}).json()
+    monkeypatch.setenv("DB_ASYNC_READS", "1")
+    monkeypatch.setattr(database, "DATABASE_URL", SQLALCHEMY_DATABASE_URL)
+    engine = database._create_async_engine()
+    assert engine is not None and engine.dialect.driver == "aiosqlite"
+
+    def tab_name(db, tab_id):
+        return db.get(models.Tab, tab_id).name
+
+    async def call():
+        try:
+            async with async_sessionmaker(engine, expire_on_commit=False)() as db:
+                return await database.run_read(db, tab_name, tab["id"])
+        finally:
+            await engine.dispose()
+
+    assert asyncio.run(call()) == "AsyncRead"
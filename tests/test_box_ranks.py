@@ -0,0 +1,90 @@
+from contextlib import contextmanager
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app import models
+from app.crud import items as items_crud
+from tests.conftest import TestingSessionLocal, engine
+
+
+@contextmanager
+def count_updates():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        # Только строки айтемов: счётчики изменений (change_counters) сюда не относятся
+        if statement.lstrip().upper().startswith("UPDATE ITEMS"):
+            statements.append(parameters if executemany else [parameters])
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def _rows_updated(statements):
+    return sum(len(params) for params in statements)
+
+
+def _large_box(client: TestClient, name: str, size: int = 500):
+    tab = client.post("/tabs/", json={"name": name}).json()
+    client.post("/tab_fields/", json={"tab_id": tab["id"], "name": "Spec"})
+    box = client.post("/boxes/", json={"name": f"{name} box", "tab_id": tab["id"]}).json()
+    with TestingSessionLocal() as db:
+        db.add_all(
+            models.Item(
+                name=f"Part {idx}",
+                qty=2,
+                tab_id=tab["id"],
+                box_id=box["id"],
+                box_rank=(idx + 1) * items_crud.POSITION_GAP,
+                metadata_json={},
+                tag_ids=[],
+            )
+            for idx in range(size)
+        )
+        db.commit()
+    return tab, box
+
+
+def test_single_move_in_large_box_updates_one_row(client: TestClient):
+    _, box = _large_box(client, "RankMove")
+    current = client.get(f"/items/{box['id']}").json()
+    ids = [item["id"] for item in current]
+    desired = [ids[-1]] + ids[:-1]
+
+    with count_updates() as statements:
+        resp = client.post("/items/reorder", json={"box_id": box["id"], "ordered_ids": desired})
+    assert resp.status_code == 200, resp.text
+
+    assert _rows_updated(statements) == 1
+    reordered = resp.json()
+    assert [item["id"] for item in reordered] == desired
+    assert [item["box_position"] for item in reordered] == list(range(1, 1001, 2))
+
+
+def test_delete_and_qty_change_do_not_renumber_neighbours(client: TestClient):
+    _, box = _large_box(client, "RankDelete")
+    ids = [item["id"] for item in client.get(f"/items/{box['id']}").json()]
+
+    with count_updates() as statements:
+        assert client.delete(f"/items/{ids[10]}").status_code == 200
+        resp = client.put(f"/items/{ids[0]}", json={"qty": 5, "box_id": box["id"]})
+    assert resp.status_code == 200, resp.text
+    assert _rows_updated(statements) == 1
+    assert resp.json()["box_position"] == 1
+
+    positions = [item["box_position"] for item in client.get(f"/items/{box['id']}").json()]
+    assert positions[:3] == [1, 6, 8]
+    assert positions[-1] == 5 + 2 * 497 + 1
+
+
+def test_assign_ranks_falls_back_when_no_gap_left():
+    items = [models.Item(id=idx, box_rank=rank) for idx, rank in enumerate([1, 2, 3])]
+    assert items_crud._assign_ranks_in_order([items[0], items[2], items[1]]) is False
+
+    spaced = [models.Item(id=idx, box_rank=rank) for idx, rank in enumerate([1024, 2048, 3072])]
+    assert items_crud._assign_ranks_in_order([spaced[2], spaced[0], spaced[1]]) is True
+    assert [item.box_rank for item in spaced] == [1024, 2048, 512]
@@ -0,0 +1,195 @@
+import asyncio
+
+import pytest
+
+from app.services import change_feed
+
+
+@pytest.fixture(autouse=True)
+def _clean_feed():
+    change_feed.clear()
+    yield
+    change_feed.clear()
+
+
+def _events(tab_id=None):
+    return change_feed.replay(0, tab_id)
+
+
+def test_crud_writes_publish_tab_scoped_deltas(client):
+    tab = client.post("/tabs/", json={"name": "FeedTab"}).json()
+    other = client.post("/tabs/", json={"name": "FeedOther"}).json()
+    client.post("/tab_fields/", json={"tab_id": tab["id"], "name": "Spec"})
+    box = client.post("/boxes/", json={"name": "Feed box", "tab_id": tab["id"]}).json()
+    first = client.post(
+        "/items/", json={"name": "Feed item", "qty": 2, "tab_id": tab["id"], "box_id": box["id"], "metadata_json": {}}
+    ).json()
+    second = client.post(
+        "/items/", json={"name": "Feed item 2", "qty": 1, "tab_id": tab["id"], "box_id": box["id"], "metadata_json": {}}
+    ).json()
+    client.post("/items/reorder", json={"box_id": box["id"], "ordered_ids": [second["id"], first["id"]]})
+    client.delete(f"/items/{second['id']}")
+
+    events = _events(tab["id"])
+    assert [event.type for event in events] == [
+        "box.created",
+        "item.created",
+        "box.counts",
+        "item.created",
+        "box.counts",
+        "items.reordered",
+        "item.deleted",
+        "box.counts",
+    ]
+    assert all(event.tab_id == tab["id"] for event in events)
+    assert events[1].data["item"]["name"] == "Feed item"
+    assert "sync_result" not in events[1].data["item"]
+    assert events[4].data == {"boxes": [{"id": box["id"], "items_count": 3}]}
+    assert events[5].data == {"box_id": box["id"], "ordered_ids": [second["id"], first["id"]]}
+    assert events[-1].data == {"boxes": [{"id": box["id"], "items_count": 2}]}
+    assert _events(other["id"]) == []
+
+
+def test_partial_issue_publishes_the_full_item(client):
+    tab = client.post("/tabs/", json={"name": "FeedIssueTab"}).json()
+    client.post("/tab_fields/", json={"tab_id": tab["id"], "name": "Spec"})
+    box = client.post("/boxes/", json={"name": "Feed issue box", "tab_id": tab["id"]}).json()
+    item = client.post(
+        "/items/",
+        json={"name": "Issued item", "qty": 3, "tab_id": tab["id"], "box_id": box["id"], "metadata_json": {}},
+    ).json()
+    status = client.post("/statuses/", json={"name": "FeedIssued", "color": "#000000"}).json()
+    change_feed.clear()
+
+    resp = client.post(
+        f"/items/{item['id']}/issue",
+        json={"status_id": status["id"], "responsible_user_name": "admin_master", "qty": 1},
+    )
+    assert resp.status_code == 200, resp.text
+
+    updated = [event for event in _events(tab["id"]) if event.type == "item.updated"]
+    assert updated[0].data["item"]["name"] == "Issued item"
+    assert updated[0].data["item"]["qty"] == 2
+    assert updated[0].data["item"]["metadata_json"] == {}
+    assert "sync_result" not in updated[0].data["item"]
+
+
+def test_tag_events_reach_every_tab(client):
+    tag = client.post("/tags/", json={"name": "FeedTag"}).json()
+    client.delete(f"/tags/{tag['id']}")
+
+    events = _events(12345)
+    assert [event.type for event in events] == ["tag.updated", "tag.deleted"]
+    assert events[0].tab_id is None
+    assert events[0].data["tag"]["name"] == "FeedTag"
+
+
+def test_replay_reports_gap_beyond_buffer():
+    for idx in range(3):
+        change_feed.publish("item.updated", 1, {"item": {"id": idx}})
+
+    assert [event.id for event in change_feed.replay(1, 1)] == [2, 3]
+    assert change_feed.replay(3, 1) == []
+    # Клиент помнит номер, которого сервер ещё не выдавал (перезапуск процесса)
+    assert change_feed.replay(10, 1) is None
+
+    change_feed._BUFFER.popleft()
+    assert change_feed.replay(0, 1) is None
+    assert [event.id for event in change_feed.replay(1, 1)] == [2, 3]
+
+
+def test_stream_resumes_from_last_event_id_and_pushes_live_events():
+    change_feed.publish("item.updated", 1, {"item": {"id": 1}})
+    change_feed.publish("item.updated", 1, {"item": {"id": 2}})
+
+    async def scenario():
+        subscriber = change_feed.subscribe(1)
+        body = change_feed.stream(subscriber, after_id=1)
+        chunks = [await body.__anext__(), await body.__anext__()]
+        # Запись из пула потоков, как у синхронных маршрутов CRUD
+        await asyncio.to_thread(change_feed.publish, "item.deleted", 2, {"item": {"id": 9}})
+        await asyncio.to_thread(change_feed.publish, "item.deleted", 1, {"item": {"id": 2}})
+        chunks.append(await asyncio.wait_for(body.__anext__(), 1))
+        stats = change_feed.get_stats()
+        await body.aclose()
+        return chunks, stats
+
+    chunks, stats = asyncio.run(scenario())
+    assert chunks[0] == f"retry: {change_feed.RETRY_MS}\n\n"
+    assert chunks[1] == 'id: 2\nevent: item.updated\ndata: {"tab_id":1,"item":{"id":2}}\n\n'
+    assert chunks[2] == 'id: 4\nevent: item.deleted\ndata: {"tab_id":1,"item":{"id":2}}\n\n'
+    assert stats["subscribers"] == 1
+    assert change_feed.get_stats()["subscribers"] == 0
+
+
+def test_stream_sends_reset_when_resume_point_is_lost():
+    change_feed.publish("item.updated", 1, {"item": {"id": 1}})
+
+    async def scenario():
+        body = change_feed.stream(change_feed.subscribe(1), after_id=50)
+        chunks = [await body.__anext__(), await body.__anext__()]
+        await body.aclose()
+        return chunks
+
+    assert asyncio.run(scenario())[1] == "id: 1\nevent: reset\ndata: {}\n\n"
+    assert change_feed.get_stats()["resets"] == 1
+
+
+class ScriptRedis:
+    """
+    Поведение _PUBLISH_SCRIPT на Python: номер, буфер и рассылка за один шаг.
+    """
+
+    def __init__(self):
+        self.seq = 0
+        self.buffer = []
+        self.published = []
+
+    def __call__(self, keys, args):
+        self.seq += 1
+        raw = '{"id":%d,%s' % (self.seq, args[0])
+        self.buffer.append(raw)
+        del self.buffer[: -int(args[1])]
+        self.published.append(raw)
+        return raw
+
+    def lrange(self, key, start, end):
+        return list(self.buffer)
+
+
+def test_redis_publish_numbers_buffers_and_broadcasts_in_one_step(monkeypatch):
+    script = ScriptRedis()
+    monkeypatch.setenv("CHANGE_FEED_REDIS", "1")
+    monkeypatch.setattr(change_feed, "_publish_script", lambda: script)
+    monkeypatch.setattr(change_feed, "_redis_connection", lambda: script)
+
+    change_feed.publish("items.reordered", 1, {"box_id": 3, "ordered_ids": []})
+    change_feed.publish("item.updated", 1, {"item": {"id": 7, "name": "Кабель"}})
+
+    assert script.published == script.buffer
+    events = change_feed.replay(0, 1)
+    assert [event.id for event in events] == [1, 2]
+    assert events[0].data == {"box_id": 3, "ordered_ids": []}
+    assert events[1].data["item"]["name"] == "Кабель"
+
+
+def test_redis_failure_sends_reset_instead_of_a_local_id(monkeypatch):
+    def broken(keys, args):
+        raise ConnectionError("redis down")
+
+    monkeypatch.setenv("CHANGE_FEED_REDIS", "1")
+    monkeypatch.setattr(change_feed, "_publish_script", lambda: broken)
+    monkeypatch.setattr(change_feed, "_ensure_listener", lambda: None)
+
+    async def scenario():
+        body = change_feed.stream(change_feed.subscribe(1), after_id=None)
+        await body.__anext__()
+        await asyncio.to_thread(change_feed.publish, "item.updated", 1, {"item": {"id": 1}})
+        chunk = await asyncio.wait_for(body.__anext__(), 1)
+        await body.aclose()
+        return chunk
+
+    assert asyncio.run(scenario()) == "id: 0\nevent: reset\ndata: {}\n\n"
+    stats = change_feed.get_stats()
+    assert stats["last_id"] == 0
+    assert stats["redis_errors"] == 1
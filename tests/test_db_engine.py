@@ -0,0 +1,64 @@
+import pytest
+from sqlalchemy import create_engine, exc as sa_exc
+
+from app import database
+
+
+def test_postgres_options_come_from_env(monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "7")
+    monkeypatch.setenv("DB_MAX_OVERFLOW", "3")
+    monkeypatch.setenv("DB_POOL_RECYCLE", "600")
+    monkeypatch.setenv("DB_STATEMENT_TIMEOUT_MS", "5000")
+    monkeypatch.setenv("DB_STATEMENT_TIMEOUT_MS_WORKER", "60000")
+
+    api = database.engine_options("postgresql://u:p@db/app", role="api")
+    assert api["pool_size"] == 7
+    assert api["max_overflow"] == 3
+    assert api["pool_recycle"] == 600
+    assert api["pool_pre_ping"] is True
+    assert api["echo"] is False
+    assert api["poolclass"] is database.InstrumentedQueuePool
+    assert api["connect_args"] == {"application_name": "dsp-ware-api", "options": "-c statement_timeout=5000"}
+
+    worker = database.engine_options("postgresql+asyncpg://u:p@db/app", role="worker", is_async=True)
+    assert worker["poolclass"] is database.InstrumentedAsyncQueuePool
+    assert worker["connect_args"] == {
+        "server_settings": {"application_name": "dsp-ware-worker", "statement_timeout": "60000"}
+    }
+
+
+def test_sqlite_keeps_default_pool():
+    options = database.engine_options("sqlite:///./x.db")
+    assert "poolclass" not in options
+    assert "connect_args" not in options
+
+
+def test_pool_stats_track_waits_and_timeouts(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}",
+        poolclass=database.InstrumentedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.05,
+    )
+    try:
+        held = engine.connect()
+        with pytest.raises(sa_exc.TimeoutError):
+            engine.connect()
+        stats = database.get_pool_stats(engine)
+        assert stats["checked_out"] == 1
+        assert stats["checkouts"] == 1
+        assert stats["timeouts"] == 1
+        held.close()
+        assert database.get_pool_stats(engine)["checked_out"] == 0
+    finally:
+        engine.dispose()
+
+
+def test_db_pool_endpoint(client):
+    resp = client.get("/system/db-pool")
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["role"] == "api"
+    assert body["threadpool"]["size"] > 0
+    assert "pool" in body["sync"]
@@ -0,0 +1,74 @@
+import json
+from datetime import datetime, UTC
+
+import pytest
+from pydantic import TypeAdapter
+
+from app import models, schemas
+from app.utils import fast_json
+from tests.conftest import TestingSessionLocal
+
+pytestmark = pytest.mark.skipif(fast_json.orjson is None, reason="orjson не установлен")
+
+
+@pytest.fixture(scope="module")
+def catalog(client):
+    tab = client.post("/tabs/", json={"name": "Быстрый JSON"}).json()
+    client.post("/tab_fields/", json={"tab_id": tab["id"], "name": "Производитель"})
+    box = client.post("/boxes/", json={"name": "Ящик ёжика", "tab_id": tab["id"], "capacity": 10}).json()
+    for idx in range(3):
+        payload = {
+            "name": f"Кабель №{idx}",
+            "qty": idx + 1,
+            "tab_id": tab["id"],
+            "box_id": box["id"],
+            "metadata_json": {"Производитель": "Завод «Искра»", } if idx else {},
+            "serial_number": [f"SN-{idx}"],
+        }
+        assert client.post("/items/", json=payload).status_code == 200
+    db = TestingSessionLocal()
+    try:
+        status = models.Status(name="Быстрая выдача", color="#abcdef")
+        issue = models.Issue(status=status, created_at=datetime(2025, 3, 1, 8, 30, 15, 120000, tzinfo=UTC))
+        db.add(models.ItemUtilized(issue=issue, item_snapshot="{}", item_name="Кабель", tab_name="Вкладка", box_name="Ящик", qty=1))
+        db.commit()
+        status_id = status.id
+    finally:
+        db.close()
+    return {"tab_id": tab["id"], "box_id": box["id"], "status_id": status_id}
+
+
+def _urls(catalog):
+    return [
+        f"/items/{catalog['box_id']}",
+        f"/boxes/{catalog['tab_id']}",
+        "/boxes/",
+        f"/items/search?query=Кабель&tab_id={catalog['tab_id']}",
+        f"/issues/?status_id={catalog['status_id']}",
+        f"/tabs/{catalog['tab_id']}/contents",
+    ]
+
+
+def test_fast_path_matches_default_responses(client, catalog, monkeypatch):
+    for url in _urls(catalog):
+        monkeypatch.setenv("FAST_JSON", "0")
+        default = client.get(url)
+        monkeypatch.setenv("FAST_JSON", "1")
+        fast = client.get(url)
+        assert default.status_code == fast.status_code == 200, url
+        assert fast.headers["content-type"] == "application/json"
+        assert fast.json() == default.json(), url
+        # Кириллица пишется как есть, а не \\uXXXX
+        assert "\\u04" not in fast.text
+
+
+def test_datetimes_encoded_like_pydantic():
+    for value in (datetime(2025, 3, 1, tzinfo=UTC), datetime(2025, 3, 1, 8, 30, 15, 120000, tzinfo=UTC), datetime(2025, 3, 1, 8, 30)):
+        entry = schemas.IssueHistoryEntry(id=1, status_id=1, status_name="Выдано", item_snapshot={"имя": "Кабель"}, created_at=value)
+        assert json.loads(fast_json.dumps(entry)) == json.loads(entry.model_dump_json())
+        assert fast_json.dumps(value) == TypeAdapter(datetime).dump_json(value)
+
+
+def test_projection_drops_extra_keys_and_fills_defaults():
+    rows = fast_json.project(schemas.BoxRead, [{"id": 1, "name": "A", "tab_id": 2, "color": "#fff"}])
+    assert rows == [{"name": "A", "description": None, "tag_ids": [], "capacity": None, "id": 1, "tab_id": 2, "items_count": 0}]
@@ -0,0 +1,102 @@
+from app import models
+from app.crud import items as items_crud
+from app.services import field_codec, sql_profiler, sync_dispatcher
+from tests.conftest import TestingSessionLocal
+
+
+def _tab_with_item(client, name):
+    tab = client.post("/tabs/", json={"name": name}).json()
+    field = client.post("/tab_fields/", json={"tab_id": tab["id"], "name": "Spec"}).json()
+    box = client.post("/boxes/", json={"name": f"{name} box", "tab_id": tab["id"]}).json()
+    item = client.post(
+        "/items/",
+        json={"name": f"{name} item", "qty": 1, "tab_id": tab["id"], "box_id": box["id"], "metadata_json": {"Spec": "v1"}},
+    ).json()
+    return tab, field, box, item
+
+
+def _field_queries(profile):
+    return sum(stats.count for shape, stats in profile.shapes.items() if "FROM tab_fields" in shape or "JOIN tab_fields" in shape)
+
+
+def test_warm_codec_translates_without_field_queries(client):
+    tab, _, box, item = _tab_with_item(client, "CodecWarm")
+    client.get(f"/items/{box['id']}")
+
+    db = TestingSessionLocal()
+    try:
+        with sql_profiler.profile() as profile:
+            items_crud.update_item(db, item["id"], items_crud.schemas.ItemUpdate(metadata_json={"Spec": "v2"}, box_id=box["id"]))
+            listed = items_crud.get_items_by_box(db, box["id"])
+            items_crud.search_items(db, "CodecWarm", tab["id"])
+    finally:
+        db.close()
+
+    assert listed[0].metadata_json == {"Spec": "v2"}
+    assert _field_queries(profile) == 0
+
+
+def test_field_changes_bump_version_and_refresh_codec(client):
+    tab, field, box, item = _tab_with_item(client, "CodecRename")
+    db = TestingSessionLocal()
+    try:
+        version = db.get(models.Tab, tab["id"]).fields_version
+        assert field_codec.get_codec(db, tab["id"], version).names == ("Spec",)
+    finally:
+        db.close()
+    assert version == 1
+
+    resp = client.put(f"/tab_fields/{field['id']}", json={"name": "Specification"})
+    assert resp.status_code == 200, resp.text
+    assert client.get(f"/items/{box['id']}").json()[0]["metadata_json"] == {"Specification": "v1"}
+
+    client.post("/tab_fields/", json={"tab_id": tab["id"], "name": "Vendor"})
+    resp = client.put(f"/items/{item['id']}", json={"metadata_json": {"Vendor": "Acme"}, "box_id": box["id"]})
+    assert resp.status_code == 200, resp.text
+    assert resp.json()["metadata_json"] == {"Vendor": "Acme"}
+
+    db = TestingSessionLocal()
+    try:
+        tab_row = db.get(models.Tab, tab["id"])
+        assert tab_row.fields_version == 3
+        codec = field_codec.for_tab(db, tab_row)
+    finally:
+        db.close()
+    assert codec.names == ("Specification", "Vendor")
+
+
+def test_sync_payload_uses_codec_names(client):
+    tab, _, box, item = _tab_with_item(client, "CodecSync")
+    db = TestingSessionLocal()
+    try:
+        tab_row = db.get(models.Tab, tab["id"])
+        tab_row.enable_sync = True
+        tab_row.sync_config = "Sheet"
+        codec = field_codec.for_tab(db, tab_row)
+        payload = sync_dispatcher.build_item_payload(tab_row, db.get(models.Box, box["id"]), db.get(models.Item, item["id"]), codec)
+    finally:
+        db.close()
+    assert payload["item"]["metadata"] == {"Spec": "v1"}
+
+
+def test_unknown_metadata_keys_are_rejected(client):
+    _, _, box, item = _tab_with_item(client, "CodecUnknown")
+    resp = client.put(f"/items/{item['id']}", json={"metadata_json": {"Nope": 1}, "box_id": box["id"]})
+    assert resp.status_code == 400
+    assert "Nope" in resp.json()["detail"]
+
+
+def test_strong_field_accepts_only_allowed_values(client):
+    tab, _, box, item = _tab_with_item(client, "CodecStrong")
+    client.post("/tab_fields/", json={"tab_id": tab["id"], "name": "Grade", "strong": True, "allowed_values": ["A", "B"]})
+
+    resp = client.put(f"/items/{item['id']}", json={"metadata_json": {"Grade": "C"}, "box_id": box["id"]})
+    assert resp.status_code == 400
+    assert "Grade" in resp.json()["detail"]
+
+    resp = client.post(
+        "/items/",
+        json={"name": "Strong", "qty": 1, "tab_id": tab["id"], "box_id": box["id"], "metadata_json": {"Grade": "B"}},
+    )
+    assert resp.status_code == 200, resp.text
+    assert resp.json()["metadata_json"] == {"Grade": "B"}
@@ -0,0 +1,78 @@
+import json
+from datetime import datetime, timedelta, UTC
+
+import pytest
+
+from app import models
+from tests.conftest import TestingSessionLocal
+
+
+@pytest.fixture(scope="module")
+def history_status():
+    db = TestingSessionLocal()
+    try:
+        status = models.Status(name="Листание", color="#123456")
+        db.add(status)
+        db.flush()
+        base = datetime(2025, 1, 1, 12, 0, tzinfo=UTC)
+        for idx in range(25):
+            # Пары записей с одинаковым временем проверяют второй ключ курсора (id).
+            issue = models.Issue(status_id=status.id, created_at=base + timedelta(minutes=idx // 2))
+            data = {"item_name": f"Кабель {idx}", "tab_name": "Склад" if idx % 2 else "Офис", "box_name": "Ящик", "qty": 1}
+            db.add(models.ItemUtilized(issue=issue, item_snapshot=json.dumps(data, ensure_ascii=False), **data))
+        # Старая строка без колонок снимка
+        legacy = models.Issue(status_id=status.id, created_at=base - timedelta(days=1))
+        db.add(
+            models.ItemUtilized(
+                issue=legacy,
+                item_snapshot=json.dumps({"item_name": "Склад-кабель", "tab_name": "Архив", "box_name": "Б", "qty": 3}, ensure_ascii=False),
+            )
+        )
+        db.commit()
+        return status.id
+    finally:
+        db.close()
+
+
+def test_cursor_walks_history_without_gaps(client, history_status):
+    seen = []
+    cursor = None
+    while True:
+        params = {"status_id": history_status, "per_page": 10, "total": "none"}
+        if cursor:
+            params["cursor"] = cursor
+        resp = client.get("/issues/", params=params)
+        assert resp.status_code == 200
+        body = resp.json()
+        assert body["total"] is None
+        seen.extend(entry["id"] for entry in body["items"])
+        cursor = body["next_cursor"]
+        if not cursor:
+            break
+
+    assert len(seen) == 26 == len(set(seen))
+    keys = [
+        (entry["created_at"], entry["id"])
+        for entry in client.get("/issues/", params={"status_id": history_status, "per_page": 200}).json()["items"]
+    ]
+    assert [issue_id for _, issue_id in keys] == seen
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_tab_filter_uses_tab_column_only(client, history_status):
+    body = client.get("/issues/", params={"status_id": history_status, "tab": "Склад", "per_page": 200}).json()
+    assert body["total"] == 12
+    assert {entry["item_snapshot"]["tab_name"] for entry in body["items"]} == {"Склад"}
+
+
+def test_legacy_rows_fall_back_to_snapshot_json(client, history_status):
+    body = client.get("/issues/", params={"status_id": history_status, "per_page": 200}).json()
+    assert body["items"][-1]["item_snapshot"] == {"item_name": "Склад-кабель", "tab_name": "Архив", "box_name": "Б", "qty": 3}
+
+
+def test_estimated_total_and_bad_cursor(client, history_status):
+    body = client.get("/issues/", params={"status_id": history_status, "total": "estimate"}).json()
+    assert body["total_estimated"] is True
+    assert body["total"] == 26
+
+    assert client.get("/issues/", params={"cursor": "не-курсор"}).status_code == 400
@@ -0,0 +1,92 @@
+import csv
+import io
+import json
+from datetime import datetime, UTC
+
+from openpyxl import load_workbook
+
+from app import models
+from app.utils import local_history
+from tests.conftest import TestingSessionLocal
+
+
+def test_journal_writer_batches_records(tmp_path, monkeypatch):
+    fsyncs = []
+    real_fsync = local_history.os.fsync
+    monkeypatch.setattr(local_history.os, "fsync", lambda fd: (fsyncs.append(fd), real_fsync(fd)))
+
+    path = tmp_path / "history.jsonl"
+    writer = local_history.JournalWriter(path, flush_interval=60, batch_size=50)
+    for idx in range(120):
+        writer.submit({"item_name": f"Товар {idx}", "qty": idx})
+    assert writer.flush()
+
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["item_name"] for line in lines] == [f"Товар {idx}" for idx in range(120)]
+    assert writer.stats["written"] == 120
+    assert writer.stats["batches"] == len(fsyncs) <= 3
+
+
+def test_journal_writer_flushes_after_interval(tmp_path):
+    path = tmp_path / "history.jsonl"
+    writer = local_history.JournalWriter(path, flush_interval=0.05, batch_size=1000)
+    writer.submit({"item_name": "Один"})
+    writer.submit({"item_name": "Два"})
+    assert writer.flush()
+
+    assert len(path.read_text(encoding="utf-8").splitlines()) == 2
+    assert writer.stats["batches"] == 1
+
+
+def test_export_builds_xlsx_from_tables(client):
+    db = TestingSessionLocal()
+    try:
+        status = models.Status(name="Экспорт", color="#000000")
+        issue = models.Issue(status=status, created_at=datetime(2024, 3, 5, 14, 7, 9, tzinfo=UTC))
+        db.add(
+            models.ItemUtilized(
+                issue=issue,
+                item_snapshot=json.dumps(
+                    {"item_name": "Кабель", "tab_name": "Склад", "box_name": "Ящик 1", "qty": 2},
+                    ensure_ascii=False,
+                ),
+                serial_number="SN-1",
+                invoice_number="INV-7",
+            )
+        )
+        db.commit()
+    finally:
+        db.close()
+
+    resp = client.get("/issues/export")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == local_history.XLSX_MEDIA_TYPE
+
+    rows = list(load_workbook(io.BytesIO(resp.content), read_only=True).active.iter_rows(values_only=True))
+    assert list(rows[0]) == local_history.HEADERS
+    assert ("5.3.2024 | 14:07:09", "Склад", "Ящик 1", "Кабель", 2, "Экспорт", None, "SN-1", "INV-7") in rows
+
+
+def test_export_csv_applies_list_filters(client):
+    resp = client.get("/issues/export", params={"format": "csv", "serial": "SN-1", "invoice": "INV-7"})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/csv")
+    assert 'filename="issue_history.csv"' in resp.headers["content-disposition"]
+
+    rows = list(csv.reader(io.StringIO(resp.content.decode("utf-8-sig"))))
+    assert rows[0] == local_history.HEADERS
+    assert rows[1:] == [["5.3.2024 | 14:07:09", "Склад", "Ящик 1", "Кабель", "2", "Экспорт", "", "SN-1", "INV-7"]]
+
+    empty = client.get("/issues/export", params={"format": "csv", "serial": "нет-такого"})
+    assert len(list(csv.reader(io.StringIO(empty.content.decode("utf-8-sig"))))) == 1
+
+
+def test_export_rejects_unknown_format(client):
+    assert client.get("/issues/export", params={"format": "pdf"}).status_code == 422
+
+
+def test_history_csv_streams_in_chunks():
+    rows = ([str(idx)] * len(local_history.HEADERS) for idx in range(20000))
+    chunks = list(local_history.iter_history_csv(rows))
+    assert len(chunks) > 1
+    assert all(len(chunk) < 2 * local_history.STREAM_CHUNK_SIZE for chunk in chunks)
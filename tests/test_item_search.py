@@ -0,0 +1,83 @@
+from fastapi.testclient import TestClient
+
+
+def _seed(client: TestClient, tab_name: str, names):
+    tab = client.post("/tabs/", json={"name": tab_name}).json()
+    client.post("/tab_fields/", json={"tab_id": tab["id"], "name": "Spec"})
+    box = client.post("/boxes/", json={"name": f"{tab_name} box", "tab_id": tab["id"]}).json()
+    created = []
+    for name, spec, serials in names:
+        resp = client.post(
+            "/items/",
+            json={
+                "name": name,
+                "tab_id": tab["id"],
+                "box_id": box["id"],
+                "qty": 1,
+                "metadata_json": {"Spec": spec},
+                "serial_number": serials,
+            },
+        )
+        assert resp.status_code == 200, resp.text
+        created.append(resp.json())
+    return tab, created
+
+
+def test_search_ranks_name_matches_before_metadata(client: TestClient):
+    tab, _ = _seed(
+        client,
+        "SearchRank",
+        [
+            ("Плата DDR4", "", []),
+            ("Кабель", "совместим с ddr4", []),
+            ("ddr4", "", []),
+            ("Диск", "", ["SN-DDR4-1"]),
+            ("Память", "", []),
+        ],
+    )
+
+    resp = client.get("/items/search", params={"query": "DDR4", "tab_id": tab["id"]})
+    assert resp.status_code == 200
+    body = resp.json()
+    assert [item["name"] for item in body["results"]] == ["ddr4", "Плата DDR4", "Диск", "Кабель"]
+    assert body["next_cursor"] is None
+
+    cyrillic = client.get("/items/search", params={"query": "пЛАТА", "tab_id": tab["id"]}).json()
+    assert [item["name"] for item in cyrillic["results"]] == ["Плата DDR4"]
+
+
+def test_search_cursor_pagination_and_cross_tab(client: TestClient):
+    first_tab, _ = _seed(client, "SearchPageA", [(f"Module {idx}", "", []) for idx in range(5)])
+    second_tab, _ = _seed(client, "SearchPageB", [("Module X", "", [])])
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"query": "module", "tab_id": first_tab["id"], "limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        body = client.get("/items/search", params=params).json()
+        seen.extend(item["id"] for item in body["results"])
+        cursor = body["next_cursor"]
+        if not cursor:
+            break
+    assert len(seen) == len(set(seen)) == 5
+
+    cross = client.get("/items/search", params={"query": "module", "all_tabs": True, "limit": 50}).json()
+    assert {first_tab["id"], second_tab["id"]} <= {item["tab_id"] for item in cross["results"]}
+
+    assert client.get("/items/search", params={"query": "module"}).status_code == 400
+    assert client.get("/items/search", params={"query": "x", "tab_id": 1, "cursor": "%%%"}).status_code == 400
+
+
+def test_search_ignores_metadata_keys(client: TestClient):
+    tab, created = _seed(client, "SearchKeys", [("Блок питания", "500W", [])])
+    field = client.get(f"/tab_fields/{tab['id']}").json()[0]
+    # Ключ в metadata_json — stable_key поля (uuid hex); совпадение с ним не должно находить айтем
+    key_fragment = field["stable_key"][:6]
+    assert key_fragment not in "500W"
+
+    body = client.get("/items/search", params={"query": key_fragment, "tab_id": tab["id"]}).json()
+    assert body["results"] == []
+    found = client.get("/items/search", params={"query": "500w", "tab_id": tab["id"]}).json()
+    assert [item["id"] for item in found["results"]] == [created[0]["id"]]
@@ -0,0 +1,97 @@
+from fastapi.testclient import TestClient
+
+from app.services import sync_dispatcher
+
+
+def _setup_box(client: TestClient, tab_name: str):
+    tab = client.post("/tabs/", json={"name": tab_name}).json()
+    assert client.post("/tab_fields/", json={"tab_id": tab["id"], "name": "Spec"}).status_code == 200
+    box = client.post("/boxes/", json={"name": f"{tab_name} box", "tab_id": tab["id"]}).json()
+    return tab, box
+
+
+def _create_op(tab_id: int, box_id: int, name: str, qty: int = 1):
+    return {
+        "action": "create",
+        "item": {"name": name, "tab_id": tab_id, "box_id": box_id, "qty": qty, "metadata_json": {"Spec": name}},
+    }
+
+
+def test_bulk_mixed_operations_commit_once(client: TestClient, monkeypatch):
+    tab, box = _setup_box(client, "BulkTab")
+    batches = []
+    monkeypatch.setattr(sync_dispatcher, "enqueue_item_batch", lambda events: batches.append(events))
+
+    created = client.post(
+        "/items/bulk",
+        json={"operations": [_create_op(tab["id"], box["id"], f"Part {idx}", qty=2) for idx in range(5)]},
+    )
+    assert created.status_code == 200, created.text
+    body = created.json()
+    assert body["committed"] is True
+    assert [result["status"] for result in body["results"]] == ["ok"] * 5
+    assert [result["item"]["box_position"] for result in body["results"]] == [1, 3, 5, 7, 9]
+    ids = [result["item_id"] for result in body["results"]]
+
+    response = client.post(
+        "/items/bulk",
+        json={
+            "operations": [
+                {"action": "delete", "item_id": ids[0]},
+                {"action": "update", "item_id": ids[1], "changes": {"qty": 1, "box_id": box["id"]}},
+                _create_op(tab["id"], box["id"], "Part new"),
+            ]
+        },
+    )
+    assert response.status_code == 200, response.text
+    results = response.json()["results"]
+    assert [result["index"] for result in results] == [0, 1, 2]
+    assert results[1]["item"]["qty"] == 1
+
+    items = client.get(f"/items/{box['id']}").json()
+    assert [item["name"] for item in items] == ["Part 1", "Part 2", "Part 3", "Part 4", "Part new"]
+    assert [item["box_position"] for item in items] == [1, 2, 4, 6, 8]
+    assert len(batches) == 2
+
+
+def test_bulk_atomic_failure_rolls_back(client: TestClient):
+    tab, box = _setup_box(client, "BulkAtomic")
+
+    response = client.post(
+        "/items/bulk",
+        json={
+            "operations": [
+                _create_op(tab["id"], box["id"], "Kept"),
+                {"action": "create", "item": {"name": "Bad", "tab_id": tab["id"], "box_id": box["id"], "qty": 1, "metadata_json": {"Nope": 1}}},
+                {"action": "delete", "item_id": 999999},
+            ]
+        },
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert body["committed"] is False
+    assert [result["status"] for result in body["results"]] == ["skipped", "error", "error"]
+    assert "Unknown tab fields" in body["results"][1]["detail"]
+    assert client.get(f"/items/{box['id']}").json() == []
+
+    partial = client.post(
+        "/items/bulk",
+        json={"atomic": False, "operations": [_create_op(tab["id"], box["id"], "Kept"), {"action": "delete", "item_id": 999999}]},
+    )
+    assert partial.json()["committed"] is True
+    assert [item["name"] for item in client.get(f"/items/{box['id']}").json()] == ["Kept"]
+
+
+def test_enqueue_item_batch_groups_by_config(monkeypatch):
+    calls = []
+    monkeypatch.setattr(sync_dispatcher.sync_queue, "enqueue_sync_events", lambda config, events: calls.append((config, events)))
+    payload = {"tab": {"sync_config": "Sheet"}, "box": {"name": "A"}, "item": {"name": "x"}}
+
+    result = sync_dispatcher.enqueue_item_batch(
+        [("create", payload), ("update", {"before": payload, "after": payload}), ("delete", None)]
+    )
+
+    assert result["status"] == "queued"
+    assert len(calls) == 1
+    assert calls[0][0] == "Sheet"
+    assert [action for action, _ in calls[0][1]] == ["create", "update"]
@@ -0,0 +1,148 @@
+import re
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import security
+from app.main import app
+from app.services import google_sync, metrics, sync_queue, sync_worker
+from app.utils import local_history
+from tests.fake_redis import FakeRedis
+from tests.test_sync_batching import fake_service  # noqa: F401
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics():
+    metrics.clear()
+    yield
+    metrics.clear()
+
+
+def _sample(text, name, **labels):
+    for line in text.splitlines():
+        if line.startswith("#") or not line.startswith(name):
+            continue
+        metric, value = line.rsplit(" ", 1)
+        if metric.split("{", 1)[0] != name:
+            continue
+        found = dict(re.findall(r'(\w+)="([^"]*)"', metric))
+        if all(found.get(key) == str(val) for key, val in labels.items()):
+            return float(value)
+    return None
+
+
+def test_metrics_endpoint_reports_route_latency_and_sql(client):
+    tab_id = client.post("/tabs/", json={"name": "Метрики"}).json()["id"]
+    assert client.get(f"/tabs/{tab_id}").status_code == 200
+    assert client.get(f"/tabs/{tab_id}").status_code == 200
+
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = resp.text
+
+    # Метка — шаблон маршрута, а не фактический путь
+    route = "/tabs/{tab_id}"
+    assert _sample(text, "http_request_duration_seconds_count", method="GET", route=route, status=200) == 2
+    assert _sample(text, "http_request_duration_seconds_bucket", method="GET", route=route, status=200, le="+Inf") == 2
+    assert _sample(text, "http_response_size_bytes_sum", method="GET", route=route) > 0
+    assert _sample(text, "db_statements_per_request_sum", route=route) >= 2
+    assert _sample(text, "db_time_per_request_seconds_count", route=route) == 2
+    assert _sample(text, "db_statements_total") > 0
+    # Запрос к /metrics ещё выполняется во время отрисовки
+    assert _sample(text, "http_requests_in_flight") == 1
+
+
+def test_unmatched_paths_share_one_label(client):
+    TestClient(app).get("/no-such-page/1")
+    TestClient(app).get("/no-such-page/2")
+    text = client.get("/metrics").text
+    assert _sample(text, "http_request_duration_seconds_count", route="unmatched", status=404) == 2
+    assert "/no-such-page" not in text
+
+
+def test_streamed_export_size_and_xlsx_latency(client):
+    resp = client.get("/issues/export")
+    assert resp.status_code == 200
+    text = client.get("/metrics").text
+    assert _sample(text, "http_response_size_bytes_sum", route="/issues/export") == len(resp.content)
+    assert _sample(text, "history_write_duration_seconds_count", target="xlsx") == 1
+
+
+def test_journal_batches_are_timed(tmp_path):
+    writer = local_history.JournalWriter(tmp_path / "history.jsonl", flush_interval=0.01, batch_size=10)
+    writer.submit({"item_name": "a"})
+    assert writer.flush()
+    assert metrics.HISTORY_WRITE_DURATION.snapshot(target="journal")["count"] == 1
+
+
+def test_sync_jobs_enqueued_per_tab(monkeypatch):
+    enqueued = []
+
+    class FakeQueue:
+        def enqueue(self, *args, **kwargs):
+            enqueued.append(args)
+
+    monkeypatch.setattr(sync_queue, "_queue", lambda: FakeQueue())
+    payload = {"tab": {"id": 7, "sync_config": "cfg"}, "item": {"name": "x"}}
+    sync_queue.enqueue_sync_job("create", payload, config_name="cfg")
+    sync_queue.enqueue_sync_events("cfg", [("update", {"before": payload, "after": payload}), ("delete", payload)])
+
+    assert len(enqueued) == 2
+    assert metrics.SYNC_JOBS_ENQUEUED.value(tab="7") == 3
+
+
+def test_worker_counts_sheets_calls_and_failures(fake_service, monkeypatch):  # noqa: F811
+    redis = FakeRedis()
+    monkeypatch.setattr(sync_queue, "_redis_connection", lambda: redis)
+    monkeypatch.setattr(sync_queue, "clear_last_error", lambda: None)
+    monkeypatch.setattr(sync_queue, "record_sheets_cache_stats", lambda stats: None)
+    payload = {
+        "tab": {"id": 3, "sync_config": "Sheet"},
+        "box": {"name": "Box A"},
+        "item": {"name": "New", "qty": 1, "metadata": {}},
+    }
+
+    sync_worker.handle_sync_events("Sheet", [("create", payload)])
+    assert fake_service.total_calls > 0
+    # Приросты ушли в Redis, реестр процесса воркера обнулён
+    assert metrics.SHEETS_API_CALLS_PER_JOB.snapshot(sync_config="Sheet") is None
+
+    def explode(self):
+        raise RuntimeError("sheets down")
+
+    monkeypatch.setattr(google_sync.TabSyncManager, "flush", explode)
+    with pytest.raises(RuntimeError):
+        sync_worker.handle_sync_events("Sheet", [("create", payload)])
+    with pytest.raises(RuntimeError):
+        sync_worker.handle_sync_events("Sheet", [("create", payload)])
+
+    # Суммы копятся между задачами (и воркерами), а не описывают последнюю задачу
+    text = sync_queue.get_worker_metrics()
+    assert _sample(text, "sync_jobs_failed_total", tab="3") == 2
+    assert _sample(text, "sheets_api_calls_per_job_count", sync_config="Sheet") == 3
+    assert _sample(text, "sheets_api_calls_per_job_sum", sync_config="Sheet") == fake_service.total_calls
+    assert _sample(text, "sheets_api_calls_per_job_bucket", sync_config="Sheet", le="+Inf") == 3
+    assert "http_request_duration_seconds" not in text
+
+
+def test_worker_metrics_stay_in_process_when_redis_is_down(monkeypatch):
+    def unavailable():
+        raise ConnectionError("redis down")
+
+    monkeypatch.setattr(sync_queue, "_redis_connection", unavailable)
+    metrics.SYNC_JOBS_FAILED.inc(tab="5")
+    sync_queue.record_worker_metrics(metrics.drain(metrics.WORKER_METRICS))
+    assert metrics.SYNC_JOBS_FAILED.value(tab="5") == 1
+
+
+def test_metrics_require_scraper_token_or_admin(client, monkeypatch):
+    assert TestClient(app).get("/metrics").status_code == 403
+
+    client.post("/auth/register", json={"user_name": "metrics_viewer", "password": "pass123", "role": "viewer"})
+    token = TestClient(app).post("/auth/login", json={"user_name": "metrics_viewer", "password": "pass123"}).json()["access_token"]
+    assert TestClient(app).get("/metrics", headers={"Authorization": f"Bearer {token}"}).status_code == 403
+
+    monkeypatch.setattr(security, "METRICS_TOKEN", "scrape-secret")
+    assert TestClient(app).get("/metrics", headers={"Authorization": "Bearer scrape-secret"}).status_code == 200
+    assert TestClient(app).get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
@@ -0,0 +1,83 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+from passlib.context import CryptContext
+
+from app import models
+from app.main import app
+from app.services import password_hasher
+from tests.conftest import TestingSessionLocal
+
+
+def test_login_rehashes_outdated_rounds(client):
+    legacy_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("oldpass1")
+    db = TestingSessionLocal()
+    try:
+        db.add(models.User(user_name="legacy_rounds", hashed_password=legacy_hash, role="viewer"))
+        db.commit()
+    finally:
+        db.close()
+
+    before = password_hasher.get_stats()["completed"]
+    resp = TestClient(app).post("/auth/login", json={"user_name": "legacy_rounds", "password": "oldpass1"})
+    assert resp.status_code == 200
+
+    db = TestingSessionLocal()
+    try:
+        stored = db.query(models.User).filter(models.User.user_name == "legacy_rounds").one().hashed_password
+    finally:
+        db.close()
+    assert stored != legacy_hash
+    assert stored.startswith(f"$2b${password_hasher.bcrypt_rounds():02d}$")
+    assert password_hasher.get_stats()["completed"] > before
+
+    wrong = TestClient(app).post("/auth/login", json={"user_name": "legacy_rounds", "password": "nope123"})
+    assert wrong.status_code == 400
+
+
+def test_hashing_does_not_block_event_loop():
+    hashed = password_hasher.pwd_context.hash("storm123")
+
+    async def storm():
+        ticks = 0
+        done = asyncio.Event()
+
+        async def ticker():
+            nonlocal ticks
+            while not done.is_set():
+                ticks += 1
+                await asyncio.sleep(0.005)
+
+        ticker_task = asyncio.create_task(ticker())
+        results = await asyncio.gather(*(password_hasher.verify_password("storm123", hashed) for _ in range(6)))
+        done.set()
+        await ticker_task
+        return ticks, results
+
+    ticks, results = asyncio.run(storm())
+    assert all(ok for ok, _ in results)
+    # Пока идут шесть bcrypt-проверок, цикл событий продолжает обслуживать другие задачи
+    assert ticks > 10
+    stats = password_hasher.get_stats()
+    assert stats["in_flight"] == 0
+    assert stats["max_in_flight"] >= 1
+
+
+def test_inactive_user_login_keeps_outdated_hash(client):
+    legacy_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("oldpass1")
+    db = TestingSessionLocal()
+    try:
+        db.add(models.User(user_name="legacy_inactive", hashed_password=legacy_hash, role="viewer", is_active=False))
+        db.commit()
+    finally:
+        db.close()
+
+    resp = TestClient(app).post("/auth/login", json={"user_name": "legacy_inactive", "password": "oldpass1"})
+    assert resp.status_code == 400
+
+    db = TestingSessionLocal()
+    try:
+        stored = db.query(models.User).filter(models.User.user_name == "legacy_inactive").one().hashed_password
+    finally:
+        db.close()
+    assert stored == legacy_hash
@@ -0,0 +1,154 @@
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from app.services import google_sync, metrics
+from gsheets_parser import quota
+from tests import fake_sheets
+from tests.fake_redis import FakeRedis
+from tests.test_sync_batching import fake_service  # noqa: F401
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(round(seconds, 3))
+        self.now += seconds
+
+
+class FlakyRequest:
+    def __init__(self, failures, result="ok"):
+        self.failures = list(failures)
+        self.result = result
+        self.calls = 0
+
+    def execute(self):
+        self.calls += 1
+        if self.failures:
+            raise self.failures.pop(0)
+        return self.result
+
+
+def _http_error(status, retry_after=None):
+    headers = {"status": str(status)}
+    if retry_after is not None:
+        headers["retry-after"] = str(retry_after)
+    return HttpError(httplib2.Response(headers), b"{}")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(quota, "time", fake)
+    monkeypatch.setenv("SHEETS_QUOTA_REDIS", "0")
+    monkeypatch.setenv("SHEETS_QUOTA_BURST", "10")
+    monkeypatch.setenv("SHEETS_WRITE_QUOTA_PER_MINUTE", "60")
+    monkeypatch.setenv("SHEETS_READ_QUOTA_PER_MINUTE", "60")
+    quota.clear()
+    yield fake
+    quota.clear()
+
+
+def test_burst_is_smoothed_to_the_per_minute_quota(clock):
+    for _ in range(20):
+        assert quota.execute(FlakyRequest([]), "values.batchUpdate") == "ok"
+
+    # Первые 10 проходят сразу, остальные — по токену каждые 60/50 секунды
+    assert len(clock.sleeps) == 10
+    assert clock.sleeps[0] == pytest.approx(1.2)
+    assert sum(clock.sleeps) == pytest.approx(12.0)
+    stats = quota.get_stats()["operations"]["values.batchUpdate"]
+    assert stats["calls"] == 20 and stats["throttled"] == 10 and stats["errors"] == 0
+    # Чтение — отдельная квота
+    quota.execute(FlakyRequest([]), "values.get")
+    assert len(clock.sleeps) == 10
+
+
+def test_429_is_retried_per_request_honouring_retry_after(clock):
+    request = FlakyRequest([_http_error(429, retry_after=7), _http_error(503)])
+    clock.sleeps.clear()
+
+    assert quota.execute(request, "values.get") == "ok"
+    assert request.calls == 3
+    assert clock.sleeps[0] == 7
+    assert 0 <= clock.sleeps[1] <= 2  # без Retry-After: случайно в [0, base * 2**attempt]
+    assert quota.get_stats()["operations"]["values.get"]["retries"] == 2
+
+
+def test_retries_are_bounded_and_other_errors_pass_through(clock, monkeypatch):
+    monkeypatch.setenv("SHEETS_MAX_RETRIES", "3")
+    monkeypatch.setattr(quota.random, "uniform", lambda low, high: high)
+
+    with pytest.raises(HttpError):
+        quota.execute(FlakyRequest([_http_error(429)] * 5), "values.batchUpdate")
+    assert clock.sleeps == [1, 2, 4]
+
+    request = FlakyRequest([_http_error(400)])
+    with pytest.raises(HttpError):
+        quota.execute(request, "values.batchUpdate")
+    assert request.calls == 1
+    assert quota.get_stats()["operations"]["values.batchUpdate"]["errors"] == 2
+
+
+def test_unreachable_redis_falls_back_to_local_bucket(clock, monkeypatch):
+    monkeypatch.setenv("SHEETS_QUOTA_REDIS", "1")
+
+    def unavailable():
+        raise ConnectionError("redis down")
+
+    monkeypatch.setattr(quota, "_redis_connection", unavailable)
+
+    assert quota.execute(FlakyRequest([]), "values.get") == "ok"
+    assert quota.get_stats()["redis"] is False
+
+
+def test_counters_are_shared_through_redis(clock, monkeypatch):
+    redis = FakeRedis()
+    monkeypatch.setenv("SHEETS_QUOTA_REDIS", "1")
+    monkeypatch.setenv("SHEETS_READ_QUOTA_PER_MINUTE", "0")
+    monkeypatch.setattr(quota, "_redis_connection", lambda: redis)
+
+    assert quota.execute(FlakyRequest([_http_error(429, retry_after=3)]), "values.get") == "ok"
+    # Задача воркера закончилась вместе с процессом: счётчики в памяти потеряны, в Redis — нет
+    quota.clear()
+    assert quota.execute(FlakyRequest([]), "values.get") == "ok"
+
+    stats = quota.get_stats()
+    assert stats["scope"] == "redis"
+    assert stats["operations"]["values.get"] == {"calls": 3, "retries": 1, "throttled": 0, "wait_seconds": 3.0, "errors": 0}
+
+
+def test_sync_job_survives_quota_error_without_refetch(fake_service, clock, monkeypatch):  # noqa: F811
+    original = fake_sheets._Request.execute
+    failures = {"values.batchUpdate": [_http_error(429, retry_after=2)]}
+
+    def flaky_execute(self, *args, **kwargs):
+        pending = failures.get(self._operation)
+        if pending:
+            self._service.calls[f"{self._operation}:429"] += 1
+            raise pending.pop(0)
+        return original(self, *args, **kwargs)
+
+    monkeypatch.setattr(fake_sheets._Request, "execute", flaky_execute)
+    metrics.SHEETS_API_REQUESTS.reset()
+
+    manager = google_sync.TabSyncManager("Sheet")
+    manager.handle_update(
+        {"box": {"name": "Box A"}, "item": {"name": "Item 1", "qty": 1, "metadata": {"Spec": "x"}}},
+        {"box": {"name": "Box A"}, "item": {"name": "Item 1", "qty": 5, "metadata": {"Spec": "x"}}},
+    )
+
+    assert fake_service.calls["values.batchUpdate:429"] == 1
+    assert fake_service.calls["values.get"] == 1
+    assert fake_service.cell(2, 2) == "5"
+    assert metrics.SHEETS_API_REQUESTS.value(operation="values.batchUpdate") == 1
+    assert quota.get_stats()["operations"]["values.batchUpdate"]["retries"] == 1
@@ -0,0 +1,55 @@
+import json
+import os
+
+import pytest
+
+from gsheets_parser import parser as sheets_parser
+
+
+@pytest.fixture
+def counted_builds(monkeypatch):
+    counters = {"credentials": 0, "build": 0}
+
+    def fake_from_file(path, scopes=None):
+        counters["credentials"] += 1
+        return object()
+
+    def fake_build(*args, **kwargs):
+        counters["build"] += 1
+        return {"credentials": kwargs.get("credentials")}
+
+    monkeypatch.setattr(sheets_parser.Credentials, "from_service_account_file", fake_from_file)
+    monkeypatch.setattr(sheets_parser, "build", fake_build)
+    sheets_parser.clear_service_cache()
+    yield counters
+    sheets_parser.clear_service_cache()
+
+
+def test_service_is_reused_for_same_credentials_file(tmp_path, counted_builds):
+    creds_path = tmp_path / "credentials.json"
+    creds_path.write_text(json.dumps({"type": "service_account"}))
+
+    first = sheets_parser.build_sheets_service(str(creds_path))
+    for _ in range(5):
+        assert sheets_parser.build_sheets_service(str(creds_path)) is first
+
+    assert counted_builds == {"credentials": 1, "build": 1}
+    stats = sheets_parser.get_service_cache_stats()
+    assert stats["service_misses"] == 1
+    assert stats["service_hits"] == 5
+    assert stats["credentials_misses"] == 1
+    assert stats["credentials_hits"] == 5
+
+
+def test_changed_credentials_file_invalidates_cache(tmp_path, counted_builds):
+    creds_path = tmp_path / "credentials.json"
+    creds_path.write_text(json.dumps({"type": "service_account"}))
+    first = sheets_parser.build_sheets_service(str(creds_path))
+
+    stat = creds_path.stat()
+    os.utime(creds_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    second = sheets_parser.build_sheets_service(str(creds_path))
+
+    assert second is not first
+    assert counted_builds == {"credentials": 2, "build": 2}
+    assert sheets_parser.get_service_cache_stats()["credentials_cached"] == 1
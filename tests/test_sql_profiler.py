@@ -0,0 +1,92 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+from app import models
+from app.main import app
+from app.services import sql_profiler
+from tests.conftest import TestingSessionLocal
+from tests.query_budget import assert_query_budget
+from tests.test_tabs_listing import _create_tab_with_children
+
+
+@pytest.fixture(scope="module")
+def catalog(client):
+    tab = None
+    for idx in range(4):
+        tab = _create_tab_with_children(client, f"Budget{idx}")
+    box_id = client.get(f"/boxes/{tab['id']}").json()[0]["id"]
+    for idx in range(6):
+        item = {"name": f"Budget item {idx}", "tab_id": tab["id"], "box_id": box_id, "qty": 1, "metadata_json": {"Spec": "x"}}
+        assert client.post("/items/", json=item).status_code == 200
+    for idx in range(4):
+        assert client.post("/tags/", json={"name": f"Budget tag {idx}", "tab_id": tab["id"]}).status_code == 200
+    return {"tab_id": tab["id"], "box_id": box_id}
+
+
+def test_statement_shape_ignores_literals_and_in_lists():
+    first = sql_profiler.statement_shape("SELECT * FROM items WHERE id IN (?, ?, ?) AND name = 'a'  LIMIT 10")
+    second = sql_profiler.statement_shape("SELECT * FROM items WHERE id IN (?) AND name = 'b' LIMIT 5")
+    assert first == second == "SELECT * FROM items WHERE id IN (?) AND name = ? LIMIT ?"
+
+
+def test_loop_of_identical_queries_is_flagged_with_call_site():
+    db = TestingSessionLocal()
+    try:
+        with sql_profiler.profile() as profile:
+            for tab_id in range(6):
+                db.execute(select(models.TabField).where(models.TabField.tab_id == tab_id)).all()
+    finally:
+        db.close()
+
+    assert profile.count == 6
+    [(shape, site, hits)] = profile.suspected_n_plus_one(threshold=5)
+    assert hits == 6
+    assert site.startswith("tests/test_sql_profiler.py:")
+    assert "FROM tab_fields" in shape
+    assert profile.summary()["n_plus_one"][0]["call_site"] == site
+
+
+def test_profile_headers_only_for_admin(client, catalog):
+    resp = client.get("/tabs/", headers={sql_profiler.PROFILE_HEADER: "1"})
+    assert int(resp.headers["x-query-count"]) > 0
+    assert float(resp.headers["x-query-time"]) >= 0
+
+    client.post("/auth/register", json={"user_name": "profile_viewer", "password": "pass123", "role": "viewer"})
+    token = TestClient(app).post("/auth/login", json={"user_name": "profile_viewer", "password": "pass123"}).json()["access_token"]
+    resp = TestClient(app).get("/tabs/", headers={"Authorization": f"Bearer {token}", sql_profiler.PROFILE_HEADER: "1"})
+    assert resp.status_code == 200
+    assert "x-query-count" not in resp.headers
+
+    assert "x-query-count" not in client.get("/tabs/").headers
+
+
+def test_env_enables_profiling_for_every_request(client, monkeypatch):
+    monkeypatch.setenv("SQL_PROFILE", "1")
+    resp = TestClient(app).get("/config.js")
+    assert resp.headers["x-query-count"] == "0"
+
+
+# Бюджеты горячих эндпоинтов; +1 на случай промаха кеша пользователей при проверке токена
+@pytest.mark.parametrize(
+    "path, budget",
+    [
+        ("/tabs/", 4),
+        ("/tabs/{tab_id}", 4),
+        ("/boxes/", 2),
+        ("/boxes/{tab_id}", 2),
+        ("/items/{box_id}", 3),
+        ("/items/search?query=Budget&all_tabs=true", 4),
+        ("/tags/", 3),
+        ("/issues/", 4),
+    ],
+)
+def test_hot_endpoint_query_budgets(client, catalog, path, budget):
+    assert_query_budget(client, "GET", path.format(**catalog), budget)
+
+
+def test_reorder_reloads_box_in_one_query(client, catalog):
+    ids = [item["id"] for item in client.get(f"/items/{catalog['box_id']}").json()]
+    payload = {"box_id": catalog["box_id"], "ordered_ids": ids[1:] + ids[:1]}
+    resp = assert_query_budget(client, "POST", "/items/reorder", 6, json=payload)
+    assert [item["id"] for item in resp.json()] == payload["ordered_ids"]
@@ -0,0 +1,236 @@
+import pytest
+
+from app.services import google_sync, sheet_snapshot, sync_queue, sync_worker
+from tests.fake_redis import FakeRedis
+from tests.fake_sheets import FakeSheetsService
+
+CONFIG = {
+    "worksheet_name": "Sheet",
+    "box_column": "Ящик",
+    "fields": {"Имя": "Товар", "Кол-во": "Кол-во", "Spec": "Spec"},
+}
+
+GRID = [
+    ["Ящик", "Товар", "Кол-во", "Spec"],
+    ["Box A", "Item 1", "1", "x"],
+    ["", "Item 2", "2", "y"],
+    ["", "", "", ""],
+    ["Box B", "Other", "1", "z"],
+    ["", "", "", ""],
+    ["", "", "", ""],
+]
+
+
+@pytest.fixture
+def fake_service(monkeypatch):
+    service = FakeSheetsService(GRID)
+    monkeypatch.setattr(google_sync.parser_storage, "get_config", lambda name: dict(CONFIG))
+    monkeypatch.setattr(google_sync.sheets_config, "get_settings", lambda: {"spreadsheet_id": "sheet-id"})
+    monkeypatch.setattr(google_sync.sheets_config, "get_credentials_file", lambda: "credentials.json")
+    monkeypatch.setattr(google_sync.sheets_parser, "build_sheets_service", lambda creds: service)
+    sheet_snapshot.clear()
+    yield service
+    sheet_snapshot.clear()
+
+
+def _payload(box, name, qty=1, spec="x"):
+    return {
+        "tab": {"id": 1, "name": "Tab", "sync_config": "Sheet"},
+        "box": {"id": 1, "name": box},
+        "item": {"id": 1, "name": name, "qty": qty, "metadata": {"Spec": spec}},
+    }
+
+
+def test_batch_of_updates_fetches_sheet_once(fake_service):
+    events = []
+    for qty in range(2, 202):
+        before = _payload("Box A", "Item 1", qty - 1, "x")
+        after = _payload("Box A", "Item 1", qty, "x")
+        events.append(("update", {"before": before, "after": after}))
+
+    manager = google_sync.TabSyncManager("Sheet")
+    manager.apply_events(events)
+
+    assert fake_service.calls["values.get"] == 1
+    assert fake_service.calls["values.batchUpdate"] == 1
+    assert fake_service.calls["spreadsheets.batchUpdate"] == 0
+    assert fake_service.total_calls == 2
+    assert fake_service.cell(2, 2) == "201"
+
+
+def test_batch_mixes_create_update_delete_into_single_write_pair(fake_service):
+    events = [
+        ("create", _payload("Box A", "New 1", 3, "n1")),
+        ("create", _payload("Box B", "New 2", 1, "n2")),
+        ("create", _payload("Box A", "Item 2", 5, "y")),
+        ("update", {"before": _payload("Box A", "New 1", 3, "n1"), "after": _payload("Box A", "New 1", 4, "n1")}),
+        ("delete", _payload("Box B", "Other", 1, "z")),
+    ]
+
+    manager = google_sync.TabSyncManager("Sheet")
+    manager.apply_events(events)
+
+    assert fake_service.calls["values.get"] == 1
+    assert fake_service.calls["spreadsheets.batchUpdate"] == 1
+    assert fake_service.calls["values.batchUpdate"] == 1
+    assert fake_service.calls["spreadsheets.get"] == 1
+
+    rows = [[str(value) for value in row[:4]] + [""] * (4 - len(row[:4])) for row in fake_service.grid]
+    assert rows[:9] == [
+        ["Ящик", "Товар", "Кол-во", "Spec"],
+        ["Box A", "Item 1", "1", "x"],
+        ["", "Item 2", "7", "y"],
+        ["", "New 1", "4", "n1"],
+        ["", "", "", ""],
+        ["Box B", "", "", ""],
+        ["", "New 2", "1", "n2"],
+        ["", "", "", ""],
+        ["", "", "", ""],
+    ]
+
+
+def test_single_event_keeps_request_count(fake_service):
+    manager = google_sync.TabSyncManager("Sheet")
+    manager.handle_create(_payload("Box B", "Fresh", 2, "f"))
+
+    assert fake_service.calls["values.get"] == 1
+    assert fake_service.calls["spreadsheets.batchUpdate"] == 1
+    assert fake_service.calls["values.batchUpdate"] == 1
+    assert fake_service.cell(6, 1) == "Fresh"
+
+
+def test_missing_columns_are_added_in_the_same_write(fake_service, monkeypatch):
+    config = dict(CONFIG, fields={**CONFIG["fields"], "Комментарий": "Комментарий"})
+    monkeypatch.setattr(google_sync.parser_storage, "get_config", lambda name: config)
+
+    manager = google_sync.TabSyncManager("Sheet")
+    manager.handle_update(
+        _payload("Box A", "Item 1", 1, "x"),
+        _payload("Box A", "Item 1", 9, "x"),
+    )
+
+    assert fake_service.calls["values.get"] == 1
+    assert fake_service.calls["values.batchUpdate"] == 1
+    assert fake_service.cell(1, 4) == "Комментарий"
+    assert fake_service.cell(2, 2) == "9"
+
+
+def test_handle_sync_batch_requeues_events_on_failure(fake_service, monkeypatch):
+    events = [("create", _payload("Box A", "Boom", 1, "b"))]
+    requeued = []
+    monkeypatch.setattr(sync_queue, "batch_window_seconds", lambda: 0)
+    monkeypatch.setattr(sync_queue, "pop_batch_events", lambda config: list(events))
+    monkeypatch.setattr(sync_queue, "requeue_batch_events", lambda config, batch, followup: requeued.extend(batch))
+    monkeypatch.setattr(sync_queue, "clear_last_error", lambda: None)
+
+    def explode(self):
+        raise RuntimeError("sheets unavailable")
+
+    monkeypatch.setattr(google_sync.TabSyncManager, "flush", explode)
+
+    with pytest.raises(RuntimeError):
+        sync_worker.handle_sync_batch("Sheet")
+    assert requeued == events
+
+
+def test_failed_value_write_removes_inserted_rows(fake_service, monkeypatch):
+    def broken_write(range_ref, values):
+        raise RuntimeError("values write failed")
+
+    write = fake_service.write
+    grid_before = [list(row) for row in fake_service.grid]
+    monkeypatch.setattr(fake_service, "write", broken_write)
+    with pytest.raises(RuntimeError):
+        google_sync.TabSyncManager("Sheet").handle_create(_payload("Box B", "Fresh", 2, "f"))
+    assert fake_service.grid == grid_before
+    assert fake_service.calls["spreadsheets.batchUpdate"] == 2
+
+    # Повтор задачи вставляет строку один раз
+    monkeypatch.setattr(fake_service, "write", write)
+    google_sync.TabSyncManager("Sheet").handle_create(_payload("Box B", "Fresh", 2, "f"))
+    assert len(fake_service.grid) == len(grid_before) + 1
+    assert fake_service.cell(6, 1) == "Fresh"
+    assert fake_service.cell(7, 1) == ""
+
+
+def test_cached_snapshot_skips_full_fetch_on_next_batch(fake_service):
+    google_sync.TabSyncManager("Sheet").handle_create(_payload("Box A", "Cached", 1, "c"))
+    fake_service.calls.clear()
+
+    manager = google_sync.TabSyncManager("Sheet")
+    manager.handle_update(_payload("Box A", "Cached", 1, "c"), _payload("Box A", "Cached", 6, "c"))
+    manager.handle_create(_payload("Box B", "Second", 1, "s"))
+
+    assert fake_service.calls["values.get"] == 0
+    assert fake_service.calls["values.batchGet"] == 2
+    assert fake_service.cell(4, 2) == "6"
+    assert fake_service.cell(7, 1) == "Second"
+    assert sheet_snapshot.get_stats()["hits"] == 2
+
+
+def test_snapshot_in_redis_survives_the_job_process(fake_service, monkeypatch):
+    redis = FakeRedis()
+    monkeypatch.setenv("SYNC_SNAPSHOT_REDIS", "1")
+    monkeypatch.setattr(sheet_snapshot, "_redis_connection", lambda: redis)
+    google_sync.TabSyncManager("Sheet").handle_create(_payload("Box A", "Shared", 1, "s"))
+    assert sheet_snapshot.get_stats()["cached"] == 1
+    fake_service.calls.clear()
+
+    # Лист больше не разбирается: снимок берётся из памяти или восстанавливается с индексами
+    def no_parse(values, config):
+        raise AssertionError("лист разобран заново")
+
+    monkeypatch.setattr(sheet_snapshot.sheets_parser, "extract_box_structure", no_parse)
+    google_sync.TabSyncManager("Sheet").handle_update(
+        _payload("Box A", "Shared", 1, "s"), _payload("Box A", "Shared", 3, "s")
+    )
+    assert sheet_snapshot.get_stats()["restored"] == 0
+
+    # Следующая задача — в другом процессе или воркере: память пуста, снимок берётся из Redis
+    sheet_snapshot.clear()
+    google_sync.TabSyncManager("Sheet").handle_update(
+        _payload("Box A", "Shared", 3, "s"), _payload("Box A", "Shared", 4, "s")
+    )
+    google_sync.TabSyncManager("Sheet").handle_create(_payload("Box A", "Item 2", 1, "y"))
+
+    assert fake_service.calls["values.get"] == 0
+    assert fake_service.cell(4, 2) == "4"
+    assert fake_service.cell(3, 2) == "3"
+    stats = sheet_snapshot.get_stats()
+    assert stats["hits"] == 2
+    assert stats["restored"] == 1
+
+
+def test_stale_snapshot_is_refetched(fake_service):
+    google_sync.TabSyncManager("Sheet").handle_create(_payload("Box A", "Fresh", 1, "f"))
+    # Кто-то вставил строку вручную — номера строк в снимке сдвинулись.
+    fake_service.grid.insert(1, ["", "", "", ""])
+    fake_service.calls.clear()
+
+    google_sync.TabSyncManager("Sheet").handle_update(
+        _payload("Box A", "Fresh", 1, "f"),
+        _payload("Box A", "Fresh", 3, "f"),
+    )
+
+    assert fake_service.calls["values.get"] == 1
+    assert fake_service.cell(5, 1) == "Fresh"
+    assert fake_service.cell(5, 2) == "3"
+    assert sheet_snapshot.get_stats()["stale"] == 1
+
+
+def test_snapshot_lookup_by_partial_metadata():
+    config = dict(CONFIG)
+    values = [list(row) for row in GRID]
+    header_map = {name: idx for idx, name in enumerate(values[0])}
+    snapshot = sheet_snapshot.WorksheetSnapshot(values, header_map, config, "Имя", "Кол-во")
+
+    box = snapshot.find_box(" box a ")
+    assert box["__header_row"] == 2
+    exact = snapshot.find_item(box, {"name": "item 2", "metadata": {"Spec": "y"}}, lambda *_: False)
+    assert exact["__row_number"] == 3
+    partial = snapshot.find_item(box, {"name": "Item 2", "metadata": {}}, lambda item, payload: True)
+    assert partial is exact
+
+    snapshot.insert_item_row(box, 4, ["", "Item 3", "1", "w"])
+    assert snapshot.find_box("Box B")["__header_row"] == 6
+    assert snapshot.find_item(box, {"name": "Item 3", "metadata": {"Spec": "w"}}, None)["__row_number"] == 4
@@ -0,0 +1,103 @@
+import pytest
+
+from app.services import metrics, sync_queue, sync_worker
+from app.services.sync_compaction import compact_events
+from tests.test_sync_batching import GRID, fake_service  # noqa: F401
+
+
+def _payload(name, qty=1, spec="x", item_id=1, box="Box A"):
+    return {
+        "tab": {"id": 1, "name": "Tab", "sync_config": "Sheet"},
+        "box": {"id": 1, "name": box},
+        "item": {"id": item_id, "name": name, "qty": qty, "metadata": {"Spec": spec}},
+    }
+
+
+def _update(before, after):
+    return ("update", {"before": before, "after": after})
+
+
+def test_chains_collapse_to_net_effect():
+    created = _payload("New", 1)
+    edited = _payload("New", 3)
+    renamed = _payload("New!", 3)
+    assert compact_events([("create", created), _update(created, edited), _update(edited, renamed)]) == [("create", renamed)]
+    assert compact_events([("create", created), _update(created, edited), ("delete", edited)]) == []
+
+    row = _payload("Item 1", 1)
+    assert compact_events([_update(row, edited), _update(edited, renamed)]) == [_update(row, renamed)]
+    # Удалять нужно строку в том виде, в каком она сейчас в листе
+    assert compact_events([_update(row, edited), ("delete", edited)]) == [("delete", row)]
+    assert compact_events([_update(row, edited), _update(edited, row)]) == []
+
+
+def test_items_keep_first_seen_order_and_unkeyed_events_pass_through():
+    first = _payload("First", item_id=1)
+    second = _payload("Second", item_id=2)
+    unkeyed = {"tab": {"sync_config": "Sheet"}, "box": {"name": "Box A"}, "item": {"name": "Legacy"}}
+    events = [
+        ("create", first),
+        ("create", second),
+        ("delete", unkeyed),
+        _update(first, _payload("First", qty=5, item_id=1)),
+    ]
+
+    assert compact_events(events) == [
+        ("create", _payload("First", qty=5, item_id=1)),
+        ("create", second),
+        ("delete", unkeyed),
+    ]
+    # Другой конфиг — другой ключ, даже при том же id айтема
+    other = dict(first, tab={"id": 2, "name": "Other", "sync_config": "Other"})
+    assert compact_events([("create", first), ("delete", other)]) == [("create", first), ("delete", other)]
+
+
+def _sheets_calls(service, monkeypatch, jobs):
+    """
+    Запускает задачи handle_item_sync: каждая получает свои ожидающие события.
+    """
+    queued = list(jobs)
+    monkeypatch.setattr(sync_queue, "pop_item_events", lambda config, item_id: queued.pop(0) if queued else [])
+    monkeypatch.setattr(sync_queue, "clear_last_error", lambda: None)
+    monkeypatch.setattr(sync_queue, "record_sheets_cache_stats", lambda stats: None)
+    # Приросты метрик остаются в процессе, как при недоступном Redis
+    monkeypatch.setattr(sync_queue, "record_worker_metrics", metrics.restore)
+    service.calls.clear()
+    for _ in jobs:
+        sync_worker.handle_item_sync("Sheet", 1)
+    return service.total_calls
+
+
+SESSIONS = {
+    # создали, поправили количество и характеристику
+    "create_then_edit": [
+        ("create", _payload("Fresh", 1, "a")),
+        _update(_payload("Fresh", 1, "a"), _payload("Fresh", 2, "a")),
+        _update(_payload("Fresh", 2, "a"), _payload("Fresh", 2, "b")),
+    ],
+    # создали, поправили и выдали целиком
+    "create_then_issue": [
+        ("create", _payload("Fresh", 1, "a")),
+        _update(_payload("Fresh", 1, "a"), _payload("Fresh", 2, "a")),
+        ("delete", _payload("Fresh", 2, "a")),
+    ],
+    # серия правок существующей строки
+    "repeated_edits": [_update(_payload("Item 1", qty - 1), _payload("Item 1", qty)) for qty in range(2, 7)],
+}
+
+
+@pytest.mark.parametrize(
+    "session, one_job_per_event, compacted",
+    [("create_then_edit", 8, 4), ("create_then_issue", 8, 0), ("repeated_edits", 10, 2)],
+)
+def test_editing_sessions_api_calls(fake_service, monkeypatch, session, one_job_per_event, compacted):  # noqa: F811
+    events = SESSIONS[session]
+    # Воркер успевал за каждой правкой: по задаче на событие, как до сжатия
+    assert _sheets_calls(fake_service, monkeypatch, [[event] for event in events]) == one_job_per_event
+
+    fake_service.grid[:] = [list(row) for row in GRID]
+    sync_worker.sheet_snapshot.clear()
+    metrics.SYNC_EVENTS_COMPACTED.reset()
+    # Правки накопились до того, как воркер взял задачу айтема: одна задача, остальные пустые
+    assert _sheets_calls(fake_service, monkeypatch, [list(events)] + [[] for _ in events[1:]]) == compacted
+    assert metrics.SYNC_EVENTS_COMPACTED.value(sync_config="Sheet") == len(events) - (0 if session == "create_then_issue" else 1)
@@ -0,0 +1,177 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import metrics, sync_dispatcher, sync_jobs, sync_queue, sync_worker
+from tests.fake_redis import FakeRedis
+from tests.test_sync_batching import fake_service  # noqa: F401
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setattr(sync_jobs, "_redis_connection", lambda: fake)
+    monkeypatch.setattr(sync_queue, "_redis_connection", lambda: fake)
+    return fake
+
+
+@pytest.fixture
+def enqueued(monkeypatch):
+    jobs = []
+
+    class FakeQueue:
+        def enqueue(self, func, *args, **kwargs):
+            jobs.append((func, args, kwargs["job_id"]))
+
+        def enqueue_in(self, delay, func, *args, **kwargs):
+            jobs.append((func, args, kwargs["job_id"]))
+
+    monkeypatch.setattr(sync_queue, "_queue", lambda: FakeQueue())
+    return jobs
+
+
+@pytest.fixture
+def worker(monkeypatch):
+    """
+    Текущая задача RQ для sync_worker: id и число оставшихся повторов.
+    """
+    current = SimpleNamespace(id=None, retries_left=0)
+    monkeypatch.setattr(sync_worker, "get_current_job", lambda: current)
+    monkeypatch.setattr(sync_queue, "clear_last_error", lambda: None)
+    monkeypatch.setattr(sync_queue, "record_sheets_cache_stats", lambda stats: None)
+    monkeypatch.setattr(sync_queue, "record_worker_metrics", lambda deltas: None)
+    return current
+
+
+def _payload(name, qty=1, item_id=1, tab_id=1, config="Sheet"):
+    return {
+        "tab": {"id": tab_id, "name": "Tab", "sync_config": config},
+        "box": {"id": 1, "name": "Box A"},
+        "item": {"id": item_id, "name": name, "qty": qty, "metadata": {"Spec": "x"}},
+    }
+
+
+def _job(job_id):
+    return sync_jobs.list_jobs(job_ids=[job_id])[0]
+
+
+def test_result_carries_job_id_and_item_edits_join_it(redis, enqueued):
+    created = sync_dispatcher.run_sync_action("create", _payload("Fresh"))
+    updated = sync_dispatcher.run_sync_action("update", {"before": _payload("Fresh"), "after": _payload("Fresh", 2)})
+
+    assert created["status"] == "queued"
+    job_id = created["job_ids"][0]
+    assert updated["job_ids"] == [job_id]
+    assert enqueued == [("app.services.sync_worker.handle_item_sync", ("Sheet", 1), job_id)]
+    job = _job(job_id)
+    assert job["status"] == "queued"
+    assert job["events"] == 2
+    assert job["attempts"] == 0
+    assert job["tabs"] == ["1"]
+
+    # Воркер забрал события: следующая правка ставит новую задачу
+    sync_queue.pop_item_events("Sheet", 1)
+    later = sync_dispatcher.run_sync_action("delete", _payload("Fresh", 2))
+    assert later["job_ids"][0] != job_id
+    assert len(enqueued) == 2
+
+
+def test_bulk_edits_share_item_lists_with_single_edits(redis, enqueued):
+    single = sync_queue.enqueue_sync_job("create", _payload("Fresh", item_id=1), config_name="Sheet")
+    bulk = sync_queue.enqueue_sync_events(
+        "Sheet",
+        [
+            ("update", {"before": _payload("Fresh", item_id=1), "after": _payload("Fresh", 5, item_id=1)}),
+            ("create", _payload("Other", item_id=2)),
+        ],
+    )
+
+    # Правка айтема 1 досталась его задаче, айтем 2 забрала новая задача пачки
+    assert bulk[1:] == [single]
+    assert enqueued[1] == ("app.services.sync_worker.handle_items_sync", ("Sheet", [2]), bulk[0])
+    assert _job(single)["events"] == 2
+    assert [action for action, _ in sync_queue.pop_item_events("Sheet", 1)] == ["create", "update"]
+
+
+def test_worker_records_status_duration_and_sheets_calls(fake_service, redis, enqueued, worker):  # noqa: F811
+    job_id = sync_queue.enqueue_sync_job(
+        "update", {"before": _payload("Item 1"), "after": _payload("Item 1", 7)}, config_name="Sheet"
+    )
+    assert set(sync_jobs.tab_lag()) == {"1"}
+
+    worker.id = job_id
+    fake_service.calls.clear()
+    sync_worker.handle_item_sync("Sheet", 1)
+
+    job = _job(job_id)
+    assert job["status"] == "succeeded"
+    assert job["attempts"] == 1
+    assert job["sheets_calls"] == fake_service.total_calls > 0
+    assert job["duration"] >= 0
+    assert sync_jobs.tab_lag() == {}
+
+
+def test_failed_attempt_stays_queued_until_retries_run_out(redis, enqueued, worker, monkeypatch):
+    class BrokenManager:
+        api_calls = 0
+
+        def __init__(self, config_name):
+            pass
+
+        def apply_events(self, events):
+            raise RuntimeError("sheet is gone")
+
+    monkeypatch.setattr(sync_worker, "TabSyncManager", BrokenManager)
+    [job_id] = sync_queue.enqueue_sync_events("Sheet", [("create", _payload("A", item_id=1, tab_id=4))])
+    worker.id = job_id
+
+    worker.retries_left = 1
+    with pytest.raises(RuntimeError):
+        sync_worker.handle_items_sync("Sheet", [1])
+    job = _job(job_id)
+    assert job["status"] == "queued"
+    assert job["detail"] == "RuntimeError: sheet is gone"
+    assert set(sync_jobs.tab_lag()) == {"4"}
+    assert len(enqueued) == 1
+
+    worker.retries_left = 0
+    with pytest.raises(RuntimeError):
+        sync_worker.handle_items_sync("Sheet", [1])
+    job = _job(job_id)
+    assert job["status"] == "failed"
+    assert job["attempts"] == 2
+
+    # Повторы кончились, события вернулись в список: их подберёт отложенная задача
+    func, args, followup_id = enqueued[-1]
+    assert (func, args) == ("app.services.sync_worker.handle_items_sync", ("Sheet", [1]))
+    assert _job(followup_id)["status"] == "queued"
+    assert set(sync_jobs.tab_lag()) == {"4"}
+    assert [action for action, _ in sync_queue.pop_item_events("Sheet", 1)] == ["create"]
+
+
+def test_sync_jobs_endpoint_filters_and_reports_lag(client, redis, monkeypatch):
+    sync_jobs.register("sync-a", "Sheet", "handle_item_sync", ["1"], 1)
+    sync_jobs.register("sync-b", "Other", "handle_sync_events", ["2", "3"], 5)
+    sync_jobs.mark_running("sync-a")
+    sync_jobs.mark_finished("sync-a", "succeeded", 0.5, 2)
+
+    body = client.get("/system/sync-jobs").json()
+    assert [job["id"] for job in body["jobs"]] == ["sync-b", "sync-a"]
+    assert set(body["lag"]) == {"2", "3"}
+    # 4 попытки по RQ_DEFAULT_TIMEOUT и паузы повторов 5 + 15 + 30 с
+    assert body["max_wait"] == 4 * 90 + 50
+
+    assert [job["id"] for job in client.get("/system/sync-jobs", params={"status": "queued"}).json()["jobs"]] == ["sync-b"]
+    assert [job["id"] for job in client.get("/system/sync-jobs", params={"tab": "1"}).json()["jobs"]] == ["sync-a"]
+    by_config = client.get("/system/sync-jobs", params={"sync_config": "Other"}).json()["jobs"]
+    assert by_config[0]["events"] == 5
+    by_id = client.get("/system/sync-jobs", params=[("job_id", "sync-a"), ("job_id", "missing")]).json()["jobs"]
+    assert [job["sheets_calls"] for job in by_id] == [2]
+    assert client.get("/system/sync-jobs", params={"status": "done"}).status_code == 422
+
+    metrics.SYNC_LAG_SECONDS.set(99, tab="1")
+    monkeypatch.setenv("METRICS_WORKER_SNAPSHOT", "1")
+    monkeypatch.setattr(sync_queue, "get_worker_metrics", lambda: None)
+    text = client.get("/metrics").text
+    assert 'sync_lag_seconds{tab="2"}' in text
+    assert 'sync_lag_seconds{tab="1"}' not in text
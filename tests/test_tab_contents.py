@@ -0,0 +1,105 @@
+from app import models
+from tests.conftest import TestingSessionLocal
+from tests.query_budget import assert_query_budget
+
+
+def _seed_tab(client, name, boxes=3, items_per_box=3):
+    tab = client.post("/tabs/", json={"name": name}).json()
+    for field_name in ("Spec", "Vendor"):
+        assert client.post("/tab_fields/", json={"tab_id": tab["id"], "name": field_name}).status_code == 200
+    box_ids = []
+    for box_idx in range(boxes):
+        box = client.post("/boxes/", json={"name": f"{name} box {box_idx}", "tab_id": tab["id"]}).json()
+        box_ids.append(box["id"])
+        for idx in range(items_per_box):
+            payload = {
+                "name": f"{name} item {box_idx}-{idx}",
+                "qty": idx + 1,
+                "tab_id": tab["id"],
+                "box_id": box["id"],
+                "metadata_json": {"Spec": f"s{idx}"} if idx % 2 == 0 else {"Vendor": "Acme"},
+                "serial_number": [f"SN{box_idx}{idx}"] if idx == 0 else [],
+            }
+            assert client.post("/items/", json=payload).status_code == 200
+    return tab["id"], box_ids
+
+
+def _as_objects(table):
+    return [dict(zip(table["columns"], row)) for row in table["rows"]]
+
+
+def test_contents_match_per_box_endpoints(client):
+    tab_id, box_ids = _seed_tab(client, "Contents")
+    resp = client.get(f"/tabs/{tab_id}/contents")
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["fields"] == ["Spec", "Vendor"]
+
+    boxes = {box["id"]: box for box in _as_objects(data["boxes"])}
+    for box in client.get(f"/boxes/{tab_id}").json():
+        assert boxes[box["id"]]["items_count"] == box["items_count"]
+
+    items = _as_objects(data["items"])
+    for box_id in box_ids:
+        expected = client.get(f"/items/{box_id}").json()
+        actual = [item for item in items if item["box_id"] == box_id]
+        assert [item["id"] for item in actual] == [item["id"] for item in expected]
+        for got, want in zip(actual, expected):
+            assert got["box_position"] == want["box_position"]
+            assert got["serial_number"] == want["serial_number"]
+            metadata = {name: value for name, value in zip(data["fields"], got["metadata"]) if value is not None}
+            assert metadata == want["metadata_json"]
+
+
+def test_contents_box_subset_and_query_budget(client):
+    tab_id, box_ids = _seed_tab(client, "ContentsSubset", boxes=6)
+    data = assert_query_budget(client, "GET", f"/tabs/{tab_id}/contents", 6).json()
+    assert len(data["boxes"]["rows"]) == 6
+
+    subset = client.get(f"/tabs/{tab_id}/contents", params={"box_ids": box_ids[:2]}).json()
+    assert [row[0] for row in subset["boxes"]["rows"]] == box_ids[:2]
+    assert {row[1] for row in subset["items"]["rows"]} == set(box_ids[:2])
+
+
+def test_contents_etag_follows_tab_changes(client):
+    tab_id, box_ids = _seed_tab(client, "ContentsEtag", boxes=1)
+    other_tab, other_boxes = _seed_tab(client, "ContentsEtagOther", boxes=1)
+
+    first = client.get(f"/tabs/{tab_id}/contents")
+    etag = first.headers["etag"]
+    assert client.get(f"/tabs/{tab_id}/contents", headers={"If-None-Match": etag}).status_code == 304
+
+    # Правка в другой вкладке не сбрасывает ETag
+    other_item = client.get(f"/items/{other_boxes[0]}").json()[0]
+    assert client.put(f"/items/{other_item['id']}", json={"qty": 7, "box_id": other_boxes[0]}).status_code == 200
+    assert client.get(f"/tabs/{tab_id}/contents", headers={"If-None-Match": etag}).status_code == 304
+
+    item = client.get(f"/items/{box_ids[0]}").json()[0]
+    assert client.put(f"/items/{item['id']}", json={"qty": 9, "box_id": box_ids[0]}).status_code == 200
+    changed = client.get(f"/tabs/{tab_id}/contents", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+
+    # Удаление меняет число айтемов вкладки
+    etag = changed.headers["etag"]
+    assert client.delete(f"/items/{item['id']}").status_code == 200
+    assert client.get(f"/tabs/{tab_id}/contents", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_contents_keep_metadata_keys_without_field(client):
+    tab_id, box_ids = _seed_tab(client, "ContentsLegacy", boxes=1, items_per_box=1)
+    db = TestingSessionLocal()
+    try:
+        item = db.query(models.Item).filter(models.Item.box_id == box_ids[0]).one()
+        item.metadata_json = {**(item.metadata_json or {}), "removed-field": "old"}
+        db.commit()
+    finally:
+        db.close()
+
+    data = client.get(f"/tabs/{tab_id}/contents").json()
+    assert data["fields"] == ["Spec", "Vendor", "removed-field"]
+    assert data["items"]["rows"][0][-1][-1] == "old"
+
+
+def test_contents_unknown_tab(client):
+    assert client.get("/tabs/999999/contents").status_code == 404
@@ -0,0 +1,72 @@
+from fastapi.testclient import TestClient
+
+from app import models
+from app.crud import change_counters
+from tests.conftest import TestingSessionLocal
+from tests.query_budget import count_queries
+
+
+def _create_tab_with_children(client: TestClient, name: str):
+    tab = client.post("/tabs/", json={"name": name}).json()
+    for field_name in ("Spec", "Vendor"):
+        assert client.post("/tab_fields/", json={"tab_id": tab["id"], "name": field_name}).status_code == 200
+    for idx in range(2):
+        assert client.post("/boxes/", json={"name": f"{name} box {idx}", "tab_id": tab["id"]}).status_code == 200
+    return tab
+
+
+def test_tab_listing_query_count_does_not_grow_with_tabs(client: TestClient):
+    _create_tab_with_children(client, "ListingA")
+    with count_queries() as few:
+        assert client.get("/tabs/").status_code == 200
+
+    for idx in range(5):
+        _create_tab_with_children(client, f"ListingB{idx}")
+    with count_queries() as many:
+        resp = client.get("/tabs/")
+    assert resp.status_code == 200
+
+    assert len(many) == len(few)
+    listed = {tab["name"]: tab for tab in resp.json()}
+    assert listed["ListingB0"]["box_count"] == 2
+    assert [field["name"] for field in listed["ListingB0"]["fields"]] == ["Spec", "Vendor"]
+
+
+def test_tabs_etag_revalidation(client: TestClient):
+    tab = _create_tab_with_children(client, "EtagTab")
+
+    first = client.get("/tabs/")
+    etag = first.headers["ETag"]
+    cached = client.get("/tabs/", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+
+    single = client.get(f"/tabs/{tab['id']}")
+    assert single.json()["box_count"] == 2
+    assert client.get(f"/tabs/{tab['id']}", headers={"If-None-Match": single.headers["ETag"]}).status_code == 304
+
+    client.post("/boxes/", json={"name": "EtagTab box new", "tab_id": tab["id"]})
+    refreshed = client.get("/tabs/", headers={"If-None-Match": etag})
+    assert refreshed.status_code == 200
+    assert refreshed.headers["ETag"] != etag
+
+
+def test_catalog_counter_is_bumped_once_at_commit(client: TestClient):
+    db = TestingSessionLocal()
+    try:
+        before = change_counters.get_value(db, change_counters.CATALOG)
+        db.add(models.Tab(name="CounterTab"))
+        db.flush()
+        db.add(models.Tab(name="CounterTab 2"))
+        db.flush()
+        # До commit строка счётчика не трогается и не блокируется
+        assert change_counters.get_value(db, change_counters.CATALOG) == before
+        db.commit()
+        assert change_counters.get_value(db, change_counters.CATALOG) == before + 1
+
+        # Первое увеличение нового счётчика — тот же upsert
+        change_counters.bump(db, "counter:new")
+        change_counters.bump(db, "counter:new")
+        db.commit()
+        assert change_counters.get_value(db, "counter:new") == 2
+    finally:
+        db.close()
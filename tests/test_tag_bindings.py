@@ -0,0 +1,49 @@
+from fastapi.testclient import TestClient
+
+from app import models
+from tests.conftest import TestingSessionLocal
+from tests.query_budget import count_queries
+
+
+def _bindings(tag_id: int):
+    with TestingSessionLocal() as db:
+        rows = db.query(models.TagBinding).filter(models.TagBinding.tag_id == tag_id).all()
+        return sorted((row.entity_type, row.entity_id) for row in rows)
+
+
+def test_bindings_follow_crud_changes(client: TestClient):
+    tab = client.post("/tabs/", json={"name": "TagTab"}).json()
+    client.post("/tab_fields/", json={"tab_id": tab["id"], "name": "Spec"})
+    box = client.post("/boxes/", json={"name": "TagBox", "tab_id": tab["id"]}).json()
+    tag = client.post("/tags/", json={"name": "Fragile", "tab_id": tab["id"]}).json()
+    assert tag["attached_tabs"] == [tab["id"]]
+
+    item = client.post(
+        "/items/",
+        json={"name": "Glass", "tab_id": tab["id"], "box_id": box["id"], "qty": 1, "tag_ids": [tag["id"]]},
+    ).json()
+    client.post(f"/tags/{tag['id']}/attach", json={"box_id": box["id"]})
+    assert _bindings(tag["id"]) == sorted([("tab", tab["id"]), ("box", box["id"]), ("item", item["id"])])
+
+    listed = {entry["id"]: entry for entry in client.get("/tags/").json()}
+    assert listed[tag["id"]]["attached_items"] == [item["id"]]
+
+    client.put(f"/items/{item['id']}", json={"tag_ids": [], "box_id": box["id"]})
+    client.post(f"/tags/{tag['id']}/detach", json={"tab_id": tab["id"]})
+    assert _bindings(tag["id"]) == [("box", box["id"])]
+
+
+def test_delete_tag_touches_only_bound_rows(client: TestClient):
+    tab = client.post("/tabs/", json={"name": "TagDeleteTab"}).json()
+    box = client.post("/boxes/", json={"name": "TagDeleteBox", "tab_id": tab["id"]}).json()
+    tag = client.post("/tags/", json={"name": "Obsolete", "box_id": box["id"]}).json()
+
+    with count_queries() as statements:
+        assert client.delete(f"/tags/{tag['id']}").status_code == 200
+
+    # Таблицы вкладок и айтемов целиком не читаются.
+    assert not any("FROM items" in sql and "WHERE" not in sql for sql in statements)
+    assert not any("FROM tabs" in sql and "WHERE" not in sql for sql in statements)
+    assert _bindings(tag["id"]) == []
+    with TestingSessionLocal() as db:
+        assert db.get(models.Box, box["id"]).tag_ids == []
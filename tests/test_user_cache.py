@@ -0,0 +1,100 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from jose import jwt
+from sqlalchemy import update
+
+from app import models
+from app.config import SECRET_KEY
+from app.main import app
+from app.security import ALGORITHM
+from app.services import user_cache
+from tests.conftest import TestingSessionLocal
+from tests.query_budget import count_queries
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    user_cache.clear()
+    yield
+    user_cache.clear()
+
+
+def _login(user_name, password="pass123"):
+    resp = TestClient(app).post("/auth/login", json={"user_name": user_name, "password": password})
+    assert resp.status_code == 200
+    return resp.json()["access_token"]
+
+
+def _register(client, user_name, role="viewer"):
+    resp = client.post("/auth/register", json={"user_name": user_name, "password": "pass123", "role": role})
+    assert resp.status_code == 200
+    return resp.json()["id"]
+
+
+def _get(token, path="/statuses/"):
+    return TestClient(app).get(path, headers={"Authorization": f"Bearer {token}"})
+
+
+def test_token_carries_version_without_role(client):
+    _register(client, "cache_claims", role="editor")
+    claims = jwt.decode(_login("cache_claims"), SECRET_KEY, algorithms=[ALGORITHM])
+    assert "role" not in claims
+    assert claims["tv"] == 0
+
+
+def test_repeated_requests_skip_user_lookup(client):
+    _register(client, "cache_reader")
+    token = _login("cache_reader")
+    assert _get(token).status_code == 200
+
+    with count_queries() as statements:
+        for _ in range(5):
+            assert _get(token).status_code == 200
+    assert not [sql for sql in statements if "FROM users" in sql]
+
+    stats = user_cache.get_stats()
+    assert stats["hits"] >= 5
+    assert 0.5 < stats["hit_rate"] < 1
+
+
+def test_deactivation_and_role_change_revoke_tokens(client):
+    user_id = _register(client, "cache_revoked")
+    token = _login("cache_revoked")
+    assert _get(token).status_code == 200
+
+    assert client.patch(f"/users/{user_id}", json={"role": "editor"}).status_code == 200
+    resp = _get(token)
+    assert resp.status_code == 401
+    assert resp.json()["detail"] == "Token revoked"
+
+    fresh = _login("cache_revoked")
+    assert jwt.decode(fresh, SECRET_KEY, algorithms=[ALGORITHM])["tv"] == 1
+    assert _get(fresh).status_code == 200
+
+    # Повтор той же роли ничего не меняет и токен не отзывает
+    assert client.patch(f"/users/{user_id}", json={"role": "editor"}).status_code == 200
+    assert _get(fresh).status_code == 200
+
+    assert client.patch(f"/users/{user_id}", json={"is_active": False}).status_code == 200
+    assert _get(fresh).status_code == 401
+
+
+def test_external_change_applies_after_ttl(client, monkeypatch):
+    monkeypatch.setenv("AUTH_CACHE_TTL", "0.2")
+    user_id = _register(client, "cache_ttl")
+    token = _login("cache_ttl")
+    assert _get(token).status_code == 200
+
+    # Изменение мимо API (другой процесс): кеш не сброшен, но живёт не дольше TTL
+    db = TestingSessionLocal()
+    try:
+        db.execute(update(models.User).where(models.User.id == user_id).values(is_active=False))
+        db.commit()
+    finally:
+        db.close()
+    assert _get(token).status_code == 200
+    time.sleep(0.25)
+    assert _get(token).status_code == 401
+